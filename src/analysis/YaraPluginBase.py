@@ -1,9 +1,10 @@
 import json
 import logging
 import re
-import subprocess
 from pathlib import Path
 
+import yara
+
 from analysis.PluginBase import AnalysisBasePlugin
 from helperFunctions.fileSystem import get_src_dir
 
@@ -23,30 +24,51 @@ class YaraBasePlugin(AnalysisBasePlugin):
         '''
         self.config = config
         self.signature_path = self._get_signature_file(plugin_path) if plugin_path else None
+        self._compiled_rules, self._compiled_rules_mtime = None, None
         self.SYSTEM_VERSION = self.get_yara_system_version()
         super().__init__(plugin_administrator, config=config, recursive=recursive, plugin_path=plugin_path)
 
     def get_yara_system_version(self):
-        with subprocess.Popen(['yara', '--version'], stdout=subprocess.PIPE) as process:
-            yara_version = process.stdout.readline().decode().strip()
-
+        yara_version = getattr(yara, 'YARA_VERSION', yara.__version__)
         access_time = int(Path(self.signature_path).stat().st_mtime)
         return '{}_{}'.format(yara_version, access_time)
 
+    def worker_processing_with_timeout(self, worker_id, next_task):
+        # load the rules in the worker process, so that the forked analysis process does not have to load them again
+        self._get_compiled_rules()
+        super().worker_processing_with_timeout(worker_id, next_task)
+
     def process_object(self, file_object):
         if self.signature_path is not None:
-            with subprocess.Popen('yara --print-meta --print-strings {} {}'.format(self.signature_path, file_object.file_path), shell=True, stdout=subprocess.PIPE) as process:
-                output = process.stdout.read().decode()
             try:
-                result = self._parse_yara_output(output)
+                matches = self._match(self._get_compiled_rules(), file_object)
+            except yara.Error as error:
+                logging.error('{}: yara scan of {} failed: {}'.format(self.NAME, file_object.uid, error))
+                file_object.processed_analysis[self.NAME] = {'ERROR': 'Processing corrupted. Likely bad call to yara.'}
+            else:
+                result = _convert_matches_to_result(matches)
                 file_object.processed_analysis[self.NAME] = result
                 file_object.processed_analysis[self.NAME]['summary'] = list(result.keys())
-            except (ValueError, TypeError):
-                file_object.processed_analysis[self.NAME] = {'ERROR': 'Processing corrupted. Likely bad call to yara.'}
         else:
             file_object.processed_analysis[self.NAME] = {'ERROR': 'Signature path not set'}
         return file_object
 
+    def _get_compiled_rules(self) -> yara.Rules:
+        '''
+        the compiled signatures are loaded once per process and reloaded if the signature file changes
+        '''
+        modification_time = Path(self.signature_path).stat().st_mtime
+        if self._compiled_rules is None or self._compiled_rules_mtime != modification_time:
+            self._compiled_rules = yara.load(self.signature_path)
+            self._compiled_rules_mtime = modification_time
+        return self._compiled_rules
+
+    @staticmethod
+    def _match(rules: yara.Rules, file_object) -> list:
+        if file_object.binary is not None:
+            return rules.match(data=file_object.binary)
+        return rules.match(filepath=file_object.file_path)
+
     @staticmethod
     def _get_signature_file_name(plugin_path):
         return plugin_path.split('/')[-3] + '.yc'
@@ -69,6 +91,42 @@ class YaraBasePlugin(AnalysisBasePlugin):
         return resulting_matches
 
 
+def _convert_matches_to_result(matches) -> dict:
+    '''
+    creates the same result as _parse_yara_output() for the output of "yara --print-meta --print-strings"
+    rules without matched strings are omitted
+    '''
+    resulting_matches = dict()
+    for match in matches:
+        strings = [(offset, identifier, _escape_matched_data(data)) for offset, identifier, data in _get_matched_strings(match)]
+        if strings:
+            resulting_matches[match.rule] = dict(rule=match.rule, matches=True, strings=strings, meta=_convert_meta_data(match.meta))
+    return resulting_matches
+
+
+def _get_matched_strings(match):
+    '''
+    yara-python < 4.3 returns tuples (offset, identifier, data), newer versions return one object per string
+    '''
+    for string in match.strings:
+        if isinstance(string, tuple):
+            yield string
+        else:
+            for instance in string.instances:
+                yield instance.offset, string.identifier, instance.matched_data
+
+
+def _escape_matched_data(data: bytes) -> bytes:
+    '''
+    escapes non printable characters like the yara command line tool
+    '''
+    return ''.join(chr(byte) if 32 <= byte <= 126 else '\\x{:02X}'.format(byte) for byte in data).encode()
+
+
+def _convert_meta_data(meta: dict) -> dict:
+    return {key: value if isinstance(value, bool) else str(value) for key, value in meta.items()}
+
+
 def _split_output_in_rules_and_matches(output):
     split_regex = re.compile(r'\n*.*\[.*\]\s/.+\n*')
     match_blocks = split_regex.split(output)
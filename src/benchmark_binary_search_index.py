@@ -0,0 +1,126 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import os
+import random
+import sys
+from configparser import ConfigParser
+from tempfile import TemporaryDirectory
+from time import time
+from typing import Dict, Optional
+
+from helperFunctions.program_setup import program_setup
+from helperFunctions.yara_binary_search import YaraBinarySearchScanner
+from objects.file import FileObject
+from storage.fs_organizer import FS_Organizer
+
+PROGRAM_NAME = 'FACT Binary Search Index Benchmark'
+PROGRAM_DESCRIPTION = 'Compare the binary search with and without the n-gram index on a synthetic corpus'
+
+NUMBER_OF_FILES = 2000
+NUMBER_OF_FILES_TESTING = 20
+MAX_FILE_SIZE = 64 * 1024
+RARE_STRING = b'fact_benchmark_rare_string'
+RARE_STRING_PROBABILITY = 0.01
+BENCHMARK_RULES = {
+    'rare literal': 'rule rare {{strings: $a = "{}" condition: $a}}'.format(RARE_STRING.decode()),
+    'common literal': 'rule common {strings: $a = "the" condition: $a}',
+    'hex string': 'rule hex {strings: $a = { 7F 45 4C 46 ?? ?? 01 } condition: $a}',
+    'regex (full scan)': 'rule regex {strings: $a = /fact_benchmark_[a-z]+_string/ condition: $a}',
+}
+WORDS = [b'the', b'firmware', b'kernel', b'busybox', b'config', b'password', b'version', b'network', b'\x7fELF\x01\x01\x01']
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    number_of_files = NUMBER_OF_FILES_TESTING if args.testing else NUMBER_OF_FILES
+    with TemporaryDirectory(prefix='fact_binary_search_benchmark_') as tmp_dir:
+        indexed_config = _get_benchmark_config(config, tmp_dir, os.path.join(tmp_dir, 'index'))
+        logging.info('storing and indexing {} files'.format(number_of_files))
+        indexing_time = _create_corpus(indexed_config, number_of_files)
+        results = {
+            'full scan': _run_searches(_get_benchmark_config(config, tmp_dir, None)),
+            'index': _run_searches(indexed_config),
+        }
+    _print_results(results, number_of_files, indexing_time)
+    return 0
+
+
+def _get_benchmark_config(config: ConfigParser, tmp_dir: str, index_directory: Optional[str]) -> ConfigParser:
+    benchmark_config = ConfigParser(interpolation=None)
+    benchmark_config.read_dict({section: dict(config.items(section, raw=True)) for section in config.sections()})
+    benchmark_config.set('data_storage', 'firmware_file_storage_directory', os.path.join(tmp_dir, 'storage'))
+    benchmark_config.set('data_storage', 'additional_file_storage_directories', '')
+    benchmark_config.set('data_storage', 'binary_search_index_directory', index_directory or '')
+    return benchmark_config
+
+
+def _create_corpus(config: ConfigParser, number_of_files: int) -> float:
+    '''
+    creates files of random bytes and words, some of them contain RARE_STRING
+    :return: time needed for storing and indexing the files in seconds
+    '''
+    fs_organizer = FS_Organizer(config=config)
+    start_time = time()
+    for _ in range(number_of_files):
+        fs_organizer.store_file(FileObject(binary=_create_file_content()))
+    fs_organizer.binary_search_index.update()
+    return time() - start_time
+
+
+def _create_file_content() -> bytes:
+    content = bytearray()
+    size = random.randint(1, MAX_FILE_SIZE)
+    while len(content) < size:
+        content.extend(random.choice(WORDS) + b' ' if random.random() < 0.5 else os.urandom(random.randint(1, 64)))
+    if random.random() < RARE_STRING_PROBABILITY:
+        content.extend(RARE_STRING)
+    return bytes(content)
+
+
+def _run_searches(config: ConfigParser) -> Dict[str, Dict]:
+    '''
+    :return: dict of rule name -> search time and number of matches
+    '''
+    results = {}
+    scanner = YaraBinarySearchScanner(config=config)
+    for name, rule in BENCHMARK_RULES.items():
+        start_time = time()
+        search_result = scanner.get_binary_search_result((rule.encode(), None))
+        results[name] = {'time': time() - start_time, 'matches': sum(len(uids) for uids in search_result.values())}
+    return results
+
+
+def _print_results(results: Dict[str, Dict[str, Dict]], number_of_files: int, indexing_time: float):
+    lines = [
+        'stored and indexed {} files in {:.2f} s'.format(number_of_files, indexing_time),
+        '{:<20}{}'.format('search time / s', ''.join('{:>15}'.format(mode) for mode in results)),
+    ]
+    for name in BENCHMARK_RULES:
+        lines.append('{:<20}{}'.format(name, ''.join('{:>15.3f}'.format(results[mode][name]['time']) for mode in results)))
+        if len({results[mode][name]['matches'] for mode in results}) != 1:
+            lines.append('  error: the numbers of matches differ')
+    print(os.linesep.join(lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
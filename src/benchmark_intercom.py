@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import os
+import random
+import sys
+from configparser import ConfigParser
+from multiprocessing import Queue
+from statistics import mean, median
+from time import sleep, time
+from typing import Dict, List
+
+from helperFunctions.database import ConnectTo
+from helperFunctions.program_setup import program_setup
+from intercom.back_end_binding import InterComBackEndBinding
+from intercom.common_mongo_binding import InterComListener, InterComMongoInterface
+from storage.MongoMgr import MongoMgr
+
+PROGRAM_NAME = 'FACT InterCom Benchmark'
+PROGRAM_DESCRIPTION = 'Compare the task dispatch latency of the intercom with polling and with push notifications'
+
+BENCHMARK_DATABASE_PREFIX = 'fact_intercom_benchmark'
+TRANSPORTS = ['polling', 'push']
+NUMBER_OF_TASKS = 50
+NUMBER_OF_TASKS_TESTING = 3
+
+
+class LatencyListener(InterComListener):
+
+    CONNECTION_TYPE = 'test'
+
+    def post_processing(self, task, task_id):
+        return time() - task
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    logging.info('Try to start Mongo Server...')
+    mongo_server = MongoMgr(config=config)
+
+    number_of_tasks = NUMBER_OF_TASKS_TESTING if args.testing else NUMBER_OF_TASKS
+    results = {}
+    for transport in TRANSPORTS:
+        logging.info('measuring dispatch latency with {}'.format(transport))
+        benchmark_config = _get_benchmark_config(config, transport)
+        results[transport] = _measure_latencies(benchmark_config, number_of_tasks)
+        _drop_benchmark_databases(benchmark_config)
+    _print_results(results)
+
+    if args.testing:
+        logging.info('Stopping Mongo Server...')
+        mongo_server.shutdown()
+
+    return 0
+
+
+def _get_benchmark_config(config: ConfigParser, transport: str) -> ConfigParser:
+    benchmark_config = ConfigParser(interpolation=None)
+    benchmark_config.read_dict({section: dict(config.items(section, raw=True)) for section in config.sections()})
+    benchmark_config.set('data_storage', 'intercom_database_prefix', BENCHMARK_DATABASE_PREFIX)
+    benchmark_config.set('ExpertSettings', 'intercom_push_notifications', 'true' if transport == 'push' else 'false')
+    return benchmark_config
+
+
+def _measure_latencies(config: ConfigParser, number_of_tasks: int) -> List[float]:
+    '''
+    sends timestamps to a listener of the backend binding, which returns the time the task was on its way
+    the tasks are sent at random points in time, since the latency of polling depends on the phase of the poll loop
+    :return: latencies in seconds
+    '''
+    latency_queue = Queue()
+    backend_binding = InterComBackEndBinding(config=config, testing=True)
+    backend_binding._start_listener(LatencyListener, latency_queue.put)  # pylint: disable=protected-access
+    latencies = []
+    with ConnectTo(InterComMongoInterface, config) as sender:
+        for _ in range(number_of_tasks):
+            sleep(random.uniform(0, backend_binding.poll_delay))
+            sender.send_task(LatencyListener.CONNECTION_TYPE, time())
+            latencies.append(latency_queue.get(timeout=float(config['ExpertSettings'].get('communication_timeout', '60'))))
+    backend_binding.shutdown()
+    latency_queue.close()
+    return latencies
+
+
+def _drop_benchmark_databases(config: ConfigParser):
+    with ConnectTo(InterComMongoInterface, config) as db_interface:
+        for database_name in db_interface.client.list_database_names():
+            if database_name.startswith(BENCHMARK_DATABASE_PREFIX):
+                db_interface.client.drop_database(database_name)
+
+
+def _print_results(results: Dict[str, List[float]]):
+    lines = ['{:<20}{}'.format('latency / ms', ''.join('{:>15}'.format(transport) for transport in TRANSPORTS))]
+    for name, function in [('mean', mean), ('median', median), ('max', max)]:
+        lines.append('{:<20}{}'.format(name, ''.join('{:>15.1f}'.format(function(results[transport]) * 1000) for transport in TRANSPORTS)))
+    print(os.linesep.join(lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
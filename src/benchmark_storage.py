@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import os
+import sys
+from configparser import ConfigParser
+from tempfile import TemporaryDirectory
+from time import time
+from typing import Dict, List
+
+from helperFunctions.database import ConnectTo
+from helperFunctions.program_setup import program_setup
+from objects.file import FileObject
+from objects.firmware import Firmware
+from storage.db_interface_admin import AdminDbInterface
+from storage.db_interface_backend import BackEndDbInterface
+from storage.db_interface_frontend import FrontEndDbInterface
+from storage.MongoMgr import MongoMgr
+
+PROGRAM_NAME = 'FACT Storage Benchmark'
+PROGRAM_DESCRIPTION = 'Compare the throughput of the MongoDB and the embedded storage backend on the same workload'
+
+BENCHMARK_DATABASE_PREFIX = 'fact_storage_benchmark'
+STORAGE_BACKENDS = ['mongodb', 'embedded']
+NUMBER_OF_FILES = 2000
+NUMBER_OF_FILES_TESTING = 20
+NUMBER_OF_SEARCHES = 100
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    logging.info('Try to start Mongo Server...')
+    mongo_server = MongoMgr(config=_get_benchmark_config(config, 'mongodb', None))
+
+    number_of_files = NUMBER_OF_FILES_TESTING if args.testing else NUMBER_OF_FILES
+    results = {}
+    with TemporaryDirectory(prefix='fact_storage_benchmark_') as embedded_storage_directory:
+        for storage_backend in STORAGE_BACKENDS:
+            logging.info('running benchmark workload on {} storage backend'.format(storage_backend))
+            benchmark_config = _get_benchmark_config(config, storage_backend, embedded_storage_directory)
+            results[storage_backend] = _run_workload(benchmark_config, *_create_test_objects(number_of_files))
+            _drop_benchmark_databases(benchmark_config)
+    _print_results(results)
+
+    if args.testing:
+        logging.info('Stopping Mongo Server...')
+        mongo_server.shutdown()
+
+    return 0
+
+
+def _get_benchmark_config(config: ConfigParser, storage_backend: str, embedded_storage_directory: str) -> ConfigParser:
+    benchmark_config = ConfigParser(interpolation=None)
+    benchmark_config.read_dict({section: dict(config.items(section, raw=True)) for section in config.sections()})
+    benchmark_config.set('data_storage', 'storage_backend', storage_backend)
+    benchmark_config.set('data_storage', 'embedded_storage_directory', embedded_storage_directory or '')
+    benchmark_config.set('data_storage', 'main_database', BENCHMARK_DATABASE_PREFIX)
+    benchmark_config.set('data_storage', 'sanitize_database', '{}_sanitize'.format(BENCHMARK_DATABASE_PREFIX))
+    benchmark_config.set('data_storage', 'intercom_database_prefix', '{}_intercom'.format(BENCHMARK_DATABASE_PREFIX))
+    return benchmark_config
+
+
+def _create_test_objects(number_of_files: int):
+    firmware = Firmware(binary=b'benchmark firmware')
+    firmware.set_device_name('benchmark device')
+    firmware.set_device_class('benchmark class')
+    firmware.set_vendor('benchmark vendor')
+    firmware.set_release_date('1970-01-01')
+    firmware.version = '1.0'
+    firmware.processed_analysis = _get_analysis_results('firmware')
+    file_objects = []
+    for index in range(number_of_files):
+        file_object = FileObject(binary='benchmark file {}'.format(index).encode(), file_name='file_{}'.format(index))
+        file_object.file_path = '/bin/file_{}'.format(index)
+        firmware.add_included_file(file_object)
+        file_object.parent_firmware_uids = {firmware.uid}
+        file_object.processed_analysis = _get_analysis_results(index)
+        file_objects.append(file_object)
+    return firmware, file_objects
+
+
+def _get_analysis_results(index) -> dict:
+    return {
+        'file_type': {'mime': 'application/x-benchmark-{}'.format(index if index == 'firmware' else index % 10), 'full': 'benchmark file', 'summary': []},
+        'file_hashes': {'sha256': '{:064x}'.format(hash(str(index)) % 2 ** 256), 'summary': []},
+        'benchmark': {'result': 'x' * 512, 'summary': ['summary {}'.format(index if index == 'firmware' else index % 5)]},
+    }
+
+
+def _run_workload(config: ConfigParser, firmware: Firmware, file_objects: List[FileObject]) -> Dict[str, float]:
+    '''
+    :return: dict of workload step -> operations per second
+    '''
+    objects = [firmware, *file_objects]
+    results = {}
+    with ConnectTo(BackEndDbInterface, config) as backend_interface:
+        results['insert objects'] = _measure(len(objects), lambda: [backend_interface.add_object(fo) for fo in objects])
+        for fo in objects:
+            fo.processed_analysis['update'] = {'result': 'updated', 'summary': []}
+        results['add analysis'] = _measure(len(objects), lambda: [backend_interface.add_analysis(fo) for fo in objects])
+    with ConnectTo(FrontEndDbInterface, config) as frontend_interface:
+        results['get object'] = _measure(len(objects), lambda: [frontend_interface.get_object(fo.uid) for fo in objects])
+        results['search'] = _measure(NUMBER_OF_SEARCHES, lambda: [
+            frontend_interface.generic_search({'processed_analysis.file_type.mime': 'application/x-benchmark-{}'.format(index % 10)})
+            for index in range(NUMBER_OF_SEARCHES)
+        ])
+        results['firmware summary'] = _measure(1, lambda: frontend_interface.get_summary(frontend_interface.get_object(firmware.uid), 'benchmark'))
+    with ConnectTo(AdminDbInterface, config) as admin_interface:
+        results['delete firmware'] = _measure(len(objects), lambda: admin_interface.delete_firmware(firmware.uid, delete_root_file=False))
+    return results
+
+
+def _measure(number_of_operations: int, workload) -> float:
+    start_time = time()
+    workload()
+    return number_of_operations / max(time() - start_time, 1e-9)
+
+
+def _drop_benchmark_databases(config: ConfigParser):
+    with ConnectTo(BackEndDbInterface, config) as db_interface:
+        for database_name in db_interface.client.list_database_names():
+            if database_name.startswith(BENCHMARK_DATABASE_PREFIX):
+                db_interface.client.drop_database(database_name)
+
+
+def _print_results(results: Dict[str, Dict[str, float]]):
+    steps = list(results[STORAGE_BACKENDS[0]])
+    lines = ['{:<20}{}'.format('operations / s', ''.join('{:>15}'.format(backend) for backend in STORAGE_BACKENDS))]
+    for step in steps:
+        lines.append('{:<20}{}'.format(step, ''.join('{:>15.1f}'.format(results[backend][step]) for backend in STORAGE_BACKENDS)))
+    print(os.linesep.join(lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
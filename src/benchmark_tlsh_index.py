@@ -0,0 +1,134 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import os
+import random
+import sys
+from tempfile import TemporaryDirectory
+from time import time
+from typing import Dict, List
+
+import tlsh
+
+from helperFunctions.program_setup import program_setup
+from plugins.analysis.tlsh.internal.tlsh_index import TlshIndex
+
+PROGRAM_NAME = 'FACT TLSH Index Benchmark'
+PROGRAM_DESCRIPTION = 'Compare the recall and latency of the tlsh index with the comparison with every hash on a synthetic corpus'
+
+NUMBER_OF_FAMILIES = 2000
+NUMBER_OF_FAMILIES_TESTING = 10
+MUTATION_RATES = [0.01, 0.05, 0.1, 0.2, 0.4]  # every family consists of a random file and variants with these shares of changed bytes
+NUMBER_OF_BACKGROUND_HASHES = 1000000  # hashes of unrelated files, so that the index has the size of a large database
+NUMBER_OF_BACKGROUND_HASHES_TESTING = 1000
+NUMBER_OF_QUERIES = 50
+NUMBER_OF_QUERIES_TESTING = 5
+MAX_DISTANCE = 150
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    args, _ = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    hashes = _create_corpus(NUMBER_OF_FAMILIES_TESTING if args.testing else NUMBER_OF_FAMILIES)
+    queries = random.sample(list(hashes.values()), min(NUMBER_OF_QUERIES_TESTING if args.testing else NUMBER_OF_QUERIES, len(hashes)))
+    hashes.update(_create_background_hashes(NUMBER_OF_BACKGROUND_HASHES_TESTING if args.testing else NUMBER_OF_BACKGROUND_HASHES, hashes))
+    with TemporaryDirectory(prefix='fact_tlsh_index_benchmark_') as tmp_dir:
+        index = TlshIndex(tmp_dir)
+        start_time = time()
+        index.add_hashes(hashes.items())
+        indexing_time = time() - start_time
+        logging.info('running {} queries'.format(len(queries)))
+        expected_results, brute_force_time = _run_queries(lambda tlsh_hash: _get_similar_files_by_comparison(hashes, tlsh_hash), queries)
+        _, first_index_time = _run_queries(lambda tlsh_hash: index.get_similar_files(tlsh_hash, MAX_DISTANCE), queries[:1])
+        results, index_time = _run_queries(lambda tlsh_hash: index.get_similar_files(tlsh_hash, MAX_DISTANCE), queries)
+    _print_results(len(hashes), indexing_time, brute_force_time, first_index_time, index_time, _get_recall(expected_results, results))
+    return 0
+
+
+def _create_corpus(number_of_families: int) -> Dict[str, str]:
+    logging.info('hashing {} files'.format(number_of_families * (len(MUTATION_RATES) + 1)))
+    hashes = {}
+    for family in range(number_of_families):
+        data = os.urandom(int(2 ** random.uniform(8, 20)))
+        hashes['{}_original'.format(family)] = tlsh.hash(data)
+        for mutation_rate in MUTATION_RATES:
+            hashes['{}_{}'.format(family, mutation_rate)] = tlsh.hash(_mutate(data, mutation_rate))
+    return hashes
+
+
+def _create_background_hashes(number_of_hashes: int, hashes: Dict[str, str]) -> Dict[str, str]:
+    '''
+    hashes of unrelated files: the headers (checksum, length value and quartile ratios) of the corpus hashes with random
+    bodies (hashing a million files would take too long)
+    '''
+    logging.info('creating {} background hashes'.format(number_of_hashes))
+    headers = [tlsh_hash[:-64] for tlsh_hash in hashes.values()]
+    return {'background_{}'.format(number): random.choice(headers) + os.urandom(32).hex().upper() for number in range(number_of_hashes)}
+
+
+def _mutate(data: bytes, mutation_rate: float) -> bytes:
+    data = bytearray(data)
+    for _ in range(int(len(data) * mutation_rate) // 16 + 1):
+        position = random.randrange(len(data))
+        data[position:position + 16] = os.urandom(16)
+    return bytes(data)
+
+
+def _get_similar_files_by_comparison(hashes: Dict[str, str], tlsh_hash: str) -> Dict[str, int]:
+    '''
+    the comparison with every hash (as done by the tlsh plugin without index)
+    '''
+    similar_files = {}
+    for uid, other_hash in hashes.items():
+        distance = tlsh.diff(tlsh_hash, other_hash)
+        if distance <= MAX_DISTANCE:
+            similar_files[uid] = distance
+    return similar_files
+
+
+def _run_queries(search_function, queries: List[str]):
+    '''
+    :return: tuple of the results and the average time per query in seconds
+    '''
+    start_time = time()
+    results = [search_function(query) for query in queries]
+    return results, (time() - start_time) / len(queries)
+
+
+def _get_recall(expected_results: List[Dict[str, int]], results: List[Dict[str, int]]) -> float:
+    expected_matches = sum(len(expected_result) for expected_result in expected_results)
+    found_matches = sum(len(expected_result.items() & result.items()) for expected_result, result in zip(expected_results, results))
+    return found_matches / expected_matches if expected_matches else 1.0
+
+
+def _print_results(number_of_hashes: int, indexing_time: float, brute_force_time: float, first_index_time: float, index_time: float, recall: float):
+    print(os.linesep.join([
+        'indexed {} hashes in {:.2f} s'.format(number_of_hashes, indexing_time),
+        '{:<25}{:>15}'.format('time per query / ms', ''),
+        '{:<25}{:>15.2f}'.format('compare with every hash', brute_force_time * 1000),
+        '{:<25}{:>15.2f}'.format('index (first query)', first_index_time * 1000),
+        '{:<25}{:>15.2f}'.format('index', index_time * 1000),
+        'recall of the index: {:.3f}'.format(recall),
+    ]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -29,7 +29,7 @@ class Compare(object):
         fo_list = []
         for uid in uid_list:
             try:
-                fo = self.db_interface.get_complete_object_including_all_summaries(uid)
+                fo = self.db_interface.get_complete_object_including_all_summaries(uid, lazy=True)
                 fo.binary = bs.get_binary_and_file_name(fo.uid)[0]
                 fo_list.append(fo)
             except Exception as exception:
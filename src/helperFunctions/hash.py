@@ -36,6 +36,10 @@ def get_ssdeep_comparison(first, second):
     return ssdeep.compare(first, second)
 
 
+def get_ssdeep_comparisons(hash_pairs):
+    return [ssdeep.compare(first, second) for first, second in hash_pairs]
+
+
 def get_tlsh(code):
     return tlsh.hash(make_bytes(code))
 
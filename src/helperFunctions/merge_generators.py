@@ -1,7 +1,7 @@
 from copy import deepcopy
-from itertools import zip_longest
+from itertools import islice, zip_longest
 from random import sample, seed
-from typing import Sequence
+from typing import Iterable, Iterator, List, Sequence
 
 seed()
 
@@ -74,3 +74,11 @@ def avg(list_: Sequence[float]) -> float:
 
 def shuffled(sequence):
     return sample(sequence, len(sequence))
+
+
+def chunks(iterable: Iterable, chunk_size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunk_size))
@@ -2,20 +2,31 @@ import logging
 import os
 import re
 import sys
-from tempfile import TemporaryDirectory
+from hashlib import sha256
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import Optional, Tuple
 
 from helperFunctions.uid import create_uid
 from objects.firmware import Firmware
 
 OPTIONAL_FIELDS = ['tags', 'device_part']
 DROPDOWN_FIELDS = ['device_class', 'vendor', 'device_name', 'device_part']
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+BATCH_ITEM_FIELDS = ['file_path', 'device_name', 'device_class', 'device_part', 'version', 'vendor', 'release_date', 'requested_analysis_systems']
 
 
-def create_analysis_task(request):
+def create_analysis_task(request, staging_directory=None):
+    '''
+    if a staging directory is given, the uploaded file is streamed to it instead of being read into memory
+    '''
     task = _get_meta_from_request(request)
     if request.files['file']:
-        task['file_name'], task['binary'] = get_file_name_and_binary_from_request(request)
-    task['uid'] = get_uid_of_analysis_task(task)
+        if staging_directory:
+            task['file_name'], task['staged_file_path'], task['uid'] = stage_uploaded_file(request.files['file'], staging_directory)
+        else:
+            task['file_name'], task['binary'] = get_file_name_and_binary_from_request(request)
+    if 'uid' not in task:
+        task['uid'] = get_uid_of_analysis_task(task)
     if task['release_date'] == '':
         # set default value if date field is empty
         task['release_date'] = '1970-01-01'
@@ -31,6 +42,23 @@ def get_file_name_and_binary_from_request(request):  # pylint: disable=invalid-n
     return file_name, file_binary
 
 
+def stage_uploaded_file(request_file, staging_directory: str) -> Tuple[str, str, str]:
+    '''
+    writes the uploaded file block by block to the staging directory and computes its uid on the way
+    :return: tuple of the file name, the path of the staged file and the uid
+    '''
+    file_name = request_file.filename or 'no name'
+    os.makedirs(staging_directory, exist_ok=True)
+    checksum, size = sha256(), 0
+    with NamedTemporaryFile(dir=staging_directory, prefix='fact_upload_', delete=False) as staged_file:
+        for block in iter(lambda: request_file.stream.read(UPLOAD_BLOCK_SIZE), b''):
+            checksum.update(block)
+            size += len(block)
+            staged_file.write(block)
+    os.chmod(staged_file.name, 0o644)
+    return file_name, staged_file.name, '{}_{}'.format(checksum.hexdigest(), size)
+
+
 def create_re_analyze_task(request, uid):
     task = _get_meta_from_request(request)
     task['uid'] = uid
@@ -76,6 +104,10 @@ def convert_analysis_task_to_fw_obj(analysis_task):
     if 'binary' in analysis_task.keys():
         fw.set_binary(analysis_task['binary'])
         fw.file_name = analysis_task['file_name']
+    elif 'staged_file_path' in analysis_task.keys():  # the backend moves the staged file into the file storage
+        fw.file_name = analysis_task['file_name']
+        fw.uid = analysis_task['uid']
+        fw.file_path = analysis_task['staged_file_path']
     else:
         if 'file_name' in analysis_task.keys():
             fw.file_name = analysis_task['file_name']
@@ -91,6 +123,46 @@ def convert_analysis_task_to_fw_obj(analysis_task):
     return fw
 
 
+def get_firmware_import_path(import_directory: str, file_path: str) -> Optional[str]:
+    '''
+    :return: the absolute path of a file in the firmware import directory (file_path is relative to it) or None if the
+             path points outside of the directory
+    '''
+    if not import_directory:
+        return None
+    base_path = os.path.realpath(import_directory)
+    absolute_path = os.path.realpath(os.path.join(base_path, file_path))
+    return absolute_path if absolute_path.startswith(base_path + os.sep) else None
+
+
+def check_for_batch_item_errors(batch_item: dict, import_directory: str) -> Optional[str]:
+    '''
+    :return: an error message if a field of the item of a batch submission is missing or its file is not in the import
+             directory, otherwise None
+    '''
+    for field in BATCH_ITEM_FIELDS:
+        if field not in batch_item:
+            return '{} not found'.format(field)
+    import_path = get_firmware_import_path(import_directory, batch_item['file_path'])
+    if import_path is None or not os.path.isfile(import_path):
+        return 'file {} not found in the import directory'.format(batch_item['file_path'])
+    return None
+
+
+def convert_batch_item_to_fw_obj(batch_item: dict, import_directory: str) -> Firmware:
+    '''
+    reads the file of an item of a batch submission from the import directory
+    :raises ValueError: if the item is invalid
+    '''
+    error = check_for_batch_item_errors(batch_item, import_directory)
+    if error:
+        raise ValueError(error)
+    with open(get_firmware_import_path(import_directory, batch_item['file_path']), 'rb') as firmware_file:
+        binary = firmware_file.read()
+    analysis_task = {'tags': '', 'file_name': os.path.basename(batch_item['file_path']), **batch_item, 'binary': binary}
+    return convert_analysis_task_to_fw_obj(analysis_task)
+
+
 def get_uid_of_analysis_task(analysis_task):
     if analysis_task['binary']:
         uid = create_uid(analysis_task['binary'])
@@ -1,3 +1,5 @@
+from typing import List
+
 from objects.file import FileObject
 
 
@@ -9,17 +11,26 @@ def update_analysis_tags(new_object: FileObject, old_object: dict) -> dict:
     return old_tags
 
 
-def update_included_files(new_object: FileObject, old_object: dict) -> list:
-    old_fi = old_object['files_included']
-    new_fi = new_object.files_included
-    old_fi.extend(new_fi)
-    old_fi = list(set(old_fi))
-    return old_fi
+def get_analysis_tag_updates(new_object: FileObject, old_object: dict) -> dict:
+    '''
+    :return: $set update of the analysis tags of all plugins that changed
+    '''
+    old_tags = old_object.get('analysis_tags', {})
+    return {
+        'analysis_tags.{}'.format(plugin): tags
+        for plugin, tags in new_object.analysis_tags.items() if old_tags.get(plugin) != tags
+    }
+
+
+def get_new_included_files(new_object: FileObject, old_object: dict) -> List[str]:
+    return sorted(set(new_object.files_included).difference(old_object['files_included']))
 
 
-def update_virtual_file_path(new_object: FileObject, old_object: dict) -> dict:
-    old_vfp = old_object['virtual_file_path']
-    new_vfp = new_object.virtual_file_path
-    for key in new_vfp.keys():
-        old_vfp[key] = new_vfp[key]
-    return old_vfp
+def get_virtual_file_path_updates(new_object: FileObject, old_object: dict) -> dict:
+    '''
+    :return: $set update of the virtual file paths of all root objects that changed
+    '''
+    return {
+        'virtual_file_path.{}'.format(root_uid): paths
+        for root_uid, paths in new_object.virtual_file_path.items() if old_object['virtual_file_path'].get(root_uid) != paths
+    }
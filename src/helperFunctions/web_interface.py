@@ -6,8 +6,11 @@ from typing import List
 from common_helper_files import get_binary_from_file
 from passlib.context import CryptContext
 
+from helperFunctions.database import ConnectTo
 from helperFunctions.fileSystem import get_template_dir
 from helperFunctions.uid import is_uid
+from intercom.front_end_binding import InterComFrontEndBinding
+from storage.binary_service import BinaryService
 
 SPECIAL_CHARACTERS = 'ÄäÀàÁáÂâÃãÅåǍǎĄąĂăÆæĀāÇçĆćĈĉČčĎđĐďðÈèÉéÊêËëĚěĘęĖėĒēĜĝĢģĞğĤĥÌìÍíÎîÏïıĪīĮįĴĵĶķĹĺĻļŁłĽľÑñŃńŇňŅņÖöÒòÓóÔôÕõŐőØøŒœŔŕŘřẞßŚśŜŝŞşŠšȘș' \
                      'ŤťŢţÞþȚțÜüÙùÚúÛûŰűŨũŲųŮůŪūŴŵÝýŸÿŶŷŹźŽžŻż'
@@ -78,3 +81,16 @@ def virtual_path_element_to_span(hid_element: str, uid_element, root_uid) -> str
 
 def split_virtual_path(virtual_path: str) -> List[str]:
     return [element for element in virtual_path.split('|') if element]
+
+
+def get_binary_and_file_name(uid, config):
+    '''
+    reads the stored file directly if the file storage is reachable from the frontend and requests it from the backend
+    otherwise
+    :return: tuple of binary and file name or None if the backend did not respond
+    '''
+    file_name, file_path = BinaryService(config=config).get_local_file_name_and_path(uid)
+    if file_path is not None:
+        return get_binary_from_file(file_path), file_name
+    with ConnectTo(InterComFrontEndBinding, config) as intercom:
+        return intercom.get_binary_and_filename(uid)
@@ -1,92 +1,221 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from hashlib import sha256
+from io import BytesIO
+from itertools import islice
+from multiprocessing import get_context
 from os.path import basename
-from subprocess import CalledProcessError
-from tempfile import NamedTemporaryFile
-from typing import Dict, List, Optional, Tuple
+from time import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import yara
-from common_helper_process import execute_shell_command
 
 from helperFunctions.database import ConnectTo
+from helperFunctions.merge_generators import chunks
+from helperFunctions.yara_rule_literals import get_literal_groups
+from storage.binary_search_cache import get_binary_search_cache
+from storage.binary_search_index import get_binary_search_index
 from storage.db_interface_common import MongoInterfaceCommon
 from storage.fs_organizer import FS_Organizer
 
+FILES_PER_SHARD = 100
+PENDING_SHARDS_PER_WORKER = 2
+CANCELLATION_CHECK_INTERVAL = 1
+PARTIAL_RESULT_INTERVAL = 1
+
 
 class YaraBinarySearchScanner:
+    '''
+    Scans the file storage (or the files of a single firmware) with yara rules
+    The files are split into shards (lists of at most FILES_PER_SHARD files) that are scanned with the compiled rules in a
+    pool of binary_search_workers processes. The shards of the whole storage are listed while the search is running.
+    If the binary search index is enabled and the rules contain literals, only the files that may match are scanned.
+    If the binary search cache is enabled, the results are cached (by the hash of the compiled rules and the firmware uid)
+    and a repeated search only scans the files that were stored since the cached search.
+    '''
 
     def __init__(self, config=None):
-        self.matches = []
         self.config = config
-        self.db_path = self.config['data_storage']['firmware_file_storage_directory']
-
-    def _execute_yara_search(self, rule_file_path, target_path=None):
+        self.fs_organizer = FS_Organizer(self.config)
+        self.storage_directories = self.fs_organizer.storage_directories
+        self.binary_search_index = get_binary_search_index(self.config)
+        self.binary_search_cache = get_binary_search_cache(self.config)
+        self.number_of_workers = int(self.config['ExpertSettings'].get('binary_search_workers', '4'))
+
+    def get_binary_search_result(self, task: Tuple[bytes, Optional[str]], partial_result_callback: Optional[Callable[[dict], None]] = None,
+                                 is_cancelled: Optional[Callable[[], bool]] = None):
+        '''
+        :param task: tuple containing the yara_rules (byte string with the contents of the yara rule file) and optionally a firmware uid if only the contents
+                     of a single firmware are to be scanned
+        :param partial_result_callback: is called with the results of the already scanned shards while the search is running
+        :param is_cancelled: is checked while the search is running, the search is stopped if it returns True
+        :return: dict of matching rules with lists of (unique) matched UIDs as values
+        '''
+        yara_rules, firmware_uid = task
+        try:
+            compiled_rules = _compile_rules(yara_rules)
+        except yara.SyntaxError as yara_error:
+            return 'There seems to be an error in the rule file:\n{}'.format(yara_error)
+        literal_groups = get_literal_groups(yara_rules.decode()) if self.binary_search_index is not None else None
+        rules_hash = sha256(compiled_rules).hexdigest()
+        cached_result, cached_generation, generation = None, None, None
+        if self.binary_search_cache is not None:
+            cached_result, cached_generation = self.binary_search_cache.get_result(rules_hash, firmware_uid)
+            generation = self.binary_search_cache.get_generation()
+        try:
+            shards = self._get_shards(firmware_uid, literal_groups, stored_since=cached_generation)
+            results = self._get_valid_cached_results(cached_result, firmware_uid) if cached_result is not None else {}
+            results, number_of_errors = self._scan_shards(compiled_rules, shards, partial_result_callback, is_cancelled, results)
+        except (yara.Error, OSError) as yara_error:
+            return 'Error when calling YARA:\n{}'.format(yara_error)
+        if number_of_errors:  # the result is incomplete and is not cached, so that the files are scanned again next time
+            logging.warning('binary search: could not scan {} files'.format(number_of_errors))
+        elif self.binary_search_cache is not None and not (is_cancelled is not None and is_cancelled()):
+            self.binary_search_cache.put_result(rules_hash, firmware_uid, generation, _get_sorted_results(results))
+        return _get_sorted_results(results)
+
+    def _get_shards(self, firmware_uid: Optional[str], literal_groups: Optional[List[List[bytes]]] = None, stored_since: Optional[int] = None) -> Iterator[List[str]]:
         '''
-        scans the (whole) db directory with the provided rule file and returns the (raw) results
-        yara-python cannot be used, because it (currently) supports single-file scanning only
-        :param rule_file_path: file path to yara rule file
-        :return: output from yara scan
+        :param stored_since: only the files stored after this generation of the binary search cache are scanned if it is set
+        :return: iterator of shards (lists of files that are scanned by one worker)
         '''
-        command = 'yara -r {} {}'.format(rule_file_path, self.db_path if target_path is None else target_path)
-        return execute_shell_command(command)
+        new_uids = self.binary_search_cache.get_uids_stored_since(stored_since) if stored_since is not None else None
+        if firmware_uid is None and new_uids is None:  # no cached result or the journal was pruned in the meantime
+            return chunks(self._filter_candidate_files(self.fs_organizer.get_stored_files(), literal_groups), FILES_PER_SHARD)
+        file_paths = list(self._filter_candidate_files(self._get_file_paths(firmware_uid, new_uids), literal_groups))
+        return chunks(file_paths, self._get_shard_size(len(file_paths)))
 
-    def _execute_yara_search_for_single_firmware(self, rule_file_path, firmware_uid):
-        with ConnectTo(YaraBinarySearchScannerDbInterface, self.config) as connection:
-            file_paths = connection.get_file_paths_of_files_included_in_fo(firmware_uid)
-        result = (self._execute_yara_search(rule_file_path, path) for path in file_paths)
-        return '\n'.join(result)
+    def _get_shard_size(self, number_of_files: int) -> int:
+        '''
+        short lists of files (e.g. of a small firmware) are split evenly over the workers, long ones into shards of
+        FILES_PER_SHARD files
+        '''
+        return max(1, min(FILES_PER_SHARD, -(-number_of_files // max(self.number_of_workers, 1))))
 
-    @staticmethod
-    def _parse_raw_result(raw_result: str) -> Dict[str, List[str]]:
+    def _get_file_paths(self, firmware_uid: Optional[str], new_uids: Optional[Set[str]]) -> List[str]:
         '''
-        :param raw_result: raw yara scan result
-        :return: dict of matching rules with lists of matched UIDs as values
+        :param new_uids: only these files are scanned if it is set (e.g. the files stored since a cached search)
         '''
-        results = {}
-        for line in raw_result.split('\n'):
-            if line and 'warning' not in line:
-                rule, match = line.split(' ')
-                match = basename(match)
-                if rule in results:
-                    results[rule].append(match)
-                else:
-                    results[rule] = [match]
-        return results
-
-    @staticmethod
-    def _eliminate_duplicates(result_dict):
-        for key in result_dict:
-            result_dict[key] = sorted(set(result_dict[key]))
-
-    def get_binary_search_result(self, task: Tuple[bytes, Optional[str]]):
+        if firmware_uid is not None:
+            file_paths = self._get_file_paths_of_firmware(firmware_uid)
+            if new_uids is None:
+                return file_paths
+            return [file_path for file_path in file_paths if basename(file_path) in new_uids]
+        return [self.fs_organizer.get_file_path(uid) for uid in sorted(new_uids)]
+
+    def _get_file_paths_of_firmware(self, firmware_uid: str) -> List[str]:
+        with ConnectTo(YaraBinarySearchScannerDbInterface, self.config) as connection:
+            return connection.get_file_paths_of_files_included_in_fo(firmware_uid)
+
+    def _get_valid_cached_results(self, cached_result: Dict[str, List[str]], firmware_uid: Optional[str]) -> Dict[str, Set[str]]:
         '''
-        :param task: tuple containing the yara_rules (byte string with the contents of the yara rule file) and optionally a firmware uid if only the contents
-                     of a single firmware are to be scanned
-        :return: dict of matching rules with lists of (unique) matched UIDs as values
+        :return: the cached results without the files that were deleted (or are no longer included in the firmware)
         '''
-        with NamedTemporaryFile() as temp_rule_file:
-            yara_rules, firmware_uid = task
-            try:
-                self._prepare_temp_rule_file(temp_rule_file, yara_rules)
-                raw_result = self._get_raw_result(firmware_uid, temp_rule_file)
-                results = self._parse_raw_result(raw_result)
-                self._eliminate_duplicates(results)
-                return results
-            except yara.SyntaxError as yara_error:
-                return 'There seems to be an error in the rule file:\n{}'.format(yara_error)
-            except CalledProcessError as process_error:
-                return 'Error when calling YARA:\n{}'.format(process_error.output.decode())
-
-    def _get_raw_result(self, firmware_uid, temp_rule_file):
-        if firmware_uid is None:
-            raw_result = self._execute_yara_search(temp_rule_file.name)
+        if firmware_uid is not None:
+            valid_uids = {basename(file_path) for file_path in self._get_file_paths_of_firmware(firmware_uid)}
         else:
-            raw_result = self._execute_yara_search_for_single_firmware(temp_rule_file.name, firmware_uid)
-        return raw_result
+            valid_uids = {uid for uids in cached_result.values() for uid in uids if os.path.isfile(self.fs_organizer.get_file_path(uid))}
+        results = {rule: valid_uids.intersection(uids) for rule, uids in cached_result.items()}
+        return {rule: uids for rule, uids in results.items() if uids}
 
-    @staticmethod
-    def _prepare_temp_rule_file(temp_rule_file, yara_rules):
-        compiled_rules = yara.compile(source=yara_rules.decode())
-        compiled_rules.save(file=temp_rule_file)
-        temp_rule_file.flush()
+    def _filter_candidate_files(self, file_paths: Iterable[str], literal_groups: Optional[List[List[bytes]]]) -> Iterable[str]:
+        '''
+        :return: the files that are not indexed or contain the literals of the rules (all files if there are no literal groups)
+        '''
+        if literal_groups is None:
+            return file_paths
+        return self._get_candidate_files(file_paths, literal_groups)
+
+    def _get_candidate_files(self, file_paths: Iterable[str], literal_groups: List[List[bytes]]) -> Iterator[str]:
+        candidate_uids = self.binary_search_index.get_candidate_uids(literal_groups)
+        for chunk in chunks(file_paths, FILES_PER_SHARD):
+            indexed_uids = self.binary_search_index.get_indexed_uids([basename(file_path) for file_path in chunk])
+            yield from (file_path for file_path in chunk if basename(file_path) in candidate_uids or basename(file_path) not in indexed_uids)
+
+    def _scan_shards(self, compiled_rules: bytes, shards: Iterable[List[str]], partial_result_callback, is_cancelled,
+                     results: Optional[Dict[str, Set[str]]] = None) -> Tuple[Dict[str, Set[str]], int]:
+        '''
+        only PENDING_SHARDS_PER_WORKER shards per worker are submitted at a time, so that the shards can be listed while
+        the search is running and a cancelled search does not leave a long queue of shards behind
+        :param results: results that the results of the shards are merged into (e.g. the valid cached results)
+        :return: tuple of the results and the number of files that could not be scanned
+        '''
+        results, number_of_errors, last_update = results if results is not None else {}, 0, time()
+        shards, max_pending = iter(shards), max(self.number_of_workers, 1) * PENDING_SHARDS_PER_WORKER
+        # the scanner runs in a thread of the multithreaded intercom dispatcher, which must not be forked
+        context = get_context('forkserver')
+        cancel_event = context.Event()
+        with ProcessPoolExecutor(max_workers=max(self.number_of_workers, 1), mp_context=context, initializer=_initialize_worker, initargs=(cancel_event,)) as executor:
+            pending = {executor.submit(_scan_shard, compiled_rules, shard) for shard in islice(shards, max_pending)}
+            while pending:
+                if is_cancelled is not None and is_cancelled():
+                    cancel_event.set()  # the running shards are stopped after their current file
+                    for future in pending:
+                        future.cancel()
+                    logging.info('binary search cancelled')
+                    break
+                done, pending = wait(pending, timeout=CANCELLATION_CHECK_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard_results, shard_errors = future.result()
+                    _merge_results(results, shard_results)
+                    number_of_errors += shard_errors
+                pending.update(executor.submit(_scan_shard, compiled_rules, shard) for shard in islice(shards, max_pending - len(pending)))
+                if done and partial_result_callback is not None and pending and time() - last_update >= PARTIAL_RESULT_INTERVAL:
+                    partial_result_callback(_get_sorted_results(results))
+                    last_update = time()
+        return results, number_of_errors
+
+
+_loaded_rules = (None, None)  # the compiled rules are only loaded once by each worker process of the pool
+_cancel_event = None  # is set by the scanner if the search is cancelled
+
+
+def _initialize_worker(cancel_event):
+    global _cancel_event  # pylint: disable=global-statement
+    _cancel_event = cancel_event
+
+
+def _compile_rules(yara_rules: bytes) -> bytes:
+    rule_file = BytesIO()
+    yara.compile(source=yara_rules.decode()).save(file=rule_file)
+    return rule_file.getvalue()
+
+
+def _load_rules(compiled_rules: bytes) -> yara.Rules:
+    global _loaded_rules  # pylint: disable=global-statement
+    if _loaded_rules[0] != compiled_rules:
+        _loaded_rules = (compiled_rules, yara.load(file=BytesIO(compiled_rules)))
+    return _loaded_rules[1]
+
+
+def _scan_shard(compiled_rules: bytes, paths: List[str]) -> Tuple[Dict[str, Set[str]], int]:
+    '''
+    :return: tuple of the results and the number of files that could not be scanned
+    '''
+    rules, results, number_of_errors = _load_rules(compiled_rules), {}, 0
+    for file_path in (path for path in paths if os.path.isfile(path)):  # files may be deleted in the meantime
+        if _cancel_event is not None and _cancel_event.is_set():
+            break
+        try:
+            matches = rules.match(filepath=file_path)
+        except yara.Error as yara_error:
+            if os.path.isfile(file_path):  # a file that was deleted in the meantime is not an error
+                logging.warning('binary search: could not scan {}: {}'.format(file_path, yara_error))
+                number_of_errors += 1
+            continue
+        for match in matches:
+            results.setdefault(match.rule, set()).add(basename(file_path))
+    return results, number_of_errors
+
+
+def _merge_results(results: Dict[str, Set[str]], shard_results: Dict[str, Set[str]]):
+    for rule, uids in shard_results.items():
+        results.setdefault(rule, set()).update(uids)
+
+
+def _get_sorted_results(results: Dict[str, Set[str]]) -> Dict[str, List[str]]:
+    return {rule: sorted(uids) for rule, uids in results.items()}
 
 
 def is_valid_yara_rule_file(rules_file):
@@ -110,6 +239,6 @@ class YaraBinarySearchScannerDbInterface(MongoInterfaceCommon):
     def get_file_paths_of_files_included_in_fo(self, fo_uid: str) -> List[str]:
         fs_organizer = FS_Organizer(self.config)
         return [
-            fs_organizer.generate_path_from_uid(uid)
+            fs_organizer.get_file_path(uid)
             for uid in self.get_uids_of_all_included_files(fo_uid)
         ]
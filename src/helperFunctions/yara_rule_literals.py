@@ -0,0 +1,171 @@
+import re
+from typing import List, Optional, Tuple
+
+MIN_LITERAL_LENGTH = 3
+ALLOWED_TEXT_STRING_MODIFIERS = {'ascii', 'wide', 'fullword', 'private'}
+ALLOWED_CONDITION_TOKENS = {'and', 'or', 'any', 'all', 'of', 'them', '(', ')', ','}
+ESCAPE_SEQUENCES = {'"': b'"', '\\': b'\\', 'n': b'\n', 'r': b'\r', 't': b'\t'}
+TOKEN_REGEX = re.compile(r'\s+|//[^\n]*|/\*.*?\*/|[$#@!]?\w+\*?|[^\s\w]', re.DOTALL)
+
+
+class NotIndexable(Exception):
+    pass
+
+
+def get_literal_groups(yara_rules: str) -> Optional[List[List[bytes]]]:
+    '''
+    extracts literals from yara rules that every matching file must contain
+    this is only possible if each rule matches no file without a match of one of its strings (the condition only
+    combines strings with "and", "or", "any of" and "all of") and each string contains a literal of at least
+    MIN_LITERAL_LENGTH bytes (no regular expressions, nocase or xor strings and no hex strings consisting of
+    alternatives or short byte sequences only)
+    :return: groups of literals (a file can only match if it contains all literals of one group) or None if the rules
+             can match files that contain none of the literals
+    '''
+    try:
+        tokens = _tokenize(yara_rules)
+        literal_groups = []
+        while tokens:
+            literal_groups.extend(_parse_rule(tokens))
+        return literal_groups or None
+    except (NotIndexable, IndexError, ValueError):
+        return None
+
+
+def _tokenize(yara_rules: str) -> List[Tuple[str, str]]:
+    '''
+    :return: list of tuples of token type (word, symbol, string or hex) and value
+    '''
+    tokens, position = [], 0
+    while position < len(yara_rules):
+        if yara_rules[position] == '"':
+            end = _find_end_of_string(yara_rules, position)
+            tokens.append(('string', yara_rules[position + 1:end]))
+            position = end + 1
+        elif yara_rules[position] == '{' and tokens and tokens[-1] == ('symbol', '='):
+            end = yara_rules.index('}', position)
+            tokens.append(('hex', yara_rules[position + 1:end]))
+            position = end + 1
+        elif yara_rules.startswith('/', position) and not yara_rules.startswith(('//', '/*'), position):
+            raise NotIndexable('regular expression')
+        else:
+            match = TOKEN_REGEX.match(yara_rules, position)
+            token = match.group()
+            if not token.isspace() and not token.startswith(('//', '/*')):
+                tokens.append(('word' if token[0].isalnum() or token[0] in '$#@!_' else 'symbol', token))
+            position = match.end()
+    return tokens
+
+
+def _find_end_of_string(yara_rules: str, start: int) -> int:
+    position = start + 1
+    while yara_rules[position] != '"':
+        position += 2 if yara_rules[position] == '\\' else 1
+        if yara_rules[position - 1] == '\n':
+            raise NotIndexable('unterminated string')
+    return position
+
+
+def _parse_rule(tokens: List[Tuple[str, str]]) -> List[List[bytes]]:
+    while tokens[0] == ('word', 'private'):
+        tokens.pop(0)
+    if tokens.pop(0) != ('word', 'rule'):  # e.g. import, include or global rules
+        raise NotIndexable('unsupported statement')
+    tokens.pop(0)  # rule name
+    while tokens.pop(0) != ('symbol', '{'):  # tags
+        pass
+    sections = {}
+    section = None
+    while tokens[0] != ('symbol', '}'):
+        if tokens[0][1] in ['meta', 'strings', 'condition'] and tokens[1] == ('symbol', ':'):
+            section = tokens[0][1]
+            sections[section] = []
+            del tokens[:2]
+        elif section is None:
+            raise NotIndexable('unexpected token')
+        else:
+            sections[section].append(tokens.pop(0))
+    tokens.pop(0)
+    _check_condition(sections.get('condition', []))
+    return _get_literal_groups_of_strings(sections.get('strings', []))
+
+
+def _check_condition(condition: List[Tuple[str, str]]):
+    if not condition:
+        raise NotIndexable('empty condition')
+    for _, token in condition:
+        if token not in ALLOWED_CONDITION_TOKENS and not token.startswith('$'):
+            raise NotIndexable('condition can be true without string matches')
+
+
+def _get_literal_groups_of_strings(strings: List[Tuple[str, str]]) -> List[List[bytes]]:
+    if not strings:
+        raise NotIndexable('rule without strings')
+    literal_groups = []
+    while strings:
+        identifier, assignment, (string_type, value) = strings[:3]
+        if not identifier[1].startswith('$') or assignment != ('symbol', '='):
+            raise NotIndexable('unexpected token')
+        del strings[:3]
+        modifiers = set()
+        while strings and not strings[0][1].startswith('$'):
+            modifiers.add(strings.pop(0)[1])
+        if string_type == 'string':
+            literal_groups.extend(_get_text_string_literals(value, modifiers))
+        elif string_type == 'hex':
+            literal_groups.append(_get_hex_string_literals(value, modifiers))
+        else:
+            raise NotIndexable('unexpected token')
+    return literal_groups
+
+
+def _get_text_string_literals(value: str, modifiers: set) -> List[List[bytes]]:
+    if not modifiers.issubset(ALLOWED_TEXT_STRING_MODIFIERS):
+        raise NotIndexable('unsupported string modifier')
+    literal = _unescape(value)
+    if len(literal) < MIN_LITERAL_LENGTH:
+        raise NotIndexable('string too short')
+    literals = []
+    if 'ascii' in modifiers or 'wide' not in modifiers:
+        literals.append([literal])
+    if 'wide' in modifiers:
+        literals.append([bytes(byte for character in literal for byte in (character, 0))])
+    return literals
+
+
+def _unescape(value: str) -> bytes:
+    literal, position = bytearray(), 0
+    while position < len(value):
+        if value[position] != '\\':
+            literal.extend(value[position].encode())
+            position += 1
+        elif value[position + 1] == 'x':
+            literal.append(int(value[position + 2:position + 4], 16))
+            position += 4
+        elif value[position + 1] in ESCAPE_SEQUENCES:
+            literal.extend(ESCAPE_SEQUENCES[value[position + 1]])
+            position += 2
+        else:
+            raise NotIndexable('unknown escape sequence')
+    return bytes(literal)
+
+
+def _get_hex_string_literals(value: str, modifiers: set) -> List[bytes]:
+    '''
+    :return: the sequences of consecutive fixed bytes (between wildcards and jumps) of a hex string
+    '''
+    if not modifiers.issubset({'private'}) or any(character in value for character in '(|~'):
+        raise NotIndexable('unsupported hex string')
+    value = re.sub(r'\s+', '', value)
+    literals, current_literal = [], bytearray()
+    for token in re.findall(r'\[[^\]]*\]|..', value):
+        if token.startswith('[') or '?' in token:
+            literals.append(bytes(current_literal))
+            current_literal = bytearray()
+        else:
+            current_literal.append(int(token, 16))
+    literals.append(bytes(current_literal))
+    literals = [literal for literal in literals if len(literal) >= MIN_LITERAL_LENGTH]
+    if not literals:
+        raise NotIndexable('no fixed byte sequence in hex string')
+    return literals
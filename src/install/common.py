@@ -58,6 +58,7 @@ def main(distribution):  # pylint: disable=too-many-statements
     apt_install_packages('python3-tlsh')
     pip3_install_packages('git+https://github.com/fkie-cad/fact_helper_file.git')
     pip3_install_packages('psutil')
+    pip3_install_packages('numpy')
     pip3_install_packages('pytest==3.5.1', 'pytest-cov', 'pytest-flake8', 'pylint', 'python-magic', 'xmltodict', 'yara-python==3.7.0', 'appdirs')
     pip3_install_packages('ssdeep')
 
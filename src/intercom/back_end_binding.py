@@ -1,15 +1,19 @@
 import logging
+import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Process, Value
-from time import sleep
+from threading import Event, Lock
 
 from common_helper_mongo.gridfs import overwrite_file
 
 from helperFunctions.database import ConnectTo
+from helperFunctions.mongo_task_conversion import convert_batch_item_to_fw_obj
 from helperFunctions.process import no_operation
 from helperFunctions.yara_binary_search import YaraBinarySearchScanner
 from intercom.common_mongo_binding import InterComListener, InterComListenerAndResponder, InterComMongoInterface
 from storage.binary_service import BinaryService
+from storage.db_interface_backend import BackEndDbInterface
 from storage.db_interface_common import MongoInterfaceCommon
 from storage.fs_organizer import FS_Organizer
 
@@ -17,6 +21,9 @@ from storage.fs_organizer import FS_Organizer
 class InterComBackEndBinding:
     '''
     Internal Communication Backend Binding
+    All listeners are served by a single dispatcher process: it receives the tasks of all connections and hands them
+    to a thread pool per listener, which processes at most MAX_CONCURRENT_TASKS of the listener at a time.
+    Tasks are only received if the pool of the listener has a free worker, so that waiting tasks stay in the database.
     '''
 
     def __init__(self, config=None, analysis_service=None, compare_service=None, unpacking_service=None, testing=False):
@@ -27,6 +34,7 @@ class InterComBackEndBinding:
         self.poll_delay = self.config['ExpertSettings'].getfloat('intercom_poll_delay')
 
         self.stop_condition = Value('i', 0)
+        self.listeners = []
         self.process_list = []
         if not testing:
             self.startup()
@@ -35,6 +43,7 @@ class InterComBackEndBinding:
     def startup(self):
         InterComBackEndAnalysisPlugInsPublisher(config=self.config, analysis_service=self.analysis_service)
         self.start_analysis_listener()
+        self.start_firmware_batch_listener()
         self.start_re_analyze_listener()
         self.start_compare_listener()
         self.start_raw_download_listener()
@@ -43,6 +52,7 @@ class InterComBackEndBinding:
         self.start_update_listener()
         self.start_delete_file_listener()
         self.start_single_analysis_listener()
+        self._start_dispatcher(self.listeners)
 
     def shutdown(self):
         self.stop_condition.value = 1
@@ -51,48 +61,117 @@ class InterComBackEndBinding:
         logging.info('InterCom down')
 
     def start_analysis_listener(self):
-        self._start_listener(InterComBackEndAnalysisTask, self.unpacking_service.add_task)
+        self._add_listener(InterComBackEndAnalysisTask, self.unpacking_service.add_task)
+
+    def start_firmware_batch_listener(self):
+        self._add_listener(InterComBackEndFirmwareBatchTask, self._add_firmware_batch)
+
+    def _add_firmware_batch(self, firmware_batch):
+        for firmware in firmware_batch:
+            self.unpacking_service.add_task(firmware)
 
     def start_re_analyze_listener(self):
-        self._start_listener(InterComBackEndReAnalyzeTask, self.unpacking_service.add_task)
+        self._add_listener(InterComBackEndReAnalyzeTask, self.unpacking_service.add_task)
 
     def start_update_listener(self):
-        self._start_listener(InterComBackEndUpdateTask, self.analysis_service.update_analysis_of_object_and_childs)
+        self._add_listener(InterComBackEndUpdateTask, self.analysis_service.update_analysis_of_object_and_childs)
 
     def start_single_analysis_listener(self):
-        self._start_listener(InterComBackEndSingleFileTask, self.analysis_service.update_analysis_of_single_object)
+        self._add_listener(InterComBackEndSingleFileTask, self.analysis_service.update_analysis_of_single_object)
 
     def start_compare_listener(self):
-        self._start_listener(InterComBackEndCompareTask, self.compare_service.add_task)
+        self._add_listener(InterComBackEndCompareTask, self.compare_service.add_task)
 
     def start_raw_download_listener(self):
-        self._start_listener(InterComBackEndRawDownloadTask, no_operation)
+        self._add_listener(InterComBackEndRawDownloadTask, no_operation)
 
     def start_tar_repack_listener(self):
-        self._start_listener(InterComBackEndTarRepackTask, no_operation)
+        self._add_listener(InterComBackEndTarRepackTask, no_operation)
 
     def start_binary_search_listener(self):
-        self._start_listener(InterComBackEndBinarySearchTask, no_operation)
+        self._add_listener(InterComBackEndBinarySearchTask, no_operation)
 
     def start_delete_file_listener(self):
-        self._start_listener(InterComBackEndDeleteFile, no_operation)
+        self._add_listener(InterComBackEndDeleteFile, no_operation)
+
+    def _add_listener(self, communication_backend, do_after_function):
+        self.listeners.append((communication_backend, do_after_function))
 
     def _start_listener(self, communication_backend, do_after_function):
-        process = Process(target=self._backend_worker, args=(communication_backend, do_after_function))
+        '''
+        starts a dispatcher process that only serves this listener
+        '''
+        self._start_dispatcher([(communication_backend, do_after_function)])
+
+    def _start_dispatcher(self, listeners):
+        process = Process(target=self._dispatcher_main, args=(listeners,))
         process.start()
         self.process_list.append(process)
 
-    def _backend_worker(self, communication_backend, do_after_function):
-        interface = communication_backend(config=self.config)
-        logging.debug('{} listener started'.format(type(interface).__name__))
+    def _dispatcher_main(self, listeners):
+        task_done = Event()
+        workers = [_ListenerWorker(communication_backend(config=self.config), do_after_function, task_done) for communication_backend, do_after_function in listeners]
+        notification_interface = InterComMongoInterface(config=self.config)
+        logging.debug('intercom dispatcher started: {}'.format(', '.join(type(worker.interface).__name__ for worker in workers)))
         while self.stop_condition.value == 0:
-            task = interface.get_next_task()
-            if task is None:
-                sleep(self.poll_delay)
-            else:
-                do_after_function(task)
-        interface.shutdown()
-        logging.debug('{} listener stopped'.format(type(interface).__name__))
+            if not any([worker.dispatch_next_task() for worker in workers]):  # every worker must get the chance to receive a task
+                task_done.clear()
+                available_connections = [worker.interface.CONNECTION_TYPE for worker in workers if worker.is_available()]
+                if available_connections:
+                    notification_interface.wait_for_notification(available_connections, self.poll_delay)
+                else:
+                    task_done.wait(self.poll_delay)
+        for worker in workers:
+            worker.shutdown()
+        notification_interface.shutdown()
+        logging.debug('intercom dispatcher stopped')
+
+
+class _ListenerWorker:
+    '''
+    receives the tasks of a listener and processes them (post processing and do_after_function) in a thread pool
+    '''
+
+    def __init__(self, interface, do_after_function, task_done: Event):
+        self.interface = interface
+        self.do_after_function = do_after_function
+        self.task_done = task_done
+        self.running_tasks = 0
+        self._lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=interface.MAX_CONCURRENT_TASKS)
+
+    def is_available(self) -> bool:
+        return self.running_tasks < self.interface.MAX_CONCURRENT_TASKS
+
+    def dispatch_next_task(self) -> bool:
+        '''
+        :return: True if a task was received and handed to the thread pool
+        '''
+        if not self.is_available():
+            return False
+        received_task = self.interface.receive_task()
+        if received_task is None:
+            return False
+        with self._lock:
+            self.running_tasks += 1
+        self.executor.submit(self._process_task, *received_task)
+        return True
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.interface.shutdown()
+
+    def _process_task(self, task, task_id):
+        try:
+            task = self.interface.post_processing(task, task_id)
+            logging.debug('{}: New task received: {}'.format(self.interface.CONNECTION_TYPE, task))
+            self.do_after_function(task)
+        except Exception as exception:  # pylint: disable=broad-except
+            logging.error('{}: Could not process task {}: {} {}'.format(self.interface.CONNECTION_TYPE, task_id, type(exception), str(exception)))
+        finally:
+            with self._lock:
+                self.running_tasks -= 1
+            self.task_done.set()
 
 
 class InterComBackEndAnalysisPlugInsPublisher(InterComMongoInterface):
@@ -113,11 +192,50 @@ class InterComBackEndAnalysisTask(InterComListener):
 
     def additional_setup(self, config=None):
         self.fs_organizer = FS_Organizer(config=config)
+        self.staging_directory = config['data_storage'].get('upload_staging_directory', '')
 
     def post_processing(self, task, task_id):
-        self.fs_organizer.store_file(task)
+        if task.binary is None:  # the upload was streamed to the staging directory
+            self._store_staged_file(task)
+        else:
+            self.fs_organizer.store_file(task)
         return task
 
+    def _store_staged_file(self, task):
+        staging_directory = os.path.realpath(self.staging_directory) if self.staging_directory else None
+        if not staging_directory or os.path.dirname(os.path.realpath(task.file_path)) != staging_directory:
+            raise ValueError('staged file {} is not in the upload staging directory'.format(task.file_path))
+        self.fs_organizer.store_staged_file(task, task.file_path)
+
+
+class InterComBackEndFirmwareBatchTask(InterComListener):
+
+    CONNECTION_TYPE = 'firmware_batch_task'
+
+    def additional_setup(self, config=None):
+        self.fs_organizer = FS_Organizer(config=config)
+        self.import_directory = config['data_storage'].get('firmware_import_directory', '')
+
+    def post_processing(self, task, task_id):
+        '''
+        :return: generator of the firmware objects of the batch: the files are only read (and stored) one at a time
+        '''
+        batch_id, batch_items = task
+        return self._get_firmware_objects(batch_id, batch_items)
+
+    def _get_firmware_objects(self, batch_id, batch_items):
+        with ConnectTo(BackEndDbInterface, self.config) as db_interface:
+            for index, batch_item in batch_items:
+                try:
+                    firmware = convert_batch_item_to_fw_obj(batch_item, self.import_directory)
+                    self.fs_organizer.store_file(firmware)
+                except (OSError, ValueError) as error:
+                    logging.warning('batch {}: could not import {}: {}'.format(batch_id, batch_item.get('file_path'), error))
+                    db_interface.update_firmware_batch_item(batch_id, index, 'error', message=str(error))
+                    continue
+                db_interface.update_firmware_batch_item(batch_id, index, 'scheduled', uid=firmware.uid)
+                yield firmware
+
 
 class InterComBackEndReAnalyzeTask(InterComListener):
 
@@ -127,7 +245,7 @@ class InterComBackEndReAnalyzeTask(InterComListener):
         self.fs_organizer = FS_Organizer(config=config)
 
     def post_processing(self, task, task_id):
-        file_path = self.fs_organizer.generate_path(task)
+        file_path = self.fs_organizer.get_file_path(task.uid)
         task.set_file_path(file_path)
         return task
 
@@ -151,6 +269,7 @@ class InterComBackEndRawDownloadTask(InterComListenerAndResponder):
 
     CONNECTION_TYPE = 'raw_download_task'
     OUTGOING_CONNECTION_TYPE = 'raw_download_task_resp'
+    MAX_CONCURRENT_TASKS = 8
 
     def get_response(self, task):
         binary_service = BinaryService(config=self.config)
@@ -162,6 +281,7 @@ class InterComBackEndTarRepackTask(InterComListenerAndResponder):
 
     CONNECTION_TYPE = 'tar_repack_task'
     OUTGOING_CONNECTION_TYPE = 'tar_repack_task_resp'
+    MAX_CONCURRENT_TASKS = 2
 
     def get_response(self, task):
         binary_service = BinaryService(config=self.config)
@@ -174,10 +294,57 @@ class InterComBackEndBinarySearchTask(InterComListenerAndResponder):
     CONNECTION_TYPE = 'binary_search_task'
     OUTGOING_CONNECTION_TYPE = 'binary_search_task_resp'
 
-    def get_response(self, task):
-        yara_binary_searcher = YaraBinarySearchScanner(config=self.config)
-        uid_list = yara_binary_searcher.get_binary_search_result(task)
-        return uid_list, task
+    def additional_setup(self, config=None):
+        self.running_searches = set()
+        self._running_searches_lock = Lock()
+
+    def receive_task(self):
+        received_task = super().receive_task()
+        if received_task is not None:
+            with self._running_searches_lock:
+                self.running_searches.add(received_task[1])
+        return received_task
+
+    def post_processing(self, task, task_id):
+        '''
+        the responses are tuples of the (partial) result, the task and a flag that is set if the search is finished
+        partial results are sent while the search is running, each response replaces the previous one
+        '''
+        try:
+            yara_binary_searcher = YaraBinarySearchScanner(config=self.config)
+            result = yara_binary_searcher.get_binary_search_result(
+                task,
+                partial_result_callback=lambda partial_result: self._send_response(task_id, (partial_result, task, False)),
+                is_cancelled=lambda: self.connections['binary_search_cancel']['fs'].exists(filename=task_id)
+            )
+            self._send_response(task_id, (result, task, True))
+        finally:
+            with self._running_searches_lock:
+                self.running_searches.discard(task_id)
+            self._delete_stale_cancel_requests()
+        return task
+
+    def _delete_stale_cancel_requests(self):
+        '''
+        deletes the cancel requests of searches that are neither waiting nor running (e.g. of searches that were
+        cancelled after they had finished)
+        '''
+        cancel_fs = self.connections['binary_search_cancel']['fs']
+        for task_id in cancel_fs.list():
+            with self._running_searches_lock:
+                is_running = task_id in self.running_searches
+            if not is_running and not self.connections[self.CONNECTION_TYPE]['fs'].exists(filename=task_id):
+                for cancel_request in cancel_fs.find({'filename': task_id}):
+                    cancel_fs.delete(cancel_request._id)  # pylint: disable=protected-access
+
+    def _send_response(self, task_id, response):
+        previous_responses = [
+            previous_response._id  # pylint: disable=protected-access
+            for previous_response in self.connections[self.OUTGOING_CONNECTION_TYPE]['fs'].find({'filename': task_id})
+        ]
+        self.send_task(self.OUTGOING_CONNECTION_TYPE, response, filename=task_id)
+        for response_id in previous_responses:
+            self.connections[self.OUTGOING_CONNECTION_TYPE]['fs'].delete(response_id)
 
 
 class InterComBackEndDeleteFile(InterComListener):
@@ -188,16 +355,19 @@ class InterComBackEndDeleteFile(InterComListener):
         self.fs_organizer = FS_Organizer(config=config)
 
     def post_processing(self, task, task_id):
-        if self._entry_was_removed_from_db(task['_id']):
-            logging.info('remove file: {}'.format(task['_id']))
-            self.fs_organizer.delete_file(task['_id'])
-
-    def _entry_was_removed_from_db(self, uid):
+        uid_list = task if isinstance(task, list) else [task['_id']]  # single file entry or batch of uids
         with ConnectTo(MongoInterfaceCommon, self.config) as db:
-            if db.existence_quick_check(uid):
-                logging.debug('file not removed, because database entry exists: {}'.format(uid))
-                return False
-            if db.check_unpacking_lock(uid):
-                logging.debug('file not removed, because it is processed by unpacker: {}'.format(uid))
-                return False
+            for uid in uid_list:
+                if self._entry_was_removed_from_db(db, uid):
+                    logging.info('remove file: {}'.format(uid))
+                    self.fs_organizer.delete_file(uid)
+
+    @staticmethod
+    def _entry_was_removed_from_db(db, uid):
+        if db.existence_quick_check(uid):
+            logging.debug('file not removed, because database entry exists: {}'.format(uid))
+            return False
+        if db.check_unpacking_lock(uid):
+            logging.debug('file not removed, because it is processed by unpacker: {}'.format(uid))
+            return False
         return True
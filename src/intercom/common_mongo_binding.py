@@ -1,11 +1,17 @@
 import logging
 import pickle
-from time import time
+from time import sleep, time
+from typing import Any, Optional, Sequence, Set, Tuple, Union
 
-import gridfs
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
 
 from helperFunctions.hash import get_sha256
-from storage.mongo_interface import MongoInterface
+from storage.mongo_interface import MongoInterface, get_grid_fs, uses_embedded_storage
+
+NOTIFICATION_COLLECTION_SIZE = 1024 * 1024
+NOTIFICATION_COLLECTION_MAX_DOCUMENTS = 10000
+NOTIFICATION_AWAIT_TIME = 0.5  # seconds the notification cursor waits for new notifications before the timeout is checked
 
 
 def generate_task_id(input_data):
@@ -17,11 +23,17 @@ def generate_task_id(input_data):
 class InterComMongoInterface(MongoInterface):
     '''
     Common parts of the InterCom Mongo interface
+    Tasks are stored in the GridFS of their connection. In addition, every sent task is announced in a capped
+    notification collection, so that receivers can block on a tailable cursor instead of polling the GridFS.
+    Receivers fall back to polling if push notifications are disabled or not supported (embedded storage backend).
+    Each interface tails the notification collection with a single cursor and skips the notifications of the
+    connections (or filenames) that it does not wait for.
     '''
 
     INTERCOM_CONNECTION_TYPES = [
         'test',
         'analysis_task',
+        'firmware_batch_task',
         'analysis_plugins',
         're_analyze_task',
         'update_task',
@@ -33,6 +45,7 @@ class InterComMongoInterface(MongoInterface):
         'tar_repack_task_resp',
         'binary_search_task',
         'binary_search_task_resp',
+        'binary_search_cancel',
         'single_file_task'
     ]
 
@@ -41,7 +54,96 @@ class InterComMongoInterface(MongoInterface):
         for item in self.INTERCOM_CONNECTION_TYPES:
             self.connections[item] = {'name': '{}_{}'.format(self.config['data_storage']['intercom_database_prefix'], item)}
             self.connections[item]['collection'] = self.client[self.connections[item]['name']]
-            self.connections[item]['fs'] = gridfs.GridFS(self.connections[item]['collection'])
+            self.connections[item]['fs'] = get_grid_fs(self.connections[item]['collection'])
+        self.notification_database = '{}_notifications'.format(self.config['data_storage']['intercom_database_prefix'])
+        self.push_notifications = (
+            self.config['ExpertSettings'].getboolean('intercom_push_notifications', True) and not uses_embedded_storage(self.config)
+        )
+        self._notification_collection = None
+        self._notification_cursor = None
+
+    def shutdown(self):
+        self._close_notification_cursor()
+        super().shutdown()
+
+    def send_task(self, connection_type: str, task, filename: Optional[str] = None):
+        '''
+        stores the task in the GridFS of the connection and notifies the receivers of the connection
+        '''
+        self.connections[connection_type]['fs'].put(pickle.dumps(task), filename=filename)
+        if self.push_notifications:
+            try:
+                self._get_notification_collection().insert_one({'connection': connection_type, 'filename': filename})
+            except PyMongoError as error:
+                logging.warning('Could not send intercom notification: {}'.format(error))
+
+    def wait_for_notification(self, connection_type: Union[str, Sequence[str]], timeout: float, filename: Optional[str] = None) -> bool:
+        '''
+        blocks until a task (with the filename) is sent to the connection (or one of the connections) or the timeout
+        (in seconds) is reached
+        without a filename only tasks that are sent after the first call are noticed, so the GridFS should be checked
+        before each call
+        :return: True if a notification was received, False after the timeout
+        '''
+        deadline = time() + timeout
+        connection_types = {connection_type} if isinstance(connection_type, str) else set(connection_type)
+        if self.push_notifications and connection_types:
+            try:
+                if self._wait_for_push_notification(connection_types, filename, deadline):
+                    return True
+            except PyMongoError as error:
+                logging.debug('Intercom notification cursor failed: {}'.format(error))
+                self._close_notification_cursor()
+        remaining_time = deadline - time()
+        if remaining_time > 0:
+            sleep(remaining_time)
+        return False
+
+    def _wait_for_push_notification(self, connection_types: Set[str], filename: Optional[str], deadline: float) -> bool:
+        '''
+        the cursor is reused by subsequent calls so that no notification between two calls is missed
+        '''
+        if self._notification_cursor is None or not self._notification_cursor.alive:
+            self._notification_cursor = self._open_notification_cursor()
+            if filename is not None and self._get_notification_collection().find_one(
+                    {'connection': {'$in': list(connection_types)}, 'filename': filename}, {'_id': 1}) is not None:
+                return True  # responses may arrive before the first call
+        while True:
+            for notification in self._notification_cursor:
+                if notification.get('connection') in connection_types and filename in (None, notification.get('filename')):
+                    return True
+            if time() >= deadline or not self._notification_cursor.alive:
+                return False
+
+    def _close_notification_cursor(self):
+        if self._notification_cursor is not None:
+            self._notification_cursor.close()
+            self._notification_cursor = None
+
+    def _get_notification_collection(self):
+        if self._notification_collection is None:
+            database = self.client[self.notification_database]
+            try:
+                database.create_collection('notifications', capped=True, size=NOTIFICATION_COLLECTION_SIZE, max=NOTIFICATION_COLLECTION_MAX_DOCUMENTS)
+            except CollectionInvalid:
+                pass  # already exists
+            except OperationFailure as error:
+                if error.code != 48:  # NamespaceExists: created by another process in the meantime
+                    raise
+            self._notification_collection = database['notifications']
+            if self._notification_collection.find_one() is None:  # a tailable cursor on an empty collection is dead right away
+                self._notification_collection.insert_one({'connection': None, 'filename': None})
+        return self._notification_collection
+
+    def _open_notification_cursor(self):
+        '''
+        :return: tailable cursor over the notifications of all connections that are sent after it was opened
+        '''
+        collection = self._get_notification_collection()
+        latest_notification = collection.find_one({}, {'_id': 1}, sort=[('$natural', -1)])
+        return collection.find(
+            {'_id': {'$gt': latest_notification['_id']}}, {'connection': 1, 'filename': 1}, cursor_type=CursorType.TAILABLE_AWAIT
+        ).max_await_time_ms(int(NOTIFICATION_AWAIT_TIME * 1000))
 
 
 class InterComListener(InterComMongoInterface):
@@ -50,12 +152,25 @@ class InterComListener(InterComMongoInterface):
     '''
 
     CONNECTION_TYPE = 'test'  # unique for each listener
+    MAX_CONCURRENT_TASKS = 1  # number of tasks that are processed in parallel by the backend
 
     def __init__(self, config=None):
         super().__init__(config=config)
         self.additional_setup(config=config)
 
     def get_next_task(self):
+        received_task = self.receive_task()
+        if received_task is not None:
+            task = self.post_processing(*received_task)
+            logging.debug('{}: New task received: {}'.format(self.CONNECTION_TYPE, task))
+            return task
+        return None
+
+    def receive_task(self) -> Optional[Tuple[Any, str]]:
+        '''
+        takes the next task from the GridFS of the listener without post processing it
+        :return: tuple of the task and its id or None if there is no task
+        '''
         try:
             task_obj = self.connections[self.CONNECTION_TYPE]['fs'].find_one()
         except Exception as exc:
@@ -63,13 +178,16 @@ class InterComListener(InterComMongoInterface):
             return None
         if task_obj is not None:
             task = pickle.loads(task_obj.read())
-            task_id = task_obj.filename
             self.connections[self.CONNECTION_TYPE]['fs'].delete(task_obj._id)
-            task = self.post_processing(task, task_id)
-            logging.debug('{}: New task received: {}'.format(self.CONNECTION_TYPE, task))
-            return task
+            return task, task_obj.filename
         return None
 
+    def wait_for_task(self, timeout: float) -> bool:
+        '''
+        blocks until a new task is sent to the listener or the timeout (in seconds) is reached
+        '''
+        return self.wait_for_notification(self.CONNECTION_TYPE, timeout)
+
     def additional_setup(self, config=None):
         '''
         optional additional setup
@@ -94,7 +212,7 @@ class InterComListenerAndResponder(InterComListener):
     def post_processing(self, task, task_id):
         logging.debug('request received: {} -> {}'.format(self.CONNECTION_TYPE, task_id))
         response = self.get_response(task)
-        self.connections[self.OUTGOING_CONNECTION_TYPE]['fs'].put(pickle.dumps(response), filename='{}'.format(task_id))
+        self.send_task(self.OUTGOING_CONNECTION_TYPE, response, filename='{}'.format(task_id))
         logging.debug('response send: {} -> {}'.format(self.OUTGOING_CONNECTION_TYPE, task_id))
         return task
 
@@ -1,6 +1,6 @@
 import logging
 import pickle
-from time import sleep, time
+from time import time
 
 from intercom.common_mongo_binding import InterComMongoInterface, generate_task_id
 
@@ -11,22 +11,32 @@ class InterComFrontEndBinding(InterComMongoInterface):
     '''
 
     def add_analysis_task(self, fw):
-        self.connections['analysis_task']['fs'].put(pickle.dumps(fw), filename=fw.uid)
+        self.send_task('analysis_task', fw, filename=fw.uid)
+
+    def add_firmware_batch_task(self, batch_id, batch_items):
+        '''
+        :param batch_items: list of tuples of the index in the batch and the item (metadata and path of the firmware
+                            file in the import directory)
+        '''
+        self.send_task('firmware_batch_task', (batch_id, batch_items), filename=batch_id)
 
     def add_re_analyze_task(self, fw, unpack=True):
         if unpack:
-            self.connections['re_analyze_task']['fs'].put(pickle.dumps(fw), filename=fw.uid)
+            self.send_task('re_analyze_task', fw, filename=fw.uid)
         else:
-            self.connections['update_task']['fs'].put(pickle.dumps(fw), filename=fw.uid)
+            self.send_task('update_task', fw, filename=fw.uid)
 
     def add_single_file_task(self, fw):
-        self.connections['single_file_task']['fs'].put(pickle.dumps(fw), filename=fw.uid)
+        self.send_task('single_file_task', fw, filename=fw.uid)
 
     def add_compare_task(self, compare_id, force=False):
-        self.connections['compare_task']['fs'].put(pickle.dumps((compare_id, force)), filename=compare_id)
+        self.send_task('compare_task', (compare_id, force), filename=compare_id)
 
     def delete_file(self, fw):
-        self.connections['file_delete_task']['fs'].put(pickle.dumps(fw))
+        self.send_task('file_delete_task', fw)
+
+    def delete_files(self, uid_list):
+        self.send_task('file_delete_task', list(uid_list))
 
     def get_available_analysis_plugins(self):
         plugin_file = self.connections['analysis_plugins']['fs'].find_one({'filename': 'plugin_dictonary'})
@@ -42,21 +52,24 @@ class InterComFrontEndBinding(InterComMongoInterface):
         return self._request_response_listener(uid, 'tar_repack_task', 'tar_repack_task_resp')
 
     def add_binary_search_request(self, yara_rule_binary, firmware_uid=None):
-        serialized_request = pickle.dumps((yara_rule_binary, firmware_uid))
         request_id = generate_task_id(yara_rule_binary)
-        self.connections["binary_search_task"]['fs'].put(serialized_request, filename="{}".format(request_id))
+        self.send_task('binary_search_task', (yara_rule_binary, firmware_uid), filename='{}'.format(request_id))
         return request_id
 
     def get_binary_search_result(self, request_id):
+        '''
+        :return: tuple of the (partial) result, the search task and a flag that is True if the search is finished
+        '''
         result = self._response_listener('binary_search_task_resp', request_id, timeout=time() + 10, delete=False)
-        return result if result is not None else (None, None)
+        return result if result is not None else (None, None, False)
+
+    def cancel_binary_search(self, request_id):
+        self.send_task('binary_search_cancel', None, filename='{}'.format(request_id))
 
     def _request_response_listener(self, input_data, request_connection, response_connection):
-        serialized_request = pickle.dumps(input_data)
         request_id = generate_task_id(input_data)
-        self.connections[request_connection]['fs'].put(serialized_request, filename="{}".format(request_id))
+        self.send_task(request_connection, input_data, filename='{}'.format(request_id))
         logging.debug('Request sent: {} -> {}'.format(request_connection, request_id))
-        sleep(1)
         return self._response_listener(response_connection, request_id)
 
     def _response_listener(self, response_connection, request_id, timeout=None, delete=True):
@@ -73,5 +86,5 @@ class InterComFrontEndBinding(InterComMongoInterface):
                 break
             else:
                 logging.debug('No response yet: {} -> {}'.format(response_connection, request_id))
-                sleep(1)
+                self.wait_for_notification(response_connection, min(timeout - time(), 1), filename='{}'.format(request_id))
         return output_data
@@ -1,14 +1,36 @@
+import logging
+import sys
+from datetime import datetime, timezone
 from itertools import chain
+from pathlib import Path
+from time import time
+from typing import Optional
+
+from bson import ObjectId
 
 from analysis.PluginBase import AnalysisBasePlugin
 from helperFunctions.database import ConnectTo
 from helperFunctions.hash import get_tlsh_comparison
 from storage.db_interface_common import MongoInterfaceCommon
 
+try:
+    from ..internal.tlsh_index import get_tlsh_index
+except ImportError:
+    sys.path.append(str(Path(__file__).parent.parent / 'internal'))
+    from tlsh_index import get_tlsh_index
+
+MAX_DISTANCE = 150
+SYNCHRONIZATION_INTERVAL = 10
+SYNCHRONIZATION_MARGIN = 60  # the generation stamp of an entry is created before the entry is written
+
 
 class AnalysisPlugin(AnalysisBasePlugin):
     '''
     TLSH Plug-in
+    If the tlsh index is enabled (index_directory), the similar files are looked up in the index instead of comparing
+    the hash with the hashes of all files in the database. The index is synchronized with the database (every
+    SYNCHRONIZATION_INTERVAL seconds), so that it also contains the hashes of files that were not analyzed by this plugin
+    or were stored while the index was disabled.
     '''
     NAME = 'tlsh'
     DESCRIPTION = 'find files with similar tlsh and calculate similarity value'
@@ -16,28 +38,73 @@ class AnalysisPlugin(AnalysisBasePlugin):
     VERSION = '0.1'
 
     def __init__(self, plugin_adminstrator, config=None, recursive=True, offline_testing=False):
+        self.tlsh_index = get_tlsh_index(config)  # the index should be initialized before the workers are started
+        if self.tlsh_index is not None and not offline_testing:
+            self._synchronize_index(config)
         super().__init__(plugin_adminstrator, config=config, recursive=recursive, plugin_path=__file__, offline_testing=offline_testing)
 
     def process_object(self, file_object):
         comparisons_dict = {}
         if 'tlsh' in file_object.processed_analysis['file_hashes'].keys():
-            with ConnectTo(TLSHInterface, self.config) as interface:
-                for file in interface.tlsh_query_all_objects():
-                    value = get_tlsh_comparison(file_object.processed_analysis['file_hashes']['tlsh'], file['processed_analysis']['file_hashes']['tlsh'])
-                    if value <= 150 and not file['_id'] == file_object.uid:
-                        comparisons_dict[file['_id']] = value
+            tlsh_hash = file_object.processed_analysis['file_hashes']['tlsh']
+            if self.tlsh_index is not None and self.tlsh_index.is_initialized():
+                self._synchronize_index(self.config)
+                comparisons_dict = self._get_similar_files_from_index(file_object.uid, tlsh_hash)
+                self.tlsh_index.add_hash(file_object.uid, tlsh_hash)
+            else:
+                with ConnectTo(TLSHInterface, self.config) as interface:
+                    for file in interface.tlsh_query_all_objects():
+                        value = get_tlsh_comparison(tlsh_hash, file['processed_analysis']['file_hashes']['tlsh'])
+                        if value <= MAX_DISTANCE and not file['_id'] == file_object.uid:
+                            comparisons_dict[file['_id']] = value
 
         file_object.processed_analysis[self.NAME] = comparisons_dict
         return file_object
 
+    def _get_similar_files_from_index(self, uid, tlsh_hash):
+        similar_files = self.tlsh_index.get_similar_files(tlsh_hash, MAX_DISTANCE)
+        similar_files.pop(uid, None)
+        if not similar_files:
+            return {}
+        with ConnectTo(TLSHInterface, self.config) as interface:
+            existing_uids = interface.get_existing_uids(list(similar_files))  # deleted files are not removed from the index
+        return {similar_uid: value for similar_uid, value in similar_files.items() if similar_uid in existing_uids}
+
+    def _synchronize_index(self, config):
+        synchronized_until = self.tlsh_index.start_synchronization(SYNCHRONIZATION_INTERVAL)
+        if synchronized_until is None:
+            return
+        start = time()
+        if not synchronized_until:
+            logging.info('{}: adding the hashes in the database to the index'.format(self.NAME))
+        changed_since = synchronized_until - SYNCHRONIZATION_MARGIN if synchronized_until else None
+        with ConnectTo(TLSHInterface, config) as interface:
+            self.tlsh_index.add_hashes(
+                (file['_id'], file['processed_analysis']['file_hashes']['tlsh']) for file in interface.tlsh_query_all_objects(changed_since)
+            )
+        self.tlsh_index.finish_synchronization(start)
+
 
 class TLSHInterface(MongoInterfaceCommon):
     READ_ONLY = True
 
-    def tlsh_query_all_objects(self):
+    def tlsh_query_all_objects(self, changed_since: Optional[float] = None):
+        '''
+        :param changed_since: only query the objects that were written after this time
+        '''
         fields = {'processed_analysis.file_hashes.tlsh': 1}
+        query = {'processed_analysis.file_hashes.tlsh': {'$exists': True}}
+        if changed_since is not None:
+            query['generation'] = {'$gte': ObjectId.from_datetime(datetime.fromtimestamp(changed_since, timezone.utc))}
 
         return chain(
-            self.file_objects.find({'processed_analysis.file_hashes.tlsh': {'$exists': True}}, fields),
-            self.firmwares.find({'processed_analysis.file_hashes.tlsh': {'$exists': True}}, fields)
+            self.file_objects.find(query, fields),
+            self.firmwares.find(query, fields)
         )
+
+    def get_existing_uids(self, uids):
+        query = self._build_search_query_for_uid_list(uids)
+        return {
+            entry['_id']
+            for entry in chain(self.file_objects.find(query, {'_id': 1}), self.firmwares.find(query, {'_id': 1}))
+        }
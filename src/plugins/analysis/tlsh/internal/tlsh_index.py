@@ -0,0 +1,285 @@
+import os
+import sqlite3
+from contextlib import closing
+from itertools import groupby, islice
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+DIGEST_SIZE = 35  # checksum, length value, quartile ratios and 32 bytes of body
+BLOCK_SIZE = 1024
+ADD_CHUNK_SIZE = 10000
+MAX_LENGTH_DIFFERENCE = 12  # a larger difference of the length values alone adds more than 150 to the distance
+PRUNING_POSITION = 19  # digests that are too distant after the header and half of the body are dropped
+
+
+def _get_bit_pairs_difference(first_byte: int, second_byte: int) -> int:
+    difference = 0
+    for shift in range(0, 8, 2):
+        bit_pair_difference = abs((first_byte >> shift & 3) - (second_byte >> shift & 3))
+        difference += 6 if bit_pair_difference == 3 else bit_pair_difference
+    return difference
+
+
+BIT_PAIRS_DIFFERENCE_TABLE = np.array([[_get_bit_pairs_difference(first, second) for second in range(256)] for first in range(256)], dtype=np.uint8)
+
+
+class TlshIndex:
+    '''
+    Index of the tlsh hashes of the analyzed files that finds all hashes within a distance without comparing the hash
+    with every hash in the database
+    The hashes are bucketed by their length value and stored in blocks of BLOCK_SIZE raw digests. Since the difference
+    of the length values contributes 12 per step to the distance, a query only searches the buckets of the length values
+    that are at most MAX_LENGTH_DIFFERENCE apart and computes the exact distances (the same as tlsh.diff) of their
+    hashes with numpy.
+    The digests are kept in memory (by each process, about 35 bytes per hash) and are refreshed before each query with
+    the blocks that were added or changed since the last query (each write to a block stamps it with a new change
+    number). Only the uids of the blocks that contain matches are read from the database. The digests of a bucket are
+    stored column by column, so that the distances are computed over contiguous arrays of the bytes at each position.
+    '''
+
+    def __init__(self, index_directory: str):
+        self.index_directory = index_directory
+        self.database_path = os.path.join(index_directory, 'tlsh_index.db')
+        os.makedirs(index_directory, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (uid TEXT PRIMARY KEY)')
+            connection.execute('CREATE TABLE IF NOT EXISTS blocks (block_id INTEGER PRIMARY KEY, length_value INTEGER, digests BLOB, uids TEXT, change INTEGER)')
+            connection.execute('CREATE INDEX IF NOT EXISTS blocks_length_value ON blocks (length_value)')
+            connection.execute('CREATE INDEX IF NOT EXISTS blocks_change ON blocks (change)')
+            connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+        self._buckets = {}  # length value -> _Bucket
+        self._last_change = 0
+        self._lock = Lock()
+
+    def is_initialized(self) -> bool:
+        return self.get_synchronized_until() is not None
+
+    def get_synchronized_until(self) -> Optional[float]:
+        '''
+        :return: the time up to which the hashes in the database were added or None if the index was never synchronized
+        '''
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT value FROM metadata WHERE key = ?', ('synchronized_until',)).fetchone()
+        return float(row[0]) if row is not None else None
+
+    def start_synchronization(self, interval: float) -> Optional[float]:
+        '''
+        claims the next synchronization with the database if the last one was started more than interval seconds ago, so
+        that only one worker synchronizes at a time (a synchronization that is not finished is repeated by the next one)
+        :return: the time up to which the index was synchronized (0 if never) or None if the synchronization is not due
+        '''
+        now = time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute('BEGIN IMMEDIATE')
+            metadata = dict(connection.execute('SELECT key, value FROM metadata'))
+            if now - float(metadata.get('synchronization_started', 0)) < interval:
+                return None
+            connection.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', ('synchronization_started', str(now)))
+        return float(metadata.get('synchronized_until', 0))
+
+    def finish_synchronization(self, synchronized_until: float):
+        with closing(self._connect()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', ('synchronized_until', str(synchronized_until)))
+
+    def add_hash(self, uid: str, tlsh_hash: str):
+        self.add_hashes([(uid, tlsh_hash)])
+
+    def add_hashes(self, uids_and_hashes: Iterable[Tuple[str, str]]):
+        '''
+        adds the hashes of files that are not yet indexed (the hash of a uid never changes, since it depends on the
+        contents of the file only), invalid hashes (e.g. TNULL of files that are too small) are ignored
+        '''
+        iterator = iter(uids_and_hashes)
+        with closing(self._connect()) as connection:
+            for chunk in iter(lambda: list(islice(iterator, ADD_CHUNK_SIZE)), []):
+                with connection:
+                    connection.execute('BEGIN IMMEDIATE')
+                    digests_by_length_value = {}
+                    for uid, tlsh_hash in chunk:
+                        digest = _get_digest(tlsh_hash)
+                        if digest is not None and connection.execute('INSERT OR IGNORE INTO entries (uid) VALUES (?)', (uid,)).rowcount == 1:
+                            digests_by_length_value.setdefault(_get_length_value(digest[1]), []).append((uid, digest))
+                    change = connection.execute('SELECT IFNULL(MAX(change), 0) + 1 FROM blocks').fetchone()[0]
+                    for length_value, digests in digests_by_length_value.items():
+                        self._append_to_blocks(connection, length_value, digests, change)
+
+    def get_similar_files(self, tlsh_hash: str, max_distance: int = 150) -> Dict[str, int]:
+        '''
+        :return: dict of the uids of the indexed files with a distance of at most max_distance and their distances
+        '''
+        digest = _get_digest(tlsh_hash)
+        if digest is None:
+            return {}
+        query = np.frombuffer(digest, dtype=np.uint8)
+        length_value = _get_length_value(int(query[1]))
+        length_values = sorted({(length_value + offset) % 256 for offset in range(-MAX_LENGTH_DIFFERENCE, MAX_LENGTH_DIFFERENCE + 1)})
+        with closing(self._connect()) as connection:
+            with self._lock:
+                self._refresh(connection)
+                buckets = [self._buckets[length_value] for length_value in length_values if length_value in self._buckets]
+            matches = {}  # block id -> list of positions in the block and distances
+            for bucket in buckets:
+                positions, distances = _find_similar_digests(query, bucket.columns, max_distance)
+                block_ids, block_positions = _get_block_positions(bucket, positions)
+                for block_id, position, distance in zip(block_ids, block_positions, distances.tolist()):
+                    matches.setdefault(block_id, []).append((position, distance))
+            if not matches:
+                return {}
+            uid_lists = {
+                block_id: block_uids.splitlines()
+                for block_id, block_uids in connection.execute('SELECT block_id, uids FROM blocks WHERE block_id IN ({})'.format(','.join('?' * len(matches))), list(matches))
+            }
+        return {uid_lists[block_id][position]: distance for block_id, block_matches in matches.items() for position, distance in block_matches}
+
+    def _refresh(self, connection: sqlite3.Connection):
+        '''
+        loads the blocks that were added or changed since the last refresh into the buckets
+        '''
+        blocks = sorted(connection.execute('SELECT length_value, block_id, digests, change FROM blocks WHERE change > ?', (self._last_change,)))
+        for length_value, length_value_blocks in groupby(blocks, key=lambda block: block[0]):
+            self._buckets[length_value] = _update_bucket(
+                self._buckets.get(length_value, EMPTY_BUCKET), [(block_id, block_digests) for _, block_id, block_digests, _ in length_value_blocks]
+            )
+        self._last_change = max((change for *_, change in blocks), default=self._last_change)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+
+    @staticmethod
+    def _append_to_blocks(connection: sqlite3.Connection, length_value: int, digests: List[Tuple[str, bytes]], change: int):
+        last_block = connection.execute(
+            'SELECT block_id, digests, uids FROM blocks WHERE length_value = ? ORDER BY block_id DESC LIMIT 1', (length_value,)
+        ).fetchone()
+        if last_block is not None and len(last_block[1]) < BLOCK_SIZE * DIGEST_SIZE:
+            block_id, block_digests, block_uids = last_block
+            free_entries = BLOCK_SIZE - len(block_digests) // DIGEST_SIZE
+            new_digests, new_uids = _join_entries(digests[:free_entries])
+            connection.execute(
+                'UPDATE blocks SET digests = ?, uids = ?, change = ? WHERE block_id = ?', (block_digests + new_digests, block_uids + new_uids, change, block_id)
+            )
+            digests = digests[free_entries:]
+        for start in range(0, len(digests), BLOCK_SIZE):
+            connection.execute(
+                'INSERT INTO blocks (length_value, digests, uids, change) VALUES (?, ?, ?, ?)', (length_value, *_join_entries(digests[start:start + BLOCK_SIZE]), change)
+            )
+
+
+class _Bucket(NamedTuple):
+    '''
+    the digests of the blocks of a length value in the order of the blocks (only the last block of a length value grows)
+    with one digest per column
+    buckets are replaced instead of modified, so that running queries can still use the old ones
+    '''
+    block_ids: np.ndarray
+    block_starts: np.ndarray
+    columns: np.ndarray
+
+
+EMPTY_BUCKET = _Bucket(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((DIGEST_SIZE, 0), dtype=np.uint8))
+
+
+def _update_bucket(bucket: _Bucket, blocks: List[Tuple[int, bytes]]) -> _Bucket:
+    '''
+    :param blocks: the added or changed blocks of the bucket ordered by block id
+    :return: the bucket with the blocks
+    '''
+    block_ids, block_starts, columns = bucket
+    if block_ids.size and blocks[0][0] == block_ids[-1]:  # the last block has grown
+        block_ids, block_starts, columns = block_ids[:-1], block_starts[:-1], columns[:, :block_starts[-1]]
+    new_columns = [np.frombuffer(block_digests, dtype=np.uint8).reshape(-1, DIGEST_SIZE).T for _, block_digests in blocks]
+    new_block_starts = columns.shape[1] + np.cumsum([0] + [block_columns.shape[1] for block_columns in new_columns[:-1]])
+    return _Bucket(
+        np.concatenate([block_ids, [block_id for block_id, _ in blocks]]).astype(np.int64),
+        np.concatenate([block_starts, new_block_starts]).astype(np.int64),
+        np.concatenate([columns, *new_columns], axis=1)
+    )
+
+
+def _get_block_positions(bucket: _Bucket, positions: np.ndarray) -> Tuple[List[int], List[int]]:
+    '''
+    :return: the block ids and the positions in their blocks of the entries at the positions of the bucket
+    '''
+    block_indices = np.searchsorted(bucket.block_starts, positions, side='right') - 1
+    return bucket.block_ids[block_indices].tolist(), (positions - bucket.block_starts[block_indices]).tolist()
+
+
+def _find_similar_digests(query: np.ndarray, columns: np.ndarray, max_distance: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    :param columns: array of raw digests (one per column)
+    :return: the positions of the digests with a distance of at most max_distance and their distances
+    '''
+    distances = _get_header_distances(query, columns)
+    for position in range(3, PRUNING_POSITION):
+        distances += BIT_PAIRS_DIFFERENCE_TABLE[query[position]][columns[position]]
+    positions = np.flatnonzero(distances <= max_distance)  # the distance only grows with the remaining positions
+    distances = distances[positions]
+    for position in range(PRUNING_POSITION, DIGEST_SIZE):
+        distances += BIT_PAIRS_DIFFERENCE_TABLE[query[position]][columns[position][positions]]
+    return positions[distances <= max_distance], distances[distances <= max_distance]
+
+
+def _join_entries(entries: List[Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    '''
+    :return: the concatenated digests and the uids (one per line) of the entries
+    '''
+    return b''.join(digest for _, digest in entries), ''.join(uid + '\n' for uid, _ in entries)
+
+
+def get_distances(query: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    '''
+    :param query: raw digest of the query hash
+    :param columns: array of raw digests (one per column)
+    :return: the distances between the query and the digests as computed by tlsh.diff (including the length difference)
+    '''
+    distances = _get_header_distances(query, columns)
+    for position in range(3, DIGEST_SIZE):
+        distances += BIT_PAIRS_DIFFERENCE_TABLE[query[position]][columns[position]]
+    return distances
+
+
+def _get_header_distances(query: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    '''
+    the distances of the length values and quartile ratios are looked up in tables of the distances of all byte values
+    '''
+    byte_values = np.arange(256)
+    length_difference = _get_modular_difference(_get_length_value(byte_values), _get_length_value(int(query[1])), 256)
+    length_distances = np.where(length_difference <= 1, length_difference, length_difference * 12)
+    ratio_distances = np.zeros(256, dtype=np.int32)
+    for shift in [0, 4]:
+        ratio_difference = _get_modular_difference(byte_values >> shift & 15, int(query[2]) >> shift & 15, 16)
+        ratio_distances += np.where(ratio_difference <= 1, ratio_difference, (ratio_difference - 1) * 12)
+    return length_distances[columns[1]] + ratio_distances[columns[2]] + (columns[0] != query[0])
+
+
+def _get_modular_difference(first, second, modulus: int):
+    difference = np.abs(np.asarray(first, dtype=np.int32) - second)
+    return np.minimum(difference, modulus - difference)
+
+
+def _get_length_value(encoded_length_value):
+    '''
+    the bytes of the header are stored with swapped nibbles
+    '''
+    return (encoded_length_value & 15) << 4 | encoded_length_value >> 4
+
+
+def _get_digest(tlsh_hash: str) -> Optional[bytes]:
+    if tlsh_hash.startswith('T1'):  # version prefix of newer tlsh versions
+        tlsh_hash = tlsh_hash[2:]
+    try:
+        digest = bytes.fromhex(tlsh_hash)
+    except ValueError:
+        return None
+    return digest if len(digest) == DIGEST_SIZE else None
+
+
+def get_tlsh_index(config) -> Optional[TlshIndex]:
+    '''
+    :return: the tlsh index or None if it is disabled
+    '''
+    index_directory = config.get('tlsh', 'index_directory', fallback='')
+    return TlshIndex(index_directory) if index_directory else None
@@ -20,9 +20,12 @@ class MockContext:
 
     def __enter__(self):
         class ControlledInterface:
-            def tlsh_query_all_objects(self):  # pylint: disable=no-self-use
+            def tlsh_query_all_objects(self, changed_since=None):  # pylint: disable=no-self-use
                 return [{'processed_analysis': {'file_hashes': {'tlsh': HASH_1}}, '_id': '5'}, ]
 
+            def get_existing_uids(self, uids):  # pylint: disable=no-self-use
+                return {'5'}.intersection(uids)
+
         return ControlledInterface()
 
     def __exit__(self, *args):
@@ -32,12 +35,26 @@ class MockContext:
 class EmptyContext(MockContext):
     def __enter__(self):
         class EmptyInterface:
-            def tlsh_query_all_objects(self):  # pylint: disable=no-self-use
+            def tlsh_query_all_objects(self, changed_since=None):  # pylint: disable=no-self-use
                 return []
 
         return EmptyInterface()
 
 
+class IndexContext(MockContext):
+    def __enter__(self):
+        interface = super().__enter__()
+
+        def tlsh_query_all_objects(changed_since=None):
+            objects = [{'processed_analysis': {'file_hashes': {'tlsh': HASH_1}}, '_id': '5'}]
+            if changed_since is None:  # the deleted file is only found by the initial synchronization
+                objects.append({'processed_analysis': {'file_hashes': {'tlsh': HASH_1}}, '_id': 'deleted'})
+            return objects
+
+        interface.tlsh_query_all_objects = tlsh_query_all_objects
+        return interface
+
+
 @pytest.fixture(scope='function')
 def test_config():
     return get_config_for_testing()
@@ -99,3 +116,31 @@ def test_file_hashes_not_run(test_object, stub_plugin):
     with pytest.raises(KeyError):
         test_object.processed_analysis.pop('file_hashes')
         stub_plugin.process_object(test_object)
+
+
+def test_similar_files_from_index(test_object, test_config, monkeypatch, tmpdir):
+    monkeypatch.setattr('plugins.base.BasePlugin._sync_view', lambda self, plugin_path: None)
+    monkeypatch.setattr('plugins.analysis.tlsh.code.tlsh.ConnectTo', IndexContext)
+    test_config.add_section('tlsh')
+    test_config.set('tlsh', 'index_directory', str(tmpdir))
+    stub_plugin = AnalysisPlugin(MockAdmin(), test_config, offline_testing=True)
+    stub_plugin._synchronize_index(test_config)  # pylint: disable=protected-access
+
+    result = stub_plugin.process_object(test_object)
+    assert result.processed_analysis[stub_plugin.NAME] == {'5': 0}
+    assert stub_plugin.tlsh_index.get_similar_files(HASH_1) == {'5': 0, 'deleted': 0, test_object.uid: 0}, 'analyzed file should be added'
+
+
+def test_index_synchronization(test_object, test_config, monkeypatch, tmpdir):
+    monkeypatch.setattr('plugins.base.BasePlugin._sync_view', lambda self, plugin_path: None)
+    monkeypatch.setattr('plugins.analysis.tlsh.code.tlsh.ConnectTo', IndexContext)
+    monkeypatch.setattr('plugins.analysis.tlsh.code.tlsh.SYNCHRONIZATION_INTERVAL', 0)
+    test_config.add_section('tlsh')
+    test_config.set('tlsh', 'index_directory', str(tmpdir))
+    stub_plugin = AnalysisPlugin(MockAdmin(), test_config, offline_testing=True)
+    stub_plugin.tlsh_index.finish_synchronization(1000)  # the file '5' was not yet added to the index
+
+    result = stub_plugin.process_object(test_object)
+    assert result.processed_analysis[stub_plugin.NAME] == {'5': 0}, 'files stored after the last synchronization should be found'
+    assert 'deleted' not in stub_plugin.tlsh_index.get_similar_files(HASH_1), 'only changed files should be queried'
+    assert stub_plugin.tlsh_index.get_synchronized_until() > 1000
@@ -0,0 +1,90 @@
+# pylint: disable=redefined-outer-name
+import os
+from unittest import mock
+
+import numpy as np
+import pytest
+import tlsh
+
+from ..internal import tlsh_index
+from ..internal.tlsh_index import TlshIndex, get_distances, get_tlsh_index
+
+HASH_0 = '9A355C07B5A614FDC5A2847046EF92B7693174A642327DBF3C88D6303F42E746B1ABE1'
+HASH_1 = '0CC34B06B1B258BCC16689308A67D671AB747E5053223B3E3684F7342F56E6F1F0DAB1'
+
+
+def _get_test_hashes():
+    hashes = []
+    for size in [1024, 4096, 50000]:
+        data = bytearray(os.urandom(size))
+        hashes.append(tlsh.hash(bytes(data)))
+        for _ in range(3):
+            position = len(data) // 4
+            data[position:position + size // 20] = os.urandom(size // 20)
+            hashes.append(tlsh.hash(bytes(data)))
+    return hashes + [HASH_0, HASH_1]
+
+
+@pytest.fixture
+def index(tmpdir):
+    return TlshIndex(str(tmpdir))
+
+
+def test_get_distances():
+    hashes = _get_test_hashes()
+    digests = np.array([list(bytes.fromhex(tlsh_hash[2:] if tlsh_hash.startswith('T1') else tlsh_hash)) for tlsh_hash in hashes], dtype=np.uint8)
+    for query, tlsh_hash in zip(digests, hashes):
+        assert get_distances(query, digests.T).tolist() == [tlsh.diff(tlsh_hash, other_hash) for other_hash in hashes]
+
+
+def test_get_similar_files(index):
+    hashes = {'uid_{}'.format(number): tlsh_hash for number, tlsh_hash in enumerate(_get_test_hashes())}
+    index.add_hashes(hashes.items())
+    for tlsh_hash in hashes.values():
+        expected_result = {uid: tlsh.diff(tlsh_hash, other_hash) for uid, other_hash in hashes.items() if tlsh.diff(tlsh_hash, other_hash) <= 100}
+        assert index.get_similar_files(tlsh_hash, max_distance=100) == expected_result
+
+
+def test_add_hash(index):
+    with mock.patch.object(tlsh_index, 'BLOCK_SIZE', 2):
+        for number in range(5):
+            index.add_hash('uid_{}'.format(number), HASH_1)
+        index.add_hash('uid_0', HASH_1)
+    assert index.get_similar_files(HASH_1) == {'uid_{}'.format(number): 0 for number in range(5)}, 'every uid is only indexed once'
+    assert index.get_similar_files(HASH_0) == {}
+
+
+def test_refresh_after_adding_hashes(index, tmpdir):
+    other_index = TlshIndex(str(tmpdir))  # e.g. of another worker process
+    with mock.patch.object(tlsh_index, 'BLOCK_SIZE', 2):
+        for number in range(5):
+            index.add_hash('uid_{}'.format(number), HASH_1)
+            assert other_index.get_similar_files(HASH_1) == {'uid_{}'.format(other_number): 0 for other_number in range(number + 1)}
+        index.add_hash('uid_other', HASH_0)
+    assert other_index.get_similar_files(HASH_0) == {'uid_other': 0}
+
+
+def test_invalid_hashes(index):
+    index.add_hashes([('uid_1', 'TNULL'), ('uid_2', ''), ('uid_3', 'T1' + HASH_1)])
+    assert index.get_similar_files(HASH_1) == {'uid_3': 0}
+    assert index.get_similar_files('TNULL') == {}
+
+
+def test_synchronization(index):
+    assert not index.is_initialized()
+    assert index.start_synchronization(interval=10) == 0
+    assert index.start_synchronization(interval=10) is None, 'only one synchronization should run at a time'
+    assert not index.is_initialized(), 'index is only initialized after the first synchronization finished'
+
+    index.finish_synchronization(1234.5)
+    assert index.is_initialized()
+    assert index.get_synchronized_until() == 1234.5
+    assert index.start_synchronization(interval=0) == 1234.5
+
+
+def test_get_tlsh_index(tmpdir):
+    config = mock.MagicMock()
+    config.get.return_value = ''
+    assert get_tlsh_index(config) is None
+    config.get.return_value = str(tmpdir)
+    assert isinstance(get_tlsh_index(config), TlshIndex)
@@ -1,14 +1,22 @@
-from itertools import combinations
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, combinations
+from multiprocessing import get_context
 from typing import Dict, List, Set, Tuple
 
 import networkx
-import ssdeep
 
 from compare.PluginBase import CompareBasePlugin
 from helperFunctions.compare_sets import iter_element_and_rest, remove_duplicates_from_unhashable
 from helperFunctions.dataConversion import convert_uid_list_to_compare_id
+from helperFunctions.hash import get_ssdeep_comparisons
+from helperFunctions.merge_generators import chunks
 from objects.file import FileObject
 
+SSDEEP_NGRAM_SIZE = 7  # ssdeep only scores signatures with a common substring of this length
+PARALLEL_COMPARE_MIN_PAIRS = 10000
+COMPARE_CHUNK_SIZE = 2000
+
 
 class ComparePlugin(CompareBasePlugin):
     '''
@@ -80,24 +88,28 @@ class ComparePlugin(CompareBasePlugin):
     def _get_similar_files(self, fo_list: List[FileObject], exclusive_files: Dict[str, List[str]]) -> Tuple[List[list], dict]:
         similar_files = []
         similarity = {}
+        ssdeep_hashes = self.database.get_ssdeep_hashes(list({
+            uid for fo in fo_list for uid in chain(exclusive_files[fo.uid], fo.files_included)
+        }))
         for parent_one, parent_two in combinations(fo_list, 2):
-            for file_one in exclusive_files[parent_one.uid]:
-                for similar_file_pair, value in self._find_similar_file_for(file_one, parent_one.uid, parent_two):
-                    similar_files.append(similar_file_pair)
-                    similarity[convert_uid_list_to_compare_id(similar_file_pair)] = value
+            for similar_file_pair, value in self._find_similar_files(exclusive_files[parent_one.uid], parent_one.uid, parent_two, ssdeep_hashes):
+                similar_files.append(similar_file_pair)
+                similarity[convert_uid_list_to_compare_id(similar_file_pair)] = value
         similarity_sets = generate_similarity_sets(remove_duplicates_from_unhashable(similar_files))
         return similarity_sets, similarity
 
-    def _find_similar_file_for(self, file_uid: str, parent_uid: str, comparison_fo: FileObject):
-        hash_one = self.database.get_ssdeep_hash(file_uid)
-        if hash_one:
-            id1 = self._get_similar_file_id(file_uid, parent_uid)
-            for potential_match in comparison_fo.files_included:
-                id2 = self._get_similar_file_id(potential_match, comparison_fo.uid)
-                hash_two = self.database.get_ssdeep_hash(potential_match)
-                ssdeep_similarity = ssdeep.compare(hash_one, hash_two)
-                if hash_two and ssdeep_similarity > self.ssdeep_ignore_threshold:
-                    yield (id1, id2), ssdeep_similarity
+    def _find_similar_files(self, file_uids: List[str], parent_uid: str, comparison_fo: FileObject, ssdeep_hashes: Dict[str, str]):
+        '''
+        only the pairs of files whose hashes can have a similarity above 0 are compared
+        '''
+        candidate_pairs = get_ssdeep_candidate_pairs(
+            {uid: ssdeep_hashes[uid] for uid in file_uids if ssdeep_hashes.get(uid)},
+            {uid: ssdeep_hashes[uid] for uid in comparison_fo.files_included if ssdeep_hashes.get(uid)}
+        )
+        similarities = compare_ssdeep_hashes([(ssdeep_hashes[file_uid], ssdeep_hashes[potential_match]) for file_uid, potential_match in candidate_pairs])
+        for (file_uid, potential_match), ssdeep_similarity in zip(candidate_pairs, similarities):
+            if ssdeep_similarity > self.ssdeep_ignore_threshold:
+                yield (self._get_similar_file_id(file_uid, parent_uid), self._get_similar_file_id(potential_match, comparison_fo.uid)), ssdeep_similarity
 
     def combine_similarity_results(self, similar_files: List[List[str]], fo_list: List[FileObject], similarity: dict):
         result_dict = {}
@@ -161,3 +173,55 @@ def generate_similarity_sets(list_of_pairs: List[Tuple[str, str]]) -> List[List[
     for file1, file2 in list_of_pairs:
         graph.add_edge(file1, file2)
     return [sorted(c) for c in networkx.algorithms.clique.find_cliques(graph)]
+
+
+def get_ssdeep_candidate_pairs(hashes_one: Dict[str, str], hashes_two: Dict[str, str]) -> List[Tuple[str, str]]:
+    '''
+    :param hashes_one: dict of uids and ssdeep hashes
+    :param hashes_two: dict of uids and ssdeep hashes
+    :return: the pairs of uids (one of each dict) whose hashes share a key (see _get_ssdeep_keys), since ssdeep.compare
+             returns 0 for all other pairs
+    '''
+    uids_by_key = {}
+    for uid, ssdeep_hash in hashes_two.items():
+        for key in _get_ssdeep_keys(ssdeep_hash):
+            uids_by_key.setdefault(key, set()).add(uid)
+    candidate_pairs = []
+    for uid, ssdeep_hash in hashes_one.items():
+        candidates = set().union(*(uids_by_key.get(key, set()) for key in _get_ssdeep_keys(ssdeep_hash)))
+        candidate_pairs.extend((uid, candidate) for candidate in sorted(candidates))
+    return candidate_pairs
+
+
+def _get_ssdeep_keys(ssdeep_hash: str) -> Set:
+    '''
+    ssdeep only compares the signatures with the same block size (the second signature of a hash has twice the block size
+    of the first) and only if they have a common substring of SSDEEP_NGRAM_SIZE characters (after runs of more than
+    three identical characters are shortened), but identical hashes are always similar
+    :return: the hash and the n-grams of its signatures combined with their block size (as integers)
+    '''
+    try:
+        block_size, first_signature, second_signature = ssdeep_hash.split(':', 2)
+        block_size = int(block_size)
+    except ValueError:
+        return {ssdeep_hash}
+    keys = {ssdeep_hash}
+    for signature_block_size, signature in [(block_size, first_signature), (2 * block_size, second_signature)]:
+        signature = re.sub(r'(.)\1{3,}', r'\1\1\1', signature)
+        keys.update(
+            signature_block_size << 8 * SSDEEP_NGRAM_SIZE | int.from_bytes(signature[index:index + SSDEEP_NGRAM_SIZE].encode(), 'big')
+            for index in range(len(signature) - SSDEEP_NGRAM_SIZE + 1)
+        )
+    return keys
+
+
+def compare_ssdeep_hashes(hash_pairs: List[Tuple[str, str]]) -> List[int]:
+    '''
+    large numbers of pairs are compared in a process pool
+    the workers are not forked from the (multithreaded) compare scheduler and therefore run a function of a regular
+    module, since plugin modules cannot be imported by name
+    '''
+    if len(hash_pairs) < PARALLEL_COMPARE_MIN_PAIRS:
+        return get_ssdeep_comparisons(hash_pairs)
+    with ProcessPoolExecutor(mp_context=get_context('forkserver')) as executor:
+        return list(chain.from_iterable(executor.map(get_ssdeep_comparisons, chunks(hash_pairs, COMPARE_CHUNK_SIZE))))
@@ -1,7 +1,14 @@
 # pylint: disable=protected-access,no-member
+from itertools import product
+from random import Random
+from unittest import mock
+
 import pytest
+import ssdeep
 
-from plugins.compare.file_coverage.code.file_coverage import ComparePlugin, generate_similarity_sets
+from plugins.compare.file_coverage.code.file_coverage import (
+    ComparePlugin, compare_ssdeep_hashes, generate_similarity_sets, get_ssdeep_candidate_pairs
+)
 from test.unit.compare.compare_plugin_test_class import ComparePluginTest
 
 
@@ -12,8 +19,8 @@ class DbMock:  # pylint: disable=unused-argument,no-self-use
     def get_entropy(self, uid):
         return 0.2
 
-    def get_ssdeep_hash(self, uid):
-        return '42'
+    def get_ssdeep_hashes(self, uids):
+        return {uid: '42' for uid in uids}
 
 
 class TestComparePluginFileCoverage(ComparePluginTest):
@@ -94,3 +101,34 @@ def test_get_similarity_value(similar_files, similarity_dict, expected_output):
 ])
 def test_generate_similarity_sets(test_input, expected_output):
     assert generate_similarity_sets(test_input) == expected_output
+
+
+def _get_test_hashes():
+    data = Random(0).getrandbits(8 * 10000).to_bytes(10000, 'big')
+    similar_data = data[:5000] + b'changed' + data[5007:]
+    return {
+        'original': ssdeep.hash(data),
+        'similar': ssdeep.hash(similar_data),
+        'other': ssdeep.hash(Random(1).getrandbits(8 * 10000).to_bytes(10000, 'big')),
+        'runs': ssdeep.hash(b'A' * 3000),
+    }
+
+
+def test_get_ssdeep_candidate_pairs():
+    hashes = _get_test_hashes()
+    candidate_pairs = get_ssdeep_candidate_pairs(hashes, hashes)
+    assert ('original', 'similar') in candidate_pairs
+    assert ('runs', 'runs') in candidate_pairs, 'identical hashes are always candidates'
+    for uid_one, uid_two in product(hashes, hashes):
+        if (uid_one, uid_two) not in candidate_pairs:
+            assert ssdeep.compare(hashes[uid_one], hashes[uid_two]) == 0
+
+
+def test_compare_ssdeep_hashes():
+    hashes = _get_test_hashes()
+    hash_pairs = list(product(hashes.values(), hashes.values()))
+    expected_result = [ssdeep.compare(hash_one, hash_two) for hash_one, hash_two in hash_pairs]
+    assert compare_ssdeep_hashes(hash_pairs) == expected_result
+    with mock.patch('plugins.compare.file_coverage.code.file_coverage.PARALLEL_COMPARE_MIN_PAIRS', 1), \
+            mock.patch('plugins.compare.file_coverage.code.file_coverage.COMPARE_CHUNK_SIZE', 3):
+        assert compare_ssdeep_hashes(hash_pairs) == expected_result
@@ -0,0 +1,43 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import sys
+
+from helperFunctions.program_setup import program_setup
+from storage.fs_organizer import FS_Organizer
+
+PROGRAM_NAME = 'FACT File Storage Rebalancer'
+PROGRAM_DESCRIPTION = 'Move the stored files to their location in the configured storage directories and directory levels'
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    _, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    fs_organizer = FS_Organizer(config=config)
+    logging.info('rebalancing files in {}'.format(', '.join(fs_organizer.storage_directories)))
+    moved, checked = fs_organizer.rebalance()
+    logging.info('moved {} of {} files'.format(moved, checked))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
+from contextlib import suppress
 from copy import copy
 from distutils.version import LooseVersion
 from multiprocessing import Queue, Value
@@ -20,6 +21,7 @@ from objects.file import FileObject
 from storage.db_interface_backend import BackEndDbInterface
 
 MANDATORY_PLUGINS = ['file_type', 'file_hashes']
+PRE_ANALYSIS_BATCH_SIZE = 100
 
 
 class AnalysisScheduler:  # pylint: disable=too-many-instance-attributes
@@ -36,6 +38,8 @@ class AnalysisScheduler:  # pylint: disable=too-many-instance-attributes
         self.tag_queue = Queue()
         self.db_backend_service = db_interface if db_interface else BackEndDbInterface(config=config)
         self.pre_analysis = pre_analysis if pre_analysis else self.db_backend_service.add_object
+        # without a custom hook, all objects taken from the queue at once are stored with a single bulk write
+        self._bulk_pre_analysis = pre_analysis is None and hasattr(self.db_backend_service, 'add_objects')
         self.post_analysis = post_analysis if post_analysis else self.db_backend_service.add_analysis
         self.start_scheduling_process()
         self.start_result_collector()
@@ -64,7 +68,7 @@ class AnalysisScheduler:  # pylint: disable=too-many-instance-attributes
         This function is used to recursively analyze an object without need of the unpacker
         '''
         for included_file in self.db_backend_service.get_list_of_all_included_files(fo):
-            child = self.db_backend_service.get_object(included_file)
+            child = self.db_backend_service.get_object(included_file, lazy=True)
             self._schedule_analysis_tasks(child, fo.scheduled_analysis)
         self.check_further_process_or_complete(fo)
 
@@ -183,12 +187,30 @@ class AnalysisScheduler:  # pylint: disable=too-many-instance-attributes
             except Empty:
                 pass
             else:
-                self.process_next_analysis(task)
+                self.process_next_analyses([task, *self._get_queued_tasks(PRE_ANALYSIS_BATCH_SIZE - 1)])
+
+    def _get_queued_tasks(self, max_number: int) -> List[FileObject]:
+        tasks = []
+        with suppress(Empty):
+            while len(tasks) < max_number:
+                tasks.append(self.process_queue.get_nowait())
+        return tasks
 
     # ---- analysis skipping ----
 
+    def process_next_analyses(self, fw_objects: List[FileObject]):
+        if self._bulk_pre_analysis:
+            self.db_backend_service.add_objects(fw_objects)
+        else:
+            for fw_object in fw_objects:
+                self.pre_analysis(fw_object)
+        for fw_object in fw_objects:
+            self._start_next_analysis(fw_object)
+
     def process_next_analysis(self, fw_object: FileObject):
-        self.pre_analysis(fw_object)
+        self.process_next_analyses([fw_object])
+
+    def _start_next_analysis(self, fw_object: FileObject):
         analysis_to_do = fw_object.scheduled_analysis.pop()
         if analysis_to_do not in self.analysis_plugins:
             logging.error('Plugin \'{}\' not available'.format(analysis_to_do))
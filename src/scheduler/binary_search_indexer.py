@@ -0,0 +1,57 @@
+import logging
+import sqlite3
+from multiprocessing import Value
+from time import sleep, time
+
+from helperFunctions.process import ExceptionSafeProcess
+from storage.binary_search_index import get_binary_search_index
+
+UPDATE_INTERVAL = 10
+
+
+class BinarySearchIndexer:
+    '''
+    Background process that indexes the files queued in the binary search index (every UPDATE_INTERVAL seconds)
+    It only runs if the binary search index is enabled.
+    '''
+
+    def __init__(self, config=None):
+        self.config = config
+        self.stop_condition = Value('i', 0)
+        self.indexer_process = None
+        if get_binary_search_index(self.config) is not None:
+            self.start_indexer_process()
+            logging.info('Binary search indexer online')
+
+    def shutdown(self):
+        self.stop_condition.value = 1
+        if self.indexer_process is not None:
+            self.indexer_process.join()
+            logging.info('Binary search indexer offline')
+
+    def start_indexer_process(self):
+        self.indexer_process = ExceptionSafeProcess(target=self._indexer_main)
+        self.indexer_process.start()
+
+    def _indexer_main(self):
+        binary_search_index = get_binary_search_index(self.config)
+        next_run = time()
+        while self.stop_condition.value == 0:
+            if time() >= next_run:
+                self.update(binary_search_index)
+                next_run = time() + UPDATE_INTERVAL
+            sleep(1)
+
+    @staticmethod
+    def update(binary_search_index) -> int:
+        '''
+        :return: the number of processed files
+        '''
+        try:
+            processed_files = binary_search_index.update()
+        except sqlite3.Error as error:  # e.g. a lock timeout, the files stay queued
+            logging.error('Could not update the binary search index: {}'.format(error))
+            return 0
+        if processed_files:
+            logging.debug('binary search index: processed {} files'.format(processed_files))
+        return processed_files
@@ -0,0 +1,246 @@
+import logging
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime, timedelta
+from hashlib import sha256
+from itertools import groupby
+from multiprocessing import Value
+from threading import Lock
+from time import sleep, time
+from typing import Dict, Iterable, Iterator, List, Set
+
+import psutil
+
+from helperFunctions.database import ConnectTo
+from helperFunctions.merge_generators import chunks
+from helperFunctions.process import ExceptionSafeProcess
+from storage.db_interface_common import MongoInterfaceCommon
+from storage.fs_organizer import FS_Organizer, UID_PATTERN
+
+CHUNK_SIZE = 1000
+READ_BLOCK_SIZE = 1024 * 1024
+FIRST_RUN_DELAY = 600
+
+
+class RateLimiter:
+    '''
+    thread safe limiter: consume() blocks until the amount can be used without exceeding the rate (per second)
+    '''
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = Lock()
+        self._next_time = time()
+
+    def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time()
+            start = max(now, self._next_time)
+            self._next_time = start + amount / self.rate
+        if start > now:
+            sleep(start - now)
+
+
+class StorageScrubber:
+    '''
+    Background process that reconciles the file storage and the sanitize storage with the database:
+    Stored files and extracted analysis results (including overwritten versions) that are no longer referenced in the
+    database are deleted and the sha256 checksums of a random sample of the stored files are verified.
+    Entries are only deleted if they are older than scrubber_min_age and were found unreferenced by two consecutive
+    runs, so that files of objects that are still being unpacked or re-analyzed are kept.
+    The process runs with idle CPU and I/O priority and reads at most scrubber_max_bytes_per_second.
+    '''
+
+    def __init__(self, config=None):
+        self.config = config
+        self.interval = float(self.config['data_storage'].get('scrubber_interval', '24')) * 3600
+        self.min_age = float(self.config['data_storage'].get('scrubber_min_age', '24')) * 3600
+        self.sample_size = int(self.config['data_storage'].get('scrubber_sample_size', '1000'))
+        self.threads = int(self.config['data_storage'].get('scrubber_threads', '2'))
+        self.rate_limiter = RateLimiter(float(self.config['data_storage'].get('scrubber_max_bytes_per_second', '10485760')))
+        self.stop_condition = Value('i', 0)
+        self._orphan_candidates = {'files': set(), 'sanitized_entries': set()}
+        self.scrubber_process = None
+        if self.interval > 0:
+            self.start_scrubber_process()
+        logging.info('Storage scrubber online')
+
+    def shutdown(self):
+        self.stop_condition.value = 1
+        if self.scrubber_process is not None:
+            self.scrubber_process.join()
+        logging.info('Storage scrubber offline')
+
+    def start_scrubber_process(self):
+        self.scrubber_process = ExceptionSafeProcess(target=self._scrubber_main)
+        self.scrubber_process.start()
+
+    def _scrubber_main(self):
+        _set_idle_priority()
+        next_run = time() + min(FIRST_RUN_DELAY, self.interval)
+        while not self._stop_requested():
+            if time() >= next_run:
+                self.scrub()
+                next_run = time() + self.interval
+            sleep(1)
+
+    def _stop_requested(self) -> bool:
+        return self.stop_condition.value != 0
+
+    def scrub(self) -> Dict[str, int]:
+        '''
+        runs one pass over the file storage and the sanitize storage
+        :return: report with the numbers of deleted files and sanitized entries, reclaimed bytes, verified and
+                 corrupted files
+        '''
+        report = dict.fromkeys(['orphaned_files', 'orphaned_sanitized_entries', 'reclaimed_bytes', 'verified_files', 'corrupted_files'], 0)
+        fs_organizer = FS_Organizer(config=self.config)
+        with ConnectTo(StorageScrubberDbInterface, self.config) as db_interface:
+            sample = self._remove_orphaned_files(fs_organizer, db_interface, report)
+            self._remove_orphaned_sanitized_entries(db_interface, report)
+        self._verify_checksums(sample, report)
+        logging.info(
+            'storage scrubber: deleted {orphaned_files} files and {orphaned_sanitized_entries} sanitized entries ({reclaimed_bytes} bytes), '
+            '{corrupted_files} of {verified_files} verified files are corrupted'.format(**report)
+        )
+        return report
+
+    def _remove_orphaned_files(self, fs_organizer: FS_Organizer, db_interface: 'StorageScrubberDbInterface', report: dict) -> List[str]:
+        '''
+        :return: a random sample of the referenced files
+        '''
+        candidates, sample, number_of_referenced_files = {}, [], 0
+        cutoff = time() - self.min_age
+        for chunk in chunks(fs_organizer.get_stored_files(), CHUNK_SIZE):
+            if self._stop_requested():
+                return sample
+            unknown_uids = db_interface.get_unknown_uids([os.path.basename(file_path) for file_path in chunk])
+            for file_path in chunk:
+                if os.path.basename(file_path) not in unknown_uids:
+                    number_of_referenced_files += 1
+                    _add_to_sample(sample, file_path, number_of_referenced_files, self.sample_size)
+                    continue
+                with suppress(FileNotFoundError):
+                    file_stat = os.stat(file_path)
+                    if file_stat.st_mtime < cutoff:
+                        candidates[file_path] = file_stat.st_size
+        for file_path in self._confirm_orphans('files', candidates):
+            with suppress(FileNotFoundError):
+                os.remove(file_path)
+                report['orphaned_files'] += 1
+                report['reclaimed_bytes'] += candidates[file_path]
+        return sample
+
+    def _remove_orphaned_sanitized_entries(self, db_interface: 'StorageScrubberDbInterface', report: dict):
+        candidates = {}
+        cutoff = datetime.utcnow() - timedelta(seconds=self.min_age)
+        versions_by_file_name = (list(versions) for _, versions in groupby(db_interface.get_sanitized_entries(), key=lambda entry: entry['filename']))
+        for chunk in chunks(versions_by_file_name, CHUNK_SIZE):
+            if self._stop_requested():
+                return
+            referenced_file_names = db_interface.get_referenced_sanitized_file_names(
+                list({_get_uid_from_file_name(versions[-1]['filename']) for versions in chunk})
+            )
+            for versions in chunk:
+                latest_version = versions[-1]
+                if not UID_PATTERN.match(_get_uid_from_file_name(latest_version['filename'])):
+                    continue
+                # older versions are superseded by the latest one, which is only kept while it is referenced
+                orphaned_versions = versions if latest_version['filename'] not in referenced_file_names else versions[:-1]
+                candidates.update({entry['_id']: entry['length'] for entry in orphaned_versions if entry['uploadDate'] < cutoff})
+        confirmed_orphans = self._confirm_orphans('sanitized_entries', candidates)
+        for chunk in chunks(confirmed_orphans, CHUNK_SIZE):
+            db_interface.delete_sanitized_entries(chunk)
+        report['orphaned_sanitized_entries'] += len(confirmed_orphans)
+        report['reclaimed_bytes'] += sum(candidates[file_id] for file_id in confirmed_orphans)
+
+    def _confirm_orphans(self, kind: str, candidates: Iterable) -> Set:
+        '''
+        :return: the candidates that were already found by the last run (the other candidates are kept for the next run)
+        '''
+        confirmed = self._orphan_candidates[kind].intersection(candidates)
+        self._orphan_candidates[kind] = set(candidates).difference(confirmed)
+        return confirmed
+
+    def _verify_checksums(self, file_paths: List[str], report: dict):
+        with ThreadPoolExecutor(max_workers=max(self.threads, 1)) as executor:
+            for file_path, is_valid in zip(file_paths, executor.map(self._verify_file, file_paths)):
+                if is_valid is None:
+                    continue
+                report['verified_files'] += 1
+                if not is_valid:
+                    report['corrupted_files'] += 1
+                    logging.error('storage scrubber: checksum mismatch of stored file {}'.format(file_path))
+
+    def _verify_file(self, file_path: str):
+        '''
+        :return: True if the sha256 and size of the file match its uid, None if it was not checked
+        '''
+        if self._stop_requested():
+            return None
+        checksum, size = sha256(), 0
+        try:
+            with open(file_path, 'rb') as stored_file:
+                for block in iter(lambda: stored_file.read(READ_BLOCK_SIZE), b''):
+                    self.rate_limiter.consume(len(block))
+                    checksum.update(block)
+                    size += len(block)
+        except FileNotFoundError:  # deleted in the meantime
+            return None
+        return '{}_{}'.format(checksum.hexdigest(), size) == os.path.basename(file_path)
+
+
+def _set_idle_priority():
+    try:
+        os.nice(19)
+        psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (AttributeError, OSError, psutil.Error):
+        logging.warning('could not lower the priority of the storage scrubber')
+
+
+def _add_to_sample(sample: List[str], file_path: str, number_of_files: int, sample_size: int):
+    '''
+    reservoir sampling: every file is in the sample with the same probability
+    '''
+    if len(sample) < sample_size:
+        sample.append(file_path)
+    else:
+        index = random.randrange(number_of_files)
+        if index < sample_size:
+            sample[index] = file_path
+
+
+def _get_uid_from_file_name(file_name: str) -> str:
+    return '_'.join(file_name.split('_')[-2:])
+
+
+class StorageScrubberDbInterface(MongoInterfaceCommon):
+
+    READ_ONLY = False
+
+    def get_unknown_uids(self, uids: List[str]) -> Set[str]:
+        query = {'_id': {'$in': uids}}
+        known_uids = {entry['_id'] for entry in self.file_objects.find(query, {'_id': 1})}
+        known_uids.update(entry['_id'] for entry in self.firmwares.find(query, {'_id': 1}))
+        return set(uids).difference(known_uids)
+
+    def get_sanitized_entries(self) -> Iterator[dict]:
+        '''
+        :return: all sanitize storage entries ordered by file name and version
+        '''
+        return self.sanitize_storage.fs.files.find({}, {'filename': 1, 'length': 1, 'uploadDate': 1}, sort=[('filename', 1), ('uploadDate', 1)])
+
+    def get_referenced_sanitized_file_names(self, uids: List[str]) -> Set[str]:
+        file_names = set(self._get_swapped_analysis_file_names(self.firmwares, uids))
+        file_names.update(self._get_swapped_analysis_file_names(self.file_objects, uids))
+        for split_collection in self._get_split_analysis_collections():
+            file_names.update(self._get_swapped_split_analysis_file_names(split_collection, uids))
+        return file_names
+
+    def delete_sanitized_entries(self, file_ids: List):
+        self.sanitize_storage.fs.chunks.delete_many({'files_id': {'$in': file_ids}})
+        self.sanitize_storage.fs.files.delete_many({'_id': {'$in': file_ids}})
@@ -22,14 +22,18 @@ import os
 import signal
 from time import sleep
 
+from helperFunctions.database import ConnectTo
 from helperFunctions.process import complete_shutdown
 from helperFunctions.program_setup import was_started_by_start_fact, program_setup
 from intercom.back_end_binding import InterComBackEndBinding
 from scheduler.Analysis import AnalysisScheduler
 from scheduler.analysis_tag import TaggingDaemon
+from scheduler.binary_search_indexer import BinarySearchIndexer
 from scheduler.Compare import CompareScheduler
+from scheduler.storage_scrubber import StorageScrubber
 from scheduler.Unpacking import UnpackingScheduler
 from statistic.work_load import WorkLoadStatistic
+from storage.db_interface_backend import BackEndDbInterface
 
 PROGRAM_NAME = 'FACT Backend'
 PROGRAM_DESCRIPTION = 'Firmware Analysis and Compare Tool (FACT) Backend'
@@ -49,12 +53,16 @@ if __name__ == '__main__':
     else:
         signal.signal(signal.SIGINT, shutdown)
     args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION)
+    with ConnectTo(BackEndDbInterface, config) as db_interface:
+        db_interface.rebuild_existence_filter()
     analysis_service = AnalysisScheduler(config=config)
     tagging_service = TaggingDaemon(analysis_scheduler=analysis_service)
     unpacking_service = UnpackingScheduler(config=config, post_unpack=analysis_service.start_analysis_of_object, analysis_workload=analysis_service.get_scheduled_workload)
     compare_service = CompareScheduler(config=config)
     intercom = InterComBackEndBinding(config=config, analysis_service=analysis_service, compare_service=compare_service, unpacking_service=unpacking_service)
     work_load_stat = WorkLoadStatistic(config=config)
+    storage_scrubber = StorageScrubber(config=config)
+    binary_search_indexer = BinarySearchIndexer(config=config)
 
     run = True
     while run:
@@ -66,6 +74,8 @@ if __name__ == '__main__':
             break
 
     logging.info('shutdown components')
+    binary_search_indexer.shutdown()
+    storage_scrubber.shutdown()
     work_load_stat.shutdown()
     intercom.shutdown()
     compare_service.shutdown()
@@ -22,7 +22,9 @@ import signal
 import sys
 from time import sleep
 
+from helperFunctions.database import ConnectTo
 from statistic.work_load import WorkLoadStatistic
+from storage.db_interface_index import IndexDbInterface
 from storage.MongoMgr import MongoMgr
 from helperFunctions.program_setup import program_setup, was_started_by_start_fact
 
@@ -45,6 +47,8 @@ if __name__ == '__main__':
 
     args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION)
     mongo_server = MongoMgr(config=config)
+    with ConnectTo(IndexDbInterface, config) as index_interface:
+        index_interface.create_indexes()
     work_load_stat = WorkLoadStatistic(config=config, component='database')
 
     run = True
@@ -8,6 +8,7 @@ from pymongo import MongoClient, errors
 from helperFunctions.config import get_config_dir
 from helperFunctions.mongo_config_parser import get_mongo_path
 from helperFunctions.process import complete_shutdown
+from storage.mongo_interface import uses_embedded_storage
 
 
 class MongoMgr:
@@ -23,9 +24,10 @@ class MongoMgr:
             self.mongo_log_path = '/tmp/fact_mongo.log'
         self.config_path = os.path.join(get_config_dir(), 'mongod.conf')
         self.mongo_db_file_path = get_mongo_path(self.config_path)
-        logging.debug('Data Storage Path: {}'.format(self.mongo_db_file_path))
-        create_dir_for_file(self.mongo_log_path)
-        os.makedirs(self.mongo_db_file_path, exist_ok=True)
+        if not uses_embedded_storage(self.config):
+            logging.debug('Data Storage Path: {}'.format(self.mongo_db_file_path))
+            create_dir_for_file(self.mongo_log_path)
+            os.makedirs(self.mongo_db_file_path, exist_ok=True)
         self.start(_authenticate=auth)
 
     def auth_is_enabled(self):
@@ -38,7 +40,9 @@ class MongoMgr:
             return True
 
     def start(self, _authenticate=True):
-        if self.config['data_storage']['mongo_server'] == 'localhost':
+        if uses_embedded_storage(self.config):
+            logging.info('using embedded storage: {}'.format(self.config['data_storage']['embedded_storage_directory']))
+        elif self.config['data_storage']['mongo_server'] == 'localhost':
             logging.info("start local mongo database")
             self.check_file_and_directory_existence_and_permissions()
             auth_option = '--auth ' if _authenticate else ''
@@ -59,7 +63,7 @@ class MongoMgr:
             complete_shutdown('Error: no write permissions for MongoDB storage path: {}'.format(self.mongo_db_file_path))
 
     def shutdown(self):
-        if self.config['data_storage']['mongo_server'] == 'localhost':
+        if self.config['data_storage']['mongo_server'] == 'localhost' and not uses_embedded_storage(self.config):
             logging.info('stop local mongo database')
             command = 'mongo --eval "db.shutdownServer()" {}:{}/admin --username {} --password "{}"'.format(
                 self.config['data_storage']['mongo_server'], self.config['data_storage']['mongo_port'],
@@ -69,6 +73,9 @@ class MongoMgr:
             logging.debug(output)
 
     def init_users(self):
+        if uses_embedded_storage(self.config):
+            logging.info('The embedded storage needs no users')
+            return
         logging.info('Creating users for MongoDB authentication')
         if self.auth_is_enabled():
             logging.error("The DB seems to be running with authentication. Try terminating the MongoDB process.")
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from time import time
+from typing import Dict, List, Optional, Set, Tuple
+
+MAX_CACHED_RESULTS = 1000
+MAX_JOURNAL_ENTRIES = 1000000  # results that need a longer journal are dropped
+MAX_SEARCH_DURATION = 24 * 60 * 60  # journal entries of this age are kept for searches that are still running
+JOURNAL_PRUNE_INTERVAL = 100
+
+
+class BinarySearchCache:
+    '''
+    Cache of binary search results and journal of the stored files
+    The stored files are numbered by a generation counter that is incremented for each stored file. A result is cached
+    with the generation of the storage at the start of its search, so that a repeated search only needs to scan the
+    files that were stored since then. The least recently used results are evicted if there are more than
+    MAX_CACHED_RESULTS. The journal only keeps the files that were stored after the oldest cached result or during the
+    last MAX_SEARCH_DURATION seconds (for the searches that are still running). A result is only cached if the journal
+    still contains all files that were stored since the start of its search.
+    '''
+
+    def __init__(self, cache_directory: str):
+        self.cache_directory = cache_directory
+        self.database_path = os.path.join(cache_directory, 'binary_search_cache.db')
+        os.makedirs(cache_directory, exist_ok=True)
+        self._local = threading.local()
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS stored_files (generation INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT, stored REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS stored_files_stored ON stored_files (stored)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (rules_hash TEXT, firmware_uid TEXT, generation INTEGER, last_used REAL, result TEXT, '
+                'PRIMARY KEY (rules_hash, firmware_uid))'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value INTEGER)')
+
+    def add_file(self, uid: str):
+        '''
+        must be called after the file was written, so that a search that sees the new generation also sees the file
+        '''
+        connection = self._get_connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            generation = connection.execute('INSERT INTO stored_files (uid, stored) VALUES (?, ?)', (uid, time())).lastrowid
+            if generation % JOURNAL_PRUNE_INTERVAL == 0:
+                _prune_journal(connection, generation)
+
+    def get_generation(self) -> int:
+        with closing(self._connect()) as connection:
+            return _get_generation(connection)
+
+    def get_uids_stored_since(self, generation: int) -> Optional[Set[str]]:
+        '''
+        :return: the uids of the files stored after the generation or None if the journal does not reach back that far
+        '''
+        with closing(self._connect()) as connection, connection:
+            connection.execute('BEGIN')
+            if generation < _get_journal_start(connection):
+                return None
+            return {uid for uid, in connection.execute('SELECT uid FROM stored_files WHERE generation > ?', (generation,))}
+
+    def get_result(self, rules_hash: str, firmware_uid: Optional[str]) -> Tuple[Optional[Dict[str, List[str]]], Optional[int]]:
+        '''
+        :return: tuple of the cached result and its generation or (None, None) if there is no cached result
+        '''
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                'SELECT generation, result FROM results WHERE rules_hash = ? AND firmware_uid = ?', (rules_hash, _get_firmware_key(firmware_uid))
+            ).fetchone()
+            if row is None:
+                return None, None
+            connection.execute('UPDATE results SET last_used = ? WHERE rules_hash = ? AND firmware_uid = ?', (time(), rules_hash, _get_firmware_key(firmware_uid)))
+        return json.loads(row[1]), row[0]
+
+    def put_result(self, rules_hash: str, firmware_uid: Optional[str], generation: int, result: Dict[str, List[str]]):
+        with closing(self._connect()) as connection, connection:
+            connection.execute('BEGIN IMMEDIATE')
+            if generation < _get_journal_start(connection):  # the files stored during the search were pruned from the journal
+                return
+            connection.execute(
+                'INSERT OR REPLACE INTO results (rules_hash, firmware_uid, generation, last_used, result) VALUES (?, ?, ?, ?, ?)',
+                (rules_hash, _get_firmware_key(firmware_uid), generation, time(), json.dumps(result))
+            )
+            connection.execute(
+                'DELETE FROM results WHERE rowid NOT IN (SELECT rowid FROM results ORDER BY last_used DESC LIMIT ?)', (MAX_CACHED_RESULTS,)
+            )
+            _prune_journal(connection, _get_generation(connection))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        '''
+        connection that is reused by the calls of add_file (one per thread and process)
+        '''
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection, self._local.pid = self._connect(), os.getpid()
+        return self._local.connection
+
+
+def _get_generation(connection: sqlite3.Connection) -> int:
+    row = connection.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', ('stored_files',)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def _get_journal_start(connection: sqlite3.Connection) -> int:
+    '''
+    :return: the generation after which all stored files are in the journal
+    '''
+    row = connection.execute('SELECT value FROM metadata WHERE key = ?', ('journal_start',)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def _prune_journal(connection: sqlite3.Connection, generation: int):
+    connection.execute('DELETE FROM results WHERE generation < ?', (generation - MAX_JOURNAL_ENTRIES,))
+    oldest_result_generation = connection.execute('SELECT MIN(generation) FROM results').fetchone()[0]
+    last_outdated_generation = connection.execute(
+        'SELECT MAX(generation) FROM stored_files WHERE stored < ?', (time() - MAX_SEARCH_DURATION,)
+    ).fetchone()[0] or 0
+    journal_start = max(
+        generation - MAX_JOURNAL_ENTRIES,
+        min(last_outdated_generation, oldest_result_generation if oldest_result_generation is not None else last_outdated_generation)
+    )
+    if journal_start > _get_journal_start(connection):
+        connection.execute('DELETE FROM stored_files WHERE generation <= ?', (journal_start,))
+        connection.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', ('journal_start', journal_start))
+
+
+def _get_firmware_key(firmware_uid: Optional[str]) -> str:
+    return firmware_uid or ''
+
+
+def get_binary_search_cache(config) -> Optional[BinarySearchCache]:
+    '''
+    :return: the binary search cache or None if it is disabled
+    '''
+    cache_directory = config['data_storage'].get('binary_search_cache_directory', '')
+    return BinarySearchCache(cache_directory) if cache_directory else None
@@ -0,0 +1,271 @@
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import closing
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+NGRAM_SIZE = 3
+INDEX_BATCH_SIZE = 500
+INDEX_BATCH_NGRAMS = 8 * 1024 * 1024
+READ_BLOCK_SIZE = 16 * 1024 * 1024
+QUERY_CHUNK_SIZE = 500
+BLOCK_BITS = 12
+LOWER_BITS_MASK = (1 << BLOCK_BITS) - 1
+MERGE_ROWS = 32  # the batch rows of a block are merged if there are at least this many
+SEGMENT_SIZE = 1 << 16  # merged rows contain the postings of aligned ranges of doc ids (the offsets are 16 bit integers)
+MERGE_CHUNK_SIZE = 16
+
+
+class BinarySearchIndex:
+    '''
+    Inverted index of the trigrams (sequences of three bytes) of the stored files
+    The binary search uses it to skip files that do not contain the literal strings of the yara rules.
+    Stored files are queued by add_file() and indexed in batches of INDEX_BATCH_SIZE files by update() (which is
+    called by the BinarySearchIndexer process of the backend, so that storing a file never waits for the index). The
+    files of a batch are read before the write transaction is started. The posting lists of a
+    batch are stored in one row per block of trigrams with the same upper 12 bits (compressed arrays of the lower bits
+    of the trigrams and the offsets of the document ids in the batch).
+    A query decompresses all rows of the block of each of its trigrams, so its cost grows with the number of rows of a
+    block. Therefore, update() merges the batch rows of a block once there are MERGE_ROWS of them into one row per
+    SEGMENT_SIZE documents, so that the number of rows grows with the number of indexed files instead of the number of
+    batches (the indexer usually indexes only a few files per batch).
+    Files that are queued, were stored before the index was enabled or could not be read are not indexed and must
+    always be scanned.
+    '''
+
+    def __init__(self, index_directory: str):
+        self.index_directory = index_directory
+        self.database_path = os.path.join(index_directory, 'binary_search_index.db')
+        os.makedirs(index_directory, exist_ok=True)
+        self._local = threading.local()
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS documents (doc_id INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT UNIQUE)')
+            connection.execute('CREATE TABLE IF NOT EXISTS pending (uid TEXT PRIMARY KEY, file_path TEXT)')
+            connection.execute('CREATE TABLE IF NOT EXISTS postings (block INTEGER, first_doc_id INTEGER, data BLOB, merged INTEGER DEFAULT 0)')
+            connection.execute('CREATE INDEX IF NOT EXISTS postings_block ON postings (block)')
+            connection.execute('CREATE INDEX IF NOT EXISTS postings_merged ON postings (merged, block)')
+
+    def add_file(self, uid: str, file_path: str):
+        '''
+        queues a stored file, it is indexed by the next call of update()
+        '''
+        connection = self._get_connection()
+        with connection:
+            connection.execute('INSERT OR IGNORE INTO pending (uid, file_path) VALUES (?, ?)', (uid, file_path))
+
+    def update(self) -> int:
+        '''
+        indexes all queued files and merges the posting rows
+        :return: the number of processed files
+        '''
+        processed_files = 0
+        with closing(self._connect()) as connection:
+            while True:
+                number_of_files = self._index_pending_files(connection)
+                if number_of_files == 0:
+                    break
+                processed_files += number_of_files
+            self._merge_postings(connection)
+        return processed_files
+
+    def remove_file(self, uid: str):
+        with closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM documents WHERE uid = ?', (uid,))
+            connection.execute('DELETE FROM pending WHERE uid = ?', (uid,))
+
+    def get_indexed_uids(self, uids: List[str]) -> Set[str]:
+        with closing(self._connect()) as connection:
+            return {
+                uid
+                for chunk_start in range(0, len(uids), QUERY_CHUNK_SIZE)
+                for uid, in connection.execute(
+                    'SELECT uid FROM documents WHERE uid IN ({})'.format(','.join('?' * len(uids[chunk_start:chunk_start + QUERY_CHUNK_SIZE]))),
+                    uids[chunk_start:chunk_start + QUERY_CHUNK_SIZE]
+                )
+            }
+
+    def get_candidate_uids(self, literal_groups: Iterable[List[bytes]]) -> Set[str]:
+        '''
+        :param literal_groups: groups of literals (of at least NGRAM_SIZE bytes), a file is a candidate if it contains all
+                               literals of any group
+        :return: the uids of the indexed files that are candidates
+        '''
+        doc_ids = set()
+        with closing(self._connect()) as connection:
+            for literals in literal_groups:
+                ngrams = _get_ngrams_of_literals(literals)
+                if len(ngrams) == 0:
+                    raise ValueError('literals must be at least {} bytes long'.format(NGRAM_SIZE))
+                doc_ids.update(self._get_doc_ids_containing_all(connection, ngrams).tolist())
+            doc_ids = sorted(doc_ids)
+            return {
+                uid
+                for chunk_start in range(0, len(doc_ids), QUERY_CHUNK_SIZE)
+                for uid, in connection.execute(
+                    'SELECT uid FROM documents WHERE doc_id IN ({})'.format(','.join('?' * len(doc_ids[chunk_start:chunk_start + QUERY_CHUNK_SIZE]))),
+                    doc_ids[chunk_start:chunk_start + QUERY_CHUNK_SIZE]
+                )
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        '''
+        connection that is reused by the calls of add_file (one per thread and process)
+        '''
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection, self._local.pid = self._connect(), os.getpid()
+        return self._local.connection
+
+    def _index_pending_files(self, connection: sqlite3.Connection) -> int:
+        '''
+        indexes the next batch of queued files: the files are read first and the batch is written in one transaction
+        that skips the files that were indexed or removed in the meantime
+        :return: the number of processed files
+        '''
+        pending_files = connection.execute('SELECT uid, file_path FROM pending LIMIT ?', (INDEX_BATCH_SIZE,)).fetchall()
+        file_ngrams, number_of_ngrams = {}, 0
+        for index, (uid, file_path) in enumerate(pending_files):
+            try:
+                file_ngrams[uid] = get_ngrams_of_file(file_path)
+            except OSError as error:
+                logging.warning('binary search index: could not index {}: {}'.format(uid, error))
+                continue
+            number_of_ngrams += len(file_ngrams[uid])
+            if number_of_ngrams >= INDEX_BATCH_NGRAMS:
+                pending_files = pending_files[:index + 1]
+                break
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            ngrams, offsets, first_doc_id = [], [], None
+            for uid, _ in pending_files:
+                if connection.execute('DELETE FROM pending WHERE uid = ?', (uid,)).rowcount == 0 or uid not in file_ngrams:
+                    continue
+                if connection.execute('SELECT 1 FROM documents WHERE uid = ?', (uid,)).fetchone() is not None:
+                    continue
+                doc_id = connection.execute('INSERT INTO documents (uid) VALUES (?)', (uid,)).lastrowid
+                first_doc_id = doc_id if first_doc_id is None else first_doc_id
+                ngrams.append(file_ngrams[uid])
+                offsets.append(np.full(len(file_ngrams[uid]), doc_id - first_doc_id, dtype=np.uint16))
+            if ngrams:
+                connection.executemany('INSERT INTO postings (block, first_doc_id, data) VALUES (?, ?, ?)', _get_posting_rows(ngrams, offsets, first_doc_id))
+        return len(pending_files)
+
+    @staticmethod
+    def _merge_postings(connection: sqlite3.Connection):
+        '''
+        replaces the batch rows (and the merged row of the last segment they belong to) of the blocks with at least
+        MERGE_ROWS batch rows by one merged row per segment
+        '''
+        blocks = [block for block, in connection.execute('SELECT block FROM postings WHERE merged = 0 GROUP BY block HAVING COUNT(*) >= ?', (MERGE_ROWS,))]
+        for chunk_start in range(0, len(blocks), MERGE_CHUNK_SIZE):
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                for block in blocks[chunk_start:chunk_start + MERGE_CHUNK_SIZE]:
+                    first_segment_start = connection.execute(
+                        'SELECT MIN(first_doc_id) FROM postings WHERE merged = 0 AND block = ?', (block,)
+                    ).fetchone()[0] // SEGMENT_SIZE * SEGMENT_SIZE
+                    rows = connection.execute(
+                        'SELECT rowid, first_doc_id, data FROM postings WHERE block = ? AND (merged = 0 OR first_doc_id >= ?)', (block, first_segment_start)
+                    ).fetchall()
+                    connection.executemany('DELETE FROM postings WHERE rowid = ?', [(rowid,) for rowid, _, _ in rows])
+                    connection.executemany(
+                        'INSERT INTO postings (block, first_doc_id, data, merged) VALUES (?, ?, ?, 1)', _get_merged_posting_rows(block, rows)
+                    )
+
+    @staticmethod
+    def _get_doc_ids_containing_all(connection: sqlite3.Connection, ngrams: np.ndarray) -> np.ndarray:
+        doc_ids = None
+        for ngram in ngrams.tolist():
+            ngram_doc_ids = np.concatenate([
+                first_doc_id + _decode_postings(data, ngram & LOWER_BITS_MASK)
+                for first_doc_id, data in connection.execute('SELECT first_doc_id, data FROM postings WHERE block = ?', (ngram >> BLOCK_BITS,))
+            ] or [np.array([], dtype=np.int64)])
+            doc_ids = ngram_doc_ids if doc_ids is None else np.intersect1d(doc_ids, ngram_doc_ids)
+            if len(doc_ids) == 0:
+                break
+        return doc_ids
+
+
+def get_ngrams_of_file(file_path: str) -> np.ndarray:
+    '''
+    :return: sorted array of the distinct trigrams (as 24 bit integers) of the file
+    '''
+    if os.path.getsize(file_path) <= READ_BLOCK_SIZE:
+        with open(file_path, 'rb') as input_file:
+            return np.unique(_get_ngrams_of_bytes(input_file.read()))
+    seen = np.zeros(1 << (8 * NGRAM_SIZE), dtype=bool)  # large files are read block by block
+    tail = b''
+    with open(file_path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(READ_BLOCK_SIZE), b''):
+            data = tail + block
+            seen[_get_ngrams_of_bytes(data)] = True
+            tail = data[-(NGRAM_SIZE - 1):]
+    return np.flatnonzero(seen).astype(np.uint32)
+
+
+def _get_ngrams_of_bytes(data: bytes) -> np.ndarray:
+    if len(data) < NGRAM_SIZE:
+        return np.array([], dtype=np.uint32)
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return (values[:-2] << 16) | (values[1:-1] << 8) | values[2:]
+
+
+def _get_ngrams_of_literals(literals: List[bytes]) -> np.ndarray:
+    return np.unique(np.concatenate([_get_ngrams_of_bytes(literal) for literal in literals] or [np.array([], dtype=np.uint32)]))
+
+
+def _get_posting_rows(ngrams: List[np.ndarray], offsets: List[np.ndarray], first_doc_id: int):
+    ngrams, offsets = np.concatenate(ngrams), np.concatenate(offsets)
+    order = np.argsort(ngrams, kind='stable')
+    ngrams, offsets = ngrams[order], offsets[order]
+    blocks = ngrams >> BLOCK_BITS
+    boundaries = [0, *(np.flatnonzero(np.diff(blocks)) + 1).tolist(), len(ngrams)]
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        data = (ngrams[start:end] & LOWER_BITS_MASK).astype('<u2').tobytes() + offsets[start:end].astype('<u2').tobytes()
+        yield int(blocks[start]), first_doc_id, zlib.compress(data, 1)
+
+
+def _get_merged_posting_rows(block: int, rows: List[Tuple[int, int, bytes]]):
+    lower_bits, doc_ids = [], []
+    for _, first_doc_id, data in rows:
+        row_lower_bits, offsets = _decode_posting_row(data)
+        lower_bits.append(row_lower_bits)
+        doc_ids.append(first_doc_id + offsets.astype(np.int64))
+    lower_bits, doc_ids = np.concatenate(lower_bits), np.concatenate(doc_ids)
+    order = np.lexsort((doc_ids, doc_ids // SEGMENT_SIZE))
+    lower_bits, doc_ids = lower_bits[order], doc_ids[order]
+    segments = doc_ids // SEGMENT_SIZE
+    boundaries = [0, *(np.flatnonzero(np.diff(segments)) + 1).tolist(), len(doc_ids)]
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        segment_start = int(segments[start]) * SEGMENT_SIZE
+        data = lower_bits[start:end].astype('<u2').tobytes() + (doc_ids[start:end] - segment_start).astype('<u2').tobytes()
+        yield block, segment_start, zlib.compress(data, 1)
+
+
+def _decode_postings(data: bytes, lower_bits: int) -> np.ndarray:
+    ngram_lower_bits, offsets = _decode_posting_row(data)
+    return offsets[ngram_lower_bits == lower_bits].astype(np.int64)
+
+
+def _decode_posting_row(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    :return: the lower bits of the trigrams and the offsets of the document ids of a posting row
+    '''
+    data = zlib.decompress(data)
+    number_of_postings = len(data) // 4
+    return np.frombuffer(data, dtype='<u2', count=number_of_postings), np.frombuffer(data, dtype='<u2', offset=2 * number_of_postings)
+
+
+def get_binary_search_index(config) -> Optional[BinarySearchIndex]:
+    '''
+    :return: the binary search index or None if it is disabled
+    '''
+    index_directory = config['data_storage'].get('binary_search_index_directory', '')
+    return BinarySearchIndex(index_directory) if index_directory else None
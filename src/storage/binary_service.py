@@ -1,8 +1,13 @@
 import logging
+import os
+from pathlib import Path
+from typing import Optional, Tuple
 
 from common_helper_files.fail_safe_file_operations import get_binary_from_file
 
+from helperFunctions.database import ConnectTo
 from storage.db_interface_common import MongoInterfaceCommon
+from storage.fs_organizer import FS_Organizer
 from unpacker.tar_repack import TarRepack
 
 
@@ -33,10 +38,25 @@ class BinaryService(object):
             name = "{}.tar.gz".format(tmp['file_name'])
             return (tar, name)
 
+    def get_local_file_name_and_path(self, uid) -> Tuple[Optional[str], Optional[str]]:
+        '''
+        looks up the stored file without the backend, e.g. on a frontend host with access to the file storage
+        :return: tuple of the file name and the path of the stored file or (None, None) if the file is not readable on
+                 this host
+        '''
+        try:
+            tmp = self._get_file_name_and_path_from_db(uid)
+        except OSError:  # the file storage is not mounted on this host
+            return None, None
+        if tmp is None or not os.path.isfile(tmp['file_path']) or not os.access(tmp['file_path'], os.R_OK):
+            return None, None
+        return tmp['file_name'], tmp['file_path']
+
     def _get_file_name_and_path_from_db(self, uid):
-        db_service = BinaryServiceDbInterface(config=self.config)
-        tmp = db_service.get_file_name_and_path(uid)
-        db_service.shutdown()
+        with ConnectTo(BinaryServiceDbInterface, self.config) as db_service:
+            tmp = db_service.get_file_name_and_path(uid)
+        if tmp is not None and not Path(tmp['file_path']).is_file():  # the file was moved by the file storage rebalancing
+            tmp['file_path'] = FS_Organizer(config=self.config).get_file_path(uid)
         return tmp
 
 
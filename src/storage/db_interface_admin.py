@@ -1,7 +1,12 @@
 import logging
+from typing import Iterable, Set, Tuple
 
+from helperFunctions.merge_generators import chunks
 from intercom.front_end_binding import InterComFrontEndBinding
 from storage.db_interface_common import MongoInterfaceCommon
+from storage.object_cache import new_generation
+
+BULK_CHUNK_SIZE = 10000
 
 
 class AdminDbInterface(MongoInterfaceCommon):
@@ -20,72 +25,94 @@ class AdminDbInterface(MongoInterfaceCommon):
         current_db = self.firmwares if self.is_firmware(uid) else self.file_objects
         current_db.find_one_and_update(
             {'_id': uid},
-            {'$unset': {field: ''}}
+            {'$unset': {field: ''}, '$set': {'generation': new_generation()}}
         )
 
     def remove_from_object_array(self, uid, field, value):
         current_db = self.firmwares if self.is_firmware(uid) else self.file_objects
         current_db.find_one_and_update(
             {'_id': uid},
-            {'$pull': {field: value}}
+            {'$pull': {field: value}, '$set': {'generation': new_generation()}}
         )
 
     def delete_firmware(self, uid, delete_root_file=True):
+        '''
+        Deletes a firmware and all included files that are not part of other firmwares. The virtual path entries of
+        included files that are part of other firmwares are removed. All database operations are grouped and the
+        backend is notified about all files to delete with a single message.
+        :param uid: the uid of the firmware
+        :param delete_root_file: also delete the firmware file from the file storage
+        :return: tuple with numbers of removed virtual file path entries and deleted files
+        '''
         removed_fp, deleted = 0, 1
-        fw = self.firmwares.find_one(uid)
+        fw = self.firmwares.find_one({'_id': uid}, {'files_included': 1})
         if fw:
-            for included_file_uid in fw['files_included']:
-                child_removed_fp, child_deleted = self._remove_virtual_path_entries(uid, included_file_uid)
-                removed_fp += child_removed_fp
-                deleted += child_deleted
-            if delete_root_file:
-                self.intercom.delete_file(fw)
-            self._delete_swapped_analysis_entries(fw)
+            uids_to_delete, uids_to_unlink = self._get_included_files_to_delete_and_unlink(uid, fw['files_included'])
+            self._remove_virtual_path_entries(uid, uids_to_unlink)
+            self._delete_swapped_analysis_entries(self.firmwares, [uid])
+            self._delete_swapped_analysis_entries(self.file_objects, uids_to_delete)
+            self._delete_split_analysis_entries([uid, *uids_to_delete])
+            for chunk in chunks(uids_to_delete, BULK_CHUNK_SIZE):
+                self.file_objects.delete_many({'_id': {'$in': chunk}})
+            self.summaries.delete_many({'root_uid': uid})
             self.firmwares.delete_one({'_id': uid})
+            files_to_delete = [uid, *uids_to_delete] if delete_root_file else list(uids_to_delete)
+            if files_to_delete:
+                self.intercom.delete_files(files_to_delete)
+            removed_fp += len(uids_to_unlink)
+            deleted += len(uids_to_delete)
         else:
             logging.error('Firmware not found in Database: {}'.format(uid))
         return removed_fp, deleted
 
-    def _delete_swapped_analysis_entries(self, fo_entry):
-        for key in fo_entry['processed_analysis']:
-            try:
-                if fo_entry['processed_analysis'][key]['file_system_flag']:
-                    for analysis_key in fo_entry['processed_analysis'][key].keys():
-                        if analysis_key != 'file_system_flag' and isinstance(fo_entry['processed_analysis'][key][analysis_key], str):
-                            sanitize_id = fo_entry['processed_analysis'][key][analysis_key]
-                            entry = self.sanitize_fs.find_one({'filename': sanitize_id})
-                            self.sanitize_fs.delete(entry._id)
-            except KeyError:
-                logging.warning('key error while deleting analysis for {}:{}'.format(fo_entry['_id'], key))
+    def _get_included_files_to_delete_and_unlink(self, root_uid: str, files_included: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        '''
+        Walks the file tree of the root object level by level. Files that are only part of the root firmware are to be
+        deleted. Files that are also part of other firmwares are to be unlinked from the root firmware.
+        :return: tuple with sets of uids to delete and uids to unlink
+        '''
+        uids_to_delete, uids_to_unlink = set(), set()
+        current_level = set(files_included)
+        while current_level:
+            next_level = set()
+            for chunk in chunks(current_level, BULK_CHUNK_SIZE):
+                for entry in self.file_objects.find({'_id': {'$in': chunk}}, {'files_included': 1, 'virtual_file_path': 1}):
+                    if any(root != root_uid for root in entry['virtual_file_path']):
+                        # there are more roots in the virtual path, meaning this file is included in other firmwares
+                        uids_to_unlink.add(entry['_id'])
+                    else:
+                        uids_to_delete.add(entry['_id'])
+                    next_level.update(entry['files_included'])
+            current_level = next_level.difference(uids_to_delete, uids_to_unlink)
+        return uids_to_delete, uids_to_unlink
+
+    def _remove_virtual_path_entries(self, root_uid: str, uids: Iterable[str]):
+        for chunk in chunks(uids, BULK_CHUNK_SIZE):
+            self.file_objects.update_many(
+                {'_id': {'$in': chunk}},
+                {
+                    '$unset': {'virtual_file_path.{}'.format(root_uid): ''},
+                    '$pull': {'parent_firmware_uids': root_uid},
+                    '$set': {'generation': new_generation()}
+                }
+            )
 
-    def _remove_virtual_path_entries(self, root_uid, fo_uid):
+    def _delete_swapped_analysis_entries(self, collection, uids: Iterable[str]):
         '''
-        Recursively checks if the provided root uid is the only entry in the virtual path of the file object specified \
-        by fo uid. If this is the case, the file object is deleted from the database. Otherwise, only the entry from \
-        the virtual path is removed.
-        :param root_uid: the uid of the root firmware
-        :param fo_uid: he uid of the current file object
-        :return: tuple with numbers of recursively removed virtual file path entries and deleted files
+        deletes all (versions of the) analysis results swapped to the sanitize storage of the given objects
         '''
-        removed_fp, deleted = 0, 0
-        fo = self.file_objects.find_one(fo_uid)
-        if fo is not None:
-            for child_uid in fo['files_included']:
-                child_removed_fp, child_deleted = self._remove_virtual_path_entries(root_uid, child_uid)
-                removed_fp += child_removed_fp
-                deleted += child_deleted
-            if any([root != root_uid for root in fo['virtual_file_path'].keys()]):
-                # there are more roots in the virtual path, meaning this file is included in other firmwares
-                self.remove_object_field(fo_uid, 'virtual_file_path.{}'.format(root_uid))
-                if 'parent_firmware_uids' in fo:
-                    self.remove_from_object_array(fo_uid, 'parent_firmware_uids', root_uid)
-                removed_fp += 1
-            else:
-                self._delete_swapped_analysis_entries(fo)
-                self._delete_file_object(fo)
-                deleted += 1
-        return removed_fp, deleted
+        split_collections = self._get_split_analysis_collections()
+        for chunk in chunks(uids, BULK_CHUNK_SIZE):
+            file_names = self._get_swapped_analysis_file_names(collection, chunk)
+            for split_collection in split_collections:
+                file_names.extend(self._get_swapped_split_analysis_file_names(split_collection, chunk))
+            for file_name_chunk in chunks(file_names, BULK_CHUNK_SIZE):
+                file_ids = [entry['_id'] for entry in self.sanitize_storage.fs.files.find({'filename': {'$in': file_name_chunk}}, {'_id': 1})]
+                self.sanitize_storage.fs.chunks.delete_many({'files_id': {'$in': file_ids}})
+                self.sanitize_storage.fs.files.delete_many({'_id': {'$in': file_ids}})
 
-    def _delete_file_object(self, fo_entry):
-        self.intercom.delete_file(fo_entry)
-        self.file_objects.delete_one({'_id': fo_entry['_id']})
+    def _delete_split_analysis_entries(self, uids: Iterable[str]):
+        split_collections = self._get_split_analysis_collections()
+        for chunk in chunks(uids, BULK_CHUNK_SIZE):
+            for split_collection in split_collections:
+                split_collection.delete_many({'_id': {'$in': chunk}})
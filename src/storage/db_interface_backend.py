@@ -1,19 +1,38 @@
 import logging
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from pymongo.errors import PyMongoError
+from pymongo import InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 
 from helperFunctions.dataConversion import convert_str_to_time
-from helperFunctions.object_storage import update_virtual_file_path, update_included_files, update_analysis_tags
+from helperFunctions.merge_generators import chunks
+from helperFunctions.object_storage import (
+    get_analysis_tag_updates, get_new_included_files, get_virtual_file_path_updates, update_analysis_tags
+)
 from helperFunctions.tag import update_tags
 from objects.file import FileObject
 from objects.firmware import Firmware
-from storage.db_interface_common import MongoInterfaceCommon
+from storage.db_interface_common import (
+    SPLIT_STORAGE_KEY, MongoInterfaceCommon, analysis_result_is_unchanged, get_split_collection_name
+)
+from storage.existence_filter import ExistenceFilter
+from storage.fs_organizer import FS_Organizer
+from storage.lazy_analysis import LazyAnalysisResult
+from storage.object_cache import new_generation
+
+BULK_BATCH_SIZE = 1000
+SANITIZE_WORKERS = 4
+DUPLICATE_KEY_ERROR = 11000
 
 
 class BackEndDbInterface(MongoInterfaceCommon):
 
+    _fs_organizer = None
+
     def add_object(self, fo_fw):
         if isinstance(fo_fw, Firmware):
             self.add_firmware(fo_fw)
@@ -24,16 +43,125 @@ class BackEndDbInterface(MongoInterfaceCommon):
             return
         self.release_unpacking_lock(fo_fw.uid)
 
+    def add_objects(self, objects: Iterable[FileObject], batch_size: int = BULK_BATCH_SIZE, sanitize_workers: int = SANITIZE_WORKERS) -> Dict[str, bool]:
+        '''
+        adds (or updates) many objects with few database round trips: the stored entries of each batch are fetched with
+        one query per collection, the objects are sanitized in a thread pool and written with one unordered bulk write
+        per collection
+        :return: dict of uid -> True if the object was stored successfully
+        '''
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=sanitize_workers) as pool:
+            for batch in chunks(objects, batch_size):
+                for uid, success in self._add_object_batch(batch, pool).items():
+                    outcomes[uid] = outcomes.get(uid, True) and success
+        return outcomes
+
+    def _add_object_batch(self, batch: List[FileObject], pool: ThreadPoolExecutor, retry: bool = True) -> Dict[str, bool]:
+        objects, duplicates = {}, []
+        for fo_fw in batch:
+            if not isinstance(fo_fw, FileObject):
+                logging.error('invalid object type: {} -> {}'.format(type(fo_fw), fo_fw))
+            elif fo_fw.uid in objects:
+                duplicates.append(fo_fw)  # stored after the first one, so that it updates the stored entry
+            else:
+                objects[fo_fw.uid] = fo_fw
+
+        old_entries = self._get_entries_of_objects(objects.values())
+        operations = {collection.name: (collection, []) for collection in [self.firmwares, self.file_objects]}
+        summary_requests = {}
+        for fo_fw, operation, requests in pool.map(lambda fo: self._get_write_operation(fo, old_entries.get(fo.uid)), objects.values()):
+            summary_requests[fo_fw.uid] = requests
+            if operation is not None:
+                operations[self._get_collection(fo_fw).name][1].append((fo_fw, operation))
+
+        outcomes = {uid: True for uid in objects}
+        to_retry = []
+        for collection, collection_operations in operations.values():
+            for fo_fw, error_code in self._bulk_write_objects(collection, collection_operations):
+                outcomes[fo_fw.uid] = False
+                if retry and error_code == DUPLICATE_KEY_ERROR:  # inserted concurrently by someone else -> update it
+                    to_retry.append(fo_fw)
+        self._write_summary_requests('batch', [request for uid, requests in summary_requests.items() if outcomes[uid] for request in requests])
+        # the locks of objects that could not be written are kept, so that their files are not deleted
+        self.locks.delete_many({'uid': {'$in': [uid for uid, success in outcomes.items() if success]}})
+
+        if to_retry:
+            outcomes.update(self._add_object_batch(to_retry, pool, retry=False))
+        if duplicates:
+            for uid, success in self._add_object_batch(duplicates, pool).items():
+                outcomes[uid] = outcomes[uid] and success
+        return outcomes
+
+    def _get_entries_of_objects(self, objects: Iterable[FileObject]) -> Dict[str, dict]:
+        entries = {}
+        for collection, uids in [
+            (self.firmwares, [fo_fw.uid for fo_fw in objects if isinstance(fo_fw, Firmware)]),
+            (self.file_objects, [fo_fw.uid for fo_fw in objects if not isinstance(fo_fw, Firmware)]),
+        ]:
+            if uids:
+                entries.update({entry['_id']: entry for entry in collection.find({'_id': {'$in': uids}})})
+        return entries
+
+    def _get_write_operation(self, fo_fw: FileObject, old_entry: Optional[dict]):
+        '''
+        :return: tuple of the object, its write operation (None if nothing changed) and its summary update requests
+        '''
+        if old_entry:
+            update, summary_requests = self._get_object_update(fo_fw, old_entry)
+            return fo_fw, UpdateOne({'_id': fo_fw.uid}, update) if update else None, summary_requests
+        if isinstance(fo_fw, Firmware):
+            entry = self.build_firmware_dict(fo_fw)
+            root_uids = [fo_fw.uid]
+        else:
+            entry = self.build_file_object_dict(fo_fw)
+            root_uids = self._get_summary_root_uids(fo_fw, entry)
+        self._existence_filter.add(fo_fw.uid)
+        return fo_fw, InsertOne(entry), self._get_summary_requests(fo_fw.uid, root_uids, fo_fw.processed_analysis)
+
+    @staticmethod
+    def _bulk_write_objects(collection, operations: List[Tuple[FileObject, object]]) -> List[Tuple[FileObject, int]]:
+        '''
+        :return: list of the objects that could not be written together with the error code
+        '''
+        if not operations:
+            return []
+        try:
+            collection.bulk_write([operation for _, operation in operations], ordered=False)
+        except BulkWriteError as error:
+            logging.error('Could not write {} of {} objects'.format(len(error.details['writeErrors']), len(operations)))
+            return [(operations[write_error['index']][0], write_error['code']) for write_error in error.details['writeErrors']]
+        except PyMongoError as error:
+            logging.error('Could not write objects: {} {}'.format(type(error).__name__, error))
+            return [(fo_fw, None) for fo_fw, _ in operations]
+        return []
+
     def update_object(self, new_object=None, old_object=None):
-        update_dictionary = {
-            'processed_analysis': self._update_processed_analysis(new_object, old_object),
-            'files_included': update_included_files(new_object, old_object),
-            'virtual_file_path': update_virtual_file_path(new_object, old_object),
-            'analysis_tags': update_analysis_tags(new_object, old_object),
+        '''
+        updates only the fields of the stored object that changed: analysis results of plugins that are not part of the
+        new object (and results that did not change) are left untouched, so that they are neither retrieved nor sanitized
+        '''
+        update, summary_requests = self._get_object_update(new_object, old_object)
+        if update:
+            self._get_collection(new_object).update_one({'_id': new_object.uid}, update)
+        self._write_summary_requests(new_object.uid, summary_requests)
+
+    def _get_object_update(self, new_object: FileObject, old_object: dict) -> Tuple[dict, list]:
+        '''
+        :return: tuple of the update of the stored object (empty if nothing changed) and the summary update requests
+        '''
+        old_root_uids = self._get_root_uids_of_entry(old_object)
+        changed_analysis = self._get_changed_analysis_results(new_object, old_object)
+        sanitized_analysis = self.sanitize_analysis(analysis_dict=changed_analysis, uid=new_object.uid)
+        fields_to_set = {
+            **{'processed_analysis.{}'.format(plugin): result for plugin, result in sanitized_analysis.items()},
+            **get_virtual_file_path_updates(new_object, old_object),
+            **get_analysis_tag_updates(new_object, old_object),
         }
+        items_to_add = {'files_included': get_new_included_files(new_object, old_object)}
 
         if isinstance(new_object, Firmware):
-            update_dictionary.update({
+            fields_to_set.update(self._get_changed_fields(old_object, {
                 'version': new_object.version,
                 'device_name': new_object.device_name,
                 'device_part': new_object.part,
@@ -41,21 +169,41 @@ class BackEndDbInterface(MongoInterfaceCommon):
                 'vendor': new_object.vendor,
                 'release_date': convert_str_to_time(new_object.release_date),
                 'tags': new_object.tags,
-            })
-            collection = self.firmwares
+            }))
         else:
-            update_dictionary.update({
-                'parent_firmware_uids': list(set.union(set(old_object['parent_firmware_uids']), new_object.parent_firmware_uids))
-            })
-            collection = self.file_objects
+            items_to_add['parent_firmware_uids'] = sorted(set(new_object.parent_firmware_uids).difference(old_object['parent_firmware_uids']))
+
+        root_uids = self._get_summary_root_uids(new_object, old_object)
+        summary_requests = [
+            *self._get_summary_requests(new_object.uid, root_uids.difference(old_root_uids), {**old_object['processed_analysis'], **sanitized_analysis}),
+            *self._get_summary_requests(new_object.uid, root_uids, new_object.processed_analysis),
+        ]
+        return self._build_update(fields_to_set, items_to_add), summary_requests
+
+    def _get_collection(self, file_object: FileObject):
+        return self.firmwares if isinstance(file_object, Firmware) else self.file_objects
+
+    @staticmethod
+    def _get_changed_analysis_results(new_object: FileObject, old_object: dict) -> dict:
+        return {
+            plugin: result
+            for plugin, result in new_object.processed_analysis.items()
+            if not analysis_result_is_unchanged(result, old_object['processed_analysis'].get(plugin))
+        }
 
-        collection.update_one({'_id': new_object.uid}, {'$set': update_dictionary})
+    @staticmethod
+    def _get_changed_fields(old_object: dict, new_fields: dict) -> dict:
+        return {key: value for key, value in new_fields.items() if key not in old_object or old_object[key] != value}
 
-    def _update_processed_analysis(self, new_object: FileObject, old_object: dict) -> dict:
-        old_pa = self.retrieve_analysis(old_object['processed_analysis'])
-        for key in new_object.processed_analysis.keys():
-            old_pa[key] = new_object.processed_analysis[key]
-        return self.sanitize_analysis(analysis_dict=old_pa, uid=new_object.uid)
+    @staticmethod
+    def _build_update(fields_to_set: dict, items_to_add: dict) -> dict:
+        items_to_add = {field: {'$each': items} for field, items in items_to_add.items() if items}
+        if not fields_to_set and not items_to_add:
+            return {}
+        update = {'$set': {**fields_to_set, 'generation': new_generation()}}
+        if items_to_add:
+            update['$addToSet'] = items_to_add
+        return update
 
     def add_firmware(self, firmware):
         old_object = self.firmwares.find_one({'_id': firmware.uid})
@@ -70,7 +218,9 @@ class BackEndDbInterface(MongoInterfaceCommon):
             logging.debug('Detected new firmware!')
             entry = self.build_firmware_dict(firmware)
             try:
+                self._existence_filter.add(firmware.uid)
                 self.firmwares.insert_one(entry)
+                self._update_summaries(firmware.uid, [firmware.uid], firmware.processed_analysis)
                 logging.debug('firmware added to db: {}'.format(firmware.uid))
             except Exception as e:
                 logging.error('Could not add firmware: {} - {}'.format(sys.exc_info()[0].__name__, e))
@@ -96,7 +246,9 @@ class BackEndDbInterface(MongoInterfaceCommon):
             'release_date': convert_str_to_time(firmware.release_date),
             'submission_date': time(),
             'analysis_tags': firmware.analysis_tags,
-            'tags': firmware.tags
+            'tags': firmware.tags,
+            'summaries_materialized': True,
+            'generation': new_generation(),
         }
         if hasattr(firmware, 'comments'):  # for backwards compatibility
             entry['comments'] = firmware.comments
@@ -115,7 +267,9 @@ class BackEndDbInterface(MongoInterfaceCommon):
             logging.debug('Detected new file_object!')
             entry = self.build_file_object_dict(file_object)
             try:
+                self._existence_filter.add(file_object.uid)
                 self.file_objects.insert_one(entry)
+                self._update_summaries(file_object.uid, self._get_summary_root_uids(file_object, entry), file_object.processed_analysis)
                 logging.debug('file added to db: {}'.format(file_object.uid))
             except Exception as e:
                 logging.error('Could not update firmware: {} - {}'.format(sys.exc_info()[0].__name__, e))
@@ -135,23 +289,34 @@ class BackEndDbInterface(MongoInterfaceCommon):
             'files_included': list(file_object.files_included),
             'size': file_object.size,
             'analysis_tags': file_object.analysis_tags,
-            'parent_firmware_uids': list(file_object.parent_firmware_uids)
+            'parent_firmware_uids': list(file_object.parent_firmware_uids),
+            'generation': new_generation(),
         }
         for attribute in ['comments']:  # for backwards compatibility
             if hasattr(file_object, attribute):
                 entry[attribute] = getattr(file_object, attribute)
         return entry
 
-    def _convert_to_firmware(self, entry, analysis_filter=None):
-        firmware = super()._convert_to_firmware(entry, analysis_filter=None)
-        firmware.set_file_path(entry['file_path'])
+    def _convert_to_firmware(self, entry, analysis_filter=None, lazy=False):
+        firmware = super()._convert_to_firmware(entry, analysis_filter=None, lazy=lazy)
+        firmware.set_file_path(self._get_file_path(entry))
         return firmware
 
-    def _convert_to_file_object(self, entry, analysis_filter=None):
-        file_object = super()._convert_to_file_object(entry, analysis_filter=None)
-        file_object.set_file_path(entry['file_path'])
+    def _convert_to_file_object(self, entry, analysis_filter=None, lazy=False):
+        file_object = super()._convert_to_file_object(entry, analysis_filter=None, lazy=lazy)
+        file_object.set_file_path(self._get_file_path(entry))
         return file_object
 
+    def _get_file_path(self, entry) -> str:
+        '''
+        the stored path is outdated if the file was moved by the file storage rebalancing
+        '''
+        if os.path.isfile(entry['file_path']):
+            return entry['file_path']
+        if self._fs_organizer is None:
+            self._fs_organizer = FS_Organizer(config=self.config)
+        return self._fs_organizer.get_file_path(entry['_id'])
+
     def update_analysis_tags(self, uid, plugin_name, tag_name, tag):
         firmware_object = self.get_object(uid=uid, analysis_filter=[])
         try:
@@ -165,7 +330,7 @@ class BackEndDbInterface(MongoInterfaceCommon):
 
         if isinstance(firmware_object, Firmware):
             try:
-                self.firmwares.update_one({'_id': uid}, {'$set': {'analysis_tags': tags}})
+                self.firmwares.update_one({'_id': uid}, {'$set': {'analysis_tags': tags, 'generation': new_generation()}})
             except (TypeError, ValueError, PyMongoError) as exception:
                 logging.error('Could not update firmware: {} - {}'.format(type(exception), str(exception)))
         else:
@@ -176,12 +341,13 @@ class BackEndDbInterface(MongoInterfaceCommon):
             processed_analysis = self.sanitize_analysis(file_object.processed_analysis, file_object.uid)
             for analysis_system in processed_analysis:
                 self._update_analysis(file_object, analysis_system, processed_analysis[analysis_system])
+            self._update_summaries(file_object.uid, self._get_summary_root_uids(file_object), processed_analysis)
         else:
             raise RuntimeError('Trying to add from type \'{}\' to database. Only allowed for \'Firmware\' and \'FileObject\'')
 
     def _update_analysis(self, file_object: FileObject, analysis_system: str, result: dict):
         try:
-            collection = self.firmwares if isinstance(file_object, Firmware) else self.file_objects
+            collection = self._get_collection(file_object)
 
             entry_with_tags = collection.find_one({'_id': file_object.uid}, {'analysis_tags': 1})
 
@@ -189,9 +355,126 @@ class BackEndDbInterface(MongoInterfaceCommon):
                 {'_id': file_object.uid},
                 {'$set': {
                     'processed_analysis.{}'.format(analysis_system): result,
-                    'analysis_tags': update_analysis_tags(file_object, entry_with_tags)
+                    'analysis_tags': update_analysis_tags(file_object, entry_with_tags),
+                    'generation': new_generation(),
                 }}
             )
         except Exception as exception:
             logging.error('Update of analysis failed badly ({})'.format(exception))
             raise exception
+
+    # --- materialized firmware summaries
+
+    @staticmethod
+    def _get_root_uids_of_entry(db_entry: dict) -> set:
+        return set(db_entry.get('parent_firmware_uids', [])).union(db_entry.get('virtual_file_path', {}))
+
+    def _get_summary_root_uids(self, file_object: FileObject, db_entry: dict = None) -> set:
+        if isinstance(file_object, Firmware):
+            return {file_object.uid}
+        if db_entry is None:
+            db_entry = self.file_objects.find_one({'_id': file_object.uid}, {'parent_firmware_uids': 1, 'virtual_file_path': 1}) or {}
+        return set(file_object.parent_firmware_uids).union(file_object.virtual_file_path, self._get_root_uids_of_entry(db_entry))
+
+    def _update_summaries(self, uid: str, root_uids: Iterable[str], processed_analysis: dict):
+        '''
+        adds uid to the summary entries of all root firmwares for each summary item of each analysis result and removes
+        it from entries with items no longer contained in the (new) result summary
+        '''
+        self._write_summary_requests(uid, self._get_summary_requests(uid, root_uids, processed_analysis))
+
+    @staticmethod
+    def _get_summary_requests(uid: str, root_uids: Iterable[str], processed_analysis: dict) -> list:
+        root_uids = list(root_uids)
+        if not root_uids:
+            return []
+        requests = []
+        for plugin, result in processed_analysis.items():
+            if not isinstance(result, dict) or not isinstance(result.get('summary', []), list):
+                continue
+            summary = list(result.get('summary', []))
+            requests.append(UpdateMany(
+                {'root_uid': {'$in': root_uids}, 'plugin': plugin, 'uids': uid, 'item': {'$nin': summary}},
+                {'$pull': {'uids': uid}}
+            ))
+            requests.extend(
+                UpdateOne({'root_uid': root_uid, 'plugin': plugin, 'item': item}, {'$addToSet': {'uids': uid}}, upsert=True)
+                for root_uid in root_uids for item in summary
+            )
+        return requests
+
+    def _write_summary_requests(self, label: str, requests: list):
+        if requests:
+            try:
+                self.summaries.bulk_write(requests, ordered=False)
+            except PyMongoError as error:
+                logging.error('Could not update summaries of {}: {} {}'.format(label, type(error).__name__, error))
+
+    def rebuild_summaries(self, firmware_uid: str):
+        '''
+        (re)creates the materialized summaries of a firmware from the stored analysis results
+        '''
+        firmware = self.get_firmware(firmware_uid, lazy=True)
+        if firmware is None:
+            logging.error('Firmware not found in Database: {}'.format(firmware_uid))
+            return
+        requests = []
+        for plugin in firmware.processed_analysis:
+            summary = self._compute_summary_of_firmware(firmware, plugin)
+            requests.extend(
+                UpdateOne({'root_uid': firmware_uid, 'plugin': plugin, 'item': item}, {'$set': {'uids': sorted(set(uids))}}, upsert=True)
+                for item, uids in summary.items()
+            )
+        self.summaries.delete_many({'root_uid': firmware_uid})
+        if requests:
+            self.summaries.bulk_write(requests, ordered=False)
+        self.firmwares.update_one({'_id': firmware_uid}, {'$set': {'summaries_materialized': True}})
+
+    def rebuild_existence_filter(self):
+        '''
+        (re)creates the existence filter of all stored uids
+        must not run concurrently with adding objects, since uids added during the rebuild might be missing
+        '''
+        if not self._existence_filter.enabled:
+            return
+        number_of_uids = self.firmwares.estimated_document_count() + self.file_objects.estimated_document_count()
+        uids = (
+            entry['_id']
+            for collection in [self.firmwares, self.file_objects]
+            for entry in collection.find({}, {'_id': 1})
+        )
+        ExistenceFilter.create(self._existence_filter.path, uids, number_of_uids)
+        logging.info('existence filter rebuilt with {} uids'.format(number_of_uids))
+
+    def migrate_analysis_storage(self):
+        '''
+        moves the analysis results to the storage layout set in the configuration: results of plugins in
+        split_analysis_plugins are moved to the collection of the plugin, results of all other plugins are moved back
+        into the object documents
+        '''
+        for plugin in sorted(self.split_analysis_plugins.union(self.get_stored_split_analysis_plugins())):
+            migrated = sum(self._migrate_analysis_storage_of_plugin(collection, plugin) for collection in [self.firmwares, self.file_objects])
+            logging.info('migrated {} results of {}'.format(migrated, plugin))
+            if plugin not in self.split_analysis_plugins:
+                self.main.drop_collection(get_split_collection_name(plugin))
+
+    def _migrate_analysis_storage_of_plugin(self, collection, plugin: str) -> int:
+        split = plugin in self.split_analysis_plugins
+        result_field = 'processed_analysis.{}'.format(plugin)
+        query = {result_field: {'$exists': True}, '{}.{}'.format(result_field, SPLIT_STORAGE_KEY): {'$exists': not split}}
+        uids = [entry['_id'] for entry in collection.find(query, {'_id': 1})]
+        for uid in uids:
+            result = collection.find_one({'_id': uid}, {result_field: 1})['processed_analysis'][plugin]
+            if split:
+                stub_values = LazyAnalysisResult(result, self._retrieve_sanitized_entry) if result['file_system_flag'] else result
+                new_result = self._store_split_analysis(uid, plugin, result, stub_values)
+            else:
+                new_result = self._retrieve_split_analysis(plugin, result)
+            collection.update_one({'_id': uid}, {'$set': {result_field: new_result, 'generation': new_generation()}})
+        return len(uids)
+
+    def update_firmware_batch_item(self, batch_id: str, index: int, status: str, uid: Optional[str] = None, message: Optional[str] = None):
+        self.firmware_batches.update_one(
+            {'_id': '{}_{}'.format(batch_id, index)},
+            {'$set': {'status': status, 'uid': uid, 'message': message}}
+        )
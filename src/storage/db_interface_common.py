@@ -1,66 +1,101 @@
 import json
 import logging
 import pickle
-from typing import Set
+from typing import List, Optional, Set
 
 import gridfs
 from common_helper_files import get_safe_name
-from common_helper_mongo.aggregate import get_list_of_all_values, get_all_value_combinations_of_fields
+from common_helper_mongo.aggregate import get_all_value_combinations_of_fields
 
+from helperFunctions.config import read_list_from_config
 from helperFunctions.dataConversion import get_dict_size, convert_time_to_str
 from objects.file import FileObject
 from objects.firmware import Firmware
-from storage.mongo_interface import MongoInterface
+from storage.existence_filter import ExistenceFilter
+from storage.lazy_analysis import LazyAnalysisResult, SanitizedResultCache
+from storage.mongo_interface import MongoInterface, get_grid_fs
+
+SPLIT_STORAGE_KEY = 'split_storage_uid'
+SPLIT_STUB_KEYS = ['summary', 'analysis_date', 'plugin_version', 'system_version']
+
+
+def get_split_collection_name(plugin: str) -> str:
+    return 'analysis_results.{}'.format(plugin)
+
+
+def analysis_result_is_unchanged(new_result: dict, old_sanitized_result: Optional[dict]) -> bool:
+    '''
+    compares a new analysis result with a stored (sanitized) result without retrieving anything: a result that is stored
+    outside of the object document always counts as changed
+    '''
+    if not old_sanitized_result or old_sanitized_result.get('file_system_flag', True) or SPLIT_STORAGE_KEY in old_sanitized_result:
+        return False
+    return _without_storage_flag(old_sanitized_result) == _without_storage_flag(new_result)
+
+
+def _without_storage_flag(result: dict) -> dict:
+    return {key: value for key, value in result.items() if key != 'file_system_flag'}
 
 
 class MongoInterfaceCommon(MongoInterface):
 
+    _sanitize_cache = None  # shared by all interfaces of a process
+    _existence_filter = None
+
     def _setup_database_mapping(self):
         main_database = self.config['data_storage']['main_database']
         self.main = self.client[main_database]
         self.firmwares = self.main.firmwares
         self.file_objects = self.main.file_objects
         self.locks = self.main.locks
+        self.summaries = self.main.analysis_summaries
+        self.firmware_batches = self.main.firmware_batches
         # sanitize stuff
         self.report_threshold = int(self.config['data_storage']['report_threshold'])
         sanitize_db = self.config['data_storage'].get('sanitize_database', 'faf_sanitize')
         self.sanitize_storage = self.client[sanitize_db]
-        self.sanitize_fs = gridfs.GridFS(self.sanitize_storage)
+        self.sanitize_fs = get_grid_fs(self.sanitize_storage)
+        # results of these plugins are stored in their own collection and only a stub is kept in the object document
+        self.split_analysis_plugins = set(read_list_from_config(self.config, 'data_storage', 'split_analysis_plugins'))
+        if MongoInterfaceCommon._sanitize_cache is None:
+            MongoInterfaceCommon._sanitize_cache = SanitizedResultCache(int(self.config['data_storage'].get('sanitize_cache_size', '0')))
+        if MongoInterfaceCommon._existence_filter is None:
+            MongoInterfaceCommon._existence_filter = ExistenceFilter(self.config['data_storage'].get('existence_filter_file', ''))
 
     def existence_quick_check(self, uid):
-        if self.is_firmware(uid):
-            return True
-        elif self.is_file_object(uid):
-            return True
-        else:
+        if not self._existence_filter.might_contain(uid):
             return False
+        return self.is_file_object(uid) or self.is_firmware(uid)
 
     def is_firmware(self, uid):
-        return self.firmwares.count_documents({'_id': uid}) > 0
+        return self.firmwares.find_one({'_id': uid}, {'_id': 1}) is not None
 
     def is_file_object(self, uid):
-        return self.file_objects.count_documents({'_id': uid}) > 0
+        return self.file_objects.find_one({'_id': uid}, {'_id': 1}) is not None
 
-    def get_object(self, uid, analysis_filter=None):
+    def get_object(self, uid, analysis_filter=None, lazy=False):
         '''
         input uid
         output:
             - firmware_object if uid found in firmware database
             - else: file_object if uid found in file_database
             - else: None
+        if lazy is set, analysis results swapped to the sanitize storage are only retrieved on first access
+        (this requires the interface to still be connected at that time)
         '''
-        fo = self.get_file_object(uid, analysis_filter=analysis_filter)
+        fo = self.get_file_object(uid, analysis_filter=analysis_filter, lazy=lazy)
         if fo is None:
-            fo = self.get_firmware(uid, analysis_filter=analysis_filter)
+            fo = self.get_firmware(uid, analysis_filter=analysis_filter, lazy=lazy)
         return fo
 
-    def get_complete_object_including_all_summaries(self, uid):
+    def get_complete_object_including_all_summaries(self, uid, lazy=False):
         '''
         input uid
         output:
             like get_object, but includes all summaries and list of all included files set
+        lazy must only be set if the interface stays connected while the object is used (see get_object)
         '''
-        fo = self.get_object(uid)
+        fo = self.get_object(uid, lazy=lazy)
         if fo is None:
             raise Exception('UID not found: {}'.format(uid))
         else:
@@ -69,28 +104,28 @@ class MongoInterfaceCommon(MongoInterface):
                 fo.processed_analysis[analysis]['summary'] = self.get_summary(fo, analysis)
         return fo
 
-    def get_firmware(self, uid, analysis_filter=None):
+    def get_firmware(self, uid, analysis_filter=None, lazy=False):
         firmware_entry = self.firmwares.find_one(uid)
         if firmware_entry:
-            return self._convert_to_firmware(firmware_entry, analysis_filter=analysis_filter)
+            return self._convert_to_firmware(firmware_entry, analysis_filter=analysis_filter, lazy=lazy)
         else:
             logging.debug('No firmware with UID {} found.'.format(uid))
             return None
 
-    def get_file_object(self, uid, analysis_filter=None):
+    def get_file_object(self, uid, analysis_filter=None, lazy=False):
         file_entry = self.file_objects.find_one(uid)
         if file_entry:
-            return self._convert_to_file_object(file_entry, analysis_filter=analysis_filter)
+            return self._convert_to_file_object(file_entry, analysis_filter=analysis_filter, lazy=lazy)
         else:
             logging.debug('No FileObject with UID {} found.'.format(uid))
             return None
 
-    def get_objects_by_uid_list(self, uid_list, analysis_filter=None):
+    def get_objects_by_uid_list(self, uid_list, analysis_filter=None, lazy=False):
         if not uid_list:
             return []
         query = self._build_search_query_for_uid_list(uid_list)
-        results = [self._convert_to_firmware(i, analysis_filter=analysis_filter) for i in self.firmwares.find(query) if i is not None]
-        results.extend([self._convert_to_file_object(i, analysis_filter=analysis_filter) for i in self.file_objects.find(query) if i is not None])
+        results = [self._convert_to_firmware(i, analysis_filter=analysis_filter, lazy=lazy) for i in self.firmwares.find(query) if i is not None]
+        results.extend([self._convert_to_file_object(i, analysis_filter=analysis_filter, lazy=lazy) for i in self.file_objects.find(query) if i is not None])
         return results
 
     @staticmethod
@@ -98,7 +133,7 @@ class MongoInterfaceCommon(MongoInterface):
         query = {'_id': {'$in': list(uid_list)}}
         return query
 
-    def _convert_to_firmware(self, entry, analysis_filter=None):
+    def _convert_to_firmware(self, entry, analysis_filter=None, lazy=False):
         firmware = Firmware()
         firmware.uid = entry['_id']
         firmware.size = entry['size']
@@ -108,7 +143,7 @@ class MongoInterfaceCommon(MongoInterface):
         firmware.set_release_date(convert_time_to_str(entry['release_date']))
         firmware.set_vendor(entry['vendor'])
         firmware.set_firmware_version(entry['version'])
-        firmware.processed_analysis = self.retrieve_analysis(entry['processed_analysis'], analysis_filter=analysis_filter)
+        firmware.processed_analysis = self.retrieve_analysis(entry['processed_analysis'], analysis_filter=analysis_filter, lazy=lazy)
         firmware.files_included = set(entry['files_included'])
         firmware.virtual_file_path = entry['virtual_file_path']
         firmware.tags = entry['tags'] if 'tags' in entry else dict()
@@ -123,14 +158,14 @@ class MongoInterfaceCommon(MongoInterface):
             firmware.comments = entry['comments']
         return firmware
 
-    def _convert_to_file_object(self, entry, analysis_filter=None):
+    def _convert_to_file_object(self, entry, analysis_filter=None, lazy=False):
         file_object = FileObject()
         file_object.uid = entry['_id']
         file_object.size = entry['size']
         file_object.set_name(entry['file_name'])
         file_object.virtual_file_path = entry['virtual_file_path']
         file_object.parents = entry['parents']
-        file_object.processed_analysis = self.retrieve_analysis(entry['processed_analysis'], analysis_filter=analysis_filter)
+        file_object.processed_analysis = self.retrieve_analysis(entry['processed_analysis'], analysis_filter=analysis_filter, lazy=lazy)
         file_object.files_included = set(entry['files_included'])
         file_object.parent_firmware_uids = set(entry['parent_firmware_uids'])
         file_object.analysis_tags = entry['analysis_tags'] if 'analysis_tags' in entry else dict()
@@ -150,23 +185,87 @@ class MongoInterfaceCommon(MongoInterface):
             else:
                 sanitized_dict[key] = analysis_dict[key]
                 sanitized_dict[key]['file_system_flag'] = False
+            if key in self.split_analysis_plugins:
+                sanitized_dict[key] = self._store_split_analysis(uid, key, sanitized_dict[key], analysis_dict[key])
         return sanitized_dict
 
-    def retrieve_analysis(self, sanitized_dict, analysis_filter=None):
+    def _store_split_analysis(self, uid, plugin, sanitized_result, original_result):
+        '''
+        stores the sanitized result in the collection of the plugin
+        :return: the stub that replaces the result in the object document
+        '''
+        self.main[get_split_collection_name(plugin)].replace_one({'_id': uid}, {'_id': uid, 'result': sanitized_result}, upsert=True)
+        stub = {key: original_result[key] for key in SPLIT_STUB_KEYS if key in original_result}
+        stub.update({'file_system_flag': False, SPLIT_STORAGE_KEY: uid})
+        return stub
+
+    def get_stored_split_analysis_plugins(self) -> Set[str]:
+        '''
+        :return: all plugins with a split storage collection (configured or not)
+        '''
+        prefix = get_split_collection_name('')
+        return {name[len(prefix):] for name in self.main.list_collection_names() if name.startswith(prefix)}
+
+    @staticmethod
+    def _get_swapped_analysis_file_names(collection, uids: List[str]) -> List[str]:
+        swapped_results = collection.aggregate([
+            {'$match': {'_id': {'$in': uids}}},
+            {'$project': {'swapped': {'$filter': {
+                'input': {'$objectToArray': '$processed_analysis'},
+                'cond': {'$eq': ['$$this.v.file_system_flag', True]}
+            }}}},
+            {'$unwind': '$swapped'},
+        ])
+        return [
+            value
+            for entry in swapped_results
+            for key, value in entry['swapped']['v'].items()
+            if key != 'file_system_flag' and isinstance(value, str)
+        ]
+
+    @staticmethod
+    def _get_swapped_split_analysis_file_names(split_collection, uids: List[str]) -> List[str]:
+        return [
+            value
+            for entry in split_collection.find({'_id': {'$in': uids}, 'result.file_system_flag': True}, {'result': 1})
+            for key, value in entry['result'].items()
+            if key != 'file_system_flag' and isinstance(value, str)
+        ]
+
+    def _get_split_analysis_collections(self):
+        return [self.main[get_split_collection_name(plugin)] for plugin in self.get_stored_split_analysis_plugins()]
+
+    def _retrieve_split_analysis(self, plugin, stub):
+        entry = self.main[get_split_collection_name(plugin)].find_one({'_id': stub[SPLIT_STORAGE_KEY]})
+        if entry is None:
+            logging.error('analysis result not found in split storage: {} {}'.format(plugin, stub[SPLIT_STORAGE_KEY]))
+            stub.pop(SPLIT_STORAGE_KEY)
+            return stub
+        return entry['result']
+
+    def retrieve_analysis(self, sanitized_dict, analysis_filter=None, lazy=False):
         '''
         retrieves analysis including sanitized entries
         :param sanitized_dict: processed analysis dictionary including references to sanitized entries
         :type dict:
-        :param analysis_filter: list of analysis plugins to be restored
+        :param analysis_filter: list of analysis plugins to be restored (only their split storage collections are read)
         :type list:
         :default None:
+        :param lazy: retrieve sanitized entries on first access instead of right away
+        :type bool:
+        :default False:
         :return: dict
         '''
         if analysis_filter is None:
             analysis_filter = sanitized_dict.keys()
         for key in analysis_filter:
             try:
-                if sanitized_dict[key]['file_system_flag']:
+                if SPLIT_STORAGE_KEY in sanitized_dict[key]:
+                    sanitized_dict[key] = self._retrieve_split_analysis(key, sanitized_dict[key])
+                if sanitized_dict[key]['file_system_flag'] and lazy:
+                    sanitized_dict[key].pop('file_system_flag')
+                    sanitized_dict[key] = LazyAnalysisResult(sanitized_dict[key], self._retrieve_sanitized_entry)
+                elif sanitized_dict[key]['file_system_flag']:
                     logging.debug('Retrieving stored file {}'.format(key))
                     sanitized_dict[key].pop('file_system_flag')
                     sanitized_dict[key] = self._retrieve_binaries(sanitized_dict, key)
@@ -194,15 +293,21 @@ class MongoInterfaceCommon(MongoInterface):
                 tmp_dict[analysis_key] = sanitized_dict[key][analysis_key]
             else:
                 logging.debug('Retrieving {}'.format(analysis_key))
-                tmp = self.sanitize_fs.get_last_version(sanitized_dict[key][analysis_key])
-                if tmp is not None:
-                    report = pickle.loads(tmp.read())
-                else:
-                    logging.error('sanitized file not found: {}'.format(sanitized_dict[key][analysis_key]))
-                    report = {}
-                tmp_dict[analysis_key] = report
+                tmp_dict[analysis_key] = self._retrieve_sanitized_entry(sanitized_dict[key][analysis_key])
         return tmp_dict
 
+    def _retrieve_sanitized_entry(self, file_name):
+        try:
+            sanitized_file = self.sanitize_fs.get_last_version(file_name)
+        except gridfs.NoFile:
+            logging.error('sanitized file not found: {}'.format(file_name))
+            return {}
+        serialized_entry = self._sanitize_cache.get(sanitized_file._id)  # pylint: disable=protected-access
+        if serialized_entry is None:
+            serialized_entry = sanitized_file.read()
+            self._sanitize_cache.add(sanitized_file._id, serialized_entry)  # pylint: disable=protected-access
+        return pickle.loads(serialized_entry)
+
     def get_specific_fields_of_db_entry(self, uid, field_dict):
         return self.file_objects.find_one(uid, field_dict) or self.firmwares.find_one(uid, field_dict)
 
@@ -210,8 +315,7 @@ class MongoInterfaceCommon(MongoInterface):
 
     def get_list_of_all_included_files(self, fo):
         if isinstance(fo, Firmware):
-            fo.list_of_all_included_files = get_list_of_all_values(
-                self.file_objects, '$_id', match={'virtual_file_path.{}'.format(fo.uid): {'$exists': 'true'}})
+            fo.list_of_all_included_files = list(self.get_uids_of_all_included_files(fo.uid))
         if fo.list_of_all_included_files is None:
             fo.list_of_all_included_files = list(self.get_set_of_all_included_files(fo))
         fo.list_of_all_included_files.sort()
@@ -221,16 +325,19 @@ class MongoInterfaceCommon(MongoInterface):
         '''
         return a set of all included files uids
         the set includes fo uid as well
+        the file tree is resolved level by level with one (uid only) query per unpacking depth
         '''
-        if fo is not None:
-            files = set()
-            files.add(fo.uid)
-            included_files = self.get_objects_by_uid_list(fo.files_included, analysis_filter=[])
-            for item in included_files:
-                files.update(self.get_set_of_all_included_files(item))
-            return files
-        else:
+        if fo is None:
             return set()
+        files = {fo.uid}
+        current_level = set(fo.files_included) - files
+        while current_level:
+            next_level = set()
+            for entry in self.file_objects.find(self._build_search_query_for_uid_list(current_level), {'files_included': 1}):
+                files.add(entry['_id'])
+                next_level.update(entry['files_included'])
+            current_level = next_level - files
+        return files
 
     def get_uids_of_all_included_files(self, uid: str) -> Set[str]:
         return {
@@ -246,6 +353,24 @@ class MongoInterfaceCommon(MongoInterface):
             return None
         if not isinstance(fo, Firmware):
             return self._collect_summary(fo.list_of_all_included_files, selected_analysis)
+        if self._summary_is_materialized(fo.uid):
+            return self.get_materialized_summary(fo.uid, selected_analysis)
+        return self._compute_summary_of_firmware(fo, selected_analysis)
+
+    def _summary_is_materialized(self, firmware_uid: str) -> bool:
+        entry = self.firmwares.find_one({'_id': firmware_uid}, {'summaries_materialized': 1})
+        return bool(entry and entry.get('summaries_materialized', False))
+
+    def get_materialized_summary(self, firmware_uid: str, selected_analysis: str) -> dict:
+        '''
+        summary of a firmware and all included files as maintained by the backend on each analysis update
+        '''
+        summary = {}
+        for entry in self.summaries.find({'root_uid': firmware_uid, 'plugin': selected_analysis}, {'item': 1, 'uids': 1}):
+            summary.setdefault(entry['item'], set()).update(entry['uids'])  # concurrent upserts may create duplicate entries
+        return {item: sorted(uids) for item, uids in summary.items() if uids}
+
+    def _compute_summary_of_firmware(self, fo, selected_analysis):
         summary = get_all_value_combinations_of_fields(
             self.file_objects, '$processed_analysis.{}.summary'.format(selected_analysis), '$_id',
             unwind=True, match={'virtual_file_path.{}'.format(fo.uid): {'$exists': 'true'}})
@@ -266,7 +391,7 @@ class MongoInterfaceCommon(MongoInterface):
 
     def _collect_summary(self, uid_list, selected_analysis):
         summary = {}
-        file_objects = self.get_objects_by_uid_list(uid_list, analysis_filter=[selected_analysis])
+        file_objects = self.get_objects_by_uid_list(uid_list, analysis_filter=[selected_analysis], lazy=True)
         for fo in file_objects:
             summary = self._update_summary(summary, self._get_summary_of_one(fo, selected_analysis))
         return summary
@@ -302,4 +427,4 @@ class MongoInterfaceCommon(MongoInterface):
         self.locks.delete_one({'uid': uid})
 
     def drop_unpacking_locks(self):
-        self.main.drop_collection('locks')
+        self.locks.delete_many({})  # keep the collection (and its index)
@@ -1,7 +1,7 @@
 import logging
 from contextlib import suppress
 from time import time
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pymongo.errors import PyMongoError
 
@@ -88,9 +88,15 @@ class CompareDbInterface(MongoInterfaceCommon):
         db_entries = self.compare_results.find({'submission_date': {'$gt': 1}}, {'_id': 1})
         return sum(1 for entry in db_entries if not self.check_objects_exist(entry['_id']))  # sum(1 for... calculates length of generator
 
-    def get_ssdeep_hash(self, uid):
-        file_object_entry = self.file_objects.find_one({'_id': uid}, {'processed_analysis.file_hashes.ssdeep': 1})
-        return file_object_entry['processed_analysis']['file_hashes']['ssdeep'] if 'file_hashes' in file_object_entry['processed_analysis'] else None
+    def get_ssdeep_hashes(self, uids: List[str]) -> Dict[str, str]:
+        '''
+        :return: dict of the uids of the file objects with an ssdeep hash and their hashes
+        '''
+        query = {'_id': {'$in': uids}, 'processed_analysis.file_hashes.ssdeep': {'$exists': True}}
+        return {
+            entry['_id']: entry['processed_analysis']['file_hashes']['ssdeep']
+            for entry in self.file_objects.find(query, {'processed_analysis.file_hashes.ssdeep': 1})
+        }
 
     def get_entropy(self, uid):
         file_object_entry = self.file_objects.find_one({'_id': uid}, {'processed_analysis.unpacker.entropy': 1})
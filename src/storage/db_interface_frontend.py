@@ -2,7 +2,7 @@ import json
 import logging
 import sys
 from copy import deepcopy
-from typing import Dict, List
+from typing import Any, Dict, Iterable, List
 
 from helperFunctions.compare_sets import remove_duplicates_from_list
 from helperFunctions.database_structure import visualize_complete_tree
@@ -12,30 +12,71 @@ from helperFunctions.merge_generators import merge_generators
 from helperFunctions.tag import TagColor
 from objects.file import FileObject
 from objects.firmware import Firmware
-from storage.db_interface_common import MongoInterfaceCommon
+from storage.db_interface_common import SPLIT_STORAGE_KEY, MongoInterfaceCommon
+from storage.object_cache import GenerationCache
+
+DEFAULT_OBJECT_CACHE_MAX_BYTES = 100 * 1024 * 1024
 
 
 class FrontEndDbInterface(MongoInterfaceCommon):
 
     READ_ONLY = True
 
+    _object_cache = None  # shared by all frontend interfaces of a process
+
+    def _setup_database_mapping(self):
+        super()._setup_database_mapping()
+        if FrontEndDbInterface._object_cache is None:
+            FrontEndDbInterface._object_cache = GenerationCache(
+                max_size=int(self.config['data_storage'].get('object_cache_size', '0')),
+                max_bytes=int(self.config['data_storage'].get('object_cache_max_bytes', str(DEFAULT_OBJECT_CACHE_MAX_BYTES)))
+            )
+
+    def get_object(self, uid, analysis_filter=None, lazy=False):
+        '''
+        like MongoInterfaceCommon.get_object, but (non-lazy) objects are served from the process-local object cache
+        as long as their database entry was not changed
+        '''
+        if lazy or not self._object_cache.enabled:
+            return super().get_object(uid, analysis_filter=analysis_filter, lazy=lazy)
+        generations = self._get_generations([uid])
+        if uid not in generations:
+            return None
+        key = ('object', uid, None if analysis_filter is None else tuple(sorted(analysis_filter)))
+        fo = self._object_cache.get(key, generations[uid])
+        if fo is None:
+            fo = super().get_object(uid, analysis_filter=analysis_filter)
+            if fo is None:
+                return None
+            self._object_cache.add(key, generations[uid], fo)
+        return fo
+
+    def _get_generations(self, uid_list: Iterable[str]) -> Dict[str, Any]:
+        '''
+        :return: dict of the generation stamps of all given uids that are found in the database
+        '''
+        query = self._build_search_query_for_uid_list(uid_list)
+        entries = merge_generators(self.firmwares.find(query, {'generation': 1}), self.file_objects.find(query, {'generation': 1}))
+        return {entry['_id']: entry.get('generation') for entry in entries}
+
     def get_meta_list(self, firmware_list=None):
         list_of_firmware_data = []
         if firmware_list is None:
             firmware_list = self.firmwares.find()
+        firmware_list = [firmware for firmware in firmware_list if firmware]
+        hids = self.get_hids([firmware['_id'] for firmware in firmware_list])
         for firmware in firmware_list:
-            if firmware:
-                tags = firmware['tags'] if 'tags' in firmware else dict()
-                tags[self._get_unpacker_name(firmware)] = TagColor.LIGHT_BLUE
-                submission_date = firmware['submission_date'] if 'submission_date' in firmware else 0
-                list_of_firmware_data.append((firmware['_id'], self.get_hid(firmware['_id']), tags, submission_date))
+            tags = firmware['tags'] if 'tags' in firmware else dict()
+            tags[self._get_unpacker_name(firmware)] = TagColor.LIGHT_BLUE
+            submission_date = firmware['submission_date'] if 'submission_date' in firmware else 0
+            list_of_firmware_data.append((firmware['_id'], hids[firmware['_id']], tags, submission_date))
         return list_of_firmware_data
 
     def _get_unpacker_name(self, firmware):
         if 'unpacker' not in firmware['processed_analysis']:
             return 'NOP'
-        if firmware['processed_analysis']['unpacker']['file_system_flag']:
-            return self.retrieve_analysis(deepcopy(firmware['processed_analysis']))['unpacker']['plugin_used']
+        if firmware['processed_analysis']['unpacker']['file_system_flag'] or SPLIT_STORAGE_KEY in firmware['processed_analysis']['unpacker']:
+            return self.retrieve_analysis(deepcopy(firmware['processed_analysis']), analysis_filter=['unpacker'])['unpacker']['plugin_used']
         return firmware['processed_analysis']['unpacker']['plugin_used']
 
     def get_hid(self, uid, root_uid=None):
@@ -43,6 +84,32 @@ class FrontEndDbInterface(MongoInterfaceCommon):
         returns a human readable identifier (hid) for a given uid
         returns an empty string if uid is not in Database
         '''
+        if self._object_cache.enabled:
+            return self.get_hids([uid], root_uid=root_uid)[uid]
+        return self._get_hid(uid, root_uid)
+
+    def get_hids(self, uid_list: Iterable[str], root_uid=None) -> Dict[str, str]:
+        '''
+        returns a dict with the human readable identifiers (hids) of the given uids (see get_hid)
+        hids are served from the process-local object cache as long as the database entry was not changed
+        '''
+        uid_list = list(uid_list)
+        if not self._object_cache.enabled:
+            return {uid: self._get_hid(uid, root_uid) for uid in uid_list}
+        generations = self._get_generations(uid_list)
+        hids = {}
+        for uid in uid_list:
+            if uid not in generations:
+                hids[uid] = ''
+                continue
+            hid = self._object_cache.get(('hid', uid, root_uid), generations[uid])
+            if hid is None:
+                hid = self._get_hid(uid, root_uid)
+                self._object_cache.add(('hid', uid, root_uid), generations[uid], hid)
+            hids[uid] = hid
+        return hids
+
+    def _get_hid(self, uid, root_uid):
         hid = self._get_hid_firmware(uid)
         if hid is None:
             hid = self._get_hid_fo(uid, root_uid)
@@ -181,7 +248,7 @@ class FrontEndDbInterface(MongoInterfaceCommon):
         comments = []
         for collection in [self.firmwares, self.file_objects]:
             db_entries = collection.aggregate([
-                {'$match': {'comments': {'$not': {'$size': 0}}}},
+                {'$match': {'comments.time': {'$exists': True}}},
                 {'$project': {'_id': 1, 'comments': 1}},
                 {'$unwind': {'path': '$comments'}},
                 {'$sort': {'comments.time': -1}},
@@ -276,3 +343,9 @@ class FrontEndDbInterface(MongoInterfaceCommon):
     def rest_get_object_uids(database, offset, limit, query):
         uid_cursor = database.find(query, {'_id': 1}).skip(offset).limit(limit)
         return [result['_id'] for result in uid_cursor]
+
+    def get_firmware_batch(self, batch_id: str) -> List[dict]:
+        '''
+        :return: the status of the items of a batch submission ordered by their index in the manifest
+        '''
+        return list(self.firmware_batches.find({'batch_id': batch_id}, {'_id': 0, 'batch_id': 0}, sort=[('index', 1)]))
@@ -1,4 +1,7 @@
+from typing import List
+
 from storage.db_interface_common import MongoInterfaceCommon
+from storage.object_cache import new_generation
 
 
 class FrontendEditingDbInterface(MongoInterfaceCommon):
@@ -14,22 +17,31 @@ class FrontendEditingDbInterface(MongoInterfaceCommon):
         current_db = self.firmwares if self.is_firmware(uid) else self.file_objects
         current_db.find_one_and_update(
             {'_id': uid},
-            {'$set': {field: value}}
+            {'$set': {field: value, 'generation': new_generation()}}
         )
 
     def add_element_to_array_in_field(self, uid, field, element):
         current_db = self.firmwares if self.is_firmware(uid) else self.file_objects
         current_db.update_one(
             {'_id': uid},
-            {'$push': {field: element}}
+            {'$push': {field: element}, '$set': {'generation': new_generation()}}
         )
 
     def remove_element_from_array_in_field(self, uid, field, condition):
         current_db = self.firmwares if self.is_firmware(uid) else self.file_objects
         current_db.update_one(
             {'_id': uid},
-            {'$pull': {field: condition}}
+            {'$pull': {field: condition}, '$set': {'generation': new_generation()}}
         )
 
     def delete_comment(self, uid, timestamp):
         self.remove_element_from_array_in_field(uid, 'comments', {'time': timestamp})
+
+    def add_firmware_batch(self, batch_id: str, items: List[dict]):
+        '''
+        stores the status of each item of a batch submission (a dict with at least file_path and status)
+        '''
+        self.firmware_batches.insert_many([
+            {'_id': '{}_{}'.format(batch_id, index), 'batch_id': batch_id, 'index': index, 'uid': None, 'message': None, **item}
+            for index, item in enumerate(items)
+        ])
@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from helperFunctions.config import read_list_from_config
+from storage.db_interface_common import MongoInterfaceCommon
+
+DEFAULT_HASH_TYPES = ['md5', 'sha256']
+
+
+class IndexDbInterface(MongoInterfaceCommon):
+    '''
+    Creates the indexes required by the queries of the DB interfaces and audits the query plans of these queries
+    '''
+
+    READ_ONLY = False
+
+    def _setup_database_mapping(self):
+        super()._setup_database_mapping()
+        self.compare_results = self.main.compare_results
+
+    def get_required_indexes(self) -> Dict[str, List[IndexModel]]:
+        hash_indexes = [
+            IndexModel([('processed_analysis.file_hashes.{}'.format(hash_type), ASCENDING)])
+            for hash_type in self._get_hash_types()
+        ]
+        return {
+            'firmwares': [
+                IndexModel([('submission_date', DESCENDING)]),
+                IndexModel([('vendor', ASCENDING), ('device_name', ASCENDING), ('device_part', ASCENDING)]),
+                IndexModel([('comments.time', DESCENDING)]),
+                IndexModel([('generation', ASCENDING)]),
+                *hash_indexes
+            ],
+            'file_objects': [
+                IndexModel([('parent_firmware_uids', ASCENDING)]),
+                IndexModel([('file_name', ASCENDING)]),
+                IndexModel([('comments.time', DESCENDING)]),
+                IndexModel([('generation', ASCENDING)]),
+                *hash_indexes
+            ],
+            'locks': [
+                IndexModel([('uid', ASCENDING)]),
+            ],
+            'compare_results': [
+                IndexModel([('submission_date', DESCENDING)]),
+            ],
+            'firmware_batches': [
+                IndexModel([('batch_id', ASCENDING), ('index', ASCENDING)]),
+            ],
+            'analysis_summaries': [
+                IndexModel([('root_uid', ASCENDING), ('plugin', ASCENDING), ('item', ASCENDING)]),
+            ],
+        }
+
+    def _get_hash_types(self) -> List[str]:
+        return read_list_from_config(self.config, 'file_hashes', 'hashes', default=DEFAULT_HASH_TYPES)
+
+    def create_indexes(self) -> bool:
+        '''
+        creates all required indexes
+        creating an index that already exists is a no-op, so this can be called on every startup
+        '''
+        success = True
+        for collection_name, indexes in self.get_required_indexes().items():
+            try:
+                created = self.main[collection_name].create_indexes(indexes)
+                logging.debug('indexes of {} present: {}'.format(collection_name, created))
+            except PyMongoError as error:
+                logging.error('Could not create indexes of {}: {} {}'.format(collection_name, type(error).__name__, error))
+                success = False
+        return success
+
+    def get_query_shapes(self) -> List[Tuple[str, str, dict, list]]:
+        '''
+        :return: list of (description, collection name, query, sort) of the main queries issued by the DB interfaces
+        '''
+        shapes = [
+            ('included files of firmware', 'file_objects', {'parent_firmware_uids': ''}, None),
+            ('latest firmwares', 'firmwares', {'submission_date': {'$gt': 1}}, [('submission_date', DESCENDING)]),
+            ('other versions of firmware', 'firmwares', {'vendor': '', 'device_name': '', 'device_part': ''}, None),
+            ('search sorted by vendor', 'firmwares', {'vendor': ''}, [('vendor', ASCENDING)]),
+            ('search sorted by file name', 'file_objects', {'file_name': ''}, [('file_name', ASCENDING)]),
+            ('commented firmwares', 'firmwares', {'comments.time': {'$exists': True}}, None),
+            ('commented files', 'file_objects', {'comments.time': {'$exists': True}}, None),
+            ('unpacking lock', 'locks', {'uid': ''}, None),
+            ('latest compare results', 'compare_results', {'submission_date': {'$gt': 1}}, [('submission_date', DESCENDING)]),
+            ('firmware summary', 'analysis_summaries', {'root_uid': '', 'plugin': ''}, None),
+            ('changed firmwares', 'firmwares', {'generation': {'$gte': ObjectId()}}, None),
+            ('changed files', 'file_objects', {'generation': {'$gte': ObjectId()}}, None),
+        ]
+        for hash_type in self._get_hash_types():
+            for collection_name in ['firmwares', 'file_objects']:
+                query = {'processed_analysis.file_hashes.{}'.format(hash_type): ''}
+                shapes.append(('{} hash search'.format(hash_type), collection_name, query, None))
+        return shapes
+
+    def audit_query_plans(self) -> List[Tuple[str, str, List[str]]]:
+        '''
+        runs explain() on all query shapes
+        :return: list of (description, collection name, stages of the winning plan) of all queries using a collection scan
+        '''
+        collection_scans = []
+        for description, collection_name, query, sort in self.get_query_shapes():
+            cursor = self.main[collection_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            stages = self._get_plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+            logging.debug('{} ({}): {}'.format(description, collection_name, ' <- '.join(stages)))
+            if 'COLLSCAN' in stages:
+                collection_scans.append((description, collection_name, stages))
+        return collection_scans
+
+    @staticmethod
+    def _get_plan_stages(plan: dict) -> List[str]:
+        stages = [plan['stage']] if 'stage' in plan else []
+        for key in ['inputStage', 'queryPlan']:
+            if key in plan:
+                stages.extend(IndexDbInterface._get_plan_stages(plan[key]))
+        for input_stage in plan.get('inputStages', []):
+            stages.extend(IndexDbInterface._get_plan_stages(input_stage))
+        return stages
@@ -1,7 +1,6 @@
-import gridfs
 from common_helper_mongo.gridfs import overwrite_file
 
-from storage.mongo_interface import MongoInterface
+from storage.mongo_interface import MongoInterface, get_grid_fs
 
 
 class ViewSyncDb(MongoInterface):
@@ -11,7 +10,7 @@ class ViewSyncDb(MongoInterface):
     def __init__(self, config=None):
         super().__init__(config=config)
         self.view_collection = self.client[self.config['data_storage']['view_storage']]
-        self.view_storage = gridfs.GridFS(self.view_collection)
+        self.view_storage = get_grid_fs(self.view_collection)
 
 
 class ViewUpdater(ViewSyncDb):
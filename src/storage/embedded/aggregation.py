@@ -0,0 +1,355 @@
+import operator
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Callable, Iterable, List
+
+from pymongo.errors import OperationFailure
+
+from storage.embedded.query import MISSING, compare_values, get_values, matches, project, set_path, sort_documents, values_are_equal
+
+
+def aggregate(documents: Iterable[dict], pipeline: List[dict], get_collection: Callable) -> List[dict]:
+    '''
+    runs a MongoDB aggregation pipeline on the documents
+    supported stages are $match, $project, $addFields, $unwind, $group, $sort, $skip, $limit, $count and $lookup
+    :param get_collection: function returning the collection of the database with the given name (used by $lookup)
+    '''
+    documents = list(documents)
+    for stage in pipeline:
+        (stage_name, specification), = stage.items()
+        if stage_name not in STAGES:
+            raise OperationFailure('unsupported aggregation stage: {}'.format(stage_name))
+        documents = STAGES[stage_name](documents, specification, get_collection)
+    return documents
+
+
+def _match_stage(documents, query, _):
+    return [document for document in documents if matches(document, query)]
+
+
+def _project_stage(documents, specification, _):
+    computed_fields = {key: value for key, value in specification.items() if not _is_projection_flag(value)}
+    projection = {key: value for key, value in specification.items() if _is_projection_flag(value)}
+    if computed_fields and not any(value for key, value in projection.items() if key != '_id'):
+        projection = {**projection, **{key: 1 for key in computed_fields}}  # computed fields turn the stage into an inclusion
+    result = []
+    for document in documents:
+        projected_document = project(document, projection) if projection else {'_id': document['_id']}
+        for key, expression in computed_fields.items():
+            value = evaluate(expression, document)
+            if value is not MISSING:
+                set_path(projected_document, key, value)
+        result.append(projected_document)
+    return result
+
+
+def _is_projection_flag(value: Any) -> bool:
+    return isinstance(value, (bool, int)) and value in [0, 1]
+
+
+def _add_fields_stage(documents, specification, _):
+    result = []
+    for document in documents:
+        new_document = deepcopy(document)
+        for key, expression in specification.items():
+            set_path(new_document, key, evaluate(expression, document))
+        result.append(new_document)
+    return result
+
+
+def _unwind_stage(documents, specification, _):
+    if isinstance(specification, str):
+        specification = {'path': specification}
+    path = specification['path'][1:]
+    preserve_empty = specification.get('preserveNullAndEmptyArrays', False)
+    result = []
+    for document in documents:
+        value = get_expression_value(document, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                new_document = deepcopy(document) if '.' in path else dict(document)
+                set_path(new_document, path, item)
+                result.append(new_document)
+        elif value not in [MISSING, None] and not isinstance(value, list) or preserve_empty:
+            result.append(document)
+    return result
+
+
+def _group_stage(documents, specification, _):
+    groups = {}
+    accumulators = {key: value for key, value in specification.items() if key != '_id'}
+    for document in documents:
+        group_id = _missing_to_none(evaluate(specification['_id'], document))
+        group = groups.setdefault(_get_hashable(group_id), {'_id': group_id, **{key: MISSING for key in accumulators}})
+        for key, accumulator in accumulators.items():
+            (accumulator_name, expression), = accumulator.items()
+            if accumulator_name not in ACCUMULATORS:
+                raise OperationFailure('unsupported accumulator: {}'.format(accumulator_name))
+            group[key] = ACCUMULATORS[accumulator_name](group[key], evaluate(expression, document))
+    result = []
+    for group in groups.values():
+        for key, accumulator in accumulators.items():
+            group[key] = _finalize_accumulator(next(iter(accumulator)), group[key])
+        result.append(group)
+    return result
+
+
+def _get_hashable(value: Any):
+    if isinstance(value, dict):
+        return tuple((key, _get_hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ('list', tuple(_get_hashable(item) for item in value))
+    return type(value).__name__, value
+
+
+def _missing_to_none(value):
+    return None if value is MISSING else value
+
+
+def _sum(current, value):
+    current = 0 if current is MISSING else current
+    if isinstance(value, list):
+        return current + sum(item for item in value if _is_number(item))
+    return current + value if _is_number(value) else current
+
+
+def _average(current, value):
+    total, count = (0, 0) if current is MISSING else current
+    return (total + value, count + 1) if _is_number(value) else (total, count)
+
+
+def _minimum(current, value):
+    if value in [MISSING, None]:
+        return current
+    return value if current is MISSING or compare_values(value, current, operator.lt) else current
+
+
+def _maximum(current, value):
+    if value in [MISSING, None]:
+        return current
+    return value if current is MISSING or compare_values(value, current, operator.gt) else current
+
+
+def _push(current, value):
+    current = [] if current is MISSING else current
+    if value is not MISSING:
+        current.append(value)
+    return current
+
+
+def _add_to_set(current, value):
+    current = [] if current is MISSING else current
+    if value is not MISSING and not any(values_are_equal(item, value) for item in current):
+        current.append(value)
+    return current
+
+
+def _first(current, value):
+    return _missing_to_none(value) if current is MISSING else current
+
+
+def _last(_, value):
+    return _missing_to_none(value)
+
+
+def _finalize_accumulator(accumulator_name, value):
+    if accumulator_name == '$avg':
+        return value[0] / value[1] if value is not MISSING and value[1] else None
+    if accumulator_name == '$sum' and value is MISSING:
+        return 0
+    return _missing_to_none(value)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+ACCUMULATORS = {
+    '$sum': _sum, '$avg': _average, '$min': _minimum, '$max': _maximum, '$push': _push, '$addToSet': _add_to_set,
+    '$first': _first, '$last': _last,
+}
+
+
+def _sort_stage(documents, specification, _):
+    return sort_documents(documents, specification)
+
+
+def _skip_stage(documents, number, _):
+    return documents[number:]
+
+
+def _limit_stage(documents, number, _):
+    return documents[:number]
+
+
+def _count_stage(documents, field, _):
+    return [{field: len(documents)}] if documents else []
+
+
+def _lookup_stage(documents, specification, get_collection):
+    foreign_collection = get_collection(specification['from'])
+    result = []
+    for document in documents:
+        local_values = get_values(document, specification['localField'])
+        local_values = [item for value in local_values for item in (value if isinstance(value, list) else [value])] or [None]
+        query = {specification['foreignField']: {'$in': local_values}}
+        result.append({**document, specification['as']: list(foreign_collection.find(query))})
+    return result
+
+
+STAGES = {
+    '$match': _match_stage, '$project': _project_stage, '$addFields': _add_fields_stage, '$unwind': _unwind_stage,
+    '$group': _group_stage, '$sort': _sort_stage, '$skip': _skip_stage, '$limit': _limit_stage, '$count': _count_stage,
+    '$lookup': _lookup_stage,
+}
+
+
+# ---- expressions ----
+
+def evaluate(expression: Any, document: dict, variables: dict = None) -> Any:
+    '''
+    evaluates an aggregation expression (field paths, variables, operators and literals) for the document
+    '''
+    variables = variables or {'ROOT': document, 'CURRENT': document}
+    if isinstance(expression, str) and expression.startswith('$$'):
+        name, _, path = expression[2:].partition('.')
+        if name not in variables:
+            raise OperationFailure('undefined variable: {}'.format(name))
+        return get_expression_value(variables[name], path) if path else variables[name]
+    if isinstance(expression, str) and expression.startswith('$'):
+        return get_expression_value(document, expression[1:])
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith('$'):
+            (operator_name, argument), = expression.items()
+            if operator_name not in EXPRESSION_OPERATORS:
+                raise OperationFailure('unsupported expression operator: {}'.format(operator_name))
+            return EXPRESSION_OPERATORS[operator_name](argument, document, variables)
+        return {key: _missing_to_none(evaluate(value, document, variables)) for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [_missing_to_none(evaluate(item, document, variables)) for item in expression]
+    return expression
+
+
+def get_expression_value(value: Any, path: str) -> Any:
+    '''
+    value of a field path in an expression: arrays on the way are mapped to the values of their elements
+    '''
+    keys = path.split('.')
+    for index, key in enumerate(keys):
+        if isinstance(value, dict):
+            if key not in value:
+                return MISSING
+            value = value[key]
+        elif isinstance(value, list):
+            remaining_path = '.'.join(keys[index:])
+            values = [get_expression_value(item, remaining_path) for item in value if isinstance(item, dict)]
+            return [item for item in values if item is not MISSING]
+        else:
+            return MISSING
+    return value
+
+
+def _get_arguments(argument, document, variables) -> list:
+    return [evaluate(item, document, variables) for item in (argument if isinstance(argument, list) else [argument])]
+
+
+def _object_to_array(argument, document, variables):
+    value = evaluate(argument, document, variables)
+    if value in [MISSING, None]:
+        return None
+    if not isinstance(value, dict):
+        raise OperationFailure('$objectToArray requires a document input')
+    return [{'k': key, 'v': item} for key, item in value.items()]
+
+
+def _filter(argument, document, variables):
+    values = evaluate(argument['input'], document, variables)
+    if values in [MISSING, None]:
+        return None
+    name = argument.get('as', 'this')
+    return [item for item in values if _is_true(evaluate(argument['cond'], document, {**variables, name: item}))]
+
+
+def _comparison(compare):
+    def _compare(argument, document, variables):
+        first, second = [_missing_to_none(value) for value in _get_arguments(argument, document, variables)]
+        if compare in [operator.eq, operator.ne]:
+            return compare(True, values_are_equal(first, second))
+        return compare_values(first, second, compare)
+    return _compare
+
+
+def _and(argument, document, variables):
+    return all(_is_true(value) for value in _get_arguments(argument, document, variables))
+
+
+def _or(argument, document, variables):
+    return any(_is_true(value) for value in _get_arguments(argument, document, variables))
+
+
+def _not(argument, document, variables):
+    return not _is_true(_get_arguments(argument, document, variables)[0])
+
+
+def _size(argument, document, variables):
+    value = _get_arguments(argument, document, variables)[0]
+    if not isinstance(value, list):
+        raise OperationFailure('$size requires an array')
+    return len(value)
+
+
+def _sum_expression(argument, document, variables):
+    values = _get_arguments(argument, document, variables)
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    return sum(value for value in values if _is_number(value))
+
+
+def _in(argument, document, variables):
+    value, array = _get_arguments(argument, document, variables)
+    return any(values_are_equal(value, item) for item in array)
+
+
+def _if_null(argument, document, variables):
+    for value in _get_arguments(argument, document, variables):
+        if value not in [MISSING, None]:
+            return value
+    return None
+
+
+def _cond(argument, document, variables):
+    if isinstance(argument, dict):
+        argument = [argument['if'], argument['then'], argument['else']]
+    condition, if_true, if_false = argument
+    return evaluate(if_true if _is_true(evaluate(condition, document, variables)) else if_false, document, variables)
+
+
+def _array_element_at(argument, document, variables):
+    array, index = _get_arguments(argument, document, variables)
+    try:
+        return array[index]
+    except (IndexError, TypeError):
+        return MISSING
+
+
+def _date_part(attribute):
+    def _get_date_part(argument, document, variables):
+        value = _get_arguments(argument, document, variables)[0]
+        if not isinstance(value, datetime):
+            raise OperationFailure('can\'t convert from {} to date'.format(type(value).__name__))
+        return getattr(value, attribute)
+    return _get_date_part
+
+
+def _is_true(value) -> bool:
+    return value not in [MISSING, None, False, 0]
+
+
+EXPRESSION_OPERATORS = {
+    '$objectToArray': _object_to_array, '$filter': _filter,
+    '$eq': _comparison(operator.eq), '$ne': _comparison(operator.ne), '$gt': _comparison(operator.gt),
+    '$gte': _comparison(operator.ge), '$lt': _comparison(operator.lt), '$lte': _comparison(operator.le),
+    '$and': _and, '$or': _or, '$not': _not, '$size': _size, '$sum': _sum_expression, '$in': _in, '$ifNull': _if_null,
+    '$cond': _cond, '$arrayElemAt': _array_element_at, '$literal': lambda argument, *_: argument,
+    '$year': _date_part('year'), '$month': _date_part('month'), '$dayOfMonth': _date_part('day'),
+}
@@ -0,0 +1,566 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+import bson
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from helperFunctions.merge_generators import chunks
+from storage.embedded.aggregation import aggregate
+from storage.embedded.query import (
+    REGEX_TYPE, apply_update, get_upsert_document, get_values, is_operator_condition, matches, project, sort_documents,
+    values_are_equal
+)
+
+BUSY_TIMEOUT = 60
+DUPLICATE_KEY_ERROR = 11000
+SQL_VARIABLE_LIMIT = 500
+META_TABLES = ['__index_fields__', '__index_entries__']
+PRESENCE_KEY = 'e:'
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$exists'}
+
+
+def encode_key(value: Any) -> str:
+    '''
+    type-tagged string representation of a value used as primary key and index key (equal values get equal keys)
+    '''
+    if isinstance(value, bool):
+        return 'b:{:d}'.format(value)
+    if isinstance(value, int) or isinstance(value, float) and value.is_integer():
+        return 'n:{:d}'.format(int(value))
+    if isinstance(value, float):
+        return 'n:{!r}'.format(value)
+    if isinstance(value, str):
+        return 's:{}'.format(value)
+    if isinstance(value, ObjectId):
+        return 'o:{}'.format(value)
+    return 'x:{}'.format(bson.encode({'v': value}).hex())
+
+
+def _is_indexable(value: Any) -> bool:
+    return value is not None and not isinstance(value, (REGEX_TYPE, dict))
+
+
+def _quote(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class EmbeddedClient:
+    '''
+    Drop-in replacement for the parts of pymongo's MongoClient used by FACT.
+    Every database is a SQLite file in the storage directory.
+    '''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._databases = {}
+
+    def __getitem__(self, name: str) -> 'EmbeddedDatabase':
+        if name not in self._databases:
+            self._databases[name] = EmbeddedDatabase(os.path.join(self.directory, '{}.sqlite3'.format(name)), name)
+        return self._databases[name]
+
+    def __getattr__(self, name: str) -> 'EmbeddedDatabase':
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def drop_database(self, name_or_database):
+        self[getattr(name_or_database, 'name', name_or_database)].drop()
+
+    def list_database_names(self) -> List[str]:
+        return sorted(file_name[:-len('.sqlite3')] for file_name in os.listdir(self.directory) if file_name.endswith('.sqlite3'))
+
+    def close(self):
+        for database in self._databases.values():
+            database.close()
+
+
+class EmbeddedDatabase:
+    '''
+    A SQLite database with one table of BSON encoded documents per collection and a table of index entries.
+    Connections are opened lazily (and reopened in forked processes) and shared by all threads of a process.
+    '''
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self._lock = RLock()
+        self._connection = None
+        self._pid = None
+        self._transaction_depth = 0
+
+    def __getitem__(self, name: str) -> 'EmbeddedCollection':
+        return EmbeddedCollection(self, name)
+
+    def __getattr__(self, name: str) -> 'EmbeddedCollection':
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def drop_collection(self, name: str):
+        self[name].drop()
+
+    def list_collection_names(self) -> List[str]:
+        with self._lock:
+            rows = self._get_connection().execute('SELECT name FROM sqlite_master WHERE type = \'table\'').fetchall()
+        return [name for name, in rows if name not in META_TABLES]
+
+    def drop(self):
+        with self.transaction() as connection:
+            for name in self.list_collection_names():
+                connection.execute('DROP TABLE {}'.format(_quote(name)))
+            for table in META_TABLES:
+                connection.execute('DELETE FROM {}'.format(table))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    @contextmanager
+    def transaction(self):
+        '''
+        exclusive write transaction (nested transactions of the same thread are part of the outer transaction)
+        '''
+        with self._lock:
+            connection = self._get_connection()
+            if self._transaction_depth == 0:
+                connection.execute('BEGIN IMMEDIATE')
+            self._transaction_depth += 1
+            try:
+                yield connection
+            except BaseException:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    connection.execute('ROLLBACK')
+                raise
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                connection.execute('COMMIT')
+
+    def execute_read(self, statement: str, parameters: Iterable = ()) -> list:
+        with self._lock:
+            try:
+                return self._get_connection().execute(statement, tuple(parameters)).fetchall()
+            except sqlite3.OperationalError as error:
+                if 'no such table' in str(error):
+                    return []
+                raise
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS __index_fields__ (collection TEXT, field TEXT, PRIMARY KEY (collection, field))')
+            connection.execute('CREATE TABLE IF NOT EXISTS __index_entries__ (collection TEXT, field TEXT, value TEXT, key TEXT)')
+            connection.execute('CREATE INDEX IF NOT EXISTS index_lookup ON __index_entries__ (collection, field, value)')
+            connection.execute('CREATE INDEX IF NOT EXISTS index_cleanup ON __index_entries__ (collection, key)')
+            self._connection, self._pid, self._transaction_depth = connection, os.getpid(), 0
+        return self._connection
+
+
+class EmbeddedCollection:  # pylint: disable=too-many-public-methods
+    '''
+    Drop-in replacement for the parts of pymongo's Collection used by FACT.
+    Queries on _id and on indexed fields (equality and $in) only fetch matching documents, all other queries scan the
+    collection. Matching, updates and aggregations are evaluated in Python.
+    '''
+
+    def __init__(self, database: EmbeddedDatabase, name: str):
+        self.database = database
+        self.name = name
+        self._table = _quote(name)
+
+    def __getattr__(self, name: str) -> 'EmbeddedCollection':
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return EmbeddedCollection(self.database, '{}.{}'.format(self.name, name))
+
+    def __eq__(self, other):
+        return isinstance(other, EmbeddedCollection) and (self.database.path, self.name) == (other.database.path, other.name)
+
+    def __hash__(self):
+        return hash((self.database.path, self.name))
+
+    @property
+    def full_name(self) -> str:
+        return '{}.{}'.format(self.database.name, self.name)
+
+    # ---- reading ----
+
+    def find(self, filter=None, projection=None, skip=0, limit=0, sort=None, **_):  # pylint: disable=redefined-builtin
+        return EmbeddedCursor(self, filter, projection, skip=skip, limit=limit, sort=sort)
+
+    def find_one(self, filter=None, *args, **kwargs):  # pylint: disable=redefined-builtin,keyword-arg-before-vararg
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        return next(iter(self.find(filter, *args, **{**kwargs, 'limit': 1})), None)
+
+    def count_documents(self, filter, skip=0, limit=0, **_) -> int:  # pylint: disable=redefined-builtin
+        return len(self.find_documents(filter, skip=skip, limit=limit))
+
+    def estimated_document_count(self, **_) -> int:
+        return self.database.execute_read('SELECT COUNT(*) FROM {}'.format(self._table))[0][0] if self._exists() else 0
+
+    def distinct(self, key: str, filter=None, **_) -> list:  # pylint: disable=redefined-builtin
+        result = []
+        for document in self.find_documents(filter):
+            for value in get_values(document, key):
+                for item in value if isinstance(value, list) else [value]:
+                    if not any(values_are_equal(item, existing) for existing in result):
+                        result.append(item)
+        return result
+
+    def aggregate(self, pipeline: List[dict], **_):
+        pipeline = list(pipeline)
+        query = pipeline.pop(0)['$match'] if pipeline and '$match' in pipeline[0] else None  # use indexes for the first match
+        return iter(aggregate(self.find_documents(query), pipeline, lambda name: self.database[name]))
+
+    def find_documents(self, filter=None, sort=None, skip=0, limit=0) -> List[dict]:  # pylint: disable=redefined-builtin
+        rows = self._find_rows(filter, limit=skip + limit if limit and not sort else 0)
+        documents = sort_documents([document for _, document in rows], sort)
+        return documents[skip:skip + limit] if limit else documents[skip:]
+
+    def get_plan(self, filter=None, sort=None) -> dict:  # pylint: disable=redefined-builtin
+        lookup = self._get_lookup(filter or {}, self._get_index_fields())
+        if lookup is None:
+            plan = {'stage': 'COLLSCAN'}
+        elif lookup[0] == '_id':
+            plan = {'stage': 'IDHACK'}
+        else:
+            plan = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': '{}_1'.format(lookup[0])}}
+        return {'stage': 'SORT', 'inputStage': plan} if sort else plan
+
+    def _find_rows(self, filter=None, limit=0) -> List[Tuple[str, dict]]:  # pylint: disable=redefined-builtin
+        '''
+        :return: list of (key, document) of all matching documents in natural order
+        '''
+        lookup = self._get_lookup(filter or {}, self._get_index_fields())
+        if lookup is None:
+            rows = self.database.execute_read('SELECT key, document FROM {} ORDER BY rowid'.format(self._table))
+        else:
+            rows = self._get_rows_by_lookup(lookup[0], lookup[1]) if lookup[1] is not None else self._get_rows_by_range(lookup[0], lookup[2])
+        result = []
+        for key, encoded_document in rows:
+            document = bson.decode(encoded_document)
+            if matches(document, filter):
+                result.append((key, document))
+                if limit and len(result) >= limit:
+                    break
+        return result
+
+    def _get_rows_by_range(self, field: str, prefix: str) -> List[Tuple[str, bytes]]:
+        statement = 'SELECT DISTINCT t.rowid, t.key, t.document FROM {} AS t JOIN __index_entries__ AS i ON i.key = t.key ' \
+                    'WHERE i.collection = ? AND i.field = ?'.format(self._table)
+        parameters = [self.name, field]
+        if prefix:
+            statement += ' AND i.value >= ? AND i.value < ?'
+            parameters.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        return [(key, document) for _, key, document in sorted(self.database.execute_read(statement, parameters))]
+
+    def _get_rows_by_lookup(self, field: str, values: List[Any]) -> List[Tuple[str, bytes]]:
+        rows = {}
+        for chunk in chunks({encode_key(value) for value in values}, SQL_VARIABLE_LIMIT):
+            placeholders = ', '.join('?' * len(chunk))
+            if field == '_id':
+                statement = 'SELECT rowid, key, document FROM {} WHERE key IN ({})'.format(self._table, placeholders)
+                parameters = chunk
+            else:
+                statement = 'SELECT DISTINCT t.rowid, t.key, t.document FROM {} AS t JOIN __index_entries__ AS i ON i.key = t.key ' \
+                            'WHERE i.collection = ? AND i.field = ? AND i.value IN ({})'.format(self._table, placeholders)
+                parameters = [self.name, field, *chunk]
+            rows.update({rowid: (key, document) for rowid, key, document in self.database.execute_read(statement, parameters)})
+        return [rows[rowid] for rowid in sorted(rows)]
+
+    @staticmethod
+    def _get_lookup(query: dict, index_fields: Set[str]) -> Optional[Tuple[str, Optional[list], str]]:
+        '''
+        :return: tuple of field, values and key prefix if the query can be answered by a primary key or index lookup
+                 (values is None for a scan of all index entries of the field starting with the prefix)
+        '''
+        range_lookup = None
+        for field in sorted(query, key=lambda field: field != '_id'):
+            if field == '_id' or field in index_fields:
+                values = _get_equality_values(query[field])
+                if values is not None:
+                    return field, values, ''
+                prefix = _get_range_prefix(query[field])
+                if field != '_id' and prefix is not None and range_lookup is None:
+                    range_lookup = field, None, prefix
+        return range_lookup
+
+    def _get_index_fields(self) -> Set[str]:
+        return {field for field, in self.database.execute_read('SELECT field FROM __index_fields__ WHERE collection = ?', [self.name])}
+
+    def _exists(self) -> bool:
+        return bool(self.database.execute_read('SELECT 1 FROM sqlite_master WHERE type = \'table\' AND name = ?', [self.name]))
+
+    # ---- writing ----
+
+    def insert_one(self, document: dict, **_) -> InsertOneResult:
+        with self.database.transaction() as connection:
+            self._insert(connection, document, self._prepare_write(connection))
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents: Iterable[dict], **kwargs) -> InsertManyResult:
+        documents = list(documents)
+        self.bulk_write([InsertOne(document) for document in documents], **kwargs)
+        return InsertManyResult([document['_id'] for document in documents], True)
+
+    def update_one(self, filter, update, upsert=False, **_) -> UpdateResult:  # pylint: disable=redefined-builtin
+        return self._update_with_result(filter, update, upsert, multi=False)
+
+    def update_many(self, filter, update, upsert=False, **_) -> UpdateResult:  # pylint: disable=redefined-builtin
+        return self._update_with_result(filter, update, upsert, multi=True)
+
+    def replace_one(self, filter, replacement, upsert=False, **_) -> UpdateResult:  # pylint: disable=redefined-builtin
+        if any(key.startswith('$') for key in replacement):
+            raise ValueError('replacement can not include $ operators')
+        return self._update_with_result(filter, replacement, upsert, multi=False)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False, return_document=ReturnDocument.BEFORE, **_):  # pylint: disable=redefined-builtin
+        with self.database.transaction() as connection:
+            index_fields = self._prepare_write(connection)
+            rows = sort_documents([document for _, document in self._find_rows(filter)], sort)[:1]
+            old_document = rows[0] if rows else None
+            new_document = self._update(connection, filter, update, upsert, index_fields, old_documents=rows)
+        result = new_document if return_document == ReturnDocument.AFTER else old_document
+        return project(result, projection) if result is not None else None
+
+    def delete_one(self, filter, **_) -> DeleteResult:  # pylint: disable=redefined-builtin
+        with self.database.transaction() as connection:
+            return DeleteResult({'n': self._delete(connection, filter, multi=False, index_fields=self._prepare_write(connection)), 'ok': 1}, True)
+
+    def delete_many(self, filter, **_) -> DeleteResult:  # pylint: disable=redefined-builtin
+        with self.database.transaction() as connection:
+            return DeleteResult({'n': self._delete(connection, filter, multi=True, index_fields=self._prepare_write(connection)), 'ok': 1}, True)
+
+    def bulk_write(self, requests: Iterable, ordered=True, **_) -> BulkWriteResult:  # pylint: disable=too-many-locals
+        result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [], 'writeErrors': [], 'writeConcernErrors': []}
+        with self.database.transaction() as connection:
+            index_fields = self._prepare_write(connection)
+            for index, request in enumerate(requests):
+                try:
+                    self._apply_request(connection, request, index, index_fields, result)
+                except (DuplicateKeyError, OperationFailure) as error:
+                    result['writeErrors'].append({'index': index, 'code': error.code, 'errmsg': str(error), 'op': request})
+                    if ordered:
+                        break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def _apply_request(self, connection, request, index: int, index_fields: Set[str], result: dict):  # pylint: disable=protected-access
+        if isinstance(request, InsertOne):
+            self._insert(connection, request._doc, index_fields)
+            result['nInserted'] += 1
+        elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+            matched, modified, upserted_id = self._update_documents(
+                connection, request._filter, request._doc, bool(request._upsert), index_fields, multi=isinstance(request, UpdateMany)
+            )
+            result['nMatched'] += matched
+            result['nModified'] += modified
+            if upserted_id is not None:
+                result['nUpserted'] += 1
+                result['upserted'].append({'index': index, '_id': upserted_id})
+        elif isinstance(request, (DeleteOne, DeleteMany)):
+            result['nRemoved'] += self._delete(connection, request._filter, multi=isinstance(request, DeleteMany), index_fields=index_fields)
+        else:
+            raise TypeError('{} is not a valid request'.format(request))
+
+    def _update_with_result(self, filter, update, upsert, multi) -> UpdateResult:  # pylint: disable=redefined-builtin
+        with self.database.transaction() as connection:
+            matched, modified, upserted_id = self._update_documents(connection, filter, update, upsert, self._prepare_write(connection), multi)
+        raw_result = {'n': matched if upserted_id is None else 1, 'nModified': modified, 'ok': 1}
+        if upserted_id is not None:
+            raw_result['upserted'] = upserted_id
+        return UpdateResult(raw_result, True)
+
+    def _update_documents(self, connection, filter, update, upsert, index_fields, multi) -> Tuple[int, int, Any]:  # pylint: disable=redefined-builtin
+        rows = self._find_rows(filter, limit=0 if multi else 1)
+        modified = 0
+        for key, old_document in rows:
+            new_document = apply_update(old_document, update)
+            if new_document != old_document:
+                self._replace(connection, key, new_document, index_fields)
+                modified += 1
+        if rows or not upsert:
+            return len(rows), modified, None
+        document = self._insert(connection, apply_update(get_upsert_document(filter), update, is_insert=True), index_fields)
+        return 0, 0, document['_id']
+
+    def _update(self, connection, filter, update, upsert, index_fields, old_documents) -> Optional[dict]:  # pylint: disable=redefined-builtin
+        if old_documents:
+            old_document = old_documents[0]
+            new_document = apply_update(old_document, update)
+            self._replace(connection, encode_key(old_document['_id']), new_document, index_fields)
+            return new_document
+        if upsert:
+            return self._insert(connection, apply_update(get_upsert_document(filter), update, is_insert=True), index_fields)
+        return None
+
+    def _delete(self, connection, filter, multi, index_fields) -> int:  # pylint: disable=redefined-builtin
+        keys = [key for key, _ in self._find_rows(filter, limit=0 if multi else 1)]
+        for chunk in chunks(keys, SQL_VARIABLE_LIMIT):
+            placeholders = ', '.join('?' * len(chunk))
+            connection.execute('DELETE FROM {} WHERE key IN ({})'.format(self._table, placeholders), chunk)
+            if index_fields:
+                connection.execute('DELETE FROM __index_entries__ WHERE collection = ? AND key IN ({})'.format(placeholders), [self.name, *chunk])
+        return len(keys)
+
+    def _prepare_write(self, connection) -> Set[str]:
+        connection.execute('CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, document BLOB NOT NULL)'.format(self._table))
+        return self._get_index_fields()
+
+    def _insert(self, connection, document: dict, index_fields: Set[str]) -> dict:
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        key = encode_key(document['_id'])
+        try:
+            connection.execute('INSERT INTO {} (key, document) VALUES (?, ?)'.format(self._table), (key, bson.encode(document)))
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError('E11000 duplicate key error collection: {} dup key: {{ _id: {!r} }}'.format(self.full_name, document['_id']), DUPLICATE_KEY_ERROR)
+        self._add_index_entries(connection, key, document, index_fields)
+        return document
+
+    def _replace(self, connection, key: str, document: dict, index_fields: Set[str]):
+        connection.execute('UPDATE {} SET document = ? WHERE key = ?'.format(self._table), (bson.encode(document), key))
+        if index_fields:
+            connection.execute('DELETE FROM __index_entries__ WHERE collection = ? AND key = ?', (self.name, key))
+            self._add_index_entries(connection, key, document, index_fields)
+
+    def _add_index_entries(self, connection, key: str, document: dict, index_fields: Set[str]):
+        entries = [
+            (self.name, field, value, key)
+            for field in index_fields
+            for value in _get_index_values(document, field)
+        ]
+        if entries:
+            connection.executemany('INSERT INTO __index_entries__ (collection, field, value, key) VALUES (?, ?, ?, ?)', entries)
+
+    # ---- indexes ----
+
+    def create_index(self, keys, **_) -> str:
+        field = keys if isinstance(keys, str) else list(keys)[0][0]
+        with self.database.transaction() as connection:
+            self._prepare_write(connection)
+            if field != '_id' and connection.execute('INSERT OR IGNORE INTO __index_fields__ VALUES (?, ?)', (self.name, field)).rowcount:
+                for key, document in self._find_rows():
+                    self._add_index_entries(connection, key, document, {field})
+        return '{}_1'.format(field)
+
+    def create_indexes(self, indexes: list, **_) -> List[str]:
+        '''
+        only the leading field of each (compound) index is indexed
+        '''
+        for index in indexes:
+            self.create_index(list(index.document['key'].items()))
+        return [index.document['name'] for index in indexes]
+
+    def index_information(self) -> dict:
+        if not self._exists():
+            return {}
+        information = {'_id_': {'key': [('_id', 1)]}}
+        information.update({'{}_1'.format(field): {'key': [(field, 1)]} for field in sorted(self._get_index_fields())})
+        return information
+
+    def drop_indexes(self):
+        with self.database.transaction() as connection:
+            connection.execute('DELETE FROM __index_fields__ WHERE collection = ?', (self.name,))
+            connection.execute('DELETE FROM __index_entries__ WHERE collection = ?', (self.name,))
+
+    def drop(self):
+        with self.database.transaction() as connection:
+            connection.execute('DROP TABLE IF EXISTS {}'.format(self._table))
+            connection.execute('DELETE FROM __index_fields__ WHERE collection = ?', (self.name,))
+            connection.execute('DELETE FROM __index_entries__ WHERE collection = ?', (self.name,))
+
+
+def _get_equality_values(condition: Any) -> Optional[list]:
+    if is_operator_condition(condition):
+        if '$eq' in condition:
+            values = [condition['$eq']]
+        elif '$in' in condition:
+            values = list(condition['$in'])
+        else:
+            return None
+    else:
+        values = [condition]
+    return values if all(_is_indexable(value) for value in values) else None
+
+
+def _get_range_prefix(condition: Any) -> Optional[str]:
+    '''
+    :return: key prefix of all index entries that may match a range or existence condition (range conditions only
+             match values of the same type)
+    '''
+    if not is_operator_condition(condition) or not set(condition).issubset(RANGE_OPERATORS) or condition.get('$exists', True) is not True:
+        return None
+    operands = [value for operator, value in condition.items() if operator != '$exists']
+    if not operands:
+        return ''
+    if not all(_is_indexable(value) and not isinstance(value, list) for value in operands):
+        return None
+    return encode_key(operands[0])[:2]
+
+
+def _get_index_values(document: dict, field: str) -> Set[str]:
+    values, field_values = set(), get_values(document, field)
+    for value in field_values:
+        if isinstance(value, list):
+            values.update(encode_key(item) for item in value if _is_indexable(item))
+        if _is_indexable(value):
+            values.add(encode_key(value))
+    if field_values and not values:
+        values.add(PRESENCE_KEY)  # documents with values that can not be indexed are found by scans of all entries
+    return values
+
+
+class EmbeddedCursor:
+    '''
+    Drop-in replacement for the parts of pymongo's Cursor used by FACT. The query is run on first iteration.
+    '''
+
+    def __init__(self, collection: EmbeddedCollection, filter=None, projection=None, skip=0, limit=0, sort=None):  # pylint: disable=redefined-builtin
+        self.collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._skip, self._limit, self._sort = skip, limit, sort
+        self._results = None
+
+    def sort(self, key_or_list, direction=None) -> 'EmbeddedCursor':
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, number: int) -> 'EmbeddedCursor':
+        self._skip = number
+        return self
+
+    def limit(self, number: int) -> 'EmbeddedCursor':
+        self._limit = number
+        return self
+
+    def explain(self) -> dict:
+        return {'queryPlanner': {'winningPlan': self.collection.get_plan(self._filter, self._sort)}}
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        if self._results is None:
+            documents = self.collection.find_documents(self._filter, sort=self._sort, skip=self._skip, limit=self._limit)
+            self._results = iter([project(document, self._projection) for document in documents])
+        return next(self._results)
+
+    def close(self):
+        self._results = iter([])
@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+
+from storage.embedded.client import EmbeddedDatabase
+
+CHUNK_SIZE = 255 * 1024
+
+
+class EmbeddedGridOut:
+    '''
+    file read from an EmbeddedGridFS (with the attributes of gridfs.GridOut used by FACT)
+    '''
+
+    def __init__(self, grid_fs: 'EmbeddedGridFS', file_document: dict):
+        self._grid_fs = grid_fs
+        self._file_document = file_document
+        self._id = file_document['_id']
+        self.filename = file_document.get('filename')
+        self.length = file_document['length']
+        self.upload_date = file_document['uploadDate']
+        self.metadata = file_document.get('metadata')
+
+    def read(self) -> bytes:
+        chunk_documents = self._grid_fs.chunks.find({'files_id': self._id}, sort=[('n', 1)])
+        return b''.join(chunk['data'] for chunk in chunk_documents)
+
+
+class EmbeddedGridFS:
+    '''
+    Drop-in replacement for the parts of gridfs.GridFS used by FACT. Files and chunks are stored in the collections
+    <collection>.files and <collection>.chunks (with the same fields as in GridFS) of an embedded database.
+    '''
+
+    def __init__(self, database: EmbeddedDatabase, collection: str = 'fs'):
+        self.database = database
+        self.files = database['{}.files'.format(collection)]
+        self.chunks = database['{}.chunks'.format(collection)]
+        self.files.create_index('filename')
+        self.chunks.create_index('files_id')
+
+    def put(self, data: bytes, **kwargs) -> ObjectId:
+        if isinstance(data, str):
+            data = data.encode(kwargs.pop('encoding'))
+        file_id = kwargs.pop('_id', ObjectId())
+        with self.database.transaction():
+            for number, offset in enumerate(range(0, len(data), CHUNK_SIZE)):
+                self.chunks.insert_one({'files_id': file_id, 'n': number, 'data': data[offset:offset + CHUNK_SIZE]})
+            self.files.insert_one({'_id': file_id, 'length': len(data), 'chunkSize': CHUNK_SIZE, 'uploadDate': datetime.utcnow(), **kwargs})
+        return file_id
+
+    def get(self, file_id) -> EmbeddedGridOut:
+        file_document = self.files.find_one({'_id': file_id})
+        if file_document is None:
+            raise NoFile('no file in gridfs collection {} with _id {!r}'.format(self.files.name, file_id))
+        return EmbeddedGridOut(self, file_document)
+
+    def get_last_version(self, filename: Optional[str] = None, **kwargs) -> EmbeddedGridOut:
+        query = {'filename': filename, **kwargs} if filename is not None else kwargs
+        file_documents = self.files.find(query, sort=[('uploadDate', 1)])
+        file_document = next(iter(reversed(list(file_documents))), None)
+        if file_document is None:
+            raise NoFile('no version of {} in gridfs collection {}'.format(filename, self.files.name))
+        return EmbeddedGridOut(self, file_document)
+
+    def find(self, filter=None, **kwargs) -> Iterator[EmbeddedGridOut]:  # pylint: disable=redefined-builtin
+        for file_document in self.files.find(filter, **kwargs):
+            yield EmbeddedGridOut(self, file_document)
+
+    def find_one(self, filter=None, **kwargs) -> Optional[EmbeddedGridOut]:  # pylint: disable=redefined-builtin
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        return next(self.find(filter, limit=1, **kwargs), None)
+
+    def exists(self, document_or_id=None, **kwargs) -> bool:
+        if document_or_id is not None and not isinstance(document_or_id, dict):
+            document_or_id = {'_id': document_or_id}
+        return self.files.find_one({**(document_or_id or {}), **kwargs}, {'_id': 1}) is not None
+
+    def delete(self, file_id):
+        with self.database.transaction():
+            self.files.delete_one({'_id': file_id})
+            self.chunks.delete_many({'files_id': file_id})
+
+    def list(self) -> List[str]:
+        return [name for name in self.files.distinct('filename') if name is not None]
@@ -0,0 +1,348 @@
+import operator
+import re
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+MISSING = object()
+REGEX_TYPE = type(re.compile(''))
+REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}
+
+
+def get_values(document: Any, path: str) -> List[Any]:
+    '''
+    :return: all values at the (dotted) path of the document, arrays on the way are traversed like MongoDB does it
+    '''
+    return _get_values(document, path.split('.'))
+
+
+def _get_values(value: Any, keys: List[str]) -> List[Any]:
+    if not keys:
+        return [value]
+    key, remaining_keys = keys[0], keys[1:]
+    if isinstance(value, dict):
+        return _get_values(value[key], remaining_keys) if key in value else []
+    if isinstance(value, list):
+        result = []
+        if key.isdigit() and int(key) < len(value):
+            result.extend(_get_values(value[int(key)], remaining_keys))
+        for item in value:
+            if isinstance(item, dict):
+                result.extend(_get_values(item, keys))
+        return result
+    return []
+
+
+# ---- comparison ----
+
+def get_type_rank(value: Any) -> int:
+    '''
+    rank of the type of a value in the BSON comparison order
+    '''
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 11
+
+
+def get_sort_key(value: Any):
+    rank = get_type_rank(value)
+    if rank == 1:
+        return rank, 0
+    if rank == 4:
+        return rank, [(key, get_sort_key(item)) for key, item in value.items()]
+    if rank == 5:
+        return rank, [get_sort_key(item) for item in value]
+    return rank, value
+
+
+def values_are_equal(value: Any, other: Any) -> bool:
+    if isinstance(value, bool) or isinstance(other, bool):
+        return type(value) is type(other) and value == other
+    return get_type_rank(value) == get_type_rank(other) and value == other
+
+
+def compare_values(value: Any, other: Any, compare) -> bool:
+    '''
+    values of different types are never comparable (like in MongoDB queries)
+    '''
+    if get_type_rank(value) != get_type_rank(other) or value is None:
+        return False
+    return compare(get_sort_key(value), get_sort_key(other))
+
+
+def sort_documents(documents: List[dict], sort: Optional[Iterable]) -> List[dict]:
+    for key, direction in reversed(list(_get_sort_spec(sort))):
+        documents.sort(key=lambda document: _get_sort_value(document, key, direction), reverse=direction < 0)  # pylint: disable=cell-var-from-loop
+    return documents
+
+
+def _get_sort_spec(sort):
+    if not sort:
+        return []
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return list(sort)
+
+
+def _get_sort_value(document: dict, key: str, direction: int):
+    candidates = list(_get_candidates(get_values(document, key)))
+    if not candidates:
+        return get_sort_key(None)
+    keys = [get_sort_key(candidate) for candidate in candidates if not isinstance(candidate, list)] or [get_sort_key([])]
+    return min(keys) if direction > 0 else max(keys)
+
+
+# ---- matching ----
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    '''
+    :return: True if the document matches the MongoDB query
+    '''
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(matches(document, sub_query) for sub_query in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(document, sub_query) for sub_query in condition):
+                return False
+        elif key == '$nor':
+            if any(matches(document, sub_query) for sub_query in condition):
+                return False
+        elif key.startswith('$'):
+            raise OperationFailure('unsupported query operator: {}'.format(key))
+        elif not field_matches(get_values(document, key), condition):
+            return False
+    return True
+
+
+def is_operator_condition(condition: Any) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith('$') for key in condition)
+
+
+def field_matches(values: List[Any], condition: Any) -> bool:
+    if is_operator_condition(condition):
+        return all(
+            _operator_matches(values, query_operator, argument, condition)
+            for query_operator, argument in condition.items() if query_operator != '$options'
+        )
+    return _equals_any(values, condition)
+
+
+def _get_candidates(values: List[Any]):
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _equals_any(values: List[Any], target: Any) -> bool:
+    if target is None:
+        return not values or any(candidate is None for candidate in _get_candidates(values))
+    if isinstance(target, REGEX_TYPE):
+        return any(isinstance(candidate, str) and target.search(candidate) for candidate in _get_candidates(values))
+    return any(values_are_equal(candidate, target) for candidate in _get_candidates(values))
+
+
+COMPARISON_OPERATORS = {'$gt': operator.gt, '$gte': operator.ge, '$lt': operator.lt, '$lte': operator.le}
+
+
+def _operator_matches(values: List[Any], query_operator: str, argument: Any, condition: dict) -> bool:  # pylint: disable=too-many-return-statements
+    if query_operator == '$eq':
+        return _equals_any(values, argument)
+    if query_operator == '$ne':
+        return not _equals_any(values, argument)
+    if query_operator in COMPARISON_OPERATORS:
+        return any(compare_values(candidate, argument, COMPARISON_OPERATORS[query_operator]) for candidate in _get_candidates(values))
+    if query_operator == '$in':
+        return any(_equals_any(values, target) for target in argument)
+    if query_operator == '$nin':
+        return not any(_equals_any(values, target) for target in argument)
+    if query_operator == '$exists':
+        return bool(values) == bool(argument)
+    if query_operator == '$size':
+        return any(isinstance(value, list) and len(value) == argument for value in values)
+    if query_operator == '$regex':
+        pattern = get_regex(argument, condition.get('$options', ''))
+        return any(isinstance(candidate, str) and pattern.search(candidate) for candidate in _get_candidates(values))
+    if query_operator == '$not':
+        return not field_matches(values, argument)
+    if query_operator == '$all':
+        return all(_equals_any(values, target) for target in argument)
+    if query_operator == '$elemMatch':
+        return any(
+            isinstance(value, list) and any(_element_matches(element, argument) for element in value)
+            for value in values
+        )
+    raise OperationFailure('unsupported query operator: {}'.format(query_operator))
+
+
+def _element_matches(element: Any, condition: dict) -> bool:
+    if is_operator_condition(condition):
+        return field_matches([element], condition)
+    return isinstance(element, dict) and matches(element, condition)
+
+
+def get_regex(pattern: Any, options: str = '') -> REGEX_TYPE:
+    if isinstance(pattern, REGEX_TYPE):
+        return pattern
+    flags = 0
+    for option in options:
+        flags |= REGEX_FLAGS.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+# ---- projection ----
+
+def project(document: dict, projection: Optional[Any]) -> dict:
+    '''
+    :param projection: MongoDB style projection (dict with inclusions or exclusions or list of included fields)
+    '''
+    if projection is None:
+        return document
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    fields = {key: value for key, value in projection.items() if key != '_id'}
+    if any(fields.values()) or not fields and projection.get('_id', 1):
+        result = {'_id': document['_id']} if projection.get('_id', 1) and '_id' in document else {}
+        for field in fields:
+            _include_path(document, result, field.split('.'))
+        return result
+    result = deepcopy(document) if any('.' in field for field in projection) else dict(document)
+    for field, included in projection.items():
+        if not included:
+            unset_path(result, field)
+    return result
+
+
+def _include_path(source: Any, target: dict, keys: List[str]):
+    key, remaining_keys = keys[0], keys[1:]
+    if not isinstance(source, dict) or key not in source:
+        return
+    value = source[key]
+    if not remaining_keys:
+        target[key] = value
+    elif isinstance(value, dict):
+        _include_path(value, target.setdefault(key, {}), remaining_keys)
+    elif isinstance(value, list):
+        target_list = target.setdefault(key, [{} for item in value if isinstance(item, dict)])
+        for item, target_item in zip([item for item in value if isinstance(item, dict)], target_list):
+            _include_path(item, target_item, remaining_keys)
+
+
+# ---- updates ----
+
+def apply_update(document: dict, update: dict, is_insert: bool = False) -> dict:
+    '''
+    :return: copy of the document with the MongoDB update (update operators or replacement document) applied
+    '''
+    if not any(key.startswith('$') for key in update):
+        return {'_id': document['_id'], **deepcopy(update)} if '_id' in document else deepcopy(update)
+    document = deepcopy(document)
+    for update_operator, fields in update.items():
+        if update_operator == '$setOnInsert' and not is_insert:
+            continue
+        for path, argument in fields.items():
+            _apply_update_operator(document, update_operator, path, argument)
+    return document
+
+
+def _apply_update_operator(document: dict, update_operator: str, path: str, argument: Any):
+    if update_operator in ['$set', '$setOnInsert']:
+        set_path(document, path, deepcopy(argument))
+    elif update_operator == '$unset':
+        unset_path(document, path)
+    elif update_operator == '$inc':
+        current_value = get_path(document, path)
+        set_path(document, path, argument if current_value is MISSING else current_value + argument)
+    elif update_operator in ['$push', '$addToSet']:
+        current_value = get_path(document, path)
+        array = [] if current_value is MISSING else current_value
+        if not isinstance(array, list):
+            raise OperationFailure('{} needs an array at {}'.format(update_operator, path))
+        items = argument['$each'] if isinstance(argument, dict) and '$each' in argument else [argument]
+        for item in deepcopy(items):
+            if update_operator == '$push' or not any(values_are_equal(existing, item) for existing in array):
+                array.append(item)
+        set_path(document, path, array)
+    elif update_operator == '$pull':
+        current_value = get_path(document, path)
+        if isinstance(current_value, list):
+            set_path(document, path, [item for item in current_value if not _pull_condition_matches(item, argument)])
+    else:
+        raise OperationFailure('unsupported update operator: {}'.format(update_operator))
+
+
+def _pull_condition_matches(item: Any, condition: Any) -> bool:
+    if is_operator_condition(condition):
+        return field_matches([item], condition)
+    if isinstance(condition, dict) and isinstance(item, dict):
+        return matches(item, condition)
+    return values_are_equal(item, condition)
+
+
+def get_path(document: dict, path: str) -> Any:
+    value = document
+    for key in path.split('.'):
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return MISSING
+    return value
+
+
+def set_path(document: dict, path: str, value: Any):
+    *parent_keys, last_key = path.split('.')
+    target = document
+    for key in parent_keys:
+        if isinstance(target, list) and key.isdigit():
+            target = target[int(key)]
+        else:
+            target = target.setdefault(key, {})
+    if isinstance(target, list) and last_key.isdigit():
+        target[int(last_key)] = value
+    else:
+        target[last_key] = value
+
+
+def unset_path(document: dict, path: str):
+    *parent_keys, last_key = path.split('.')
+    parent = get_path(document, '.'.join(parent_keys)) if parent_keys else document
+    if isinstance(parent, dict):
+        parent.pop(last_key, None)
+
+
+def get_upsert_document(query: dict) -> dict:
+    '''
+    :return: the document created by an upsert of the query: all equality conditions of the query are set
+    '''
+    document = {}
+    for key, condition in (query or {}).items():
+        if key.startswith('$'):
+            continue
+        if is_operator_condition(condition):
+            if '$eq' in condition:
+                set_path(document, key, deepcopy(condition['$eq']))
+        else:
+            set_path(document, key, deepcopy(condition))
+    return document
@@ -0,0 +1,132 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from math import ceil, log
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Iterable, List
+
+MAGIC = b'FACTBLM1'
+HEADER = struct.Struct('<8s?3xIQ')  # magic, valid flag, number of hash functions, number of bits
+VALID_FLAG_OFFSET = len(MAGIC)
+MIN_CAPACITY = 1000000
+ERROR_RATE = 0.01
+
+
+class ExistenceFilter:
+    '''
+    Bloom filter of all uids stored in the database. The filter lives in a memory mapped file that is shared by all
+    FACT processes of a host. It is written by the backend and answers "definitely not stored" without a database query.
+    Bits are only ever set, so a negative answer is always correct: uids are added before their database entry is
+    created. Deleted uids stay in the filter (costing a database query) until it is rebuilt.
+    If the filter is disabled (empty path) or not (yet) available, every uid might be contained.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._file = None
+        self._map = None
+        self._writable = False
+        self._pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def might_contain(self, uid: str) -> bool:
+        if not self._is_available():
+            return True
+        num_hashes, num_bits = self._get_parameters()
+        return all(self._map[HEADER.size + position // 8] & (1 << position % 8) for position in _get_bit_positions(uid, num_hashes, num_bits))
+
+    def add(self, uid: str):
+        if not self._is_available(writable=True):
+            return
+        num_hashes, num_bits = self._get_parameters()
+        with self._lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                for position in _get_bit_positions(uid, num_hashes, num_bits):
+                    self._map[HEADER.size + position // 8] |= 1 << position % 8
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            if self._file is not None:
+                self._file.close()
+            self._map, self._file = None, None
+
+    def _is_available(self, writable: bool = False) -> bool:
+        if not self.enabled:
+            return False
+        if self._map is None or self._pid != os.getpid() or not self._map[VALID_FLAG_OFFSET] or (writable and not self._writable):
+            self._open(writable=writable or self._writable)
+        return self._map is not None
+
+    def _open(self, writable: bool):
+        self.close()
+        try:
+            with self._lock:
+                self._file = open(self.path, 'r+b' if writable else 'rb')
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+                self._writable, self._pid = writable, os.getpid()
+            magic, valid, _, num_bits = HEADER.unpack_from(self._map)
+            if magic != MAGIC or not valid or len(self._map) < HEADER.size + ceil(num_bits / 8):
+                logging.warning('existence filter {} is invalid'.format(self.path))
+                self.close()
+        except (OSError, ValueError) as error:
+            logging.debug('existence filter {} not available: {}'.format(self.path, error))
+            self.close()
+
+    def _get_parameters(self):
+        _, _, num_hashes, num_bits = HEADER.unpack_from(self._map)
+        return num_hashes, num_bits
+
+    @staticmethod
+    def create(path: str, uids: Iterable[str], number_of_uids: int, min_capacity: int = MIN_CAPACITY):
+        '''
+        (Re)builds the filter file of all given uids. The new filter replaces the old one atomically and processes still
+        using the old filter switch to the new one on their next access.
+        :param number_of_uids: expected number of uids, the filter is sized for twice as many to leave room for new ones
+        '''
+        num_bits, num_hashes = _get_filter_size(max(min_capacity, 2 * number_of_uids), ERROR_RATE)
+        bits = bytearray(ceil(num_bits / 8))
+        for uid in uids:
+            for position in _get_bit_positions(uid, num_hashes, num_bits):
+                bits[position // 8] |= 1 << position % 8
+        with NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), delete=False) as tmp_file:
+            tmp_file.write(HEADER.pack(MAGIC, True, num_hashes, num_bits))
+            tmp_file.write(bits)
+        os.chmod(tmp_file.name, 0o644)
+        old_filter = _open_for_invalidation(path)
+        os.replace(tmp_file.name, path)
+        if old_filter is not None:
+            with old_filter:
+                old_filter.seek(VALID_FLAG_OFFSET)
+                old_filter.write(b'\x00')
+
+
+def _open_for_invalidation(path: str):
+    try:
+        return open(path, 'r+b')
+    except OSError:
+        return None
+
+
+def _get_filter_size(capacity: int, error_rate: float):
+    num_bits = ceil(-capacity * log(error_rate) / log(2) ** 2)
+    num_hashes = max(1, round(num_bits / capacity * log(2)))
+    return num_bits, num_hashes
+
+
+def _get_bit_positions(uid: str, num_hashes: int, num_bits: int) -> List[int]:
+    digest = blake2b(uid.encode(), digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+    return [(first + index * second) % num_bits for index in range(num_hashes)]
@@ -1,20 +1,47 @@
 import logging
 import os
+import re
+import shutil
+import sqlite3
+from hashlib import blake2b
+from typing import Iterator, List, Tuple
 
 from common_helper_files import write_binary_to_file, create_dir_for_file, delete_file
 
 from helperFunctions.fileSystem import get_absolute_path
+from storage.binary_search_cache import get_binary_search_cache
+from storage.binary_search_index import get_binary_search_index
+
+MAX_DIRECTORY_LEVELS = 4
+UID_PATTERN = re.compile(r'^[0-9a-f]{64}_[0-9]+$')
 
 
 class FS_Organizer(object):
     '''
     This module organizes file system storage
+    The path of a file only depends on its uid: the files are distributed over all storage directories (e.g. on
+    different volumes) by rendezvous hashing, so that adding a storage directory only moves the files that belong to
+    the new directory. Inside a storage directory the files are spread over levels of sub directories that are named
+    after the first characters of the uid (two characters per level).
+    Files stored with another layout are still found until they are moved by rebalance().
+    Stored files are added to the binary search index and the journal of the binary search cache if they are enabled.
     '''
 
     def __init__(self, config=None):
         self.config = config
         self.data_storage_path = get_absolute_path(self.config['data_storage']['firmware_file_storage_directory'])
-        create_dir_for_file(self.data_storage_path)
+        self.storage_directories = [self.data_storage_path] + [
+            get_absolute_path(directory.strip())
+            for directory in self.config['data_storage'].get('additional_file_storage_directories', '').split(',')
+            if directory.strip()
+        ]
+        self.directory_levels = int(self.config['data_storage'].get('file_storage_directory_levels', '1'))
+        if not 1 <= self.directory_levels <= MAX_DIRECTORY_LEVELS:
+            raise ValueError('file_storage_directory_levels must be between 1 and {}'.format(MAX_DIRECTORY_LEVELS))
+        for storage_directory in self.storage_directories:
+            create_dir_for_file(storage_directory)
+        self._binary_search_index = None
+        self._binary_search_cache = None
 
     def store_file(self, file_object):
         if file_object.binary is None:
@@ -23,13 +50,146 @@ class FS_Organizer(object):
             destination_path = self.generate_path(file_object)
             write_binary_to_file(file_object.binary, destination_path, overwrite=False)
             file_object.set_file_path(destination_path)
+            self._register_stored_file(file_object)
+
+    def store_staged_file(self, file_object, staged_file_path):
+        '''
+        moves a file (e.g. a streamed upload) into the file storage, the uid of the file object must already be set
+        '''
+        if os.path.isfile(self.get_file_path(file_object.uid)):  # already stored
+            os.remove(staged_file_path)
+        else:
+            _move_file(staged_file_path, self.generate_path(file_object))
+        file_object.set_file_path(self.get_file_path(file_object.uid))
+        self._register_stored_file(file_object)
 
     def delete_file(self, uid):
-        local_file_path = self.generate_path_from_uid(uid)
-        delete_file(local_file_path)
+        for local_file_path in self._get_possible_paths(uid):
+            if os.path.isfile(local_file_path):
+                delete_file(local_file_path)
+        if self.binary_search_index is not None:
+            try:
+                self.binary_search_index.remove_file(uid)
+            except sqlite3.Error as error:  # harmless: the binary search skips files that no longer exist
+                logging.error('Could not remove {} from the binary search index: {}'.format(uid, error))
+
+    @property
+    def binary_search_index(self):
+        if self._binary_search_index is None:
+            self._binary_search_index = get_binary_search_index(self.config)
+        return self._binary_search_index
+
+    @property
+    def binary_search_cache(self):
+        if self._binary_search_cache is None:
+            self._binary_search_cache = get_binary_search_cache(self.config)
+        return self._binary_search_cache
+
+    def _register_stored_file(self, file_object):
+        if self.binary_search_index is not None:
+            try:
+                self.binary_search_index.add_file(file_object.uid, file_object.file_path)
+            except sqlite3.Error as error:  # the file is not indexed and therefore always scanned
+                logging.error('Could not add {} to the binary search index: {}'.format(file_object.uid, error))
+        if self.binary_search_cache is not None:
+            self.binary_search_cache.add_file(file_object.uid)
 
     def generate_path(self, file_object):
         return self.generate_path_from_uid(file_object.uid)
 
     def generate_path_from_uid(self, uid):
-        return os.path.join(self.data_storage_path, uid[0:2], uid)
+        '''
+        :return: the path of the file with the current storage layout
+        '''
+        return self._get_path(self.get_storage_directory(uid), uid, self.directory_levels)
+
+    def get_file_path(self, uid):
+        '''
+        :return: the path of the stored file (which differs from generate_path_from_uid() if the file has not been moved
+        after a change of the storage layout) or the path of the current layout if the file is not stored
+        '''
+        for local_file_path in self._get_possible_paths(uid):
+            if os.path.isfile(local_file_path):
+                return local_file_path
+        return self.generate_path_from_uid(uid)
+
+    def get_storage_directory(self, uid):
+        if len(self.storage_directories) == 1:
+            return self.storage_directories[0]
+        return max(self.storage_directories, key=lambda storage_directory: _get_rendezvous_weight(storage_directory, uid))
+
+    def rebalance(self) -> Tuple[int, int]:
+        '''
+        moves all stored files that are not stored at the path of the current layout (e.g. after adding a storage
+        directory or changing the number of directory levels) and removes directories that become empty
+        this is safe while FACT is running, since files are found at their old location until they are moved
+        :return: tuple of the numbers of moved and checked files
+        '''
+        stored_files = list(self.get_stored_files())
+        moved = 0
+        for file_path in stored_files:
+            destination_path = self.generate_path_from_uid(os.path.basename(file_path))
+            if file_path != destination_path:
+                _move_file(file_path, destination_path)
+                moved += 1
+        for storage_directory in self.storage_directories:
+            _remove_empty_directories(storage_directory)
+        return moved, len(stored_files)
+
+    def get_stored_files(self) -> Iterator[str]:
+        '''
+        :return: generator of the paths of all stored files in all storage directories
+        '''
+        for storage_directory in self.storage_directories:
+            yield from _get_stored_files(storage_directory)
+
+    def _get_possible_paths(self, uid) -> List[str]:
+        current_path = self.generate_path_from_uid(uid)
+        return [current_path] + [
+            self._get_path(storage_directory, uid, levels)
+            for storage_directory in self.storage_directories
+            for levels in range(1, MAX_DIRECTORY_LEVELS + 1)
+            if self._get_path(storage_directory, uid, levels) != current_path
+        ]
+
+    @staticmethod
+    def _get_path(storage_directory, uid, levels):
+        return os.path.join(storage_directory, *[uid[2 * level:2 * level + 2] for level in range(levels)], uid)
+
+
+def _get_rendezvous_weight(storage_directory: str, uid: str) -> int:
+    return int.from_bytes(blake2b('{}|{}'.format(storage_directory, uid).encode(), digest_size=8).digest(), 'big')
+
+
+def _get_stored_files(storage_directory: str) -> Iterator[str]:
+    for directory, _, file_names in os.walk(storage_directory):
+        for file_name in file_names:
+            if UID_PATTERN.match(file_name):
+                yield os.path.join(directory, file_name)
+
+
+def _move_file(source_path: str, destination_path: str):
+    '''
+    moves the file atomically: the destination (on another volume) is written under a temporary name first
+    '''
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    try:
+        os.rename(source_path, destination_path)
+    except OSError:  # different volume
+        temporary_path = '{}.tmp'.format(destination_path)
+        try:
+            shutil.copy2(source_path, temporary_path)
+            os.replace(temporary_path, destination_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        os.remove(source_path)
+
+
+def _remove_empty_directories(storage_directory: str):
+    for directory, sub_directories, file_names in os.walk(storage_directory, topdown=False):
+        if directory != storage_directory and not sub_directories and not file_names:
+            try:
+                os.rmdir(directory)
+            except OSError:  # a file was stored in the meantime
+                pass
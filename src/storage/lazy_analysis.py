@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+
+
+class SanitizedResultCache:
+    '''
+    Process-local LRU cache for serialized analysis results swapped to the sanitize GridFS.
+    Entries are keyed by the GridFS file id, so an overwritten analysis result never produces a stale hit.
+    '''
+
+    def __init__(self, max_size: int = 0):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def add(self, key: Hashable, serialized_entry: bytes):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = serialized_entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LazyAnalysisResult(dict):
+    '''
+    Result of a single analysis plugin whose entries were swapped to the sanitize GridFS.
+    Swapped entries are only retrieved when they are accessed for the first time. The (never swapped) summary is
+    available right away. Pickling or copying the result retrieves all entries and produces a plain dict.
+    '''
+
+    def __init__(self, sanitized_result: dict, retrieve_function: Callable[[str], Any]):
+        super().__init__(sanitized_result)
+        self._retrieve = retrieve_function
+        self._swapped_keys = {key for key, value in sanitized_result.items() if self._is_swapped(key, value)}
+
+    @staticmethod
+    def _is_swapped(key, value):
+        return key != 'summary' or isinstance(value, str)
+
+    def _load(self, key):
+        if key in self._swapped_keys:
+            super().__setitem__(key, self._retrieve(super().__getitem__(key)))
+            self._swapped_keys.discard(key)
+
+    def _load_all(self):
+        for key in list(self._swapped_keys):
+            self._load(key)
+
+    @property
+    def fully_loaded(self) -> bool:
+        return not self._swapped_keys
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._swapped_keys.discard(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._swapped_keys.discard(key)
+        super().__delitem__(key)
+
+    def __iter__(self):  # overridden so that dict(...) and {**...} use __getitem__ instead of copying raw entries
+        return super().__iter__()
+
+    def __eq__(self, other):
+        self._load_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._load_all()
+        return super().__repr__()
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.copy(), memo)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        self._load(key)
+        self._swapped_keys.discard(key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self._load_all()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def copy(self):
+        self._load_all()
+        return dict(super().items())
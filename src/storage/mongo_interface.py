@@ -1,8 +1,11 @@
 import warnings
 
+import gridfs
 from pymongo import MongoClient, errors
 
 from helperFunctions.process import complete_shutdown
+from storage.embedded.client import EmbeddedClient, EmbeddedDatabase
+from storage.embedded.grid_fs import EmbeddedGridFS
 
 
 warnings.filterwarnings('ignore', module='pymongo.topology')
@@ -13,16 +16,20 @@ class MongoInterface(object):
     This is the mongo interface base class handling:
     - load config
     - setup connection including authentication
+    - the embedded storage backend (SQLite) is used instead of MongoDB if configured
     '''
 
     READ_ONLY = False
 
     def __init__(self, config=None):
         self.config = config
-        mongo_server = self.config['data_storage']['mongo_server']
-        mongo_port = self.config['data_storage']['mongo_port']
-        self.client = MongoClient('mongodb://{}:{}'.format(mongo_server, mongo_port), connect=False)
-        self._authenticate()
+        if uses_embedded_storage(self.config):
+            self.client = EmbeddedClient(self.config['data_storage']['embedded_storage_directory'])
+        else:
+            mongo_server = self.config['data_storage']['mongo_server']
+            mongo_port = self.config['data_storage']['mongo_port']
+            self.client = MongoClient('mongodb://{}:{}'.format(mongo_server, mongo_port), connect=False)
+            self._authenticate()
         self._setup_database_mapping()
 
     def shutdown(self):
@@ -40,3 +47,16 @@ class MongoInterface(object):
             self.client.admin.authenticate(user, pw, mechanism='SCRAM-SHA-1')
         except errors.OperationFailure as e:  # Authentication not successful
             complete_shutdown('Error: Authentication not successful: {}'.format(e))
+
+
+def uses_embedded_storage(config) -> bool:
+    return config['data_storage'].get('storage_backend', 'mongodb') == 'embedded'
+
+
+def get_grid_fs(database):
+    '''
+    :return: GridFS of a MongoDB database or its counterpart for an embedded database
+    '''
+    if isinstance(database, EmbeddedDatabase):
+        return EmbeddedGridFS(database)
+    return gridfs.GridFS(database)
@@ -0,0 +1,66 @@
+import pickle
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+from bson import ObjectId
+
+
+def new_generation() -> ObjectId:
+    '''
+    generation stamp of a database entry. It has to be renewed on every write to the entry, so that cached data derived
+    from the old version of the entry is no longer used
+    '''
+    return ObjectId()
+
+
+class GenerationCache:
+    '''
+    Process-local LRU cache of data derived from database entries.
+    Each value is stored together with the generation stamp of its entry and is only returned while the stamp is unchanged.
+    The values are stored pickled: the cache holds at most max_size values and (if it is set) max_bytes bytes of pickled
+    values, and each get returns a new copy that the caller may modify.
+    '''
+
+    def __init__(self, max_size: int = 0, max_bytes: Optional[int] = None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.size_in_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and (self.max_bytes is None or self.max_bytes > 0)
+
+    def get(self, key: Hashable, generation: Any) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            cached_generation, pickled_value = self._entries[key]
+            if cached_generation != generation:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(pickled_value)
+
+    def add(self, key: Hashable, generation: Any, value: Any):
+        if not self.enabled:
+            return
+        pickled_value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and len(pickled_value) > self.max_bytes:
+                return
+            self._entries[key] = (generation, pickled_value)
+            self.size_in_bytes += len(pickled_value)
+            while len(self._entries) > self.max_size or (self.max_bytes is not None and self.size_in_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        _, pickled_value = self._entries.pop(key)
+        self.size_in_bytes -= len(pickled_value)
+
+    def __len__(self):
+        return len(self._entries)
@@ -38,7 +38,11 @@ class TestRestBinarySearch(TestAcceptanceBase):
         return result['request']['search_id']
 
     def _get_binary_search_result(self, search_id):
-        rv = self.test_client.get('/rest/binary_search/{}'.format(search_id), follow_redirects=True)
-        results = json.loads(rv.data.decode())
+        for _ in range(10):
+            rv = self.test_client.get('/rest/binary_search/{}'.format(search_id), follow_redirects=True)
+            results = json.loads(rv.data.decode())
+            if results.get('finished'):
+                break
+            sleep(1)
         assert 'binary_search_results' in results
         assert 'rulename' in results['binary_search_results']
@@ -4,8 +4,15 @@ import os
 import pytest
 from common_helper_process import execute_shell_command_get_return_code
 
+import benchmark_binary_search_index
+import benchmark_intercom
+import benchmark_storage
+import benchmark_tlsh_index
 import init_database
+import migrate_analysis_storage
+import rebalance_file_storage
 import update_statistic
+import update_summaries
 import update_variety_data
 from helperFunctions.fileSystem import get_src_dir
 
@@ -28,7 +35,10 @@ def test_start_script_help_and_version(script):
     gc.collect()
 
 
-@pytest.mark.parametrize('script', [init_database, update_statistic, update_variety_data])
+@pytest.mark.parametrize('script', [
+    benchmark_binary_search_index, benchmark_intercom, benchmark_storage, benchmark_tlsh_index, init_database, migrate_analysis_storage, rebalance_file_storage, update_statistic,
+    update_summaries, update_variety_data
+])
 def test_start_scripts_with_main(script, monkeypatch):
     monkeypatch.setattr('update_variety_data._create_variety_data', lambda _: 0)
     assert script.main([script.__name__, '-t']) == 0, 'script did not run successfully'
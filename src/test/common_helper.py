@@ -4,6 +4,7 @@ import os
 from base64 import standard_b64encode
 from configparser import ConfigParser
 from copy import deepcopy
+from tempfile import gettempdir
 
 from helperFunctions.config import load_config
 from helperFunctions.dataConversion import normalize_compare_id
@@ -28,7 +29,7 @@ class CommonDbInterfaceMock(MongoInterfaceCommon):
     def __init__(self):  # pylint: disable=super-init-not-called
         pass
 
-    def retrieve_analysis(self, sanitized_dict, analysis_filter=None):
+    def retrieve_analysis(self, sanitized_dict, analysis_filter=None, lazy=False):
         return {}
 
 
@@ -102,7 +103,7 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
             return [fo_entry]
         return [fw_entry]
 
-    def get_object(self, uid, analysis_filter=None):
+    def get_object(self, uid, analysis_filter=None, lazy=False):
         if uid == TEST_FW.uid:
             result = deepcopy(TEST_FW)
             result.processed_analysis = {
@@ -131,6 +132,12 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
     def get_hid(self, uid, root_uid=None):
         return 'TEST_FW_HID'
 
+    def add_objects(self, objects):
+        return {}
+
+    def get_hids(self, uid_list, root_uid=None):
+        return {uid: self.get_hid(uid, root_uid=root_uid) for uid in uid_list}
+
     def get_device_class_list(self):
         return ['test class']
 
@@ -226,6 +233,18 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
     def add_re_analyze_task(self, task, unpack=True):
         self.tasks.append(task)
 
+    def add_firmware_batch_task(self, batch_id, batch_items):
+        self.tasks.append((batch_id, batch_items))
+
+    def add_firmware_batch(self, batch_id, items):
+        pass
+
+    @staticmethod
+    def get_firmware_batch(batch_id):
+        if batch_id == 'test_batch_id':
+            return [{'index': 0, 'file_path': 'test.zip', 'status': 'scheduled', 'uid': TEST_FW.uid, 'message': None}]
+        return []
+
     def add_single_file_task(self, task):
         self.tasks.append(task)
 
@@ -240,6 +259,11 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
             'file_type': ('file_type plugin', False, {'default': False}, '0.0')
         }
 
+    def get_file_name_and_path(self, uid):
+        if uid == TEST_FW.uid:
+            return {'file_name': TEST_FW.file_name, 'file_path': TEST_FW.file_path}
+        return None
+
     def get_binary_and_filename(self, uid):
         if uid == TEST_FW.uid:
             return TEST_FW.binary, TEST_FW.file_name
@@ -259,8 +283,11 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
 
     def get_binary_search_result(self, uid):
         if uid == 'some_id':
-            return {'test_rule': ['test_uid']}, b'some yara rule'
-        return None, None
+            return {'test_rule': ['test_uid']}, (b'some yara rule', None), True
+        return None, None, False
+
+    def cancel_binary_search(self, request_id):
+        pass
 
     def get_statistic(self, identifier):
         statistics = {
@@ -278,7 +305,7 @@ class DatabaseMock:  # pylint: disable=too-many-public-methods
             return {'date_histogram_data': [['July 2014', 1]]}
         return None
 
-    def get_complete_object_including_all_summaries(self, uid):
+    def get_complete_object_including_all_summaries(self, uid, lazy=False):
         if uid == TEST_FW.uid:
             return TEST_FW
         raise Exception('UID not found: {}'.format(uid))
@@ -351,6 +378,7 @@ def fake_exit(self, *args):
 def get_database_names(config):
     databases = ['{}_{}'.format(config.get('data_storage', 'intercom_database_prefix'), intercom_db)
                  for intercom_db in InterComMongoInterface.INTERCOM_CONNECTION_TYPES]
+    databases.append('{}_notifications'.format(config.get('data_storage', 'intercom_database_prefix')))
     databases.extend([config.get('data_storage', 'main_database'), config.get(
         'data_storage', 'view_storage'), config.get('data_storage', 'statistic_database')])
     return databases
@@ -408,6 +436,9 @@ def get_config_for_testing(temp_dir=None):
     config.set('ExpertSettings', 'nginx', 'false')
     load_users_from_main_config(config)
     config.add_section('Logging')
+    # the embedded storage backend runs the tests without a MongoDB server
+    config.set('data_storage', 'storage_backend', os.environ.get('FACT_TEST_STORAGE_BACKEND', 'mongodb'))
+    config.set('data_storage', 'embedded_storage_directory', os.path.join(temp_dir.name if temp_dir else gettempdir(), 'fact_test_embedded_db'))
     if temp_dir is not None:
         config.set('data_storage', 'firmware_file_storage_directory', temp_dir.name)
         config.set('Logging', 'mongoDbLogFile', os.path.join(temp_dir.name, 'mongo.log'))
@@ -16,7 +16,10 @@ class MockFSOrganizer:
         if file_path.is_file():
             file_path.unlink()
 
-    def generate_path(self, uid):
+    def generate_path(self, file_object):
+        return self.get_file_path(file_object.uid)
+
+    def get_file_path(self, uid):
         return str(Path(self._data_folder.name, uid))
 
     def __del__(self):
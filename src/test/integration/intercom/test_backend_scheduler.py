@@ -2,9 +2,10 @@ import gc
 import unittest
 from multiprocessing import Queue, Value
 from tempfile import TemporaryDirectory
+from threading import Event
 from time import sleep
 
-from intercom.back_end_binding import InterComBackEndBinding
+from intercom.back_end_binding import InterComBackEndBinding, _ListenerWorker
 from storage.MongoMgr import MongoMgr
 from test.common_helper import get_config_for_testing
 
@@ -12,7 +13,7 @@ TMP_DIR = TemporaryDirectory(prefix='fact_test_')
 
 
 # This number must be changed, whenever a listener is added or removed
-NUMBER_OF_LISTENERS = 9
+NUMBER_OF_LISTENERS = 10
 
 
 class ServiceMock:
@@ -29,14 +30,19 @@ class ServiceMock:
 
 class CommunicationBackendMock:
 
+    CONNECTION_TYPE = 'test'
+    MAX_CONCURRENT_TASKS = 1
     counter = Value('i', 0)
 
     def __init__(self, config=None):
         pass
 
-    def get_next_task(self):
+    def receive_task(self):
         self.counter.value += 1
-        return 'test_task' if self.counter.value < 2 else None
+        return ('test_task', 'task_id') if self.counter.value < 2 else None
+
+    def post_processing(self, task, task_id):  # pylint: disable=no-self-use,unused-argument
+        return task
 
     def shutdown(self):
         pass
@@ -84,4 +90,26 @@ class TestInterComBackEndScheduler(unittest.TestCase):
     def test_all_listeners_started(self):
         self.interface.startup()
         sleep(2)
-        self.assertEqual(len(self.interface.process_list), NUMBER_OF_LISTENERS, 'Not all listeners started')
+        self.assertEqual(len(self.interface.listeners), NUMBER_OF_LISTENERS, 'Not all listeners started')
+        self.assertEqual(len(self.interface.process_list), 1, 'all listeners should be served by one dispatcher process')
+
+
+def test_listener_worker_concurrency_limit():
+    task_done, continue_processing, processed_tasks = Event(), Event(), []
+    interface = CommunicationBackendMock()
+    interface.receive_task = lambda: ('test_task', 'task_id')
+
+    def process_task(task):
+        continue_processing.wait(timeout=5)
+        processed_tasks.append(task)
+
+    worker = _ListenerWorker(interface, process_task, task_done)
+    assert worker.dispatch_next_task()
+    assert not worker.dispatch_next_task(), 'a second task must not be received while the worker is busy'
+    assert not worker.is_available()
+
+    continue_processing.set()
+    assert task_done.wait(timeout=5)
+    worker.shutdown()
+    assert processed_tasks == ['test_task']
+    assert worker.is_available()
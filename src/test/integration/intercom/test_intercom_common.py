@@ -2,6 +2,9 @@ import gc
 import pickle
 import unittest
 from tempfile import TemporaryDirectory
+from threading import Timer
+from time import time
+from unittest import mock
 
 from helperFunctions.entropy import generate_random_data
 from intercom.common_mongo_binding import InterComListener
@@ -26,6 +29,7 @@ class TestInterComListener(unittest.TestCase):
     def tearDown(self):
         for item in self.generic_listener.connections.keys():
             self.generic_listener.client.drop_database(self.generic_listener.connections[item]['name'])
+        self.generic_listener.client.drop_database(self.generic_listener.notification_database)
         self.generic_listener.shutdown()
         gc.collect()
 
@@ -47,3 +51,40 @@ class TestInterComListener(unittest.TestCase):
     def test_big_file(self):
         large_test_data = generate_random_data(size=BSON_MAX_FILE_SIZE + 1024)
         self.check_file(large_test_data)
+
+    def test_wait_for_task_timeout(self):
+        start_time = time()
+        self.assertFalse(self.generic_listener.wait_for_task(0.5))
+        self.assertGreaterEqual(time() - start_time, 0.5)
+
+    def test_wait_for_task(self):
+        if not self.generic_listener.push_notifications:
+            self.skipTest('push notifications are not supported by the storage backend')
+        self.assertIsNone(self.generic_listener.get_next_task())
+        Timer(0.2, self.generic_listener.send_task, args=(self.generic_listener.CONNECTION_TYPE, b'test task')).start()
+        start_time = time()
+        self.assertTrue(self.generic_listener.wait_for_task(10))
+        self.assertLess(time() - start_time, 5, 'listener was not notified')
+        self.assertEqual(self.generic_listener.get_next_task(), b'test task')
+
+    def test_notifications_are_filtered(self):
+        notifications = [{'connection': 'other', 'filename': None}, {'connection': 'test', 'filename': 'other_request_id'}, {'connection': 'test', 'filename': 'request_id'}]
+        cursor = mock.MagicMock(alive=True)
+        cursor.__iter__.side_effect = lambda: iter([notifications.pop(0)] if notifications else [])
+        self.generic_listener.push_notifications = True
+        with mock.patch.object(self.generic_listener, '_open_notification_cursor', return_value=cursor) as open_cursor, \
+                mock.patch.object(self.generic_listener, '_get_notification_collection'):
+            self.generic_listener._get_notification_collection().find_one.return_value = None
+            self.assertTrue(self.generic_listener.wait_for_notification('test', 10, filename='request_id'))
+            self.assertEqual(notifications, [], 'the notifications of other connections and filenames are skipped')
+            self.assertFalse(self.generic_listener.wait_for_notification(['test', 'other'], 0.1))
+        open_cursor.assert_called_once()
+        self.generic_listener.push_notifications = False
+        self.generic_listener._notification_cursor = None
+
+    def test_response_sent_before_waiting(self):
+        if not self.generic_listener.push_notifications:
+            self.skipTest('push notifications are not supported by the storage backend')
+        self.generic_listener.send_task('test', b'response', filename='request_id')
+        self.assertTrue(self.generic_listener.wait_for_notification('test', 10, filename='request_id'))
+        self.assertFalse(self.generic_listener.wait_for_notification('test', 0.1, filename='other_request_id'))
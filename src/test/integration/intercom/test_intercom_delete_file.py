@@ -50,3 +50,9 @@ def test_delete_file_is_locked(mock_listener, monkeypatch):
     monkeypatch.setattr('test.common_helper.DatabaseMock.check_unpacking_lock', lambda self, uid: True)
     mock_listener.post_processing(dict(_id='AnyID'), None)
     assert 'processed by unpacker: AnyID' in LOGGING_OUTPUT
+
+
+def test_delete_file_batch(mock_listener, monkeypatch):
+    monkeypatch.setattr('test.common_helper.DatabaseMock.existence_quick_check', lambda self, uid: uid == 'ExistingID')
+    mock_listener.post_processing(['AnyID', 'ExistingID'], None)
+    assert 'entry exists: ExistingID' in LOGGING_OUTPUT
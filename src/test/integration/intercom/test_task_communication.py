@@ -4,12 +4,16 @@ import unittest
 from tempfile import TemporaryDirectory
 from unittest import mock
 
+from helperFunctions.database import ConnectTo
 from intercom.back_end_binding import (
-    InterComBackEndAnalysisPlugInsPublisher, InterComBackEndAnalysisTask, InterComBackEndCompareTask,
-    InterComBackEndRawDownloadTask, InterComBackEndReAnalyzeTask, InterComBackEndSingleFileTask,
+    InterComBackEndAnalysisPlugInsPublisher, InterComBackEndAnalysisTask, InterComBackEndBinarySearchTask, InterComBackEndCompareTask,
+    InterComBackEndFirmwareBatchTask, InterComBackEndRawDownloadTask, InterComBackEndReAnalyzeTask, InterComBackEndSingleFileTask,
     InterComBackEndTarRepackTask
 )
 from intercom.front_end_binding import InterComFrontEndBinding
+from objects.firmware import Firmware
+from storage.db_interface_frontend import FrontEndDbInterface
+from storage.db_interface_frontend_editing import FrontendEditingDbInterface
 from storage.fs_organizer import FS_Organizer
 from storage.MongoMgr import MongoMgr
 from test.common_helper import create_test_firmware, get_config_for_testing
@@ -60,6 +64,51 @@ class TestInterComTaskCommunication(unittest.TestCase):
         self.assertIsNotNone(task.file_path, 'file_path not set')
         self.assertTrue(os.path.exists(task.file_path), 'file does not exist')
 
+    def test_analysis_task_staged_upload(self):
+        staging_directory = os.path.join(self.tmp_dir.name, 'staging')
+        os.makedirs(staging_directory, exist_ok=True)
+        self.config.set('data_storage', 'upload_staging_directory', staging_directory)
+        self.backend = InterComBackEndAnalysisTask(config=self.config)
+        test_fw = create_test_firmware()
+        staged_file_path = os.path.join(staging_directory, 'fact_upload_test')
+        with open(staged_file_path, 'wb') as staged_file:
+            staged_file.write(test_fw.binary)
+        staged_fw = Firmware(scheduled_analysis=[])
+        staged_fw.uid, staged_fw.file_name, staged_fw.file_path = test_fw.uid, 'test.zip', staged_file_path
+
+        self.frontend.add_analysis_task(staged_fw)
+        task = self.backend.get_next_task()
+        assert task.uid == test_fw.uid
+        assert task.binary == test_fw.binary
+        assert task.file_path == FS_Organizer(config=self.config).generate_path(test_fw)
+        assert not os.path.exists(staged_file_path), 'staged file not moved into the file storage'
+
+    def test_firmware_batch_task(self):
+        import_directory = os.path.join(self.tmp_dir.name, 'import')
+        os.makedirs(import_directory, exist_ok=True)
+        with open(os.path.join(import_directory, 'test.bin'), 'wb') as firmware_file:
+            firmware_file.write(b'test firmware')
+        self.config.set('data_storage', 'firmware_import_directory', import_directory)
+        batch_item = {
+            'file_path': 'test.bin', 'device_name': 'test device', 'device_class': 'test class', 'device_part': 'complete',
+            'version': '1.0', 'vendor': 'test vendor', 'release_date': '1970-01-01', 'requested_analysis_systems': []
+        }
+        with ConnectTo(FrontendEditingDbInterface, self.config) as db_interface:
+            db_interface.add_firmware_batch('batch_id', [{'file_path': 'test.bin', 'status': 'pending'}, {'file_path': 'missing.bin', 'status': 'pending'}])
+        self.backend = InterComBackEndFirmwareBatchTask(config=self.config)
+        self.frontend.add_firmware_batch_task('batch_id', [(0, batch_item), (1, {**batch_item, 'file_path': 'missing.bin'})])
+
+        firmwares = list(self.backend.get_next_task())
+        assert len(firmwares) == 1
+        assert firmwares[0].device_name == 'test device'
+        assert os.path.isfile(firmwares[0].file_path), 'file not stored'
+
+        with ConnectTo(FrontEndDbInterface, self.config) as db_interface:
+            batch = db_interface.get_firmware_batch('batch_id')
+            db_interface.client.drop_database(self.config['data_storage']['main_database'])
+        assert [item['status'] for item in batch] == ['scheduled', 'error']
+        assert batch[0]['uid'] == firmwares[0].uid
+
     def test_single_file_task(self):
         self.backend = InterComBackEndSingleFileTask(config=self.config)
         test_fw = create_test_firmware()
@@ -133,3 +182,36 @@ class TestInterComTaskCommunication(unittest.TestCase):
         self.assertEqual(task, 'valid_uid', 'task not correct')
         result = self.frontend.get_repacked_binary_and_file_name('valid_uid_0.0')
         self.assertEqual(result, (b'test', 'test.tar'), 'retrieved binary not correct')
+
+    @mock.patch('intercom.back_end_binding.YaraBinarySearchScanner')
+    def test_binary_search_task(self, scanner_mock):
+        task = (b'yara rules', 'firmware_uid')
+        request_id = self.frontend.add_binary_search_request(*task)
+
+        def mock_search(_, partial_result_callback=None, is_cancelled=None):
+            partial_result_callback({'rule': ['uid_1']})
+            assert self.frontend.get_binary_search_result(request_id) == ({'rule': ['uid_1']}, task, False)
+            assert not is_cancelled()
+            self.frontend.cancel_binary_search(request_id)
+            assert is_cancelled()
+            return {'rule': ['uid_1', 'uid_2']}
+
+        scanner_mock().get_binary_search_result.side_effect = mock_search
+        self.backend = InterComBackEndBinarySearchTask(config=self.config)
+        self.backend.get_next_task()
+        assert self.frontend.get_binary_search_result(request_id) == ({'rule': ['uid_1', 'uid_2']}, task, True)
+        assert len(list(self.backend.connections['binary_search_task_resp']['fs'].find({'filename': request_id}))) == 1, 'partial result not replaced'
+        assert not self.backend.connections['binary_search_cancel']['fs'].exists(filename=request_id)
+
+    @mock.patch('intercom.back_end_binding.YaraBinarySearchScanner')
+    def test_binary_search_stale_cancel_requests(self, scanner_mock):
+        scanner_mock().get_binary_search_result.return_value = {}
+        finished_id = self.frontend.add_binary_search_request(b'finished rules')
+        self.backend = InterComBackEndBinarySearchTask(config=self.config)
+        self.backend.get_next_task()
+        waiting_id = self.frontend.add_binary_search_request(b'waiting rules')
+        for request_id in [finished_id, waiting_id, 'unknown_id']:
+            self.frontend.cancel_binary_search(request_id)
+
+        self.backend._delete_stale_cancel_requests()  # pylint: disable=protected-access
+        assert self.backend.connections['binary_search_cancel']['fs'].list() == [waiting_id]
@@ -0,0 +1,118 @@
+# pylint: disable=redefined-outer-name
+import gc
+import os
+from tempfile import TemporaryDirectory
+from time import sleep
+
+import pytest
+
+from objects.file import FileObject
+from scheduler.storage_scrubber import StorageScrubber
+from storage.db_interface_backend import BackEndDbInterface
+from storage.fs_organizer import FS_Organizer
+from storage.MongoMgr import MongoMgr
+from test.common_helper import create_test_file_object, get_config_for_testing
+
+TMP_DIR = TemporaryDirectory(prefix='fact_test_')
+
+
+@pytest.fixture(scope='module')
+def config():
+    config = get_config_for_testing(TMP_DIR)
+    config.set('data_storage', 'sanitize_database', 'tmp_sanitize')
+    config.set('data_storage', 'scrubber_interval', '0')
+    config.set('data_storage', 'scrubber_min_age', '0')
+    mongo_server = MongoMgr(config=config)
+    yield config
+    mongo_server.shutdown()
+    TMP_DIR.cleanup()
+
+
+@pytest.fixture
+def backend_interface(config):
+    backend_interface = BackEndDbInterface(config=config)
+    yield backend_interface
+    backend_interface.client.drop_database(config.get('data_storage', 'main_database'))
+    backend_interface.client.drop_database(config.get('data_storage', 'sanitize_database'))
+    backend_interface.shutdown()
+    for file_path in FS_Organizer(config=config).get_stored_files():
+        os.remove(file_path)
+    gc.collect()
+
+
+def test_remove_orphaned_files(config, backend_interface):
+    fs_organizer = FS_Organizer(config=config)
+    test_fo = create_test_file_object()
+    fs_organizer.store_file(test_fo)
+    backend_interface.add_object(test_fo)
+    orphan = FileObject(binary=b'orphan')
+    fs_organizer.store_file(orphan)
+    scrubber = StorageScrubber(config=config)
+
+    report = scrubber.scrub()
+    assert report['orphaned_files'] == 0, 'orphans must only be deleted by the second run'
+    assert report['verified_files'] == 1 and report['corrupted_files'] == 0
+
+    report = scrubber.scrub()
+    assert report['orphaned_files'] == 1
+    assert report['reclaimed_bytes'] == len(b'orphan')
+    assert not os.path.exists(fs_organizer.get_file_path(orphan.uid))
+    assert os.path.isfile(fs_organizer.get_file_path(test_fo.uid))
+
+
+def test_keep_new_orphans(config, backend_interface):
+    config.set('data_storage', 'scrubber_min_age', '1')
+    orphan = FileObject(binary=b'orphan')
+    FS_Organizer(config=config).store_file(orphan)
+    scrubber = StorageScrubber(config=config)
+    config.set('data_storage', 'scrubber_min_age', '0')
+
+    for _ in range(2):
+        assert scrubber.scrub()['orphaned_files'] == 0
+    assert os.path.isfile(orphan.file_path)
+
+
+def test_detect_corrupted_files(config, backend_interface):
+    test_fo = create_test_file_object()
+    FS_Organizer(config=config).store_file(test_fo)
+    backend_interface.add_object(test_fo)
+    with open(test_fo.file_path, 'wb') as stored_file:
+        stored_file.write(b'corrupted')
+
+    report = StorageScrubber(config=config).scrub()
+    assert report['verified_files'] == 1 and report['corrupted_files'] == 1
+    assert os.path.isfile(test_fo.file_path), 'corrupted files must not be deleted'
+
+
+def test_remove_orphaned_sanitized_entries(config, backend_interface):
+    test_fo = create_test_file_object()
+    test_fo.processed_analysis = {'big_plugin': {'result': 'x' * 4096}}
+    backend_interface.add_object(test_fo)
+    test_fo.processed_analysis = {'big_plugin': {'result': 'y' * 4096}}
+    backend_interface.add_object(test_fo)
+    orphan = FileObject(binary=b'orphan')
+    backend_interface.sanitize_fs.put(b'orphaned result', filename='big_plugin_result_{}'.format(orphan.uid))
+    scrubber = StorageScrubber(config=config)
+
+    assert scrubber.scrub()['orphaned_sanitized_entries'] == 0
+    report = scrubber.scrub()
+    assert report['orphaned_sanitized_entries'] == 2, 'the overwritten version and the entry of the unknown object'
+    assert report['reclaimed_bytes'] > len(b'orphaned result')
+    assert len(list(backend_interface.sanitize_fs.find())) == 1
+    assert backend_interface.get_object(test_fo.uid).processed_analysis['big_plugin']['result'] == 'y' * 4096
+
+
+def test_remove_old_versions_of_new_sanitized_entries(config, backend_interface):
+    test_fo = create_test_file_object()
+    test_fo.processed_analysis = {'big_plugin': {'result': 'x' * 4096}}
+    backend_interface.add_object(test_fo)
+    sleep(1.1)
+    test_fo.processed_analysis = {'big_plugin': {'result': 'y' * 4096}}
+    backend_interface.add_object(test_fo)
+    config.set('data_storage', 'scrubber_min_age', str(1 / 3600))
+    scrubber = StorageScrubber(config=config)
+    config.set('data_storage', 'scrubber_min_age', '0')
+
+    scrubber.scrub()
+    assert scrubber.scrub()['orphaned_sanitized_entries'] == 1, 'the old version is removed although the latest one is new'
+    assert backend_interface.get_object(test_fo.uid).processed_analysis['big_plugin']['result'] == 'y' * 4096
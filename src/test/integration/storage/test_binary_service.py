@@ -49,3 +49,11 @@ class TestBinaryService(unittest.TestCase):
         binary, file_name = self.binary_service.get_repacked_binary_and_file_name('invalid_uid')
         self.assertIsNone(binary, 'should be none')
         self.assertIsNone(file_name, 'should be none')
+
+    def test_get_local_file_name_and_path(self):
+        file_name, file_path = self.binary_service.get_local_file_name_and_path(TEST_FW.uid)
+        self.assertEqual(file_name, TEST_FW.file_name, 'file_name not correct')
+        self.assertEqual(file_path, TEST_FW.file_path, 'file_path not correct')
+
+    def test_get_local_file_name_and_path_invalid_uid(self):
+        self.assertEqual(self.binary_service.get_local_file_name_and_path('invalid_uid'), (None, None))
@@ -6,10 +6,12 @@ from os import path
 from tempfile import TemporaryDirectory
 from typing import Set
 
+from helperFunctions.database import ConnectTo
 from objects.file import FileObject
 from objects.firmware import Firmware
 from storage.db_interface_backend import BackEndDbInterface
 from storage.db_interface_common import MongoInterfaceCommon
+from storage.lazy_analysis import LazyAnalysisResult
 from storage.MongoMgr import MongoMgr
 from test.common_helper import create_test_file_object, create_test_firmware, get_config_for_testing, get_test_data_dir
 
@@ -106,6 +108,14 @@ class TestMongoInterface(unittest.TestCase):
         self.assertIn('sum a', tmp.processed_analysis['dummy']['summary'], 'summary of original file not included')
         self.assertIn('file exclusive sum b', tmp.processed_analysis['dummy']['summary'], 'summary of included file not found')
 
+    def test_get_complete_object_including_all_summaries_after_disconnect(self):
+        self.test_firmware.processed_analysis['stub_plugin'] = {'result': 'x' * 1000, 'summary': []}
+        self.db_interface_backend.add_firmware(self.test_firmware)
+        with ConnectTo(MongoInterfaceCommon, self._config) as connection:
+            firmware = connection.get_complete_object_including_all_summaries(self.test_firmware.uid)
+        self.assertNotIsInstance(firmware.processed_analysis['stub_plugin'], LazyAnalysisResult)
+        self.assertEqual(firmware.processed_analysis['stub_plugin']['result'], 'x' * 1000, 'swapped result not loaded before disconnect')
+
     def test_sanitize_analysis(self):
         short_dict = {'stub_plugin': {'result': 0}}
         long_dict = {'stub_plugin': {'result': 10000000000, 'misc': 'Bananarama', 'summary': []}}
@@ -145,6 +155,16 @@ class TestMongoInterface(unittest.TestCase):
         self.assertEqual(retrieved_dict['selected_plugin']['result'], 'This is a test!')
         self.assertIn('file_system_flag', retrieved_dict['other_plugin'])
 
+    def test_retrieve_analysis_lazy(self):
+        self.db_interface.sanitize_fs.put(pickle.dumps('This is a test!'), filename='test_file_path')
+        sanitized_dict = {'stub_plugin': {'result': 'test_file_path', 'summary': ['a'], 'file_system_flag': True}}
+        retrieved_dict = self.db_interface.retrieve_analysis(sanitized_dict, lazy=True)
+        self.assertNotIn('file_system_flag', retrieved_dict['stub_plugin'])
+        self.assertEqual(retrieved_dict['stub_plugin']['summary'], ['a'])
+        self.assertFalse(retrieved_dict['stub_plugin'].fully_loaded)
+        self.assertEqual(retrieved_dict['stub_plugin']['result'], 'This is a test!')
+        self.assertTrue(retrieved_dict['stub_plugin'].fully_loaded)
+
     def test_get_objects_by_uid_list(self):
         self.db_interface_backend.add_firmware(self.test_firmware)
         fo_list = self.db_interface.get_objects_by_uid_list([self.test_firmware.uid])
@@ -272,6 +292,27 @@ class TestSummary(unittest.TestCase):
         self.assertIn(self.test_fo.uid, result_set_fw, 'test file not in result set firmware')
         self.assertIn(self.test_fw.uid, result_set_fw, 'fw not in result set firmware')
 
+    def test_get_set_of_all_included_files_nested(self):
+        self.create_and_add_test_fimrware_and_file_object()
+        child_fo = FileObject(binary=b'nested child')
+        child_fo.virtual_file_path = {self.test_fw.uid: ['|{}|{}|/nested'.format(self.test_fw.uid, self.test_fo.uid)]}
+        self.test_fo.files_included = {child_fo.uid, 'uid not in db'}
+        self.db_interface_backend.add_object(self.test_fo)
+        self.db_interface_backend.add_object(child_fo)
+        result = self.db_interface.get_set_of_all_included_files(self.test_fw)
+        assert result == {self.test_fw.uid, self.test_fo.uid, child_fo.uid}
+
+    def test_get_list_of_all_included_files_of_firmware(self):
+        self.test_fw = create_test_firmware()
+        self.db_interface_backend.add_object(self.test_fw)
+        for binary in [b'child 2', b'child 1']:
+            child = FileObject(binary=binary)
+            child.virtual_file_path = {self.test_fw.uid: ['|{}|/{}'.format(self.test_fw.uid, binary.decode())]}
+            child.parent_firmware_uids = {self.test_fw.uid}
+            self.db_interface_backend.add_object(child)
+        result = self.db_interface.get_list_of_all_included_files(self.test_fw)
+        assert result == sorted([FileObject(binary=b'child 1').uid, FileObject(binary=b'child 2').uid])
+
     def test_get_uids_of_all_included_files(self):
         def add_test_file_to_db_with_parent_uids(uid, parent_uids: Set[str]):
             test_fo = create_test_file_object()
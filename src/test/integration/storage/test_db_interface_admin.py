@@ -8,6 +8,7 @@ from tempfile import TemporaryDirectory
 from intercom.common_mongo_binding import InterComListener
 from storage.db_interface_admin import AdminDbInterface
 from storage.db_interface_backend import BackEndDbInterface
+from storage.db_interface_common import get_split_collection_name
 from storage.MongoMgr import MongoMgr
 from test.common_helper import create_test_file_object, create_test_firmware, get_config_for_testing, get_test_data_dir
 
@@ -62,40 +63,43 @@ class TestStorageDbInterfaceAdmin(unittest.TestCase):
         self.admin_interface.remove_object_field(self.child_uid, 'virtual_file_path.{}'.format(self.uid))
         self.assertNotIn(self.uid, self.db_backend_interface.file_objects.find_one(self.child_uid, {'virtual_file_path': 1})['virtual_file_path'])
 
-    def test_remove_virtual_path_entries_no_other_roots(self):
+    def test_get_included_files_to_delete_and_unlink(self):
+        other_child = create_test_file_object(bin_path='get_files_test/testfile2')
+        other_child.virtual_file_path = {self.uid: ['|{}|/other'.format(self.uid)], 'someuid': ['|someuid|/other']}
+        self.child_fo.files_included = [other_child.uid]
         self.db_backend_interface.add_file_object(self.child_fo)
-        self.assertIn(self.uid, self.db_backend_interface.file_objects.find_one(self.child_uid, {'virtual_file_path': 1})['virtual_file_path'])
-        removed_vps, deleted_files = self.admin_interface._remove_virtual_path_entries(self.uid, self.child_fo.uid)
-        self.assertIsNone(self.db_backend_interface.file_objects.find_one(self.child_uid))
-        self.assertEqual(removed_vps, 0)
-        self.assertEqual(deleted_files, 1)
+        self.db_backend_interface.add_file_object(other_child)
+        to_delete, to_unlink = self.admin_interface._get_included_files_to_delete_and_unlink(self.uid, [self.child_uid])
+        self.assertEqual(to_delete, {self.child_uid})
+        self.assertEqual(to_unlink, {other_child.uid})
 
-    def test_remove_virtual_path_entries_other_roots(self):
+    def test_remove_virtual_path_entries(self):
         self.child_fo.virtual_file_path.update({'someuid': ['|someuid|/some/virtual/path']})
+        self.child_fo.parent_firmware_uids = {self.uid, 'someuid'}
         self.db_backend_interface.add_file_object(self.child_fo)
         self.assertIn(self.uid, self.db_backend_interface.file_objects.find_one(self.child_uid, {'virtual_file_path': 1})['virtual_file_path'])
-        removed_vps, deleted_files = self.admin_interface._remove_virtual_path_entries(self.uid, self.child_fo.uid)
-        self.assertNotIn(self.uid, self.db_backend_interface.file_objects.find_one(self.child_uid, {'virtual_file_path': 1})['virtual_file_path'])
-        self.assertEqual(removed_vps, 1)
-        self.assertEqual(deleted_files, 0)
+        self.admin_interface._remove_virtual_path_entries(self.uid, [self.child_uid])
+        db_entry = self.db_backend_interface.file_objects.find_one(self.child_uid)
+        self.assertNotIn(self.uid, db_entry['virtual_file_path'])
+        self.assertIn('someuid', db_entry['virtual_file_path'])
+        self.assertEqual(db_entry['parent_firmware_uids'], ['someuid'])
 
     def test_delete_swapped_analysis_entries(self):
         self.test_firmware.processed_analysis = {'test_plugin': {'result': 10000000000, 'misc': 'delete_swap_test'}}
         self.db_backend_interface.add_firmware(self.test_firmware)
-        self.admin_interface.client.drop_database(self.config.get('data_storage', 'sanitize_database'))
-        self.admin_interface.sanitize_analysis(self.test_firmware.processed_analysis, self.uid)
         self.assertIn('test_plugin_result_{}'.format(self.test_firmware.uid), self.admin_interface.sanitize_fs.list())
-        self.admin_interface._delete_swapped_analysis_entries(self.admin_interface.firmwares.find_one(self.uid))
+        self.admin_interface._delete_swapped_analysis_entries(self.admin_interface.firmwares, [self.uid])
         self.assertNotIn('test_plugin_result_{}'.format(self.test_firmware.uid), self.admin_interface.sanitize_fs.list())
 
-    def test_delete_file_object(self):
-        self.db_backend_interface.add_file_object(self.child_fo)
-        db_entry = self.db_backend_interface.file_objects.find_one(self.child_fo.uid)
-        self.assertIsNotNone(db_entry)
-        self.admin_interface._delete_file_object(db_entry)
-        self.assertIsNone(self.db_backend_interface.file_objects.find_one(self.child_fo.uid), 'file not deleted from db')
-        delete_tasks = self._get_delete_tasks()
-        self.assertIn(self.child_fo.uid, delete_tasks, 'file not found in delete tasks')
+    def test_get_swapped_analysis_file_names(self):
+        self.test_firmware.processed_analysis = {
+            'test_plugin': {'result': 10000000000, 'misc': 'delete_swap_test'},
+            'small_plugin': {'result': 1}
+        }
+        self.db_backend_interface.add_firmware(self.test_firmware)
+        file_names = self.admin_interface._get_swapped_analysis_file_names(self.admin_interface.firmwares, [self.uid])
+        self.assertIn('test_plugin_result_{}'.format(self.uid), file_names)
+        self.assertFalse(any(name.startswith('small_plugin') for name in file_names))
 
     def test_delete_firmware(self):
         self.db_backend_interface.add_firmware(self.test_firmware)
@@ -116,6 +120,27 @@ class TestStorageDbInterfaceAdmin(unittest.TestCase):
         self.assertIn(self.child_fo.uid, delete_tasks, 'child delete task not found')
         self.assertEqual(len(delete_tasks), 2, 'number of delete tasks not correct')
 
+    def test_delete_firmware_shared_child(self):
+        self.child_fo.virtual_file_path.update({'someuid': ['|someuid|/some/virtual/path']})
+        self.db_backend_interface.add_firmware(self.test_firmware)
+        self.db_backend_interface.add_file_object(self.child_fo)
+        removed_vps, deleted_files = self.admin_interface.delete_firmware(self.uid, delete_root_file=False)
+        self.assertIsNone(self.db_backend_interface.firmwares.find_one(self.uid), 'firmware not deleted from db')
+        self.assertNotIn(self.uid, self.db_backend_interface.file_objects.find_one(self.child_uid)['virtual_file_path'])
+        self.assertEqual(removed_vps, 1)
+        self.assertEqual(deleted_files, 1)
+        self.assertEqual(self._get_delete_tasks(), [])
+
+    def test_delete_firmware_with_split_analysis(self):
+        self.admin_interface.split_analysis_plugins = {'dummy'}
+        self.db_backend_interface.split_analysis_plugins = {'dummy'}
+        self.db_backend_interface.add_firmware(self.test_firmware)
+        self.db_backend_interface.add_file_object(self.child_fo)
+        split_collection = self.admin_interface.main[get_split_collection_name('dummy')]
+        assert split_collection.count_documents({}) == 2
+        self.admin_interface.delete_firmware(self.uid)
+        assert split_collection.count_documents({}) == 0
+
     def _get_delete_tasks(self):
         intercom = InterComListener(config=self.config)
         intercom.CONNECTION_TYPE = 'file_delete_task'
@@ -124,6 +149,6 @@ class TestStorageDbInterfaceAdmin(unittest.TestCase):
             tmp = intercom.get_next_task()
             if tmp is None:
                 break
-            delete_tasks.append(tmp['_id'])
+            delete_tasks.extend(tmp if isinstance(tmp, list) else [tmp['_id']])
         intercom.shutdown()
         return delete_tasks
@@ -1,11 +1,15 @@
+# pylint: disable=protected-access
 import gc
 import unittest
 from os import path
 from tempfile import TemporaryDirectory
 from time import time
+from unittest import mock
 
 from storage.db_interface_backend import BackEndDbInterface
-from storage.db_interface_common import MongoInterfaceCommon
+from storage.db_interface_common import MongoInterfaceCommon, get_split_collection_name
+from storage.existence_filter import ExistenceFilter
+from storage.fs_organizer import FS_Organizer
 from storage.MongoMgr import MongoMgr
 from test.common_helper import create_test_file_object, create_test_firmware, get_config_for_testing, get_test_data_dir
 
@@ -111,6 +115,64 @@ class TestStorageDbInterfaceBackend(unittest.TestCase):
         self.assertEqual(1, received_object.processed_analysis['stub_plugin']['result'])
         self.assertEqual(3, len(received_object.files_included))
 
+    def test_update_object_leaves_unchanged_results_in_place(self):
+        self.test_fo.processed_analysis = {'big_plugin': {'result': 'x' * 4096}, 'small_plugin': {'result': 0}}
+        self.db_interface_backend.add_file_object(self.test_fo)
+        generation = self.db_interface.file_objects.find_one(self.test_fo.uid)['generation']
+        self.test_fo.processed_analysis = {'small_plugin': {'result': 1}}
+        self.db_interface_backend.add_file_object(self.test_fo)
+
+        assert len(list(self.db_interface.sanitize_fs.find({'filename': 'big_plugin_result_{}'.format(self.test_fo.uid)}))) == 1, 'swapped result written again'
+        received_object = self.db_interface.get_object(self.test_fo.uid)
+        assert received_object.processed_analysis['big_plugin']['result'] == 'x' * 4096
+        assert received_object.processed_analysis['small_plugin']['result'] == 1
+        assert self.db_interface.file_objects.find_one(self.test_fo.uid)['generation'] != generation
+
+    def test_update_object_without_changes(self):
+        self.db_interface_backend.add_file_object(self.test_fo)
+        generation = self.db_interface.file_objects.find_one(self.test_fo.uid)['generation']
+        self.db_interface_backend.add_file_object(self.test_fo)
+        assert self.db_interface.file_objects.find_one(self.test_fo.uid)['generation'] == generation, 'unchanged object was updated'
+
+    def test_add_objects(self):
+        self.test_firmware.add_included_file(self.test_fo)
+        self.test_fo.parent_firmware_uids = {self.test_firmware.uid}
+        outcomes = self.db_interface_backend.add_objects([self.test_firmware, self.test_fo, 'invalid object'])
+        assert outcomes == {self.test_firmware.uid: True, self.test_fo.uid: True}
+        assert self.db_interface.get_object(self.test_firmware.uid).vendor == self.test_firmware.vendor
+        assert self.test_firmware.uid in self.db_interface.get_object(self.test_fo.uid).parent_firmware_uids
+        assert self.test_fo.uid in self.db_interface.get_materialized_summary(self.test_firmware.uid, 'dummy')['file exclusive sum b']
+
+    def test_add_objects_updates_stored_objects(self):
+        self.test_fo.processed_analysis = {'other_plugin': {'result': 0}}
+        self.db_interface_backend.add_file_object(self.test_fo)
+        self.test_fo.processed_analysis = {'stub_plugin': {'result': 1}}
+        assert self.db_interface_backend.add_objects([self.test_fo], batch_size=1) == {self.test_fo.uid: True}
+        received_object = self.db_interface.get_object(self.test_fo.uid)
+        assert received_object.processed_analysis['other_plugin']['result'] == 0
+        assert received_object.processed_analysis['stub_plugin']['result'] == 1
+
+    def test_add_objects_with_duplicates(self):
+        second_version = create_test_file_object()
+        second_version.processed_analysis = {'stub_plugin': {'result': 1}}
+        assert self.db_interface_backend.add_objects([self.test_fo, second_version]) == {self.test_fo.uid: True}
+        received_object = self.db_interface.get_object(self.test_fo.uid)
+        assert received_object.processed_analysis['stub_plugin']['result'] == 1
+        assert 'dummy' in received_object.processed_analysis
+
+    def test_add_objects_keeps_locks_of_failed_writes(self):
+        for uid in [self.test_firmware.uid, self.test_fo.uid]:
+            self.db_interface_backend.set_unpacking_lock(uid)
+
+        def bulk_write_objects(collection, operations):
+            return [(fo_fw, None) for fo_fw, _ in operations] if collection.name == self.db_interface_backend.file_objects.name else []
+
+        with mock.patch.object(self.db_interface_backend, '_bulk_write_objects', side_effect=bulk_write_objects):
+            outcomes = self.db_interface_backend.add_objects([self.test_firmware, self.test_fo])
+        assert outcomes == {self.test_firmware.uid: True, self.test_fo.uid: False}
+        assert not self.db_interface_backend.check_unpacking_lock(self.test_firmware.uid)
+        assert self.db_interface_backend.check_unpacking_lock(self.test_fo.uid), 'the object was not written'
+
     def test_add_and_get_object_including_comment(self):
         comment, author, date, uid = 'this is a test comment!', 'author', '1473431685', self.test_fo.uid
         self.test_fo.comments.append(
@@ -183,3 +245,108 @@ class TestStorageDbInterfaceBackend(unittest.TestCase):
 
         with self.assertRaises(AttributeError):
             self.db_interface_backend._update_analysis(dict(), 'dummy', dict())
+
+    def test_materialized_summary(self):
+        self.test_firmware.add_included_file(self.test_fo)
+        self.db_interface_backend.add_object(self.test_firmware)
+        self.db_interface_backend.add_object(self.test_fo)
+        summary = self.db_interface.get_materialized_summary(self.test_firmware.uid, 'dummy')
+        assert summary == {
+            'sum a': sorted([self.test_firmware.uid, self.test_fo.uid]),
+            'fw exclusive sum a': [self.test_firmware.uid],
+            'file exclusive sum b': [self.test_fo.uid]
+        }
+        assert self.db_interface.get_summary(self.test_firmware, 'dummy') == summary
+
+    def test_materialized_summary_is_updated(self):
+        self.test_firmware.add_included_file(self.test_fo)
+        self.db_interface_backend.add_object(self.test_firmware)
+        self.db_interface_backend.add_object(self.test_fo)
+
+        self.test_fo.processed_analysis['dummy'] = {'summary': ['new sum'], 'content': 'new content'}
+        self.db_interface_backend.add_analysis(self.test_fo)
+        summary = self.db_interface.get_materialized_summary(self.test_firmware.uid, 'dummy')
+        assert summary == {'sum a': [self.test_firmware.uid], 'fw exclusive sum a': [self.test_firmware.uid], 'new sum': [self.test_fo.uid]}
+
+    def test_materialized_summary_of_file_added_to_second_firmware(self):
+        self.test_firmware.add_included_file(self.test_fo)
+        self.db_interface_backend.add_object(self.test_firmware)
+        self.db_interface_backend.add_object(self.test_fo)
+
+        second_firmware = create_test_firmware(bin_path='container/test.7z')
+        self.db_interface_backend.add_object(second_firmware)
+        file_object_in_second_firmware = create_test_file_object()
+        file_object_in_second_firmware.processed_analysis = {}
+        second_firmware.add_included_file(file_object_in_second_firmware)
+        self.db_interface_backend.add_object(file_object_in_second_firmware)
+
+        summary = self.db_interface.get_materialized_summary(second_firmware.uid, 'dummy')
+        assert self.test_fo.uid in summary['file exclusive sum b']
+
+    def test_rebuild_summaries(self):
+        self.test_firmware.add_included_file(self.test_fo)
+        self.db_interface_backend.add_object(self.test_firmware)
+        self.db_interface_backend.add_object(self.test_fo)
+        expected_summary = self.db_interface.get_materialized_summary(self.test_firmware.uid, 'dummy')
+        self.db_interface.summaries.delete_many({})
+
+        self.db_interface_backend.rebuild_summaries(self.test_firmware.uid)
+        assert self.db_interface.get_materialized_summary(self.test_firmware.uid, 'dummy') == expected_summary
+
+    def test_existence_filter(self):
+        existence_filter = ExistenceFilter(path.join(TMP_DIR.name, 'existence_filter'))
+        MongoInterfaceCommon._existence_filter = existence_filter
+        try:
+            self.db_interface_backend.add_object(self.test_firmware)
+            self.db_interface_backend.rebuild_existence_filter()
+            assert existence_filter.might_contain(self.test_firmware.uid)
+            assert not existence_filter.might_contain(self.test_fo.uid)
+
+            self.db_interface_backend.add_object(self.test_fo)
+            assert existence_filter.might_contain(self.test_fo.uid)
+            assert self.db_interface.existence_quick_check(self.test_fo.uid)
+            assert not self.db_interface.existence_quick_check('none_existing')
+        finally:
+            existence_filter.close()
+            MongoInterfaceCommon._existence_filter = ExistenceFilter('')
+
+    def test_split_analysis_storage(self):
+        self.db_interface_backend.split_analysis_plugins = {'dummy'}
+        self.db_interface_backend.add_object(self.test_fo)
+        stored_result = self.db_interface.file_objects.find_one(self.test_fo.uid)['processed_analysis']['dummy']
+        assert stored_result == {'summary': ['sum a', 'file exclusive sum b'], 'file_system_flag': False, 'split_storage_uid': self.test_fo.uid}
+        split_entry = self.db_interface.main[get_split_collection_name('dummy')].find_one(self.test_fo.uid)
+        assert split_entry['result']['content'] == 'file abcd'
+
+        fo = self.db_interface.get_object(self.test_fo.uid, analysis_filter=['dummy'])
+        assert fo.processed_analysis['dummy'] == {'summary': ['sum a', 'file exclusive sum b'], 'content': 'file abcd'}
+        assert 'split_storage_uid' in self.db_interface.get_object(self.test_fo.uid, analysis_filter=['file_type']).processed_analysis['dummy']
+
+    def test_migrate_analysis_storage(self):
+        self.db_interface_backend.add_object(self.test_fo)
+        self.db_interface_backend.split_analysis_plugins = {'dummy'}
+        self.db_interface_backend.migrate_analysis_storage()
+        assert 'split_storage_uid' in self.db_interface.file_objects.find_one(self.test_fo.uid)['processed_analysis']['dummy']
+        assert self.db_interface.get_stored_split_analysis_plugins() == {'dummy'}
+        assert self.db_interface.get_object(self.test_fo.uid).processed_analysis['dummy']['content'] == 'file abcd'
+
+        self.db_interface_backend.split_analysis_plugins = set()
+        self.db_interface_backend.migrate_analysis_storage()
+        stored_result = self.db_interface.file_objects.find_one(self.test_fo.uid)['processed_analysis']['dummy']
+        assert stored_result['content'] == 'file abcd'
+        assert 'split_storage_uid' not in stored_result
+        assert self.db_interface.get_stored_split_analysis_plugins() == set()
+
+    def test_get_object_after_rebalance(self):
+        FS_Organizer(config=self._config).store_file(self.test_fo)
+        self.db_interface_backend.add_object(self.test_fo)
+        self._config.set('data_storage', 'file_storage_directory_levels', '2')
+        try:
+            assert FS_Organizer(config=self._config).rebalance()[0] == 1
+            fo = BackEndDbInterface(config=self._config).get_object(self.test_fo.uid)
+            assert fo.uid == self.test_fo.uid
+            assert fo.binary == self.test_fo.binary
+            assert fo.file_path == FS_Organizer(config=self._config).generate_path(self.test_fo)
+        finally:
+            self._config.set('data_storage', 'file_storage_directory_levels', '1')
+            FS_Organizer(config=self._config).rebalance()
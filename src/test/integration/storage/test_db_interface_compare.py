@@ -9,7 +9,7 @@ from storage.db_interface_backend import BackEndDbInterface
 from storage.db_interface_common import MongoInterfaceCommon
 from storage.db_interface_compare import CompareDbInterface, FactCompareException
 from storage.MongoMgr import MongoMgr
-from test.common_helper import create_test_firmware, get_config_for_testing
+from test.common_helper import create_test_file_object, create_test_firmware, get_config_for_testing
 
 
 class TestCompare:
@@ -137,3 +137,12 @@ class TestCompare:
         self.db_interface_compare.add_compare_result(compare_dict)
         exclusive_files = self.db_interface_compare.get_exclusive_files(self.compare_id, root_uid)
         assert exclusive_files == expected_result
+
+    def test_get_ssdeep_hashes(self):
+        file_with_hash, file_without_hash = create_test_file_object(), create_test_file_object(bin_path='get_files_test/testfile2')
+        file_with_hash.processed_analysis['file_hashes'] = {'ssdeep': '3:abc:def'}
+        for file_object in [file_with_hash, file_without_hash]:
+            self.db_interface_backend.add_file_object(file_object)
+
+        ssdeep_hashes = self.db_interface_compare.get_ssdeep_hashes([file_with_hash.uid, file_without_hash.uid, 'unknown_uid'])
+        assert ssdeep_hashes == {file_with_hash.uid: '3:abc:def'}
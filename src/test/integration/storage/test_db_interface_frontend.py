@@ -1,3 +1,4 @@
+# pylint: disable=protected-access
 import gc
 import unittest
 from tempfile import TemporaryDirectory
@@ -6,6 +7,7 @@ from helperFunctions.file_tree import FileTreeNode
 from storage.db_interface_backend import BackEndDbInterface
 from storage.db_interface_frontend import FrontEndDbInterface
 from storage.MongoMgr import MongoMgr
+from storage.object_cache import GenerationCache
 from test.common_helper import create_test_file_object, create_test_firmware, get_config_for_testing, get_test_data_dir
 
 TESTS_DIR = get_test_data_dir()
@@ -202,3 +204,38 @@ class TestStorageDbInterfaceFrontend(unittest.TestCase):
         assert all(set(entry.keys()) == {'_id', 'virtual_file_path'} for entry in result)
         result_uids = [entry['_id'] for entry in result]
         assert all(uid in result_uids for uid in test_uid_list)
+
+    def test_object_cache(self):
+        FrontEndDbInterface._object_cache = GenerationCache(max_size=10)
+        try:
+            self.db_backend_interface.add_firmware(self.test_firmware)
+            assert self.db_frontend_interface.get_object(self.test_firmware.uid).vendor == 'test_vendor'
+            assert len(FrontEndDbInterface._object_cache) == 1
+            cached_object = self.db_frontend_interface.get_object(self.test_firmware.uid)
+            cached_object.vendor = 'changed by caller'
+            assert self.db_frontend_interface.get_object(self.test_firmware.uid).vendor == 'test_vendor', 'cached object was modified'
+
+            self.test_firmware.vendor = 'new_vendor'
+            self.db_backend_interface.add_firmware(self.test_firmware)
+            assert self.db_frontend_interface.get_object(self.test_firmware.uid).vendor == 'new_vendor', 'cache not invalidated'
+            assert self.db_frontend_interface.get_object('none_existing') is None
+        finally:
+            FrontEndDbInterface._object_cache = GenerationCache()
+
+    def test_get_hids(self):
+        FrontEndDbInterface._object_cache = GenerationCache(max_size=10)
+        try:
+            test_fo = create_test_file_object(bin_path='get_files_test/testfile2')
+            test_fo.virtual_file_path = {'b': ['|b|/get_files_test/testfile2']}
+            self.db_backend_interface.add_firmware(self.test_firmware)
+            self.db_backend_interface.add_file_object(test_fo)
+            expected_result = {
+                self.test_firmware.uid: 'test_vendor test_router - 0.1 (Router)',
+                test_fo.uid: '/get_files_test/testfile2',
+                'none_existing': ''
+            }
+            assert self.db_frontend_interface.get_hids(list(expected_result), root_uid='b') == expected_result
+            assert self.db_frontend_interface.get_hids(list(expected_result), root_uid='b') == expected_result
+            assert len(FrontEndDbInterface._object_cache) == 2
+        finally:
+            FrontEndDbInterface._object_cache = GenerationCache()
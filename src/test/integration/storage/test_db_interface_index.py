@@ -0,0 +1,44 @@
+import gc
+
+import pytest
+
+from storage.db_interface_index import IndexDbInterface
+from storage.MongoMgr import MongoMgr
+from test.common_helper import get_config_for_testing
+
+CONFIG = get_config_for_testing()
+
+
+@pytest.fixture(scope='module')
+def index_interface():
+    mongo_server = MongoMgr(config=CONFIG)
+    interface = IndexDbInterface(config=CONFIG)
+    yield interface
+    interface.client.drop_database(CONFIG.get('data_storage', 'main_database'))
+    interface.shutdown()
+    mongo_server.shutdown()
+    gc.collect()
+
+
+def test_create_indexes(index_interface):
+    assert index_interface.create_indexes()
+    assert 'parent_firmware_uids_1' in index_interface.file_objects.index_information()
+    assert 'uid_1' in index_interface.locks.index_information()
+    assert index_interface.create_indexes(), 'creating existing indexes should not fail'
+
+
+def test_audit_query_plans(index_interface):
+    index_interface.create_indexes()
+    assert index_interface.audit_query_plans() == []
+
+
+def test_audit_detects_collection_scan(index_interface):
+    index_interface.create_indexes()
+    index_interface.locks.drop_indexes()
+    collection_scans = index_interface.audit_query_plans()
+    assert [(description, collection) for description, collection, _ in collection_scans] == [('unpacking lock', 'locks')]
+
+
+def test_get_plan_stages():
+    plan = {'stage': 'FETCH', 'inputStage': {'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}}
+    assert IndexDbInterface._get_plan_stages(plan) == ['FETCH', 'OR', 'IXSCAN', 'COLLSCAN']  # pylint: disable=protected-access
@@ -1,10 +1,13 @@
 import logging
 import os
+import shutil
+import subprocess
 from pathlib import Path
 
 import pytest
+import yara
 
-from analysis.YaraPluginBase import YaraBasePlugin, _parse_meta_data, _split_output_in_rules_and_matches
+from analysis.YaraPluginBase import YaraBasePlugin, _convert_matches_to_result, _parse_meta_data, _split_output_in_rules_and_matches
 from helperFunctions.fileSystem import get_src_dir
 from objects.file import FileObject
 from test.common_helper import get_test_data_dir
@@ -12,6 +15,35 @@ from test.unit.analysis.analysis_plugin_test_class import AnalysisPluginTest
 
 YARA_TEST_OUTPUT = Path(get_test_data_dir(), 'yara_matches').read_text()
 
+EQUIVALENCE_TEST_RULES = '''
+rule testRule
+{
+    meta:
+        software_name = "Test Software"
+        open_source = false
+        version = 2
+    strings:
+        $a = /test(\\d+\\.\\d+\\.\\d+)?/ nocase ascii wide
+        $b = "blah"
+    condition:
+        any of them
+}
+rule noMatch
+{
+    strings:
+        $a = "not in the file"
+    condition:
+        $a
+}
+'''
+EQUIVALENCE_TEST_BINARY = b'This is a Testblubblah\nT\x00E\x00S\x00T\x001\x00.\x002\x00.\x003\x00\n'
+EQUIVALENCE_TEST_CLI_OUTPUT = (  # output of yara 3.7.1 with --print-meta --print-strings
+    'testRule [software_name="Test Software",open_source=false,version=2] /tmp/test_file\n'
+    '0xa:$a: Test\n'
+    '0x17:$a: T\\x00E\\x00S\\x00T\\x001\\x00.\\x002\\x00.\\x003\\x00\n'
+    '0x12:$b: blah\n'
+)
+
 
 class TestAnalysisYaraBasePlugin(AnalysisPluginTest):
 
@@ -36,6 +68,18 @@ class TestAnalysisYaraBasePlugin(AnalysisPluginTest):
         self.assertTrue('testRule' in results, 'testRule match not found')
         self.assertEqual(results['summary'], ['testRule'])
 
+    def test_process_object_from_binary(self):
+        test_file = FileObject(binary=b'This is a Testblubblah')
+        processed_file = self.analysis_plugin.process_object(test_file)
+        assert processed_file.processed_analysis[self.PLUGIN_NAME]['testRule']['strings'] == [(10, '$a', b'Test')]
+
+    def test_compiled_rules_are_cached(self):
+        compiled_rules = self.analysis_plugin._get_compiled_rules()
+        assert self.analysis_plugin._get_compiled_rules() is compiled_rules
+
+        self.analysis_plugin._compiled_rules_mtime = 0
+        assert self.analysis_plugin._get_compiled_rules() is not compiled_rules, 'rules should be reloaded if the signature file changed'
+
     def test_process_object_nothing_found(self):
         test_file = FileObject(file_path=os.path.join(get_test_data_dir(), 'zero_byte'))
         test_file.processed_analysis.update({self.PLUGIN_NAME: []})
@@ -69,3 +113,21 @@ def test_split_output_uneven():
     uneven_yara_output = 'rule1 [meta=0,data=1] /path\n0x0:$a1: AA BB \nrule2 [meta=0,data=1] /path\n'
     with pytest.raises(ValueError):
         _split_output_in_rules_and_matches(uneven_yara_output)
+
+
+def test_in_process_matches_equal_command_line_output():
+    rules = yara.compile(source=EQUIVALENCE_TEST_RULES)
+    result = _convert_matches_to_result(rules.match(data=EQUIVALENCE_TEST_BINARY))
+    assert result == YaraBasePlugin._parse_yara_output(EQUIVALENCE_TEST_CLI_OUTPUT)
+    assert result['testRule']['meta'] == {'software_name': 'Test Software', 'open_source': False, 'version': '2'}
+
+
+@pytest.mark.skipif(shutil.which('yara') is None, reason='yara command line tool not installed')
+def test_in_process_matches_equal_installed_command_line_tool(tmpdir):
+    rule_file, test_file = Path(str(tmpdir), 'test.yara'), Path(str(tmpdir), 'test_file')
+    rule_file.write_text(EQUIVALENCE_TEST_RULES)
+    test_file.write_bytes(EQUIVALENCE_TEST_BINARY)
+    cli_output = subprocess.run(['yara', '--print-meta', '--print-strings', str(rule_file), str(test_file)], stdout=subprocess.PIPE, check=True).stdout.decode()
+
+    result = _convert_matches_to_result(yara.compile(filepath=str(rule_file)).match(data=EQUIVALENCE_TEST_BINARY))
+    assert result == YaraBasePlugin._parse_yara_output(cli_output)
@@ -31,8 +31,8 @@ class MockDbInterface(object):
         else:
             return self.fo
 
-    def get_ssdeep_hash(self, uid):
-        return ''
+    def get_ssdeep_hashes(self, uids):
+        return {}
 
 
 class TestCompare(unittest.TestCase):
@@ -1,5 +1,7 @@
+import pytest
+
 from helperFunctions import merge_generators
-from helperFunctions.merge_generators import sum_up_lists
+from helperFunctions.merge_generators import chunks, sum_up_lists
 
 
 class TestHelperFunctionsMergeGenerators:  # pylint: disable=no-self-use
@@ -22,3 +24,13 @@ class TestHelperFunctionsMergeGenerators:  # pylint: disable=no-self-use
         assert ['a', 1] in result
         assert ['b', 6] in result
         assert ['c', 3] in result
+
+
+@pytest.mark.parametrize('input_data, chunk_size, expected', [
+    ([], 2, []),
+    ([1, 2, 3], 2, [[1, 2], [3]]),
+    (range(4), 2, [[0, 1], [2, 3]]),
+    ({'a'}, 5, [['a']]),
+])
+def test_chunks(input_data, chunk_size, expected):
+    assert list(chunks(input_data, chunk_size)) == expected
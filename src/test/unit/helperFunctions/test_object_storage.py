@@ -2,7 +2,9 @@ from copy import deepcopy
 
 import pytest
 
-from helperFunctions.object_storage import update_analysis_tags, update_included_files, update_virtual_file_path
+from helperFunctions.object_storage import (
+    get_analysis_tag_updates, get_new_included_files, get_virtual_file_path_updates, update_analysis_tags
+)
 from test.common_helper import TEST_TEXT_FILE
 
 
@@ -34,29 +36,31 @@ def test_update_analysis_tags_overwrite(mutable_test_file, mongo_entry):
     assert analysis_tags['existing_tag'] == 'overwrite'
 
 
-def test_update_included_files_normal(mutable_test_file, mongo_entry):
-    mutable_test_file.files_included = ['i', 'like', 'files']
-    files_included = update_included_files(mutable_test_file, mongo_entry)
-    assert len(files_included) == 5
-    assert all(name in files_included for name in ['i', 'like', 'files', 'legacy_file', 'duplicated_entry'])
+def test_get_analysis_tag_updates(mutable_test_file, mongo_entry):
+    mutable_test_file.analysis_tags = {'new_tag': 'hurray', 'existing_tag': 'foobar'}
+    assert get_analysis_tag_updates(mutable_test_file, mongo_entry) == {'analysis_tags.new_tag': 'hurray'}
 
 
-def test_update_included_files_duplicate(mutable_test_file, mongo_entry):
+def test_get_analysis_tag_updates_no_tags_in_db(mutable_test_file):
+    mutable_test_file.analysis_tags = {'new_tag': 'hurray'}
+    assert get_analysis_tag_updates(mutable_test_file, {}) == {'analysis_tags.new_tag': 'hurray'}
+
+
+def test_get_new_included_files(mutable_test_file, mongo_entry):
     mutable_test_file.files_included = ['beware', 'the', 'duplicated_entry']
-    files_included = update_included_files(mutable_test_file, mongo_entry)
-    assert len(files_included) == 4
-    assert all(name in files_included for name in ['legacy_file', 'beware', 'the', 'duplicated_entry'])
+    assert get_new_included_files(mutable_test_file, mongo_entry) == ['beware', 'the']
+
+
+def test_get_new_included_files_nothing_new(mutable_test_file, mongo_entry):
+    mutable_test_file.files_included = ['legacy_file']
+    assert get_new_included_files(mutable_test_file, mongo_entry) == []
 
 
-def test_update_virtual_file_path_normal(mutable_test_file, mongo_entry):
-    mutable_test_file.virtual_file_path = {'new': 'new|path|in|another|object'}
-    virtual_file_path = update_virtual_file_path(mutable_test_file, mongo_entry)
-    assert len(virtual_file_path.keys()) == 2
-    assert all(root in virtual_file_path for root in ['any', 'new'])
+def test_get_virtual_file_path_updates(mutable_test_file, mongo_entry):
+    mutable_test_file.virtual_file_path = {'new': 'new|path|in|another|object', 'any': 'any|virtual|path'}
+    assert get_virtual_file_path_updates(mutable_test_file, mongo_entry) == {'virtual_file_path.new': 'new|path|in|another|object'}
 
 
-def test_update_virtual_file_path_overwrite(mutable_test_file, mongo_entry):
+def test_get_virtual_file_path_updates_overwrite(mutable_test_file, mongo_entry):
     mutable_test_file.virtual_file_path = {'any': 'new|path|from|better|unpacker'}
-    virtual_file_path = update_virtual_file_path(mutable_test_file, mongo_entry)
-    assert len(virtual_file_path.keys()) == 1
-    assert virtual_file_path['any'] == 'new|path|from|better|unpacker'
+    assert get_virtual_file_path_updates(mutable_test_file, mongo_entry) == {'virtual_file_path.any': 'new|path|from|better|unpacker'}
@@ -1,9 +1,18 @@
+import hashlib
+import re
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from os import path
-from subprocess import CalledProcessError
-from unittest.mock import patch
+from threading import Event
+from unittest.mock import Mock, patch
+
+import yara
 
 from helperFunctions import yara_binary_search
+from helperFunctions.yara_rule_literals import get_literal_groups
+from objects.file import FileObject
+from storage.fs_organizer import FS_Organizer
 from test.common_helper import get_config_for_testing, get_test_data_dir
 
 TEST_FILE_1 = 'binary_search_test'
@@ -30,8 +39,8 @@ def mock_connect_to_enter(_, config=None):
     return yara_binary_search.YaraBinarySearchScannerDbInterface(config)
 
 
-def mock_check_output(call, shell=True, stderr=None):
-    raise CalledProcessError(1, call, b'', stderr)
+def mock_scan_shard(compiled_rules, paths):
+    raise yara.Error('could not open file')
 
 
 class TestHelperFunctionsYaraBinarySearch(unittest.TestCase):
@@ -40,9 +49,12 @@ class TestHelperFunctionsYaraBinarySearch(unittest.TestCase):
         yara_binary_search.YaraBinarySearchScannerDbInterface.__bases__ = (MockCommonDbInterface,)
         yara_binary_search.ConnectTo.__enter__ = mock_connect_to_enter
         yara_binary_search.ConnectTo.__exit__ = lambda _, __, ___, ____: None
+        uid_pattern_patch = patch('storage.fs_organizer.UID_PATTERN', re.compile(r'binary_search_test'))  # the test files are not named by uid
+        uid_pattern_patch.start()
+        self.addCleanup(uid_pattern_patch.stop)
         self.yara_rule = b'rule test_rule {strings: $a = "test1234" condition: $a}'
         test_path = path.join(get_test_data_dir(), TEST_FILE_1)
-        test_config = {'data_storage': {'firmware_file_storage_directory': test_path}}
+        test_config = {'data_storage': {'firmware_file_storage_directory': test_path}, 'ExpertSettings': {'binary_search_workers': '2'}}
         self.yara_binary_scanner = yara_binary_search.YaraBinarySearchScanner(test_config)
 
     def test_get_binary_search_result(self):
@@ -62,34 +74,73 @@ class TestHelperFunctionsYaraBinarySearch(unittest.TestCase):
         assert isinstance(result, str)
         assert 'There seems to be an error in the rule file' in result
 
-    @patch('helperFunctions.yara_binary_search.execute_shell_command', side_effect=mock_check_output)
+    @patch('helperFunctions.yara_binary_search.ProcessPoolExecutor', lambda max_workers, **_: ThreadPoolExecutor(max_workers))
+    @patch('helperFunctions.yara_binary_search._scan_shard', side_effect=mock_scan_shard)
     def test_get_binary_search_yara_error(self, _):
         result = self.yara_binary_scanner.get_binary_search_result((self.yara_rule, None))
         assert isinstance(result, str)
         assert 'Error when calling YARA' in result
 
-    def test_eliminate_duplicates(self):
-        test_dict = {1: [1, 2, 3, 3], 2: [1, 1, 2, 3]}
-        self.yara_binary_scanner._eliminate_duplicates(test_dict)
-        self.assertEqual(test_dict, {1: [1, 2, 3], 2: [1, 2, 3]})
+    def test_get_binary_search_result_multiple_rules(self):
+        yara_rules = b'rule test_rule {strings: $a = "test1234" condition: $a} rule test_rule_2 {strings: $a = "TEST_STRING!" condition: $a}'
+        result = self.yara_binary_scanner.get_binary_search_result((yara_rules, None))
+        assert result == {'test_rule': [TEST_FILE_1], 'test_rule_2': [TEST_FILE_2]}
+
+    def test_get_shards(self):
+        shards = list(self.yara_binary_scanner._get_shards(None))
+        assert [sorted(path.basename(file_path) for file_path in shard) for shard in shards] == [[TEST_FILE_1, TEST_FILE_2, TEST_FILE_3]], 'shards of FILES_PER_SHARD files'
+
+        shards = list(self.yara_binary_scanner._get_shards('single_firmware'))
+        assert [[path.basename(file_path) for file_path in shard] for shard in shards] == [[TEST_FILE_2], [TEST_FILE_3]], 'one shard per worker'
+
+    def test_get_shard_size(self):
+        assert self.yara_binary_scanner._get_shard_size(0) == 1
+        assert self.yara_binary_scanner._get_shard_size(3) == 2
+        assert self.yara_binary_scanner._get_shard_size(20000) == yara_binary_search.FILES_PER_SHARD
+
+    def test_partial_results(self):
+        partial_results = []
+        with patch('helperFunctions.yara_binary_search.PARTIAL_RESULT_INTERVAL', 0):
+            result = self.yara_binary_scanner.get_binary_search_result((self.yara_rule, None), partial_result_callback=partial_results.append)
+        assert result == {'test_rule': [TEST_FILE_1]}
+        assert len(partial_results) <= 1, 'no partial result after the last shard'
+        assert all(set(partial_result).issubset({'test_rule'}) for partial_result in partial_results)
+
+    def test_cancel_search(self):
+        result = self.yara_binary_scanner.get_binary_search_result((self.yara_rule, None), is_cancelled=lambda: True)
+        assert result == {}
+
+    def test_scan_shard(self):
+        compiled_rules = yara_binary_search._compile_rules(b'rule test_rule_2 {strings: $a = "TEST_STRING!" condition: $a}')
+        paths = [path.join(get_test_data_dir(), TEST_FILE_1, 'bi', file_name) for file_name in [TEST_FILE_2, TEST_FILE_3, 'not_existing']]
+        assert yara_binary_search._scan_shard(compiled_rules, paths) == ({'test_rule_2': {TEST_FILE_2}}, 0), 'a missing file is no error'
+
+    def test_scan_shard_error(self):
+        compiled_rules = yara_binary_search._compile_rules(b'rule test_rule_2 {strings: $a = "TEST_STRING!" condition: $a}')
+        paths = [path.join(get_test_data_dir(), TEST_FILE_1, 'bi', file_name) for file_name in [TEST_FILE_2, TEST_FILE_3]]
+        rules = yara.load(file=BytesIO(compiled_rules))
+        with patch('helperFunctions.yara_binary_search._load_rules', return_value=Mock(match=Mock(side_effect=[rules.match(paths[0]), yara.Error('could not map file')]))):
+            assert yara_binary_search._scan_shard(compiled_rules, paths) == ({'test_rule_2': {TEST_FILE_2}}, 1)
 
-    def test_parse_raw_result(self):
-        raw_result = 'rule_1 match_1\nrule_1 match_2\nrule_2 match_1'
-        result = self.yara_binary_scanner._parse_raw_result(raw_result)
-        self.assertEqual(result, {'rule_1': ['match_1', 'match_2'], 'rule_2': ['match_1']})
+    def test_scan_shard_cancelled(self):
+        compiled_rules = yara_binary_search._compile_rules(b'rule test_rule_2 {strings: $a = "TEST_STRING!" condition: $a}')
+        cancel_event = Event()
+        cancel_event.set()
+        with patch('helperFunctions.yara_binary_search._cancel_event', cancel_event):
+            result = yara_binary_search._scan_shard(compiled_rules, [path.join(get_test_data_dir(), TEST_FILE_1, 'bi', TEST_FILE_2)])
+        assert result == ({}, 0), 'the remaining files of the shard are not scanned'
 
-    def test_execute_yara_search(self):
-        test_rule_path = path.join(get_test_data_dir(), 'yara_binary_search_test_rule')
-        result = self.yara_binary_scanner._execute_yara_search(test_rule_path)
-        self.assertTrue('test_rule' in result)
+    def test_get_valid_cached_results(self):
+        cached_result = {'rule_1': [TEST_FILE_2, 'deleted_uid'], 'rule_2': ['deleted_uid']}
+        assert self.yara_binary_scanner._get_valid_cached_results(cached_result, None) == {'rule_1': {TEST_FILE_2}}
 
-    def test_execute_yara_search_for_single_file(self):
-        test_rule_path = path.join(get_test_data_dir(), 'yara_binary_search_test_rule')
-        result = self.yara_binary_scanner._execute_yara_search(
-            test_rule_path,
-            target_path=path.join(get_test_data_dir(), TEST_FILE_1, TEST_FILE_1)
-        )
-        self.assertTrue('test_rule' in result)
+        cached_result = {'rule_1': [TEST_FILE_1, TEST_FILE_2]}
+        assert self.yara_binary_scanner._get_valid_cached_results(cached_result, 'single_firmware') == {'rule_1': {TEST_FILE_2}}, 'not included'
+
+    def test_merge_results(self):
+        results = {'rule_1': {'uid_1'}}
+        yara_binary_search._merge_results(results, {'rule_1': {'uid_1', 'uid_2'}, 'rule_2': {'uid_1'}})
+        assert results == {'rule_1': {'uid_1', 'uid_2'}, 'rule_2': {'uid_1'}}
 
 
 class TestYaraBinarySearchScannerDbInterface(unittest.TestCase):
@@ -106,3 +157,70 @@ class TestYaraBinarySearchScannerDbInterface(unittest.TestCase):
         assert len(result) == 2
         assert path.basename(result[0]) == TEST_FILE_2
         assert path.basename(result[1]) == TEST_FILE_3
+
+
+def test_binary_search_with_index(tmpdir):
+    config = {
+        'data_storage': {'firmware_file_storage_directory': str(tmpdir.join('storage')), 'binary_search_index_directory': str(tmpdir.join('index'))},
+        'ExpertSettings': {'binary_search_workers': '2'}
+    }
+    fs_organizer = FS_Organizer(config)
+    matching_file, other_file = FileObject(binary=b'foo test1234 bar'), FileObject(binary=b'something else')
+    for file_object in [matching_file, other_file]:
+        fs_organizer.store_file(file_object)
+    fs_organizer.binary_search_index.update()
+    not_indexed_file = FileObject(binary=b'stored later test1234')
+    fs_organizer.store_file(not_indexed_file)
+    scanner = yara_binary_search.YaraBinarySearchScanner(config)
+    yara_rule = b'rule test_rule {strings: $a = "test1234" condition: $a}'
+
+    shards = list(scanner._get_shards(None, get_literal_groups(yara_rule.decode())))
+    assert sorted(path.basename(file_path) for shard in shards for file_path in shard) == sorted([matching_file.uid, not_indexed_file.uid])
+    assert scanner.get_binary_search_result((yara_rule, None)) == {'test_rule': sorted([matching_file.uid, not_indexed_file.uid])}
+
+    shards = list(scanner._get_shards(None, get_literal_groups('rule test_rule {strings: $a = /test[0-9]+/ condition: $a}')))
+    assert len([file_path for shard in shards for file_path in shard]) == 3, 'full scan without literals'
+
+
+def test_binary_search_with_cache(tmpdir):
+    config = {
+        'data_storage': {'firmware_file_storage_directory': str(tmpdir.join('storage')), 'binary_search_cache_directory': str(tmpdir.join('cache'))},
+        'ExpertSettings': {'binary_search_workers': '2'}
+    }
+    fs_organizer = FS_Organizer(config)
+    first_file, deleted_file = FileObject(binary=b'foo test1234 bar'), FileObject(binary=b'test1234 will be deleted')
+    for file_object in [first_file, deleted_file, FileObject(binary=b'something else')]:
+        fs_organizer.store_file(file_object)
+    scanner = yara_binary_search.YaraBinarySearchScanner(config)
+    yara_rule = b'rule test_rule {strings: $a = "test1234" condition: $a}'
+    assert scanner.get_binary_search_result((yara_rule, None)) == {'test_rule': sorted([first_file.uid, deleted_file.uid])}
+
+    new_file = FileObject(binary=b'stored later test1234')
+    fs_organizer.store_file(new_file)
+    fs_organizer.delete_file(deleted_file.uid)
+    _, cached_generation = scanner.binary_search_cache.get_result(hashlib.sha256(yara_binary_search._compile_rules(yara_rule)).hexdigest(), None)
+    shards = list(scanner._get_shards(None, stored_since=cached_generation))
+    assert [path.basename(file_path) for shard in shards for file_path in shard] == [new_file.uid], 'only the new file is scanned'
+
+    equivalent_rule = b'rule test_rule {\n  strings:\n    $a = "test1234"  // comment\n  condition:\n    $a\n}'
+    assert scanner.get_binary_search_result((equivalent_rule, None)) == {'test_rule': sorted([first_file.uid, new_file.uid])}
+    assert scanner.get_binary_search_result((yara_rule, None), is_cancelled=lambda: True) == {'test_rule': sorted([first_file.uid, new_file.uid])}
+
+    with patch.object(scanner.binary_search_cache, 'get_uids_stored_since', return_value=None):
+        shards = list(scanner._get_shards(None, stored_since=cached_generation))
+    assert len([file_path for shard in shards for file_path in shard]) == 3, 'all files are scanned if the journal was pruned in the meantime'
+
+
+@patch('helperFunctions.yara_binary_search.ProcessPoolExecutor', lambda max_workers, **_: ThreadPoolExecutor(max_workers))
+def test_binary_search_with_errors_is_not_cached(tmpdir):
+    config = {
+        'data_storage': {'firmware_file_storage_directory': str(tmpdir.join('storage')), 'binary_search_cache_directory': str(tmpdir.join('cache'))},
+        'ExpertSettings': {'binary_search_workers': '2'}
+    }
+    matching_file = FileObject(binary=b'foo test1234 bar')
+    FS_Organizer(config).store_file(matching_file)
+    scanner = yara_binary_search.YaraBinarySearchScanner(config)
+    yara_rule = b'rule test_rule {strings: $a = "test1234" condition: $a}'
+    with patch('helperFunctions.yara_binary_search._scan_shard', return_value=({'test_rule': {matching_file.uid}}, 1)):
+        assert scanner.get_binary_search_result((yara_rule, None)) == {'test_rule': [matching_file.uid]}
+    assert scanner.binary_search_cache.get_result(hashlib.sha256(yara_binary_search._compile_rules(yara_rule)).hexdigest(), None) == (None, None)
@@ -0,0 +1,41 @@
+import pytest
+
+from helperFunctions.yara_rule_literals import get_literal_groups
+
+
+@pytest.mark.parametrize('rules, expected_groups', [
+    ('rule test {strings: $a = "foobar" condition: $a}', [[b'foobar']]),
+    ('rule test {strings: $a = "foo\\"bar\\x00" $b = "test" condition: any of them}', [[b'foo"bar\x00'], [b'test']]),
+    ('rule test {strings: $a = "foo" wide condition: $a}', [[b'f\x00o\x00o\x00']]),
+    ('rule test {strings: $a = "foo" ascii wide fullword condition: $a}', [[b'foo'], [b'f\x00o\x00o\x00']]),
+    ('rule test {strings: $a = { 30 82 ?? ?? 02 01 00 [2-4] AA BB CC DD } condition: $a}', [[b'\x02\x01\x00', b'\xaa\xbb\xcc\xdd']]),
+    (
+        'private rule test_1 : tag {meta: author = "rule condition: true" strings: $a = "foo" condition: $a} '
+        'rule test_2 {strings: $b1 = "bar" $b2 = "baz" condition: ($b1 and $b2) or all of ($b*)}',
+        [[b'foo'], [b'bar'], [b'baz']]
+    ),
+    ('rule test { // comment\n strings: /* other comment */ $a = "http://foo" condition: $a}', [[b'http://foo']]),
+])
+def test_get_literal_groups(rules, expected_groups):
+    assert get_literal_groups(rules) == expected_groups
+
+
+@pytest.mark.parametrize('rules', [
+    'rule test {strings: $a = /foo[0-9]+/ condition: $a}',
+    'rule test {strings: $a = "foobar" nocase condition: $a}',
+    'rule test {strings: $a = "foobar" xor condition: $a}',
+    'rule test {strings: $a = "fo" condition: $a}',
+    'rule test {strings: $a = { 30 82 ?? ?? 02 01 } condition: $a}',
+    'rule test {strings: $a = { 30 82 ( 01 02 03 | 04 05 06 ) } condition: $a}',
+    'rule test {strings: $a = "foobar" condition: not $a}',
+    'rule test {strings: $a = "foobar" condition: $a or filesize < 100}',
+    'rule test {strings: $a = "foobar" condition: #a > 2}',
+    'rule test {condition: true}',
+    'rule test_1 {strings: $a = "foobar" condition: $a} rule test_2 {condition: test_1}',
+    'import "pe" rule test {strings: $a = "foobar" condition: $a}',
+    'global rule test {strings: $a = "foobar" condition: $a}',
+    'rule test {strings: $a = "foobar',
+    '',
+])
+def test_get_literal_groups_not_indexable(rules):
+    assert get_literal_groups(rules) is None
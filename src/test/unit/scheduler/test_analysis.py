@@ -102,6 +102,17 @@ class TestScheduleInitialAnalysis(AnalysisSchedulerTest):
             self.sched.process_next_analysis(test_fw)
             assert not spy.was_called(), 'unknown plugin should simply be skipped'
 
+    def test_process_next_analyses_bulk_pre_analysis(self):
+        test_objects = [Firmware(file_path=os.path.join(get_test_data_dir(), 'get_files_test/{}'.format(name))) for name in ['testfile1', 'testfile2']]
+        for test_object in test_objects:
+            test_object.scheduled_analysis = ['unknown_plugin']
+        self.sched._bulk_pre_analysis = True
+        stored_objects = []
+        with mock_patch(self.mocked_interface, 'add_objects', stored_objects.extend):
+            self.sched.process_next_analyses(test_objects)
+        assert stored_objects == test_objects
+        assert all(test_object.scheduled_analysis == [] for test_object in test_objects)
+
     def test_skip_analysis_because_whitelist(self):
         self.sched.config.set('dummy_plugin_for_testing_only', 'mime_whitelist', 'foo, bar')
         test_fw = Firmware(file_path=os.path.join(get_test_data_dir(), 'get_files_test/testfile1'))
@@ -0,0 +1,45 @@
+import sqlite3
+from unittest import mock
+
+from objects.file import FileObject
+from scheduler.binary_search_indexer import BinarySearchIndexer
+from storage.fs_organizer import FS_Organizer
+
+
+def _get_config(tmpdir, index_directory):
+    return {'data_storage': {'firmware_file_storage_directory': str(tmpdir.join('storage')), 'binary_search_index_directory': index_directory}}
+
+
+def test_indexer_is_disabled(tmpdir):
+    indexer = BinarySearchIndexer(config=_get_config(tmpdir, ''))
+    assert indexer.indexer_process is None
+    indexer.shutdown()
+
+
+def test_update(tmpdir):
+    config = _get_config(tmpdir, str(tmpdir.join('index')))
+    fs_organizer = FS_Organizer(config)
+    file_object = FileObject(binary=b'foobar')
+    fs_organizer.store_file(file_object)
+
+    with mock.patch.object(fs_organizer.binary_search_index, 'update', side_effect=sqlite3.OperationalError('database is locked')):
+        assert BinarySearchIndexer.update(fs_organizer.binary_search_index) == 0
+    assert BinarySearchIndexer.update(fs_organizer.binary_search_index) == 1
+    assert fs_organizer.binary_search_index.get_candidate_uids([[b'foobar']]) == {file_object.uid}
+
+
+def test_indexer_process(tmpdir):
+    config = _get_config(tmpdir, str(tmpdir.join('index')))
+    fs_organizer = FS_Organizer(config)
+    file_object = FileObject(binary=b'foobar')
+    fs_organizer.store_file(file_object)
+
+    indexer = BinarySearchIndexer(config=config)
+    try:
+        for _ in range(50):
+            if fs_organizer.binary_search_index.get_indexed_uids([file_object.uid]):
+                break
+            indexer.indexer_process.join(0.1)
+        assert fs_organizer.binary_search_index.get_indexed_uids([file_object.uid]) == {file_object.uid}
+    finally:
+        indexer.shutdown()
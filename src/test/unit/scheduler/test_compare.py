@@ -26,7 +26,7 @@ class MockDbInterface:
         if not compare_id == 'existing_id':
             raise FactCompareException('{} not found in database'.format(compare_id))
 
-    def get_complete_object_including_all_summaries(self, uid):
+    def get_complete_object_including_all_summaries(self, uid, lazy=False):
         if uid == self.test_object.uid:
             return self.test_object
 
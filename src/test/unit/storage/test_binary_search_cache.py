@@ -0,0 +1,92 @@
+# pylint: disable=redefined-outer-name
+from unittest import mock
+
+import pytest
+
+from storage import binary_search_cache
+from storage.binary_search_cache import BinarySearchCache, get_binary_search_cache
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return BinarySearchCache(str(tmpdir.join('cache')))
+
+
+def test_generation(cache):
+    assert cache.get_generation() == 0
+    cache.add_file('uid_1')
+    generation = cache.get_generation()
+    cache.add_file('uid_2')
+    cache.add_file('uid_3')
+    assert cache.get_generation() == generation + 2
+    assert cache.get_uids_stored_since(generation) == {'uid_2', 'uid_3'}
+    assert cache.get_uids_stored_since(0) == {'uid_1', 'uid_2', 'uid_3'}
+
+
+def test_get_and_put_result(cache):
+    assert cache.get_result('rules_hash', None) == (None, None)
+    cache.put_result('rules_hash', None, 3, {'rule': ['uid_1']})
+    cache.put_result('rules_hash', 'firmware_uid', 5, {})
+
+    assert cache.get_result('rules_hash', None) == ({'rule': ['uid_1']}, 3)
+    assert cache.get_result('rules_hash', 'firmware_uid') == ({}, 5)
+    assert cache.get_result('other_hash', None) == (None, None)
+
+    cache.put_result('rules_hash', None, 4, {'rule': ['uid_1', 'uid_2']})
+    assert cache.get_result('rules_hash', None) == ({'rule': ['uid_1', 'uid_2']}, 4)
+
+
+def test_journal_is_pruned(cache):
+    for uid in ['uid_1', 'uid_2', 'uid_3']:
+        cache.add_file(uid)
+    cache.put_result('old_rules_hash', None, 1, {})
+    assert cache.get_uids_stored_since(0) == {'uid_1', 'uid_2', 'uid_3'}, 'files of running searches should be kept'
+
+    with mock.patch.object(binary_search_cache, 'MAX_SEARCH_DURATION', -1):
+        cache.put_result('old_rules_hash', None, 1, {})
+        assert cache.get_uids_stored_since(0) is None, 'files stored before the oldest cached result are not needed'
+        assert cache.get_uids_stored_since(1) == {'uid_2', 'uid_3'}
+
+        cache.put_result('old_rules_hash', None, 3, {})
+        assert cache.get_uids_stored_since(3) == set()
+    cache.add_file('uid_4')
+    assert cache.get_generation() == 4, 'the generation must not be reset by pruning'
+
+
+def test_journal_is_pruned_without_results(cache):
+    with mock.patch.object(binary_search_cache, 'MAX_SEARCH_DURATION', -1), mock.patch.object(binary_search_cache, 'JOURNAL_PRUNE_INTERVAL', 2):
+        for number in range(5):
+            cache.add_file('uid_{}'.format(number))
+    assert cache.get_uids_stored_since(4) == {'uid_4'}
+    assert cache.get_uids_stored_since(3) is None, 'the journal should be pruned when files are added'
+
+    cache.put_result('rules_hash', None, 2, {})
+    assert cache.get_result('rules_hash', None) == (None, None), 'results of searches whose journal was pruned must not be cached'
+
+
+def test_journal_size_is_limited(cache):
+    with mock.patch.object(binary_search_cache, 'MAX_JOURNAL_ENTRIES', 2), mock.patch.object(binary_search_cache, 'JOURNAL_PRUNE_INTERVAL', 1):
+        cache.add_file('uid_1')
+        cache.put_result('rules_hash', None, 1, {})
+        for uid in ['uid_2', 'uid_3', 'uid_4']:
+            cache.add_file(uid)
+        assert cache.get_result('rules_hash', None) == (None, None), 'result with a journal that is too long should be dropped'
+        assert cache.get_uids_stored_since(2) == {'uid_3', 'uid_4'}
+        assert cache.get_uids_stored_since(1) is None
+
+
+def test_least_recently_used_results_are_evicted(cache):
+    with mock.patch.object(binary_search_cache, 'MAX_CACHED_RESULTS', 2):
+        cache.put_result('hash_1', None, 0, {})
+        cache.put_result('hash_2', None, 0, {})
+        cache.get_result('hash_1', None)
+        cache.put_result('hash_3', None, 0, {})
+    assert cache.get_result('hash_2', None) == (None, None)
+    assert cache.get_result('hash_1', None) == ({}, 0)
+    assert cache.get_result('hash_3', None) == ({}, 0)
+
+
+def test_get_binary_search_cache(tmpdir):
+    assert get_binary_search_cache({'data_storage': {}}) is None
+    assert get_binary_search_cache({'data_storage': {'binary_search_cache_directory': ''}}) is None
+    assert isinstance(get_binary_search_cache({'data_storage': {'binary_search_cache_directory': str(tmpdir)}}), BinarySearchCache)
@@ -0,0 +1,121 @@
+# pylint: disable=redefined-outer-name,protected-access
+import os
+from contextlib import closing
+from unittest import mock
+
+import pytest
+
+from storage import binary_search_index
+from storage.binary_search_index import BinarySearchIndex, get_ngrams_of_file
+
+TEST_FILES = {
+    'uid_1': b'some data with the string foobar in it',
+    'uid_2': b'some other data containing foo and bar',
+    'uid_3': b'foobar and test1234',
+}
+
+
+@pytest.fixture
+def index(tmpdir):
+    return _create_index(tmpdir)
+
+
+def _create_index(directory):
+    index = BinarySearchIndex(str(directory.join('index')))
+    for uid, content in TEST_FILES.items():
+        file_path = str(directory.join(uid))
+        with open(file_path, 'wb') as test_file:
+            test_file.write(content)
+        index.add_file(uid, file_path)
+    return index
+
+
+def test_get_ngrams_of_file(tmpdir):
+    test_file = tmpdir.join('test_file')
+    test_file.write_binary(b'abcdabc')
+    assert get_ngrams_of_file(str(test_file)).tolist() == [0x616263, 0x626364, 0x636461, 0x646162]
+
+
+def test_get_ngrams_of_large_file(tmpdir):
+    test_file = tmpdir.join('test_file')
+    test_file.write_binary(b'abcdabc')
+    with mock.patch.object(binary_search_index, 'READ_BLOCK_SIZE', 2):
+        assert get_ngrams_of_file(str(test_file)).tolist() == [0x616263, 0x626364, 0x636461, 0x646162], 'n-grams across block borders missing'
+
+
+def test_files_are_queued(index):
+    assert index.get_indexed_uids(list(TEST_FILES)) == set(), 'files should only be indexed by update()'
+    assert index.update() == len(TEST_FILES)
+    assert index.get_indexed_uids(list(TEST_FILES) + ['unknown_uid']) == set(TEST_FILES)
+    assert index.update() == 0
+
+
+def test_index_in_batches(tmpdir):
+    with mock.patch.object(binary_search_index, 'INDEX_BATCH_SIZE', 2):
+        index = _create_index(tmpdir)
+        assert index.get_indexed_uids(list(TEST_FILES)) == set(), 'files should not be indexed by add_file() if a batch is complete'
+        assert index.update() == len(TEST_FILES)
+    assert index.get_indexed_uids(list(TEST_FILES)) == set(TEST_FILES)
+    assert index.get_candidate_uids([[b'foobar']]) == {'uid_1', 'uid_3'}
+
+
+def test_file_removed_while_indexing(index):
+    original_get_ngrams_of_file = binary_search_index.get_ngrams_of_file
+
+    def get_ngrams_and_remove_file(file_path):
+        index.remove_file('uid_2')
+        return original_get_ngrams_of_file(file_path)
+
+    with mock.patch.object(binary_search_index, 'get_ngrams_of_file', get_ngrams_and_remove_file):
+        index.update()
+    assert index.get_indexed_uids(list(TEST_FILES)) == {'uid_1', 'uid_3'}
+
+
+def test_get_candidate_uids(index):
+    index.update()
+    assert index.get_candidate_uids([[b'foobar']]) == {'uid_1', 'uid_3'}
+    assert index.get_candidate_uids([[b'foo', b'bar']]) == {'uid_1', 'uid_2', 'uid_3'}
+    assert index.get_candidate_uids([[b'containing'], [b'test1234']]) == {'uid_2', 'uid_3'}
+    assert index.get_candidate_uids([[b'not included']]) == set()
+    with pytest.raises(ValueError):
+        index.get_candidate_uids([[b'ab']])
+
+
+def test_index_multiple_batches(index, tmpdir):
+    index.update()
+    file_path = str(tmpdir.join('uid_4'))
+    with open(file_path, 'wb') as test_file:
+        test_file.write(b'another foobar')
+    index.add_file('uid_4', file_path)
+    index.update()
+    assert index.get_candidate_uids([[b'foobar']]) == {'uid_1', 'uid_3', 'uid_4'}
+
+
+def test_merge_postings(tmpdir):
+    index = BinarySearchIndex(str(tmpdir.join('index')))
+    with mock.patch.object(binary_search_index, 'MERGE_ROWS', 3), mock.patch.object(binary_search_index, 'SEGMENT_SIZE', 4):
+        for number in range(10):  # one batch per file
+            file_path = str(tmpdir.join('uid_{}'.format(number)))
+            with open(file_path, 'wb') as test_file:
+                test_file.write(b'foobar' if number % 3 == 0 else b'something else')
+            index.add_file('uid_{}'.format(number), file_path)
+            index.update()
+            assert index.get_candidate_uids([[b'foobar']]) == {'uid_{}'.format(other_number) for other_number in range(0, number + 1, 3)}
+    with closing(index._connect()) as connection:
+        block_rows = connection.execute('SELECT block, merged, COUNT(*) FROM postings GROUP BY block, merged').fetchall()
+    assert any(merged for _, merged, _ in block_rows)
+    assert all(count < 3 for _, merged, count in block_rows if not merged), 'the batch rows are merged'
+    assert all(count <= 3 for _, merged, count in block_rows if merged), 'one merged row per segment of 4 documents'
+
+
+def test_remove_file(index):
+    index.update()
+    index.remove_file('uid_1')
+    assert index.get_indexed_uids(list(TEST_FILES)) == {'uid_2', 'uid_3'}
+    assert index.get_candidate_uids([[b'foobar']]) == {'uid_3'}
+
+
+def test_missing_file_is_not_indexed(index, tmpdir):
+    os.remove(str(tmpdir.join('uid_2')))
+    index.update()
+    assert index.get_indexed_uids(list(TEST_FILES)) == {'uid_1', 'uid_3'}
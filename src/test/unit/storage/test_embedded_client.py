@@ -0,0 +1,173 @@
+# pylint: disable=redefined-outer-name
+import pytest
+from gridfs.errors import NoFile
+from pymongo import ASCENDING, DESCENDING, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from storage.embedded.client import EmbeddedClient, encode_key
+from storage.embedded.grid_fs import CHUNK_SIZE, EmbeddedGridFS
+
+
+@pytest.fixture
+def client(tmpdir):
+    client = EmbeddedClient(str(tmpdir))
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def collection(client):
+    collection = client.test_database.file_objects
+    collection.insert_many([
+        {'_id': 'uid_{}'.format(index), 'size': index, 'parent_firmware_uids': ['fw_{}'.format(index % 2)]}
+        for index in range(10)
+    ])
+    return collection
+
+
+def test_encode_key():
+    assert encode_key(1) == encode_key(1.0)
+    assert encode_key(True) != encode_key(1)
+    assert encode_key('1') != encode_key(1)
+
+
+def test_find(collection):
+    assert collection.find_one('uid_3') == {'_id': 'uid_3', 'size': 3, 'parent_firmware_uids': ['fw_1']}
+    assert collection.find_one({'_id': 'missing'}) is None
+    assert [entry['_id'] for entry in collection.find({'size': {'$gte': 7}}, {'_id': 1})] == ['uid_7', 'uid_8', 'uid_9']
+    assert [entry['size'] for entry in collection.find({}, sort=[('size', DESCENDING)], skip=1, limit=2)] == [8, 7]
+    assert [entry['size'] for entry in collection.find({}).skip(8).limit(5)] == [8, 9]
+    assert collection.count_documents({'parent_firmware_uids': 'fw_0'}) == 5
+    assert collection.estimated_document_count() == 10
+    assert sorted(collection.distinct('parent_firmware_uids')) == ['fw_0', 'fw_1']
+
+
+def test_missing_collection(client):
+    assert client.test_database.missing.find_one() is None
+    assert client.test_database.missing.count_documents({}) == 0
+    assert client.test_database.missing.estimated_document_count() == 0
+
+
+def test_index(collection):
+    assert collection.find({'parent_firmware_uids': 'fw_1'}).explain()['queryPlanner']['winningPlan']['stage'] == 'COLLSCAN'
+    assert collection.create_indexes([IndexModel([('parent_firmware_uids', ASCENDING)])]) == ['parent_firmware_uids_1']
+    plan = collection.find({'parent_firmware_uids': 'fw_1'}).explain()['queryPlanner']['winningPlan']
+    assert plan['inputStage']['stage'] == 'IXSCAN'
+    assert collection.count_documents({'parent_firmware_uids': 'fw_1'}) == 5
+
+    collection.update_one({'_id': 'uid_0'}, {'$addToSet': {'parent_firmware_uids': 'fw_1'}})
+    collection.delete_one({'_id': 'uid_1'})
+    collection.insert_one({'_id': 'new', 'parent_firmware_uids': ['fw_1']})
+    assert {entry['_id'] for entry in collection.find({'parent_firmware_uids': {'$in': ['fw_1']}})} == {'uid_0', 'uid_3', 'uid_5', 'uid_7', 'uid_9', 'new'}
+    assert collection.find({'_id': 'uid_0'}).explain()['queryPlanner']['winningPlan']['stage'] == 'IDHACK'
+
+
+def test_range_index_scan(collection):
+    collection.insert_one({'_id': 'no size', 'size': {'unindexed': True}})
+    collection.create_index('size')
+    plan = collection.find({'size': {'$gte': 7}}).explain()['queryPlanner']['winningPlan']
+    assert plan['inputStage']['stage'] == 'IXSCAN'
+    assert [entry['_id'] for entry in collection.find({'size': {'$gte': 7}})] == ['uid_7', 'uid_8', 'uid_9']
+    assert collection.count_documents({'size': {'$exists': True}}) == 11
+    assert collection.count_documents({'size': {'$lt': 'string'}}) == 0
+    assert collection.find({'size': {'$exists': False}}).explain()['queryPlanner']['winningPlan']['stage'] == 'COLLSCAN'
+
+    assert sorted(collection.index_information()) == ['_id_', 'size_1']
+    collection.drop_indexes()
+    assert sorted(collection.index_information()) == ['_id_']
+
+
+def test_insert_duplicate(collection):
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({'_id': 'uid_0'})
+    document = {'size': 100}
+    inserted_id = collection.insert_one(document).inserted_id
+    assert document['_id'] == inserted_id
+    assert collection.find_one(inserted_id)['size'] == 100
+
+
+def test_update(collection):
+    result = collection.update_many({'parent_firmware_uids': 'fw_0'}, {'$set': {'tag': 'even'}})
+    assert result.matched_count == 5 and result.modified_count == 5
+    assert collection.count_documents({'tag': 'even'}) == 5
+
+    result = collection.update_one({'_id': 'missing'}, {'$set': {'size': 1}}, upsert=True)
+    assert result.upserted_id == 'missing'
+    assert collection.find_one('missing') == {'_id': 'missing', 'size': 1}
+
+    collection.replace_one({'_id': 'uid_0'}, {'_id': 'uid_0', 'replaced': True})
+    assert collection.find_one('uid_0') == {'_id': 'uid_0', 'replaced': True}
+
+
+def test_find_one_and_update(collection):
+    before = collection.find_one_and_update({'_id': 'uid_1'}, {'$pull': {'parent_firmware_uids': 'fw_1'}})
+    assert before['parent_firmware_uids'] == ['fw_1']
+    after = collection.find_one_and_update({'_id': 'uid_1'}, {'$push': {'parent_firmware_uids': 'fw_2'}}, return_document=ReturnDocument.AFTER)
+    assert after['parent_firmware_uids'] == ['fw_2']
+
+
+def test_delete(collection):
+    assert collection.delete_many({'size': {'$lt': 5}}).deleted_count == 5
+    assert collection.delete_one({}).deleted_count == 1
+    assert collection.count_documents({}) == 4
+
+
+def test_bulk_write(collection):
+    with pytest.raises(BulkWriteError) as error:
+        collection.bulk_write([
+            InsertOne({'_id': 'uid_0'}),
+            InsertOne({'_id': 'new'}),
+            UpdateOne({'_id': 'uid_1'}, {'$set': {'size': 100}}),
+        ], ordered=False)
+    assert [(write_error['index'], write_error['code']) for write_error in error.value.details['writeErrors']] == [(0, 11000)]
+    assert collection.find_one('new') is not None
+    assert collection.find_one('uid_1')['size'] == 100
+
+    result = collection.bulk_write([UpdateOne({'root': 'fw', 'item': 'a'}, {'$addToSet': {'uids': 'uid_0'}}, upsert=True)] * 2)
+    assert result.upserted_count == 1 and result.matched_count == 1
+    assert collection.find_one({'root': 'fw'})['uids'] == ['uid_0']
+
+
+def test_aggregate(collection):
+    result = collection.aggregate([
+        {'$match': {'size': {'$in': [1, 2, 3]}}},
+        {'$unwind': '$parent_firmware_uids'},
+        {'$group': {'_id': '$parent_firmware_uids', 'total': {'$sum': '$size'}}},
+        {'$sort': {'_id': 1}},
+    ])
+    assert list(result) == [{'_id': 'fw_0', 'total': 2}, {'_id': 'fw_1', 'total': 4}]
+
+
+def test_drop_database(client, collection):
+    assert client.list_database_names() == ['test_database']
+    client.drop_database('test_database')
+    assert client.test_database.list_collection_names() == []
+    assert collection.find_one() is None
+    collection.insert_one({'_id': 'new'})
+    assert collection.count_documents({}) == 1
+
+
+def test_shared_storage(tmpdir, collection):
+    other_client = EmbeddedClient(str(tmpdir))
+    other_client.test_database.file_objects.insert_one({'_id': 'from other client'})
+    assert collection.find_one('from other client') is not None
+    other_client.close()
+
+
+def test_grid_fs(client):
+    grid_fs = EmbeddedGridFS(client.test_sanitize)
+    large_file_id = grid_fs.put(b'x' * (2 * CHUNK_SIZE + 1), filename='result')
+    grid_fs.put(b'second version', filename='result')
+    assert len(grid_fs.get(large_file_id).read()) == 2 * CHUNK_SIZE + 1
+    assert client.test_sanitize.fs.chunks.count_documents({'files_id': large_file_id}) == 3
+    assert grid_fs.get_last_version('result').read() == b'second version'
+    assert [grid_out.filename for grid_out in grid_fs.find({'filename': 'result'})] == ['result', 'result']
+    assert grid_fs.exists(filename='result')
+
+    grid_fs.delete(large_file_id)
+    assert client.test_sanitize.fs.chunks.count_documents({'files_id': large_file_id}) == 0
+    assert grid_fs.find_one().read() == b'second version'
+    with pytest.raises(NoFile):
+        grid_fs.get(large_file_id)
+    with pytest.raises(NoFile):
+        grid_fs.get_last_version('missing')
@@ -0,0 +1,162 @@
+from datetime import datetime
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from storage.embedded.aggregation import aggregate
+from storage.embedded.query import apply_update, get_upsert_document, get_values, matches, project, sort_documents
+
+TEST_DOCUMENT = {
+    '_id': 'uid',
+    'size': 42,
+    'file_name': 'busybox',
+    'parent_firmware_uids': ['fw_1', 'fw_2'],
+    'virtual_file_path': {'fw_1': ['fw_1|/bin/busybox']},
+    'comments': [{'time': 1, 'author': 'a'}, {'time': 3, 'author': 'b'}],
+    'processed_analysis': {'file_type': {'mime': 'application/x-executable', 'summary': []}},
+}
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('size', [42]),
+    ('missing', []),
+    ('virtual_file_path.fw_1', [['fw_1|/bin/busybox']]),
+    ('comments.time', [1, 3]),
+    ('parent_firmware_uids.1', ['fw_2']),
+])
+def test_get_values(path, expected):
+    assert get_values(TEST_DOCUMENT, path) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ({}, True),
+    ({'_id': 'uid'}, True),
+    ({'_id': 'other'}, False),
+    ({'size': 42.0}, True),
+    ({'size': True}, False),
+    ({'parent_firmware_uids': 'fw_2'}, True),
+    ({'parent_firmware_uids': ['fw_1', 'fw_2']}, True),
+    ({'missing': None}, True),
+    ({'size': {'$gt': 40, '$lte': 42}}, True),
+    ({'size': {'$gt': '40'}}, False),
+    ({'size': {'$in': [1, 42]}}, True),
+    ({'size': {'$nin': [1, 42]}}, False),
+    ({'size': {'$ne': 1}}, True),
+    ({'comments.time': {'$exists': True}}, True),
+    ({'missing': {'$exists': True}}, False),
+    ({'parent_firmware_uids': {'$size': 2}}, True),
+    ({'processed_analysis.file_type.summary': {'$not': {'$size': 0}}}, False),
+    ({'file_name': {'$regex': 'BUSY', '$options': 'i'}}, True),
+    ({'parent_firmware_uids': {'$all': ['fw_1', 'fw_3']}}, False),
+    ({'comments': {'$elemMatch': {'time': {'$gt': 2}, 'author': 'b'}}}, True),
+    ({'$or': [{'size': 1}, {'file_name': 'busybox'}]}, True),
+    ({'$and': [{'size': 42}, {'file_name': 'ls'}]}, False),
+    ({'$nor': [{'_id': {'$nin': ['uid']}}]}, True),
+])
+def test_matches(query, expected):
+    assert matches(TEST_DOCUMENT, query) is expected
+
+
+def test_unsupported_operator():
+    with pytest.raises(OperationFailure):
+        matches(TEST_DOCUMENT, {'size': {'$mod': [2, 0]}})
+
+
+@pytest.mark.parametrize('projection, expected', [
+    (None, TEST_DOCUMENT),
+    ({'_id': 1}, {'_id': 'uid'}),
+    ({'size': 1, '_id': 0}, {'size': 42}),
+    (['file_name'], {'_id': 'uid', 'file_name': 'busybox'}),
+    ({'processed_analysis.file_type.mime': 1}, {'_id': 'uid', 'processed_analysis': {'file_type': {'mime': 'application/x-executable'}}}),
+    ({'comments.author': 1}, {'_id': 'uid', 'comments': [{'author': 'a'}, {'author': 'b'}]}),
+])
+def test_project(projection, expected):
+    assert project(TEST_DOCUMENT, projection) == expected
+
+
+def test_exclusion_projection():
+    result = project(TEST_DOCUMENT, {'comments': 0, 'processed_analysis.file_type.summary': 0})
+    assert 'comments' not in result
+    assert result['processed_analysis']['file_type'] == {'mime': 'application/x-executable'}
+    assert TEST_DOCUMENT['processed_analysis']['file_type']['summary'] == [], 'original document must not be changed'
+
+
+def test_sort_documents():
+    documents = [{'_id': 1, 'a': 2, 'b': 1}, {'_id': 2, 'a': 1}, {'_id': 3, 'a': 2, 'b': 2}, {'_id': 4, 'a': None}]
+    assert [document['_id'] for document in sort_documents(documents, [('a', 1), ('b', -1)])] == [4, 2, 3, 1]
+
+
+def test_apply_update():
+    result = apply_update(TEST_DOCUMENT, {
+        '$set': {'virtual_file_path.fw_2': ['fw_2|/busybox'], 'size': 1},
+        '$unset': {'file_name': ''},
+        '$inc': {'counter': 2},
+        '$addToSet': {'parent_firmware_uids': {'$each': ['fw_2', 'fw_3']}},
+        '$pull': {'comments': {'time': {'$lt': 2}}},
+        '$push': {'tags': 'new'},
+    })
+    assert result['virtual_file_path'] == {'fw_1': ['fw_1|/bin/busybox'], 'fw_2': ['fw_2|/busybox']}
+    assert result['size'] == 1 and result['counter'] == 2 and result['tags'] == ['new']
+    assert 'file_name' not in result
+    assert result['parent_firmware_uids'] == ['fw_1', 'fw_2', 'fw_3']
+    assert result['comments'] == [{'time': 3, 'author': 'b'}]
+    assert TEST_DOCUMENT['size'] == 42, 'original document must not be changed'
+
+
+def test_apply_replacement():
+    assert apply_update(TEST_DOCUMENT, {'size': 1}) == {'_id': 'uid', 'size': 1}
+
+
+def test_upsert_document():
+    document = get_upsert_document({'root_uid': 'fw', 'plugin': {'$eq': 'p'}, 'uids': {'$size': 0}})
+    assert apply_update(document, {'$addToSet': {'uids': 'uid'}, '$setOnInsert': {'new': True}}, is_insert=True) == {
+        'root_uid': 'fw', 'plugin': 'p', 'uids': ['uid'], 'new': True
+    }
+
+
+def test_aggregate_swapped_results():
+    documents = [{'_id': 'a', 'processed_analysis': {'x': {'file_system_flag': True, 'result': 'file'}, 'y': {'file_system_flag': False}}}]
+    result = aggregate(documents, [
+        {'$project': {'swapped': {'$filter': {
+            'input': {'$objectToArray': '$processed_analysis'},
+            'cond': {'$eq': ['$$this.v.file_system_flag', True]}
+        }}}},
+        {'$unwind': '$swapped'},
+    ], None)
+    assert result == [{'_id': 'a', 'swapped': {'k': 'x', 'v': {'file_system_flag': True, 'result': 'file'}}}]
+
+
+def test_aggregate_group():
+    documents = [
+        {'_id': 1, 'vendor': 'a', 'size': 1, 'release_date': datetime(2020, 1, 1)},
+        {'_id': 2, 'vendor': 'a', 'size': 3, 'release_date': datetime(2020, 2, 1)},
+        {'_id': 3, 'vendor': 'b', 'size': 5, 'release_date': datetime(2020, 2, 1)},
+    ]
+    result = aggregate(documents, [
+        {'$group': {'_id': '$vendor', 'count': {'$sum': 1}, 'average': {'$avg': '$size'}, 'uids': {'$push': '$_id'}}},
+        {'$sort': {'_id': -1}},
+    ], None)
+    assert result == [{'_id': 'b', 'count': 1, 'average': 5, 'uids': [3]}, {'_id': 'a', 'count': 2, 'average': 2, 'uids': [1, 2]}]
+
+    result = aggregate(documents, [{'$group': {'_id': {'month': {'$month': '$release_date'}, 'year': {'$year': '$release_date'}}, 'count': {'$sum': 1}}}], None)
+    assert result == [{'_id': {'month': 1, 'year': 2020}, 'count': 1}, {'_id': {'month': 2, 'year': 2020}, 'count': 2}]
+
+
+def test_aggregate_lookup():
+    class ForeignCollection:
+        @staticmethod
+        def find(query):
+            return [document for document in [{'_id': 'fw_1', 'vendor': 'v'}] if matches(document, query)]
+
+    result = aggregate([TEST_DOCUMENT], [
+        {'$unwind': '$parent_firmware_uids'},
+        {'$lookup': {'from': 'firmwares', 'localField': 'parent_firmware_uids', 'foreignField': '_id', 'as': 'firmware'}},
+        {'$unwind': '$firmware'},
+        {'$project': {'_id': 1, 'vendor': '$firmware.vendor'}},
+    ], lambda name: ForeignCollection)
+    assert result == [{'_id': 'uid', 'vendor': 'v'}]
+
+
+def test_unsupported_stage():
+    with pytest.raises(OperationFailure):
+        aggregate([TEST_DOCUMENT], [{'$facet': {}}], None)
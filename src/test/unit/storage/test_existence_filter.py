@@ -0,0 +1,74 @@
+# pylint: disable=protected-access,redefined-outer-name
+import os
+
+import pytest
+
+from storage.existence_filter import ExistenceFilter, _get_bit_positions, _get_filter_size
+
+STORED_UIDS = ['{:064x}_{}'.format(index, index) for index in range(1000)]
+
+
+@pytest.fixture
+def filter_path(tmpdir):
+    path = str(tmpdir.join('existence_filter'))
+    ExistenceFilter.create(path, STORED_UIDS, len(STORED_UIDS), min_capacity=1000)
+    return path
+
+
+def test_disabled_filter():
+    existence_filter = ExistenceFilter('')
+    assert existence_filter.enabled is False
+    assert existence_filter.might_contain('any uid') is True
+    existence_filter.add('any uid')
+
+
+def test_missing_filter_file(tmpdir):
+    existence_filter = ExistenceFilter(str(tmpdir.join('missing')))
+    assert existence_filter.might_contain('any uid') is True
+
+
+def test_invalid_filter_file(tmpdir):
+    path = str(tmpdir.join('invalid'))
+    with open(path, 'wb') as fp:
+        fp.write(b'not a filter' * 10)
+    assert ExistenceFilter(path).might_contain('any uid') is True
+
+
+def test_stored_uids_are_contained(filter_path):
+    existence_filter = ExistenceFilter(filter_path)
+    assert all(existence_filter.might_contain(uid) for uid in STORED_UIDS)
+
+
+def test_false_positive_rate(filter_path):
+    existence_filter = ExistenceFilter(filter_path)
+    false_positives = sum(existence_filter.might_contain('unknown_{}'.format(index)) for index in range(10000))
+    assert false_positives < 200
+
+
+def test_add_is_visible_to_other_instances(filter_path):
+    reader, writer = ExistenceFilter(filter_path), ExistenceFilter(filter_path)
+    assert reader.might_contain('new uid') is False
+    writer.add('new uid')
+    assert reader.might_contain('new uid') is True
+
+
+def test_rebuild_replaces_old_filter(filter_path):
+    existence_filter = ExistenceFilter(filter_path)
+    assert existence_filter.might_contain(STORED_UIDS[0]) is True
+    ExistenceFilter.create(filter_path, ['other uid'], 1, min_capacity=1000)
+    assert existence_filter.might_contain('other uid') is True
+    assert existence_filter.might_contain(STORED_UIDS[0]) is False
+    assert os.listdir(os.path.dirname(filter_path)) == ['existence_filter']
+
+
+def test_get_filter_size():
+    num_bits, num_hashes = _get_filter_size(1000, 0.01)
+    assert num_bits == 9586
+    assert num_hashes == 7
+
+
+def test_get_bit_positions():
+    positions = _get_bit_positions('some uid', 7, 1000)
+    assert len(positions) == 7
+    assert all(0 <= position < 1000 for position in positions)
+    assert positions == _get_bit_positions('some uid', 7, 1000)
@@ -1,8 +1,10 @@
 import gc
 import os
+import sqlite3
 import unittest
 from configparser import ConfigParser
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 from common_helper_files import get_binary_from_file
 from objects.file import FileObject
@@ -43,3 +45,114 @@ class TestFsOrganizer(unittest.TestCase):
 
         self.fs_organzier.delete_file(file_object.uid)
         self.assertFalse(os.path.exists(file_object.file_path), 'file not deleted')
+
+    def test_store_staged_file(self):
+        staged_file_path = os.path.join(self.ds_tmp_dir.name, 'staged_upload')
+        with open(staged_file_path, 'wb') as staged_file:
+            staged_file.write(b'abcde')
+        file_object = FileObject()
+        file_object.uid = '36bbe50ed96841d10443bcb670d6554f0a34b761be67ec9c4a8ad2c0c44ca42c_5'
+
+        self.fs_organzier.store_staged_file(file_object, staged_file_path)
+        self.check_file_presence_and_content('{}/36/36bbe50ed96841d10443bcb670d6554f0a34b761be67ec9c4a8ad2c0c44ca42c_5'.format(self.ds_tmp_dir.name), b'abcde')
+        self.assertFalse(os.path.exists(staged_file_path), 'staged file not moved')
+        self.assertEqual(file_object.binary, b'abcde')
+
+    def test_binary_search_index(self):
+        assert self.fs_organzier.binary_search_index is None, 'index should be disabled by default'
+        self.fs_organzier.config.set('data_storage', 'binary_search_index_directory', os.path.join(self.ds_tmp_dir.name, 'index'))
+        file_object = FileObject(b'foobar')
+
+        self.fs_organzier.store_file(file_object)
+        self.fs_organzier.binary_search_index.update()
+        assert self.fs_organzier.binary_search_index.get_candidate_uids([[b'foobar']]) == {file_object.uid}
+
+        self.fs_organzier.delete_file(file_object.uid)
+        assert self.fs_organzier.binary_search_index.get_indexed_uids([file_object.uid]) == set()
+
+    def test_binary_search_index_error(self):
+        self.fs_organzier.config.set('data_storage', 'binary_search_index_directory', os.path.join(self.ds_tmp_dir.name, 'index'))
+        file_object = FileObject(b'foobar')
+        with mock.patch.object(self.fs_organzier.binary_search_index, 'add_file', side_effect=sqlite3.OperationalError('database is locked')):
+            self.fs_organzier.store_file(file_object)
+        self.check_file_presence_and_content(file_object.file_path, b'foobar')
+        with mock.patch.object(self.fs_organzier.binary_search_index, 'remove_file', side_effect=sqlite3.OperationalError('database is locked')):
+            self.fs_organzier.delete_file(file_object.uid)
+        assert not os.path.exists(file_object.file_path)
+
+    def test_binary_search_cache_journal(self):
+        assert self.fs_organzier.binary_search_cache is None, 'cache should be disabled by default'
+        self.fs_organzier.config.set('data_storage', 'binary_search_cache_directory', os.path.join(self.ds_tmp_dir.name, 'cache'))
+        generation = self.fs_organzier.binary_search_cache.get_generation()
+        file_object = FileObject(b'foobar')
+
+        self.fs_organzier.store_file(file_object)
+        assert self.fs_organzier.binary_search_cache.get_uids_stored_since(generation) == {file_object.uid}
+
+
+class TestFsOrganizerMultipleDirectories(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dirs = [TemporaryDirectory(prefix='fact_tests_') for _ in range(2)]
+        self.config = ConfigParser()
+        self.config.add_section('data_storage')
+        self.config.set('data_storage', 'firmware_file_storage_directory', self.tmp_dirs[0].name)
+        self.config.set('data_storage', 'additional_file_storage_directories', self.tmp_dirs[1].name)
+        self.config.set('data_storage', 'file_storage_directory_levels', '2')
+        self.fs_organizer = FS_Organizer(self.config)
+        self.file_objects = [FileObject('test file {}'.format(index).encode()) for index in range(20)]
+
+    def tearDown(self):
+        for tmp_dir in self.tmp_dirs:
+            tmp_dir.cleanup()
+        gc.collect()
+
+    def test_generate_path(self):
+        uid = self.file_objects[0].uid
+        file_path = self.fs_organizer.generate_path_from_uid(uid)
+        assert file_path == os.path.join(self.fs_organizer.get_storage_directory(uid), uid[0:2], uid[2:4], uid)
+        assert self.fs_organizer.generate_path_from_uid(uid) == file_path, 'path must be stable'
+
+    def test_files_are_distributed(self):
+        used_directories = {self.fs_organizer.get_storage_directory(fo.uid) for fo in self.file_objects}
+        assert used_directories == {tmp_dir.name for tmp_dir in self.tmp_dirs}
+
+    def test_invalid_directory_levels(self):
+        self.config.set('data_storage', 'file_storage_directory_levels', '0')
+        with self.assertRaises(ValueError):
+            FS_Organizer(self.config)
+
+    def test_get_file_path_of_old_layout(self):
+        file_object = self.file_objects[0]
+        old_path = os.path.join(self.tmp_dirs[0].name, file_object.uid[0:2], file_object.uid)
+        os.makedirs(os.path.dirname(old_path))
+        with open(old_path, 'wb') as old_file:
+            old_file.write(file_object.binary)
+        assert self.fs_organizer.get_file_path(file_object.uid) == old_path
+        assert self.fs_organizer.get_file_path(self.file_objects[1].uid) == self.fs_organizer.generate_path_from_uid(self.file_objects[1].uid)
+
+        self.fs_organizer.delete_file(file_object.uid)
+        assert not os.path.exists(old_path)
+
+    def test_rebalance(self):
+        single_directory_config = ConfigParser()
+        single_directory_config.read_dict({'data_storage': {'firmware_file_storage_directory': self.tmp_dirs[0].name}})
+        old_fs_organizer = FS_Organizer(single_directory_config)
+        for file_object in self.file_objects:
+            old_fs_organizer.store_file(file_object)
+        os.makedirs(os.path.join(self.tmp_dirs[0].name, 'unrelated'))
+        with open(os.path.join(self.tmp_dirs[0].name, 'unrelated', 'not_a_uid'), 'w') as unrelated_file:
+            unrelated_file.write('content')
+
+        moved, checked = self.fs_organizer.rebalance()
+        assert (moved, checked) == (len(self.file_objects), len(self.file_objects))
+        for file_object in self.file_objects:
+            new_path = self.fs_organizer.generate_path_from_uid(file_object.uid)
+            assert self.fs_organizer.get_file_path(file_object.uid) == new_path
+            self.check_file_content(new_path, file_object.binary)
+            assert not os.path.exists(old_fs_organizer.generate_path_from_uid(file_object.uid))
+        assert os.path.isfile(os.path.join(self.tmp_dirs[0].name, 'unrelated', 'not_a_uid')), 'other files must not be moved'
+        assert self.fs_organizer.rebalance() == (0, len(self.file_objects))
+
+    def check_file_content(self, file_path, file_binary):
+        assert get_binary_from_file(file_path) == file_binary
@@ -0,0 +1,86 @@
+import json
+import pickle
+from copy import deepcopy
+
+import pytest
+
+from storage.lazy_analysis import LazyAnalysisResult, SanitizedResultCache
+
+
+class RetrieveMock:
+    def __init__(self):
+        self.requested = []
+
+    def __call__(self, file_name):
+        self.requested.append(file_name)
+        return 'content of {}'.format(file_name)
+
+
+@pytest.fixture(scope='function')
+def retrieve():
+    return RetrieveMock()
+
+
+@pytest.fixture(scope='function')
+def lazy_result(retrieve):
+    return LazyAnalysisResult({'summary': ['a', 'b'], 'result': 'file_1', 'plugin_version': 'file_2'}, retrieve)
+
+
+def test_summary_does_not_trigger_retrieval(lazy_result, retrieve):
+    assert lazy_result['summary'] == ['a', 'b']
+    assert 'result' in lazy_result
+    assert sorted(lazy_result.keys()) == ['plugin_version', 'result', 'summary']
+    assert retrieve.requested == []
+
+
+def test_entry_is_retrieved_once(lazy_result, retrieve):
+    assert lazy_result['result'] == 'content of file_1'
+    assert lazy_result.get('result') == 'content of file_1'
+    assert retrieve.requested == ['file_1']
+    assert not lazy_result.fully_loaded
+
+
+def test_string_summary_is_retrieved(retrieve):
+    lazy_result = LazyAnalysisResult({'summary': 'file_3'}, retrieve)
+    assert lazy_result['summary'] == 'content of file_3'
+
+
+def test_overwritten_entry_is_not_retrieved(lazy_result, retrieve):
+    lazy_result['result'] = 'new'
+    lazy_result.update({'plugin_version': '1.0'})
+    assert lazy_result == {'summary': ['a', 'b'], 'result': 'new', 'plugin_version': '1.0'}
+    assert retrieve.requested == []
+
+
+@pytest.mark.parametrize('conversion', [
+    dict,
+    lambda result: {**result},
+    lambda result: dict(result.items()),
+    lambda result: result.copy(),
+    lambda result: pickle.loads(pickle.dumps(result)),
+    deepcopy,
+    lambda result: json.loads(json.dumps(result)),
+])
+def test_conversion_retrieves_everything(lazy_result, conversion):
+    converted = conversion(lazy_result)
+    assert converted == {'summary': ['a', 'b'], 'result': 'content of file_1', 'plugin_version': 'content of file_2'}
+    assert type(converted) is dict  # pylint: disable=unidiomatic-typecheck
+
+
+def test_cache_evicts_least_recently_used():
+    cache = SanitizedResultCache(max_size=2)
+    cache.add('a', b'1')
+    cache.add('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.add('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+    assert cache.get('c') == b'3'
+    assert len(cache) == 2
+
+
+def test_disabled_cache():
+    cache = SanitizedResultCache()
+    cache.add('a', b'1')
+    assert cache.get('a') is None
+    assert len(cache) == 0
@@ -0,0 +1,56 @@
+from storage.object_cache import GenerationCache, new_generation
+
+
+def test_disabled_cache():
+    cache = GenerationCache(max_size=0)
+    assert cache.enabled is False
+    cache.add('key', 1, 'value')
+    assert cache.get('key', 1) is None
+    assert len(cache) == 0
+
+
+def test_get_with_generation():
+    cache = GenerationCache(max_size=2)
+    cache.add('key', 1, 'value')
+    assert cache.get('key', 1) == 'value'
+    assert cache.get('key', 2) is None
+    assert len(cache) == 0, 'outdated entry should be removed'
+    assert cache.get('unknown key', 1) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = GenerationCache(max_size=2)
+    cache.add('a', 1, 'value a')
+    cache.add('b', 1, 'value b')
+    assert cache.get('a', 1) == 'value a'
+    cache.add('c', 1, 'value c')
+    assert len(cache) == 2
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == 'value a'
+    assert cache.get('c', 1) == 'value c'
+
+
+def test_new_generation_is_unique():
+    assert new_generation() != new_generation()
+
+
+def test_entries_are_bounded_by_bytes():
+    cache = GenerationCache(max_size=10, max_bytes=250)
+    cache.add('a', 1, b'a' * 100)
+    cache.add('b', 1, b'b' * 100)
+    assert len(cache) == 2
+    cache.add('c', 1, b'c' * 100)
+    assert len(cache) == 2
+    assert cache.get('a', 1) is None
+    assert cache.size_in_bytes <= 250
+
+    cache.add('too large', 1, b'x' * 300)
+    assert cache.get('too large', 1) is None
+    assert len(cache) == 2
+
+
+def test_get_returns_a_copy():
+    cache = GenerationCache(max_size=1)
+    cache.add('key', 1, {'list': [1]})
+    cache.get('key', 1)['list'].append(2)
+    assert cache.get('key', 1) == {'list': [1]}
@@ -49,3 +49,14 @@ def test_get_result_without_search_id(test_app):
 def test_get_result_non_existent_id(test_app):
     result = decode_response(test_app.get('/rest/binary_search/foobar'))
     assert 'result is not ready yet' in result['error_message']
+
+
+def test_get_result(test_app):
+    result = decode_response(test_app.get('/rest/binary_search/some_id'))
+    assert result['binary_search_results'] == {'test_rule': ['test_uid']}
+    assert result['finished'] is True
+
+
+def test_cancel_binary_search(test_app):
+    result = decode_response(test_app.delete('/rest/binary_search/some_id'))
+    assert 'Binary search cancelled' in result['message']
@@ -0,0 +1,55 @@
+# pylint: disable=redefined-outer-name
+import json
+
+import pytest
+
+from test.unit.web_interface.rest.conftest import decode_response
+
+TEST_ITEM = {
+    'file_path': 'test.bin', 'device_name': 'test device', 'device_class': 'test class', 'device_part': 'complete',
+    'version': '1.0', 'vendor': 'test vendor', 'release_date': '1970-01-01', 'requested_analysis_systems': ['dummy']
+}
+
+
+@pytest.fixture
+def import_directory(test_config, tmp_path):
+    (tmp_path / 'test.bin').write_bytes(b'test firmware')
+    test_config.set('data_storage', 'firmware_import_directory', str(tmp_path))
+    yield tmp_path
+    test_config.set('data_storage', 'firmware_import_directory', '')
+
+
+def test_batch_submission_disabled(test_app):
+    result = decode_response(test_app.put('/rest/firmware_batch', data=json.dumps({'firmwares': [TEST_ITEM]})))
+    assert 'Batch submission is disabled' in result['error_message']
+
+
+def test_bad_manifest(test_app, import_directory):
+    result = decode_response(test_app.put('/rest/firmware_batch', data='no json'))
+    assert 'Request should be a dict' in result['error_message']
+
+    result = decode_response(test_app.put('/rest/firmware_batch', data=json.dumps({'firmwares': []})))
+    assert 'firmwares not found' in result['error_message']
+
+
+def test_batch_submission(test_app, import_directory):
+    manifest = {'firmwares': [
+        TEST_ITEM,
+        {**TEST_ITEM, 'file_path': 'missing.bin'},
+        {**TEST_ITEM, 'file_path': '../test.bin'},
+        {key: value for key, value in TEST_ITEM.items() if key != 'vendor'},
+    ]}
+    result = decode_response(test_app.put('/rest/firmware_batch', data=json.dumps(manifest)))
+    assert result['status'] == 0
+    assert result['batch_id']
+    assert [item['status'] for item in result['items']] == ['pending', 'error', 'error', 'error']
+    assert 'not found in the import directory' in result['items'][2]['message']
+    assert result['items'][3]['message'] == 'vendor not found'
+
+
+def test_get_batch_status(test_app):
+    result = decode_response(test_app.get('/rest/firmware_batch/test_batch_id'))
+    assert result['items'][0]['status'] == 'scheduled'
+
+    result = decode_response(test_app.get('/rest/firmware_batch/unknown_id'))
+    assert 'No batch with id unknown_id found' in result['error_message']
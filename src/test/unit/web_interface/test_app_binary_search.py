@@ -61,3 +61,14 @@ class TestAppBinarySearch(WebInterfaceTest):
         )
         assert b'test firmware' in rv.data
         assert b'Results for signature' in rv.data
+
+    def test_app_binary_search_results(self):
+        rv = self.test_client.get('/database/database_binary_search_results.html?request_id=some_id')
+        assert b'Results for signature' in rv.data
+        assert b'some yara rule' in rv.data
+        assert b'All files are scanned' not in rv.data
+
+    def test_app_binary_search_results_full_scan_notice(self):
+        self.config.set('data_storage', 'binary_search_index_directory', '/tmp/fact_test_binary_search_index')
+        rv = self.test_client.get('/database/database_binary_search_results.html?request_id=some_id')
+        assert b'All files are scanned' in rv.data, 'some yara rule contains no literals'
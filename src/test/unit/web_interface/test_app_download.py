@@ -1,4 +1,4 @@
-from test.common_helper import TEST_FW
+from test.common_helper import TEST_FW, TEST_TEXT_FILE
 from test.unit.web_interface.base import WebInterfaceTest
 
 
@@ -17,6 +17,16 @@ class TestAppDownload(WebInterfaceTest):
         assert TEST_FW.binary in rv.data
         assert "attachment; filename=test.zip" in rv.headers['Content-Disposition']
 
+    def test_app_download_raw_range(self):
+        rv = self.test_client.get('/download/{}'.format(TEST_FW.uid), headers={'Range': 'bytes=0-9'})
+        assert rv.status_code == 206
+        assert rv.data == TEST_FW.binary[:10]
+
+    def test_app_download_raw_storage_not_reachable(self):
+        rv = self.test_client.get('/download/{}'.format(TEST_TEXT_FILE.uid))
+        assert rv.data == TEST_TEXT_FILE.binary
+        assert "attachment; filename={}".format(TEST_TEXT_FILE.file_name) in rv.headers['Content-Disposition']
+
     def test_app_tar_download(self):
         rv = self.test_client.get('/tar-download/{}'.format(TEST_FW.uid))
         assert TEST_FW.binary in rv.data
@@ -1,4 +1,6 @@
+import os
 from io import BytesIO
+from tempfile import TemporaryDirectory
 
 from test.unit.web_interface.base import WebInterfaceTest
 
@@ -42,3 +44,24 @@ class TestAppUpload(WebInterfaceTest):
         self.assertEqual(self.mocked_interface.tasks[0].uid, 'c1f95369a99b765e93c335067e77a7d91af3076d2d3d64aacd04e1e0a810b3ed_17', 'fw not added to intercom')
         self.assertIn('dummy', self.mocked_interface.tasks[0].scheduled_analysis, 'analysis system not added')
         self.assertEqual(self.mocked_interface.tasks[0].file_name, 'test_file.txt', 'file name not correct')
+
+    def test_app_upload_to_staging_directory(self):
+        with TemporaryDirectory(prefix='fact_test_') as staging_directory:
+            self.config.set('data_storage', 'upload_staging_directory', staging_directory)
+            rv = self.test_client.post('/upload', content_type='multipart/form-data', data={
+                'file': (BytesIO(b'test_file_content'), 'test_file.txt'),
+                'device_name': 'test_device',
+                'device_part': 'complete',
+                'device_class': 'test_class',
+                'version': '1.0',
+                'vendor': 'test_vendor',
+                'release_date': '01.01.1970',
+                'tags': '',
+                'analysis_systems': ['dummy']}, follow_redirects=True)
+            assert b'Upload Successful' in rv.data
+            task = self.mocked_interface.tasks[0]
+            assert task.uid == 'c1f95369a99b765e93c335067e77a7d91af3076d2d3d64aacd04e1e0a810b3ed_17'
+            assert task.binary is None, 'the binary must not be sent over the intercom'
+            assert os.path.dirname(task.file_path) == staging_directory
+            with open(task.file_path, 'rb') as staged_file:
+                assert staged_file.read() == b'test_file_content'
@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+'''
+    Firmware Analysis and Comparison Tool (FACT)
+    Copyright (C) 2015-2020  Fraunhofer FKIE
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import logging
+import sys
+
+from helperFunctions.database import ConnectTo
+from helperFunctions.program_setup import program_setup
+from storage.db_interface_backend import BackEndDbInterface
+from storage.MongoMgr import MongoMgr
+
+PROGRAM_NAME = 'FACT Summary Updater'
+PROGRAM_DESCRIPTION = 'Rebuild the materialized analysis summaries of all firmwares'
+
+
+def main(command_line_options=None):
+    command_line_options = sys.argv if not command_line_options else command_line_options
+    args, config = program_setup(PROGRAM_NAME, PROGRAM_DESCRIPTION, command_line_options=command_line_options)
+
+    logging.info('Try to start Mongo Server...')
+    mongo_server = MongoMgr(config=config)
+
+    with ConnectTo(BackEndDbInterface, config) as db_interface:
+        firmware_uids = [entry['_id'] for entry in db_interface.firmwares.find({}, {'_id': 1})]
+        for index, firmware_uid in enumerate(firmware_uids, start=1):
+            logging.info('rebuilding summaries of {} ({}/{})'.format(firmware_uid, index, len(firmware_uids)))
+            db_interface.rebuild_summaries(firmware_uid)
+
+    if args.testing:
+        logging.info('Stopping Mongo Server...')
+        mongo_server.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,7 @@ from flask import jsonify, render_template
 
 from helperFunctions.database import ConnectTo
 from helperFunctions.file_tree import FileTreeNode, get_correct_icon_for_mime, remove_virtual_path_from_root
-from intercom.front_end_binding import InterComFrontEndBinding
+from helperFunctions.web_interface import get_binary_and_file_name
 from storage.db_interface_compare import CompareDbInterface
 from storage.db_interface_frontend import FrontEndDbInterface
 from web_interface.components.component_base import ComponentBase
@@ -144,8 +144,7 @@ class AjaxRoutes(ComponentBase):
     def _ajax_get_binary(self, mime_type, uid):
         mime_type = mime_type.replace('_', '/')
         div = '<div style="display: block; border: 1px solid; border-color: #dddddd; padding: 5px; text-align: center">'
-        with ConnectTo(InterComFrontEndBinding, self._config) as sc:
-            binary = sc.get_binary_and_filename(uid)[0]
+        binary = get_binary_and_file_name(uid, self._config)[0]
         if 'text/' in mime_type:
             return '<pre style="white-space: pre-wrap">{}</pre>'.format(html.escape(bytes_to_str_filter(binary)))
         if 'image/' in mime_type:
@@ -12,6 +12,7 @@ from helperFunctions.dataConversion import make_unicode_string
 from helperFunctions.mongo_task_conversion import get_file_name_and_binary_from_request
 from helperFunctions.web_interface import apply_filters_to_query, filter_out_illegal_characters
 from helperFunctions.yara_binary_search import get_yara_error, is_valid_yara_rule_file
+from helperFunctions.yara_rule_literals import get_literal_groups
 from intercom.front_end_binding import InterComFrontEndBinding
 from storage.db_interface_frontend import FrontEndDbInterface
 from web_interface.components.component_base import ComponentBase
@@ -180,21 +181,28 @@ class DatabaseRoutes(ComponentBase):
 
     @roles_accepted(*PRIVILEGES['pattern_search'])
     def _app_show_binary_search_results(self):
-        firmware_dict, error, yara_rules = None, None, None
+        firmware_dict, error, yara_rules, finished, full_scan = None, None, None, False, False
         if request.args.get('request_id'):
             request_id = request.args.get('request_id')
             with ConnectTo(InterComFrontEndBinding, self._config) as connection:
-                result, yara_rules = connection.get_binary_search_result(request_id)
+                result, task, finished = connection.get_binary_search_result(request_id)
             if isinstance(result, str):
                 error = result
             elif result is not None:
-                yara_rules = make_unicode_string(yara_rules)
+                yara_rules = make_unicode_string(task[0])
+                full_scan = self._binary_search_needs_full_scan(yara_rules)
                 firmware_dict = self._build_firmware_dict_for_binary_search(result)
         else:
             error = 'No request ID found'
             request_id = None
         return render_template('database/database_binary_search_results.html', result=firmware_dict, error=error,
-                               request_id=request_id, yara_rules=yara_rules)
+                               request_id=request_id, yara_rules=yara_rules, finished=finished, full_scan=full_scan)
+
+    def _binary_search_needs_full_scan(self, yara_rules: str) -> bool:
+        '''
+        the binary search index can only be used if all rules contain literal strings
+        '''
+        return bool(self._config['data_storage'].get('binary_search_index_directory', '')) and get_literal_groups(yara_rules) is None
 
     def _build_firmware_dict_for_binary_search(self, uid_dict):
         firmware_dict = {}
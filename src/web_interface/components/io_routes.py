@@ -1,10 +1,11 @@
 import binascii
 import json
+import os
 from tempfile import TemporaryDirectory
 from time import sleep
 
 import requests
-from flask import make_response, redirect, render_template, request
+from flask import make_response, redirect, render_template, request, send_file
 
 from helperFunctions.database import ConnectTo
 from helperFunctions.dataConversion import remove_linebreaks_from_byte_string
@@ -12,8 +13,9 @@ from helperFunctions.mongo_task_conversion import (
     check_for_errors, convert_analysis_task_to_fw_obj, create_analysis_task
 )
 from helperFunctions.pdf import build_pdf_report
-from helperFunctions.web_interface import get_radare_endpoint
+from helperFunctions.web_interface import get_binary_and_file_name, get_radare_endpoint
 from intercom.front_end_binding import InterComFrontEndBinding
+from storage.binary_service import BinaryService
 from storage.db_interface_compare import CompareDbInterface, FactCompareException
 from storage.db_interface_frontend import FrontEndDbInterface
 from web_interface.components.additional_functions.hex_dump import create_hex_dump
@@ -47,8 +49,7 @@ class IORoutes(ComponentBase):
         if not span_in_binary:
             return render_template('error.html', message='Undisclosed error in base64 decoding')
 
-        with ConnectTo(InterComFrontEndBinding, self._config) as connection:
-            raw_binary = connection.get_binary_and_filename(file_obj.uid)
+        raw_binary = get_binary_and_file_name(file_obj.uid, self._config)
 
         binary, _ = remove_linebreaks_from_byte_string(raw_binary[0][span_in_binary[0]:span_in_binary[1]])
 
@@ -67,13 +68,15 @@ class IORoutes(ComponentBase):
     def _app_upload(self):
         error = {}
         if request.method == 'POST':
-            analysis_task = create_analysis_task(request)
+            analysis_task = create_analysis_task(request, self._config['data_storage'].get('upload_staging_directory', ''))
             error = check_for_errors(analysis_task)
             if not error:
                 fw = convert_analysis_task_to_fw_obj(analysis_task)
                 with ConnectTo(InterComFrontEndBinding, self._config) as sc:
                     sc.add_analysis_task(fw)
                 return render_template('upload/upload_successful.html', uid=analysis_task['uid'])
+            if 'staged_file_path' in analysis_task:
+                os.remove(analysis_task['staged_file_path'])
 
         with ConnectTo(FrontEndDbInterface, self._config) as sc:
             device_class_list = sc.get_device_class_list()
@@ -103,6 +106,10 @@ class IORoutes(ComponentBase):
             object_exists = sc.existence_quick_check(uid)
         if not object_exists:
             return render_template('uid_not_found.html', uid=uid)
+        if not packed:
+            file_name, file_path = BinaryService(config=self._config).get_local_file_name_and_path(uid)
+            if file_path is not None:  # stream the file from the file storage (with support for range requests)
+                return send_file(file_path, mimetype='application/octet-stream', as_attachment=True, attachment_filename=file_name, conditional=True)
         with ConnectTo(InterComFrontEndBinding, self._config) as sc:
             if packed:
                 result = sc.get_repacked_binary_and_file_name(uid)
@@ -135,8 +142,7 @@ class IORoutes(ComponentBase):
             object_exists = sc.existence_quick_check(uid)
         if not object_exists:
             return render_template('uid_not_found.html', uid=uid)
-        with ConnectTo(InterComFrontEndBinding, self._config) as sc:
-            result = sc.get_binary_and_filename(uid)
+        result = get_binary_and_file_name(uid, self._config)
         if result is None:
             return render_template('error.html', message='timeout')
         binary, _ = result
@@ -153,8 +159,7 @@ class IORoutes(ComponentBase):
             object_exists = sc.existence_quick_check(uid)
         if not object_exists:
             return render_template('uid_not_found.html', uid=uid)
-        with ConnectTo(InterComFrontEndBinding, self._config) as sc:
-            result = sc.get_binary_and_filename(uid)
+        result = get_binary_and_file_name(uid, self._config)
         if result is None:
             return render_template('error.html', message='timeout')
         binary, _ = result
@@ -44,8 +44,9 @@ class FilterClass:
             return ' '
         uid_list = flt.get_all_uids_in_string(tmp)
         with ConnectTo(FrontEndDbInterface, self._config) as sc:
-            for item in uid_list:
-                tmp = tmp.replace(item, sc.get_hid(item, root_uid=root_uid))
+            hids = sc.get_hids(uid_list, root_uid=root_uid)
+        for item in uid_list:
+            tmp = tmp.replace(item, hids[item])
         return tmp
 
     def _filter_replace_comparison_uid_with_hid(self, input_data, root_uid=None):
@@ -59,9 +60,9 @@ class FilterClass:
             return ' '
         uid_list = flt.get_all_uids_in_string(tmp)
         with ConnectTo(FrontEndDbInterface, self._config) as sc:
-            for item in uid_list:
-                tmp = tmp.replace(item, '<a href="/analysis/{}/ro/{}">{}</a>'.format(
-                    item, root_uid, sc.get_hid(item, root_uid=root_uid)))
+            hids = sc.get_hids(uid_list, root_uid=root_uid)
+        for item in uid_list:
+            tmp = tmp.replace(item, '<a href="/analysis/{}/ro/{}">{}</a>'.format(item, root_uid, hids[item]))
         return tmp
 
     def _filter_nice_uid_list(self, input_data, root_uid=None, selected_analysis=None):
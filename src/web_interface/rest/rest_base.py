@@ -9,6 +9,7 @@ from web_interface.rest.rest_binary_search import RestBinarySearch
 from web_interface.rest.rest_compare import RestCompare
 from web_interface.rest.rest_file_object import RestFileObject
 from web_interface.rest.rest_firmware import RestFirmware
+from web_interface.rest.rest_firmware_batch import RestFirmwareBatch
 from web_interface.rest.rest_statistic import RestStatus
 
 
@@ -18,8 +19,9 @@ class RestBase:
         self.api.add_resource(RestBinary, '/rest/binary/<uid>', methods=['GET'], resource_class_kwargs={'config': config})
         self.api.add_resource(RestCompare, '/rest/compare', '/rest/compare/<compare_id>', methods=['GET', 'PUT'], resource_class_kwargs={'config': config})
         self.api.add_resource(RestFirmware, '/rest/firmware', '/rest/firmware/<uid>', methods=['GET', 'PUT'], resource_class_kwargs={'config': config})
+        self.api.add_resource(RestFirmwareBatch, '/rest/firmware_batch', '/rest/firmware_batch/<batch_id>', methods=['GET', 'PUT'], resource_class_kwargs={'config': config})
         self.api.add_resource(RestFileObject, '/rest/file_object', '/rest/file_object/<uid>', methods=['GET'], resource_class_kwargs={'config': config})
-        self.api.add_resource(RestBinarySearch, '/rest/binary_search', '/rest/binary_search/<search_id>', methods=['GET', 'POST'], resource_class_kwargs={'config': config})
+        self.api.add_resource(RestBinarySearch, '/rest/binary_search', '/rest/binary_search/<search_id>', methods=['GET', 'POST', 'DELETE'], resource_class_kwargs={'config': config})
         self.api.add_resource(RestStatus, '/rest/status', methods=['GET'], resource_class_kwargs={'config': config})
 
         self._wrap_response(self.api)
@@ -5,6 +5,7 @@ from flask_restful import Resource, request
 from helperFunctions.database import ConnectTo
 from helperFunctions.hash import get_sha256
 from helperFunctions.rest import error_message, get_tar_flag, success_message
+from helperFunctions.web_interface import get_binary_and_file_name
 from intercom.front_end_binding import InterComFrontEndBinding
 from storage.db_interface_frontend import FrontEndDbInterface
 from web_interface.security.decorator import roles_accepted
@@ -33,10 +34,10 @@ class RestBinary(Resource):
         except ValueError as value_error:
             return error_message(str(value_error), self.URL, request_data=dict(uid=uid, tar=request.args.get('tar')))
 
-        with ConnectTo(InterComFrontEndBinding, self.config) as intercom:
-            if not tar_flag:
-                binary, file_name = intercom.get_binary_and_filename(uid)
-            else:
+        if not tar_flag:
+            binary, file_name = get_binary_and_file_name(uid, self.config)
+        else:
+            with ConnectTo(InterComFrontEndBinding, self.config) as intercom:
                 binary, file_name = intercom.get_repacked_binary_and_file_name(uid)
 
         response = {
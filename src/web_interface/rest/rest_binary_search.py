@@ -52,19 +52,33 @@ class RestBinarySearch(Resource):
         The search_id is needed to fetch the corresponding search result.
         The result of the search request can only be fetched once. After this the search needs to be started again.
         The results have the form:
-        {'binary_search_results': {'<rule_name_1>': ['<matching_uid_1>', ...], '<rule_name_2>': [...], ...}
+        {'binary_search_results': {'<rule_name_1>': ['<matching_uid_1>', ...], '<rule_name_2>': [...], ...}, 'finished': true}
+        While the search is running, the results found so far are returned and finished is false.
         '''
 
         if search_id is None:
             return error_message('The request is missing a search_id (.../binary_search/<search_id>).', self.URL)
 
         with ConnectTo(InterComFrontEndBinding, self.config) as intercom:
-            result, _ = intercom.get_binary_search_result(search_id)
+            result, _, finished = intercom.get_binary_search_result(search_id)
 
         if result is None:
             return error_message('The result is not ready yet or it has already been fetched', self.URL)
 
-        return success_message({'binary_search_results': result}, self.URL)
+        return success_message({'binary_search_results': result, 'finished': finished}, self.URL)
+
+    @roles_accepted(*PRIVILEGES['pattern_search'])
+    def delete(self, search_id=None):
+        '''
+        Cancels a running search. The results found until then can be fetched with GET.
+        '''
+        if search_id is None:
+            return error_message('The request is missing a search_id (.../binary_search/<search_id>).', self.URL)
+
+        with ConnectTo(InterComFrontEndBinding, self.config) as intercom:
+            intercom.cancel_binary_search(search_id)
+
+        return success_message({'message': 'Binary search cancelled'}, self.URL, request_data={'search_id': search_id})
 
     @staticmethod
     def _get_yara_rules(request_data):
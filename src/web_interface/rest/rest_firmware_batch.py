@@ -0,0 +1,71 @@
+from flask_restful import Resource, request
+
+from helperFunctions.database import ConnectTo
+from helperFunctions.mongo_task_conversion import check_for_batch_item_errors
+from helperFunctions.rest import convert_rest_request, error_message, success_message
+from intercom.common_mongo_binding import generate_task_id
+from intercom.front_end_binding import InterComFrontEndBinding
+from storage.db_interface_frontend import FrontEndDbInterface
+from storage.db_interface_frontend_editing import FrontendEditingDbInterface
+from web_interface.security.decorator import roles_accepted
+from web_interface.security.privileges import PRIVILEGES
+
+
+class RestFirmwareBatch(Resource):
+    URL = '/rest/firmware_batch'
+
+    def __init__(self, **kwargs):
+        self.config = kwargs.get('config', None)
+
+    @roles_accepted(*PRIVILEGES['submit_analysis'])
+    def put(self):
+        '''
+        Submits many firmware files that are already stored in the firmware import directory (shared by frontend and
+        backend) with a single request. The request data should have the form
+        {"firmwares": [{"file_path": path_relative_to_the_import_directory, "device_name": ..., "device_class": ...,
+                        "device_part": ..., "version": ..., "vendor": ..., "release_date": ...,
+                        "requested_analysis_systems": [...], "tags": ... (optional), "file_name": ... (optional)}, ...]}
+        The status of each firmware can be fetched with GET and the batch_id.
+        '''
+        import_directory = self.config['data_storage'].get('firmware_import_directory', '')
+        if not import_directory:
+            return error_message('Batch submission is disabled (no firmware_import_directory configured)', self.URL, request_data=request.data)
+        try:
+            data = convert_rest_request(request.data)
+        except TypeError as type_error:
+            return error_message(str(type_error), self.URL, request_data=request.data)
+        if not isinstance(data.get('firmwares'), list) or not data['firmwares']:
+            return error_message('firmwares not found', self.URL, request_data=data)
+
+        batch_id = generate_task_id(data)
+        items, valid_items = [], []
+        for index, batch_item in enumerate(data['firmwares']):
+            error = check_for_batch_item_errors(batch_item, import_directory) if isinstance(batch_item, dict) else 'item is not a dict'
+            if error is None:
+                valid_items.append((index, batch_item))
+            file_path = batch_item.get('file_path') if isinstance(batch_item, dict) else None
+            items.append({'file_path': file_path, 'status': 'error' if error else 'pending', 'message': error})
+
+        with ConnectTo(FrontendEditingDbInterface, self.config) as db_interface:
+            db_interface.add_firmware_batch(batch_id, items)
+        if valid_items:
+            with ConnectTo(InterComFrontEndBinding, self.config) as intercom:
+                intercom.add_firmware_batch_task(batch_id, valid_items)
+
+        return success_message({'batch_id': batch_id, 'items': items}, self.URL, request_data={'number_of_firmwares': len(items)})
+
+    @roles_accepted(*PRIVILEGES['submit_analysis'])
+    def get(self, batch_id=None):
+        '''
+        The results have the form
+        {'items': [{'index': ..., 'file_path': ..., 'status': 'pending' | 'scheduled' | 'error', 'uid': ..., 'message': ...}, ...]}
+        '''
+        if batch_id is None:
+            return error_message('The request is missing a batch_id (.../firmware_batch/<batch_id>).', self.URL)
+
+        with ConnectTo(FrontEndDbInterface, self.config) as db_interface:
+            items = db_interface.get_firmware_batch(batch_id)
+        if not items:
+            return error_message('No batch with id {} found'.format(batch_id), self.URL, request_data={'batch_id': batch_id}, return_code=404)
+
+        return success_message({'items': items}, self.URL, request_data={'batch_id': batch_id})